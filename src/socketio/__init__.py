@@ -4,19 +4,27 @@ from .manager import Manager
 from .pubsub_manager import PubSubManager
 from .kombu_manager import KombuManager
 from .redis_manager import RedisManager
+from .redis_streams_manager import RedisStreamsManager
 from .kafka_manager import KafkaManager
 from .zmq_manager import ZmqManager
+from .local_ipc_manager import LocalIPCManager
 from .server import Server
+from .emitter import Emitter
 from .namespace import Namespace, ClientNamespace
 from .middleware import WSGIApp, Middleware
 from .tornado import get_tornado_handler
 from .async_client import AsyncClient
 from .async_simple_client import AsyncSimpleClient
 from .async_server import AsyncServer
+from .async_emitter import AsyncEmitter
 from .async_manager import AsyncManager
 from .async_namespace import AsyncNamespace, AsyncClientNamespace
 from .async_redis_manager import AsyncRedisManager
+from .async_redis_streams_manager import AsyncRedisStreamsManager
 from .async_aiopika_manager import AsyncAioPikaManager
+from .async_kafka_manager import AsyncKafkaManager
+from .async_zmq_manager import AsyncZmqManager
+from .async_local_ipc_manager import AsyncLocalIPCManager
 from .asgi import ASGIApp
 
 __all__ = ['SimpleClient', 'Client', 'Server', 'Manager', 'PubSubManager',
@@ -25,4 +33,6 @@ __all__ = ['SimpleClient', 'Client', 'Server', 'Manager', 'PubSubManager',
            'AsyncSimpleClient', 'AsyncClient', 'AsyncServer',
            'AsyncNamespace', 'AsyncClientNamespace', 'AsyncManager',
            'AsyncRedisManager', 'ASGIApp', 'get_tornado_handler',
-           'AsyncAioPikaManager']
+           'AsyncAioPikaManager', 'AsyncKafkaManager', 'RedisStreamsManager',
+           'AsyncRedisStreamsManager', 'Emitter', 'AsyncEmitter',
+           'AsyncZmqManager', 'LocalIPCManager', 'AsyncLocalIPCManager']
@@ -176,19 +176,27 @@ class InstrumentedServer:
         self.sio.emit(event, data, to=room_filter, namespace=namespace)
 
     def admin_enter_room(self, _, namespace, room, room_filter=None):
-        for sid, _ in self.sio.manager.get_participants(
-                namespace, room_filter):
-            self.sio.enter_room(sid, room, namespace=namespace)
+        if room_filter is None:
+            for sid, _ in self.sio.manager.get_participants(namespace, None):
+                self.sio.enter_room(sid, room, namespace=namespace)
+            return
+        self.sio.enter_room(None, room, namespace=namespace,
+                            room_filter=room_filter)
 
     def admin_leave_room(self, _, namespace, room, room_filter=None):
-        for sid, _ in self.sio.manager.get_participants(
-                namespace, room_filter):
-            self.sio.leave_room(sid, room, namespace=namespace)
+        if room_filter is None:
+            for sid, _ in self.sio.manager.get_participants(namespace, None):
+                self.sio.leave_room(sid, room, namespace=namespace)
+            return
+        self.sio.leave_room(None, room, namespace=namespace,
+                            room_filter=room_filter)
 
     def admin_disconnect(self, _, namespace, close, room_filter=None):
-        for sid, _ in self.sio.manager.get_participants(
-                namespace, room_filter):
-            self.sio.disconnect(sid, namespace=namespace)
+        if room_filter is None:
+            for sid, _ in self.sio.manager.get_participants(namespace, None):
+                self.sio.disconnect(sid, namespace=namespace)
+            return
+        self.sio.disconnect(None, namespace=namespace, room_filter=room_filter)
 
     def shutdown(self):
         if self.stats_task:  # pragma: no branch
@@ -266,23 +274,22 @@ class InstrumentedServer:
         return self.sio.manager.__basic_leave_room(sid, namespace, room)
 
     def _emit(self, event, data, namespace, room=None, skip_sid=None,
-              callback=None, **kwargs):
+              callback=None, skip_rooms=None, **kwargs):
         ret = self.sio.manager.__emit(event, data, namespace, room=room,
                                       skip_sid=skip_sid, callback=callback,
-                                      **kwargs)
+                                      skip_rooms=skip_rooms, **kwargs)
         if namespace != self.admin_namespace:
             event_data = [event] + list(data) if isinstance(data, tuple) \
                 else [event, data]
-            if not isinstance(skip_sid, list):  # pragma: no branch
-                skip_sid = [skip_sid]
-            for sid, _ in self.sio.manager.get_participants(namespace, room):
-                if sid not in skip_sid:
-                    self.sio.emit('event_sent', (
-                        namespace,
-                        sid,
-                        event_data,
-                        datetime.now(timezone.utc).isoformat(),
-                    ), namespace=self.admin_namespace)
+            for sid, _ in self.sio.manager.get_recipients(
+                    namespace, room, skip_sid=skip_sid,
+                    skip_rooms=skip_rooms):
+                self.sio.emit('event_sent', (
+                    namespace,
+                    sid,
+                    event_data,
+                    datetime.now(timezone.utc).isoformat(),
+                ), namespace=self.admin_namespace)
         return ret
 
     def _handle_eio_connect(self, eio_sid, environ):
@@ -162,19 +162,28 @@ class InstrumentedAsyncServer:
         await self.sio.emit(event, data, to=room_filter, namespace=namespace)
 
     async def admin_enter_room(self, _, namespace, room, room_filter=None):
-        for sid, _ in self.sio.manager.get_participants(
-                namespace, room_filter):
-            await self.sio.enter_room(sid, room, namespace=namespace)
+        if room_filter is None:
+            for sid, _ in self.sio.manager.get_participants(namespace, None):
+                await self.sio.enter_room(sid, room, namespace=namespace)
+            return
+        await self.sio.enter_room(None, room, namespace=namespace,
+                                  room_filter=room_filter)
 
     async def admin_leave_room(self, _, namespace, room, room_filter=None):
-        for sid, _ in self.sio.manager.get_participants(
-                namespace, room_filter):
-            await self.sio.leave_room(sid, room, namespace=namespace)
+        if room_filter is None:
+            for sid, _ in self.sio.manager.get_participants(namespace, None):
+                await self.sio.leave_room(sid, room, namespace=namespace)
+            return
+        await self.sio.leave_room(None, room, namespace=namespace,
+                                  room_filter=room_filter)
 
     async def admin_disconnect(self, _, namespace, close, room_filter=None):
-        for sid, _ in self.sio.manager.get_participants(
-                namespace, room_filter):
-            await self.sio.disconnect(sid, namespace=namespace)
+        if room_filter is None:
+            for sid, _ in self.sio.manager.get_participants(namespace, None):
+                await self.sio.disconnect(sid, namespace=namespace)
+            return
+        await self.sio.disconnect(None, namespace=namespace,
+                                  room_filter=room_filter)
 
     async def shutdown(self):
         if self.stats_task:  # pragma: no branch
@@ -253,23 +262,22 @@ class InstrumentedAsyncServer:
         return self.sio.manager.__basic_leave_room(sid, namespace, room)
 
     async def _emit(self, event, data, namespace, room=None, skip_sid=None,
-                    callback=None, **kwargs):
+                    callback=None, skip_rooms=None, **kwargs):
         ret = await self.sio.manager.__emit(
             event, data, namespace, room=room, skip_sid=skip_sid,
-            callback=callback, **kwargs)
+            callback=callback, skip_rooms=skip_rooms, **kwargs)
         if namespace != self.admin_namespace:
             event_data = [event] + list(data) if isinstance(data, tuple) \
                 else [event, data]
-            if not isinstance(skip_sid, list):  # pragma: no branch
-                skip_sid = [skip_sid]
-            for sid, _ in self.sio.manager.get_participants(namespace, room):
-                if sid not in skip_sid:
-                    await self.sio.emit('event_sent', (
-                        namespace,
-                        sid,
-                        event_data,
-                        datetime.now(timezone.utc).isoformat(),
-                    ), namespace=self.admin_namespace)
+            for sid, _ in self.sio.manager.get_recipients(
+                    namespace, room, skip_sid=skip_sid,
+                    skip_rooms=skip_rooms):
+                await self.sio.emit('event_sent', (
+                    namespace,
+                    sid,
+                    event_data,
+                    datetime.now(timezone.utc).isoformat(),
+                ), namespace=self.admin_namespace)
         return ret
 
     async def _handle_eio_connect(self, eio_sid, environ):
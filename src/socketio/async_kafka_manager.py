@@ -0,0 +1,164 @@
+import asyncio
+from functools import partial
+
+try:
+    import aiokafka
+except ImportError:
+    aiokafka = None
+
+from .async_pubsub_manager import AsyncPubSubManager
+
+
+class AsyncKafkaManager(AsyncPubSubManager):
+    """Kafka based client manager for asyncio servers.
+
+    This class implements a Kafka backend for event sharing across multiple
+    processes, using the aiokafka package.
+
+    To use a Kafka backend, initialize the :class:`AsyncServer` instance as
+    follows::
+
+        url = 'kafka://hostname:port'
+        server = socketio.AsyncServer(
+            client_manager=socketio.AsyncKafkaManager(url))
+
+    :param url: The connection URL for the Kafka server. For a default Kafka
+                store running on the same host, use ``kafka://``. For a highly
+                available deployment of Kafka, pass a list with all the
+                connection URLs available in your cluster.
+    :param channel: The channel name (topic) on which the server sends and
+                    receives notifications. Must be the same in all the
+                    servers.
+    :param write_only: If set to ``True``, only initialize to emit events. The
+                       default of ``False`` initializes the class for emitting
+                       and receiving. A write-only instance can be used
+                       independently of the server to emit to clients from an
+                       external process.
+    :param logger: a custom logger to log it. If not given, the server logger
+                   is used.
+    :param json: An alternative JSON module to use for encoding and decoding
+                 packets. Custom json modules must have ``dumps`` and ``loads``
+                 functions that are compatible with the standard library
+                 versions. This setting is only used when ``write_only`` is set
+                 to ``True``. Otherwise the JSON module configured in the
+                 server is used.
+    :param serializer: The format of the messages published to the message
+                       queue, ``'default'`` for JSON or ``'msgpack'``. See
+                       :class:`AsyncPubSubManager` for details.
+    :param batch_size: The maximum number of messages that are combined into a
+                       single publish. The default of ``None`` disables
+                       batching. See :class:`AsyncPubSubManager` for details.
+    :param batch_interval: The maximum time in seconds that a message waits
+                           for its batch to fill before it is published.
+    :param sid_directory: If set to ``True``, emits addressed to a single
+                          client are only handled by the server that hosts the
+                          client. See :class:`AsyncPubSubManager` for details.
+    :param envelope: If set to ``True``, emits are published with a routing
+                     header that allows servers without recipients to discard
+                     them without decoding. See :class:`AsyncPubSubManager` for
+                     details.
+    :param packet_passthrough: If set to ``True``, emits are published as
+                               encoded Socket.IO packets. See
+                               :class:`AsyncPubSubManager` for details.
+    :param producer_options: additional keyword arguments to be passed to the
+                             ``AIOKafkaProducer`` constructor. The
+                             ``linger_ms`` and ``max_batch_size`` options can
+                             be used to configure how the producer combines
+                             messages when ``flush`` is set to ``False``.
+    :param flush: If set to ``True`` (the default), publishing a message waits
+                  until it is delivered to Kafka. If set to ``False``,
+                  messages are sent in the background by the producer, which
+                  can combine several of them in a single request.
+    :param delivery_callback: A function that is invoked once a published
+                              message is delivered to Kafka or fails to be
+                              delivered, with the message and the exception
+                              (or ``None`` on success) as arguments.
+    :param packet_cache_size: The maximum number of encoded events kept in the
+                              cache used by the ``cache_key`` argument of
+                              ``emit()``.
+    """
+    name = 'aiokafka'
+
+    def __init__(self, url='kafka://localhost:9092', channel='socketio',
+                 write_only=False, logger=None, json=None,
+                 serializer='default', batch_size=None,
+                 batch_interval=0.005, sid_directory=False, envelope=False,
+                 packet_passthrough=False, producer_options=None, flush=True,
+                 delivery_callback=None, packet_cache_size=128):
+        if aiokafka is None:
+            raise RuntimeError('aiokafka package is not installed '
+                               '(Run "pip install aiokafka" in your '
+                               'virtualenv).')
+
+        super().__init__(channel=channel, write_only=write_only, logger=logger,
+                         json=json, serializer=serializer,
+                         batch_size=batch_size, batch_interval=batch_interval,
+                         sid_directory=sid_directory, envelope=envelope,
+                         packet_passthrough=packet_passthrough,
+                         packet_cache_size=packet_cache_size)
+
+        urls = [url] if isinstance(url, str) else url
+        self.kafka_urls = [url[8:] if url != 'kafka://' else 'localhost:9092'
+                           for url in urls]
+        self.producer_options = producer_options or {}
+        self.flush = flush
+        self.delivery_callback = delivery_callback
+        self.producer = None
+        self._lock = asyncio.Lock()
+
+    async def _producer(self):
+        if self.producer is None:
+            async with self._lock:
+                if self.producer is None:
+                    producer = aiokafka.AIOKafkaProducer(
+                        bootstrap_servers=self.kafka_urls,
+                        **self.producer_options)
+                    await producer.start()
+                    self.producer = producer
+        return self.producer
+
+    async def _publish(self, data):
+        future = await self._send(data)
+        if self.flush:
+            # delivery errors are reported by the callback
+            await asyncio.wait([future])
+
+    async def _publish_many(self, messages):
+        # all the messages are sent before waiting for their delivery, so
+        # that the producer can group them
+        futures = [await self._send(message) for message in messages]
+        await asyncio.gather(*futures)  # raises delivery errors
+
+    async def _send(self, data):
+        producer = await self._producer()
+        value = self._encode_message(data)
+        if isinstance(value, str):
+            value = value.encode()
+        future = await producer.send(self.channel, value=value)
+        future.add_done_callback(partial(self._on_delivery, data))
+        return future
+
+    def _on_delivery(self, data, future):
+        if future.cancelled():
+            return
+        exc = future.exception()
+        if exc is not None:
+            self._get_logger().error('Cannot publish to kafka',
+                                     extra={'kafka_exception': str(exc)})
+        if self.delivery_callback:
+            self.delivery_callback(data, exc)
+
+    async def _kafka_listen(self):
+        consumer = aiokafka.AIOKafkaConsumer(
+            self.channel, bootstrap_servers=self.kafka_urls)
+        await consumer.start()
+        try:
+            async for message in consumer:
+                yield message
+        finally:
+            await consumer.stop()
+
+    async def _listen(self):
+        async for message in self._kafka_listen():
+            if message.topic == self.channel:
+                yield message.value
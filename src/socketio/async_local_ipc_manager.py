@@ -0,0 +1,211 @@
+import asyncio
+import os
+
+from . import local_ipc_manager
+from .async_pubsub_manager import AsyncPubSubManager
+from .local_ipc_manager import PUBLISHER, SUBSCRIBER, default_ipc_path, \
+    encode_frame, frame_size, lock_ipc_hub
+
+
+class AsyncLocalIPCManager(AsyncPubSubManager):
+    """Unix socket based client manager for asyncio servers.
+
+    This class implements a backend for event sharing across multiple
+    processes that run on the same host, such as the workers of a web server,
+    without an external message queue. See :class:`LocalIPCManager` for
+    details.
+
+    To use a local IPC backend, initialize the :class:`AsyncServer` instance
+    as follows::
+
+        server = socketio.AsyncServer(
+            client_manager=socketio.AsyncLocalIPCManager())
+
+    :param path: The path of the Unix socket used by the hub. The default is
+                 a file named after the channel, in a directory that is
+                 private to the current user. Must be the same in all the
+                 servers, which must run as the same user.
+    :param channel: The channel name on which the server sends and receives
+                    notifications. Must be the same in all the servers.
+    :param write_only: If set to ``True``, only initialize to emit events. The
+                       default of ``False`` initializes the class for emitting
+                       and receiving. A write-only instance can be used
+                       independently of the server to emit to clients from an
+                       external process. Write-only instances never become the
+                       hub.
+    :param logger: a custom logger to log it. If not given, the server logger
+                   is used.
+    :param json: An alternative JSON module to use for encoding and decoding
+                 packets. Custom json modules must have ``dumps`` and ``loads``
+                 functions that are compatible with the standard library
+                 versions. This setting is only used when ``write_only`` is set
+                 to ``True``. Otherwise the JSON module configured in the
+                 server is used.
+    :param serializer: The format of the messages published to the message
+                       queue, ``'default'`` for JSON or ``'msgpack'``. See
+                       :class:`AsyncPubSubManager` for details.
+    :param batch_size: The maximum number of messages that are combined into a
+                       single publish. The default of ``None`` disables
+                       batching. See :class:`AsyncPubSubManager` for details.
+    :param batch_interval: The maximum time in seconds that a message waits
+                           for its batch to fill before it is published.
+    :param sid_directory: If set to ``True``, emits addressed to a single
+                          client are only handled by the server that hosts the
+                          client. See :class:`AsyncPubSubManager` for details.
+    :param envelope: If set to ``True``, emits are published with a routing
+                     header that allows servers without recipients to discard
+                     them without decoding. See :class:`AsyncPubSubManager` for
+                     details.
+    :param packet_passthrough: If set to ``True``, emits are published as
+                               encoded Socket.IO packets. See
+                               :class:`AsyncPubSubManager` for details.
+    :param packet_cache_size: The maximum number of encoded events kept in the
+                              cache used by the ``cache_key`` argument of
+                              ``emit()``.
+    """
+    name = 'asynclocalipc'
+    max_buffer_size = 16 * 1024 * 1024  # bytes
+    max_frame_size = 16 * 1024 * 1024  # bytes
+
+    def __init__(self, path=None, channel='socketio', write_only=False,
+                 logger=None, json=None, serializer='default',
+                 batch_size=None, batch_interval=0.005, sid_directory=False,
+                 envelope=False, packet_passthrough=False,
+                 packet_cache_size=128):
+        if local_ipc_manager.fcntl is None:  # pragma: no cover
+            raise RuntimeError('Unix sockets are not supported on this '
+                               'platform')
+        super().__init__(channel=channel, write_only=write_only, logger=logger,
+                         json=json, serializer=serializer,
+                         batch_size=batch_size, batch_interval=batch_interval,
+                         sid_directory=sid_directory, envelope=envelope,
+                         packet_passthrough=packet_passthrough,
+                         packet_cache_size=packet_cache_size)
+        self.path = path or default_ipc_path(channel)
+        self.publisher = None
+        self.publisher_lock = asyncio.Lock()
+        self.hub_lock_file = None
+        self.hub_server = None
+        self.hub_subscribers = []
+
+    async def _connect(self, role):
+        """Connect to the hub, becoming the hub first if there is none."""
+        try:
+            reader, writer = await asyncio.open_unix_connection(self.path)
+        except OSError:
+            if self.write_only or not await self._start_hub():
+                raise
+            reader, writer = await asyncio.open_unix_connection(self.path)
+        writer.write(role)
+        await writer.drain()
+        return reader, writer
+
+    async def _start_hub(self):
+        lock_file = lock_ipc_hub(self.path)
+        if lock_file is None:
+            return False
+        self.hub_server = await asyncio.start_unix_server(self._hub_client,
+                                                          path=self.path)
+        os.chmod(self.path, 0o600)
+        self.hub_lock_file = lock_file
+        self._get_logger().info('Local IPC hub started on ' + self.path)
+        return True
+
+    async def _hub_client(self, reader, writer):
+        try:
+            role = await reader.readexactly(1)
+            if role == SUBSCRIBER:
+                self.hub_subscribers.append(writer)
+                # subscribers do not send anything, so this returns when the
+                # connection is closed
+                await reader.read()
+            else:
+                while True:
+                    header = await reader.readexactly(4)
+                    body = await reader.readexactly(
+                        frame_size(header, self.max_frame_size))
+                    self._hub_broadcast(header + body)
+        except Exception:
+            pass
+        if writer in self.hub_subscribers:
+            self.hub_subscribers.remove(writer)
+        writer.close()
+
+    def _hub_broadcast(self, frame):
+        for writer in self.hub_subscribers[:]:
+            if writer.transport.get_write_buffer_size() > \
+                    self.max_buffer_size:
+                # a subscriber that does not keep up is disconnected
+                self.hub_subscribers.remove(writer)
+                writer.close()
+                continue
+            writer.write(frame)
+
+    def _frame(self, data):
+        body = self._encode_message(data)
+        if isinstance(body, str):
+            body = body.encode()
+        if len(body) > self.max_frame_size:
+            raise ValueError(f'Message of {len(body)} bytes exceeds the '
+                             f'maximum size of {self.max_frame_size} bytes')
+        return encode_frame(body)
+
+    async def _publish(self, data):
+        frame = self._frame(data)
+        for retries_left in range(1, -1, -1):  # 2 attempts
+            try:
+                async with self.publisher_lock:
+                    if self.publisher is None:
+                        self.publisher = await self._connect(PUBLISHER)
+                    self.publisher[1].write(frame)
+                    await self.publisher[1].drain()
+                return
+            except Exception as exc:
+                self._close_publisher()
+                if retries_left > 0:
+                    self._get_logger().error(
+                        'Cannot publish to local hub... retrying',
+                        extra={"ipc_exception": str(exc)})
+                else:
+                    self._get_logger().error(
+                        'Cannot publish to local hub... giving up',
+                        extra={"ipc_exception": str(exc)})
+
+    async def _publish_many(self, messages):
+        # all the messages are sent to the hub in a single write
+        frames = b''.join([self._frame(message) for message in messages])
+        try:
+            async with self.publisher_lock:
+                if self.publisher is None:
+                    self.publisher = await self._connect(PUBLISHER)
+                self.publisher[1].write(frames)
+                await self.publisher[1].drain()
+        except Exception:
+            self._close_publisher()
+            raise
+
+    def _close_publisher(self):
+        if self.publisher is not None:
+            self.publisher[1].close()
+            self.publisher = None
+
+    async def _listen(self):
+        retry_sleep = 1
+        while True:
+            try:
+                reader, writer = await self._connect(SUBSCRIBER)
+                retry_sleep = 1
+                try:
+                    while True:
+                        header = await reader.readexactly(4)
+                        yield await reader.readexactly(
+                            frame_size(header, self.max_frame_size))
+                finally:
+                    writer.close()
+            except Exception as exc:
+                self._get_logger().error(
+                    'Cannot receive from local hub... retrying in '
+                    f'{retry_sleep} secs',
+                    extra={"ipc_exception": str(exc)})
+                await asyncio.sleep(retry_sleep)
+                retry_sleep = min(retry_sleep * 2, 60)
@@ -1,18 +1,23 @@
 import asyncio
 import inspect
 
-from engineio import packet as eio_packet
 from socketio import packet
 from .base_manager import BaseManager
 
 
 class AsyncManager(BaseManager):
-    """Manage a client list for an asyncio server."""
+    """Manage a client list for an asyncio server.
+
+    :param packet_cache_size: The maximum number of encoded events kept in the
+                              cache used by the ``cache_key`` argument of
+                              ``emit()``.
+    """
     async def can_disconnect(self, sid, namespace):
         return self.is_connected(sid, namespace)
 
     async def emit(self, event, data, namespace, room=None, skip_sid=None,
-                   callback=None, to=None, **kwargs):
+                   callback=None, to=None, skip_rooms=None,
+                   cache_key=None, binary=None, packets=None, **kwargs):
         """Emit a message to a single client, a room, or all the clients
         connected to the namespace.
 
@@ -29,40 +34,32 @@ class AsyncManager(BaseManager):
             data = [data]
         else:
             data = []
-        if not isinstance(skip_sid, list):
-            skip_sid = [skip_sid]
-        tasks = []
+        recipients = self.get_recipients(namespace, room, skip_sid=skip_sid,
+                                         skip_rooms=skip_rooms)
         if not callback:
             # when callbacks aren't used the packets sent to each recipient are
             # identical, so they can be generated once and reused
-            pkt = self.server.packet_class(
-                packet.EVENT, namespace=namespace, data=[event] + data)
-            encoded_packet = pkt.encode()
-            if not isinstance(encoded_packet, list):
-                encoded_packet = [encoded_packet]
-            eio_pkt = [eio_packet.Packet(eio_packet.MESSAGE, p)
-                       for p in encoded_packet]
-            for sid, eio_sid in self.get_participants(namespace, room):
-                if sid not in skip_sid:
-                    for p in eio_pkt:
-                        tasks.append(asyncio.create_task(
-                            self.server._send_eio_packet(eio_sid, p)))
+            eio_pkt = self._get_eio_packets(event, data, namespace,
+                                            cache_key=cache_key, binary=binary,
+                                            packets=packets)
+            await self.server._send_eio_packet_many(
+                [eio_sid for _, eio_sid in recipients], eio_pkt)
         else:
             # callbacks are used, so each recipient must be sent a packet that
             # contains a unique callback id
             # note that callbacks when addressing a group of people are
             # implemented but not tested or supported
-            for sid, eio_sid in self.get_participants(namespace, room):
-                if sid not in skip_sid:  # pragma: no branch
-                    id = self._generate_ack_id(sid, callback)
-                    pkt = self.server.packet_class(
-                        packet.EVENT, namespace=namespace, data=[event] + data,
-                        id=id)
-                    tasks.append(asyncio.create_task(
-                        self.server._send_packet(eio_sid, pkt)))
-        if tasks == []:  # pragma: no cover
-            return
-        await asyncio.wait(tasks)
+            tasks = []
+            for sid, eio_sid in recipients:
+                id = self._generate_ack_id(sid, callback)
+                pkt = self.server.packet_class(
+                    packet.EVENT, namespace=namespace, data=[event] + data,
+                    id=id, binary=binary)
+                tasks.append(asyncio.create_task(
+                    self.server._send_packet(eio_sid, pkt)))
+            if tasks == []:  # pragma: no cover
+                return
+            await asyncio.wait(tasks)
 
     async def connect(self, eio_sid, namespace):
         """Register a client connection to a namespace.
@@ -74,22 +71,52 @@ class AsyncManager(BaseManager):
     async def disconnect(self, sid, namespace, **kwargs):
         """Disconnect a client.
 
+        If ``sid`` is ``None``, the clients in the rooms given in the
+        ``room_filter`` argument are disconnected.
+
         Note: this method is a coroutine.
         """
+        if sid is None:
+            if kwargs.get('room_filter') is None:
+                raise ValueError('A room_filter is required when sid is None.')
+            for sid, _ in self.get_participants(namespace,
+                                                kwargs.get('room_filter')):
+                await self.server.disconnect(sid, namespace=namespace,
+                                             ignore_queue=True)
+            return
         return self.basic_disconnect(sid, namespace, **kwargs)
 
-    async def enter_room(self, sid, namespace, room, eio_sid=None):
+    async def enter_room(self, sid, namespace, room, eio_sid=None,
+                         room_filter=None):
         """Add a client to a room.
 
+        If ``sid`` is ``None``, the clients in the rooms given in
+        ``room_filter`` are added.
+
         Note: this method is a coroutine.
         """
+        if sid is None:
+            if room_filter is None:
+                raise ValueError('A room_filter is required when sid is None.')
+            for sid, eio_sid in self.get_participants(namespace, room_filter):
+                self.basic_enter_room(sid, namespace, room, eio_sid=eio_sid)
+            return
         return self.basic_enter_room(sid, namespace, room, eio_sid=eio_sid)
 
-    async def leave_room(self, sid, namespace, room):
+    async def leave_room(self, sid, namespace, room, room_filter=None):
         """Remove a client from a room.
 
+        If ``sid`` is ``None``, the clients in the rooms given in
+        ``room_filter`` are removed.
+
         Note: this method is a coroutine.
         """
+        if sid is None:
+            if room_filter is None:
+                raise ValueError('A room_filter is required when sid is None.')
+            for sid, _ in self.get_participants(namespace, room_filter):
+                self.basic_leave_room(sid, namespace, room)
+            return
         return self.basic_leave_room(sid, namespace, room)
 
     async def close_room(self, room, namespace):
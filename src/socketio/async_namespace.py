@@ -59,7 +59,8 @@ class AsyncNamespace(base_namespace.BaseServerNamespace):
             return ret
 
     async def emit(self, event, data=None, to=None, room=None, skip_sid=None,
-                   namespace=None, callback=None, ignore_queue=False):
+                   namespace=None, callback=None, ignore_queue=False,
+                   skip_rooms=None, cache_key=None, binary=None):
         """Emit a custom event to one or more connected clients.
 
         The only difference with the :func:`socketio.Server.emit` method is
@@ -72,10 +73,13 @@ class AsyncNamespace(base_namespace.BaseServerNamespace):
                                       skip_sid=skip_sid,
                                       namespace=namespace or self.namespace,
                                       callback=callback,
-                                      ignore_queue=ignore_queue)
+                                      ignore_queue=ignore_queue,
+                                      skip_rooms=skip_rooms,
+                                      cache_key=cache_key, binary=binary)
 
     async def send(self, data, to=None, room=None, skip_sid=None,
-                   namespace=None, callback=None, ignore_queue=False):
+                   namespace=None, callback=None, ignore_queue=False,
+                   skip_rooms=None):
         """Send a message to one or more connected clients.
 
         The only difference with the :func:`socketio.Server.send` method is
@@ -88,7 +92,8 @@ class AsyncNamespace(base_namespace.BaseServerNamespace):
                                       skip_sid=skip_sid,
                                       namespace=namespace or self.namespace,
                                       callback=callback,
-                                      ignore_queue=ignore_queue)
+                                      ignore_queue=ignore_queue,
+                                      skip_rooms=skip_rooms)
 
     async def call(self, event, data=None, to=None, sid=None, namespace=None,
                    timeout=None, ignore_queue=False):
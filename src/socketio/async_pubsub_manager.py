@@ -1,10 +1,17 @@
 import asyncio
-import base64
 from functools import partial
+import time
 import uuid
 
+try:
+    import msgpack
+except ImportError:  # pragma: no cover
+    msgpack = None
+
 from .async_manager import AsyncManager
-from .packet import Packet
+from .pubsub_manager import batch_message, decode_emit_data, \
+    decode_emit_packets, decode_message, encode_emit_data, encode_message, \
+    has_local_recipients, remove_expired_hosts, serialize_message
 
 
 class AsyncPubSubManager(AsyncManager):
@@ -33,27 +40,102 @@ class AsyncPubSubManager(AsyncManager):
                  versions. This setting is only used when ``write_only`` is set
                  to ``True``. Otherwise the JSON module configured in the
                  server is used.
+    :param serializer: The format of the messages published to the message
+                       queue. The default is ``'default'``, which uses JSON
+                       and encodes binary attachments in base64. With
+                       ``'msgpack'`` binary attachments are sent without any
+                       encoding. This requires the ``msgpack`` package.
+                       Received messages are accepted in either format.
+    :param batch_size: The maximum number of messages that are combined into a
+                       single publish to the message queue. The default of
+                       ``None`` disables batching, so that each message is
+                       published on its own. All the servers that share the
+                       message queue must run a version of this package that
+                       supports batches before batching is enabled.
+    :param batch_interval: The maximum time in seconds that a message waits
+                           for its batch to fill before it is published. The
+                           default is 0.005 seconds.
+    :param sid_directory: If set to ``True``, the servers share the location of
+                          their clients through the message queue, so that
+                          emits addressed to a single client are not
+                          broadcast to all the servers. Emits to a client
+                          connected to the emitting server are not published
+                          at all, and emits to a client on another server are
+                          addressed to that server. Each server sends a
+                          heartbeat every ``host_heartbeat_interval`` seconds,
+                          and the clients of a server that is not heard from
+                          for ``host_timeout`` seconds are removed from the
+                          directory. All the servers that share the message
+                          queue must enable this option.
+    :param envelope: If set to ``True``, emits are published with a small
+                     routing header in front of the message, which allows the
+                     servers that have no recipients for an emit to discard it
+                     without decoding it. When batching is enabled, each emit
+                     in a batch gets its own routing header. All the servers
+                     that share the message queue must run a version of this
+                     package that supports envelopes before this option is
+                     enabled.
+    :param packet_passthrough: If set to ``True``, emits are published as
+                               encoded Socket.IO packets, which the receiving
+                               servers send to their clients without decoding
+                               and encoding them again. Emits that request a
+                               callback are always published in the regular
+                               format. All the servers that share the message
+                               queue must use the same Socket.IO serializer,
+                               and must run a version of this package that
+                               supports pass-through packets before this
+                               option is enabled.
+    :param packet_cache_size: The maximum number of encoded events kept in the
+                              cache used by the ``cache_key`` argument of
+                              ``emit()``.
     """
     name = 'asyncpubsub'
+    host_heartbeat_interval = 15  # seconds
+    host_timeout = 60  # seconds
 
     def __init__(self, channel='socketio', write_only=False, logger=None,
-                 json=None):
-        super().__init__()
+                 json=None, serializer='default', batch_size=None,
+                 batch_interval=0.005, sid_directory=False, envelope=False,
+                 packet_passthrough=False, packet_cache_size=128):
+        super().__init__(packet_cache_size=packet_cache_size)
         self.channel = channel
         self.write_only = write_only
         self.host_id = uuid.uuid4().hex
         self.logger = logger
         if json is not None:
             self.json = json
+        if serializer not in ['default', 'msgpack']:
+            raise ValueError('Invalid serializer')
+        if serializer == 'msgpack' and msgpack is None:
+            raise RuntimeError('msgpack package is not installed '
+                               '(Run "pip install msgpack" in your '
+                               'virtualenv).')
+        self.serializer = serializer
+        self.batch_size = batch_size
+        self.batch_interval = batch_interval
+        self.batch = []
+        self.batch_id = 0
+        self.sid_directory = sid_directory
+        self.sid_hosts = {}  # self.sid_hosts[sid] = host_id
+        self.host_last_seen = {}  # self.host_last_seen[host_id] = time
+        self.envelope = envelope
+        self.packet_passthrough = packet_passthrough
+        self.pending_queries = {}  # self.pending_queries[id] = queue
+        self.listener = None
+        self.batch_task = None
+        self.publish_lock = asyncio.Lock()
 
     def initialize(self):
         super().initialize()
         if not self.write_only:
             self.thread = self.server.start_background_task(self._thread)
+            if self.sid_directory:
+                self.server.start_background_task(self._heartbeat_thread)
         self._get_logger().info(self.name + ' backend initialized.')
 
     async def emit(self, event, data, namespace=None, room=None, skip_sid=None,
-                   callback=None, to=None, **kwargs):
+                   callback=None, to=None, skip_rooms=None,
+                   cache_key=None, binary=None, **kwargs):
         """Emit a message to a single client, a room, or all the clients
         connected to the namespace.
 
@@ -68,7 +150,8 @@ class AsyncPubSubManager(AsyncManager):
         if kwargs.get('ignore_queue'):
             return await super().emit(
                 event, data, namespace=namespace, room=room, skip_sid=skip_sid,
-                callback=callback)
+                skip_rooms=skip_rooms, callback=callback, cache_key=cache_key,
+                binary=binary)
         namespace = namespace or '/'
         if callback is not None:
             if self.server is None:
@@ -80,20 +163,31 @@ class AsyncPubSubManager(AsyncManager):
             callback = (room, namespace, id)
         else:
             callback = None
-        if isinstance(data, tuple):
-            data = list(data)
-        else:
-            data = [data]
-        binary = Packet.data_is_binary(data)
-        if binary:
-            data, attachments = Packet.deconstruct_binary(data)
-            data = [data, *[base64.b64encode(a).decode() for a in attachments]]
-        message = {'method': 'emit', 'event': event, 'data': data,
-                   'binary': binary, 'namespace': namespace, 'room': room,
-                   'skip_sid': skip_sid, 'callback': callback,
-                   'host_id': self.host_id}
+        message = self._get_emit_message(
+            event, data, namespace=namespace, room=room, skip_sid=skip_sid,
+            skip_rooms=skip_rooms, callback=callback, cache_key=cache_key,
+            binary=binary)
+        if self.sid_directory and isinstance(room, str):
+            if self.is_connected(room, namespace):
+                # the client is in this server, so there is no need to notify
+                # other hosts
+                return await self._handle_emit(message)
+            elif room in self.sid_hosts:
+                # the client is in a known server, so only that server needs
+                # to receive the message
+                message['to_host'] = self.sid_hosts[room]
+                return await self._publish_message(message)
         await self._handle_emit(message)  # handle in this host
-        await self._publish(message)  # notify other hosts
+        await self._publish_message(message)  # notify other hosts
+
+    async def connect(self, eio_sid, namespace):
+        sid = await super().connect(eio_sid, namespace)
+        if sid is not None and self.sid_directory:
+            # let the other hosts know where this client is
+            await self._publish_message({'method': 'directory_add', 'sid': sid,
+                                         'namespace': namespace,
+                                         'host_id': self.host_id})
+        return sid
 
     async def can_disconnect(self, sid, namespace):
         if self.is_connected(sid, namespace):
@@ -101,20 +195,42 @@ class AsyncPubSubManager(AsyncManager):
             return await super().can_disconnect(sid, namespace)
         else:
             # client is in another server, so we post request to the queue
-            await self._publish({'method': 'disconnect', 'sid': sid,
-                                 'namespace': namespace or '/',
-                                 'host_id': self.host_id})
+            await self._publish_message({'method': 'disconnect', 'sid': sid,
+                                         'namespace': namespace or '/',
+                                         'host_id': self.host_id})
 
     async def disconnect(self, sid, namespace, **kwargs):
         if kwargs.get('ignore_queue'):
+            if self.sid_directory and \
+                    sid in self.rooms.get(namespace, {}).get(None, {}):
+                await self._publish_message({'method': 'directory_remove',
+                                             'sid': sid,
+                                             'namespace': namespace,
+                                             'host_id': self.host_id})
             return await super().disconnect(
-                sid, namespace=namespace)
+                sid, namespace=namespace,
+                room_filter=kwargs.get('room_filter'))
         message = {'method': 'disconnect', 'sid': sid,
                    'namespace': namespace or '/', 'host_id': self.host_id}
+        if sid is None:
+            # a single message disconnects the selected clients in all hosts
+            if kwargs.get('room_filter') is None:
+                raise ValueError('A room_filter is required when sid is None.')
+            message['room_filter'] = kwargs.get('room_filter')
         await self._handle_disconnect(message)  # handle in this host
-        await self._publish(message)  # notify other hosts
+        await self._publish_message(message)  # notify other hosts
 
-    async def enter_room(self, sid, namespace, room, eio_sid=None):
+    async def enter_room(self, sid, namespace, room, eio_sid=None,
+                         room_filter=None):
+        if sid is None:
+            # a single message adds the selected clients in all hosts
+            if room_filter is None:
+                raise ValueError('A room_filter is required when sid is None.')
+            message = {'method': 'enter_room', 'sid': None, 'room': room,
+                       'room_filter': room_filter,
+                       'namespace': namespace or '/', 'host_id': self.host_id}
+            await self._handle_enter_room(message)  # handle in this host
+            return await self._publish_message(message)  # notify other hosts
         if self.is_connected(sid, namespace):
             # client is in this server, so we can disconnect directly
             return await super().enter_room(sid, namespace, room,
@@ -122,22 +238,186 @@ class AsyncPubSubManager(AsyncManager):
         else:
             message = {'method': 'enter_room', 'sid': sid, 'room': room,
                        'namespace': namespace or '/', 'host_id': self.host_id}
-            await self._publish(message)  # notify other hosts
+            await self._publish_message(message)  # notify other hosts
 
-    async def leave_room(self, sid, namespace, room):
+    async def leave_room(self, sid, namespace, room, room_filter=None):
+        if sid is None:
+            # a single message removes the selected clients in all hosts
+            if room_filter is None:
+                raise ValueError('A room_filter is required when sid is None.')
+            message = {'method': 'leave_room', 'sid': None, 'room': room,
+                       'room_filter': room_filter,
+                       'namespace': namespace or '/', 'host_id': self.host_id}
+            await self._handle_leave_room(message)  # handle in this host
+            return await self._publish_message(message)  # notify other hosts
         if self.is_connected(sid, namespace):
             # client is in this server, so we can disconnect directly
             return await super().leave_room(sid, namespace, room)
         else:
             message = {'method': 'leave_room', 'sid': sid, 'room': room,
                        'namespace': namespace or '/', 'host_id': self.host_id}
-            await self._publish(message)  # notify other hosts
+            await self._publish_message(message)  # notify other hosts
 
     async def close_room(self, room, namespace=None):
         message = {'method': 'close_room', 'room': room,
                    'namespace': namespace or '/', 'host_id': self.host_id}
         await self._handle_close_room(message)  # handle in this host
-        await self._publish(message)  # notify other hosts
+        await self._publish_message(message)  # notify other hosts
+
+    async def fetch_participants(self, namespace, room, timeout=5,
+                                 hosts=None, page_size=1000):
+        """Return an asynchronous iterator with the sids of the participants
+        in a room, across all the servers connected to the message queue.
+
+        The participants connected to this server are returned first. The
+        other servers return their participants in pages of ``page_size``
+        sids, which are returned as they are received.
+
+        :param namespace: The Socket.IO namespace.
+        :param room: The room name, a list of room names, or ``None`` for all
+                     the clients connected to the namespace.
+        :param timeout: The maximum time in seconds to wait for the other
+                        servers to reply.
+        :param hosts: The number of other servers that are expected to reply.
+                      When all of them have replied the iteration ends without
+                      waiting for the timeout.
+        :param page_size: The maximum number of sids in each reply.
+        """
+        namespace = namespace or '/'
+        for sid, _ in self.get_participants(namespace, room):
+            yield sid
+        async for reply in self._query('participants', timeout, hosts,
+                                       namespace=namespace, room=room,
+                                       page_size=page_size):
+            for sid in reply['result']:
+                yield sid
+
+    async def fetch_rooms(self, sid, namespace=None, timeout=5, hosts=None):
+        """Return the rooms a client is in, in whichever server the client
+        is connected.
+
+        ``None`` is returned if the client is not found.
+
+        :param sid: The sid of the client.
+        :param namespace: The Socket.IO namespace.
+        :param timeout: The maximum time in seconds to wait for the other
+                        servers to reply.
+        :param hosts: The number of other servers that are expected to reply.
+                      When all of them have replied without finding the
+                      client ``None`` is returned without waiting for the
+                      timeout.
+
+        Note: this method is a coroutine.
+        """
+        namespace = namespace or '/'
+        if self.is_connected(sid, namespace):
+            return self.get_rooms(sid, namespace)
+        replies = self._query('rooms', timeout, hosts, sid=sid,
+                              namespace=namespace)
+        try:
+            async for reply in replies:
+                if reply['result'] is not None:
+                    return reply['result']
+        finally:
+            await replies.aclose()
+
+    async def count(self, namespace, room=None, timeout=5, hosts=None):
+        """Return the number of participants in a room, across all the
+        servers connected to the message queue.
+
+        :param namespace: The Socket.IO namespace.
+        :param room: The room name, a list of room names, or ``None`` to
+                     count all the clients connected to the namespace. A
+                     client that is in several of the given rooms is counted
+                     once.
+        :param timeout: The maximum time in seconds to wait for the other
+                        servers to reply.
+        :param hosts: The number of other servers that are expected to reply.
+                      When all of them have replied the count is returned
+                      without waiting for the timeout.
+
+        Note: this method is a coroutine.
+        """
+        namespace = namespace or '/'
+        total = self._count_local(namespace, room)
+        async for reply in self._query('count', timeout, hosts,
+                                       namespace=namespace, room=room):
+            total += reply['result']
+        return total
+
+    def _count_local(self, namespace, room):
+        if isinstance(room, (list, tuple)):
+            # clients that are in several of the rooms are counted once
+            return sum(1 for _ in self.get_participants(namespace, room))
+        return len(self.rooms.get(namespace, {}).get(room, {}))
+
+    async def _query(self, query, timeout, hosts, **kwargs):
+        """Send a query to the other servers and return an asynchronous
+        iterator with their replies.
+
+        The iteration ends when the expected number of servers have sent
+        their last reply, or when the timeout expires.
+        """
+        if self.server is None or self.write_only:
+            raise RuntimeError('Queries can only be issued from the context '
+                               'of a server.')
+        if self.listener is not None and \
+                asyncio.current_task() == self.listener:
+            # the replies would never be received
+            raise RuntimeError('Queries cannot be issued from the pubsub '
+                               'listening task.')
+        if hosts == 0:
+            return
+        query_id = uuid.uuid4().hex
+        replies = asyncio.Queue()
+        self.pending_queries[query_id] = replies
+        try:
+            await self._publish_message({'method': 'query', 'query': query,
+                                         'id': query_id,
+                                         'host_id': self.host_id, **kwargs})
+            completed = set()
+            deadline = time.time() + timeout
+            while hosts is None or len(completed) < hosts:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                try:
+                    reply = await asyncio.wait_for(replies.get(), remaining)
+                except asyncio.TimeoutError:
+                    break
+                if reply.get('last'):
+                    completed.add(reply.get('responder'))
+                yield reply
+        finally:
+            del self.pending_queries[query_id]
+
+    def _get_emit_message(self, event, data, namespace, room=None,
+                          skip_sid=None, skip_rooms=None, callback=None,
+                          cache_key=None, binary=None):
+        """Return the message that is published for an emit."""
+        if isinstance(data, tuple):
+            data = list(data)
+        else:
+            data = [data]
+        if self.packet_passthrough and callback is None:
+            # the packets are encoded once here, and the other hosts send them
+            # to their clients as they are
+            packets = [eio_pkt.data for eio_pkt in self._get_eio_packets(
+                event, data, namespace, cache_key=cache_key, binary=binary)]
+            message = {'method': 'emit', 'event': event, 'packets': packets,
+                       'namespace': namespace, 'room': room,
+                       'skip_sid': skip_sid, 'skip_rooms': skip_rooms,
+                       'callback': None, 'cache_key': cache_key,
+                       'host_id': self.host_id}
+        else:
+            if binary is not False:
+                data, binary = encode_emit_data(data, self.serializer)
+            message = {'method': 'emit', 'event': event, 'data': data,
+                       'binary': binary, 'namespace': namespace,
+                       'room': room, 'skip_sid': skip_sid,
+                       'skip_rooms': skip_rooms, 'callback': callback,
+                       'cache_key': cache_key, 'host_id': self.host_id}
+        return message
 
     async def _publish(self, data):
         """Publish a message on the Socket.IO channel.
@@ -148,6 +428,61 @@ class AsyncPubSubManager(AsyncManager):
         raise NotImplementedError('This method must be implemented in a '
                                   'subclass.')  # pragma: no cover
 
+    async def _publish_many(self, messages):
+        """Publish several messages at once.
+
+        The default implementation publishes the messages as a single batch.
+        Subclasses can override this method to use a more efficient method
+        provided by the backend. Unlike :meth:`_publish`, errors must be
+        raised to the caller, so subclasses with a :meth:`_publish` method
+        that handles its errors must override it.
+        """
+        if messages:
+            await self._publish(self._batch_message(messages))
+
+    def _batch_message(self, messages):
+        """Return the message that publishes a list of messages."""
+        return batch_message(messages, self.host_id)
+
+    async def _publish_message(self, message):
+        """Publish a message, or add it to the current batch when batching
+        is enabled."""
+        if not self.batch_size:
+            return await self._publish(message)
+        self.batch.append(message)
+        if len(self.batch) >= self.batch_size:
+            await self._publish_batch()
+        elif len(self.batch) == 1:
+            # the first message of a batch starts the timer that publishes it
+            self.batch_task = asyncio.create_task(
+                self._publish_batch_later(self.batch_id))
+
+    async def _publish_batch_later(self, batch_id):
+        await asyncio.sleep(self.batch_interval)
+        await self._publish_batch(batch_id)
+
+    async def _publish_batch(self, batch_id=None):
+        """Publish the messages in the current batch.
+
+        When a ``batch_id`` is given the batch is only published if it has not
+        been published already.
+        """
+        if batch_id is not None and batch_id != self.batch_id:
+            return
+        messages = self.batch
+        self.batch = []
+        self.batch_id += 1
+        if not messages:
+            return
+        # the publish lock ensures that batches are published in order
+        async with self.publish_lock:
+            try:
+                await self._publish_many(messages)
+            except Exception as exc:
+                self._get_logger().error(
+                    'Cannot publish, %d messages discarded', len(messages),
+                    extra={'exception': str(exc)})
+
     async def _listen(self):
         """Return the next message published on the Socket.IO channel,
         blocking until a message is available.
@@ -158,6 +493,33 @@ class AsyncPubSubManager(AsyncManager):
         raise NotImplementedError('This method must be implemented in a '
                                   'subclass.')  # pragma: no cover
 
+    def _encode_message(self, message):
+        """Serialize a message for publishing with the configured
+        serializer.
+
+        When envelopes are enabled, emits are prefixed with a routing header
+        that can be decoded on its own.
+        """
+        return encode_message(message, self.serializer, self.json,
+                              envelope=self.envelope)
+
+    def _serialize_message(self, message):
+        return serialize_message(message, self.serializer, self.json)
+
+    def _decode_message(self, message):
+        """Deserialize a message received from the message queue.
+
+        Emits that are wrapped in an envelope are only decoded when they have
+        recipients in this server, else ``None`` is returned.
+        """
+        return decode_message(message, self.json,
+                              has_recipients=self._has_local_recipients)
+
+    def _has_local_recipients(self, header):
+        """Check if an emit needs to be handled in this server, using only
+        its routing header."""
+        return has_local_recipients(header, self.host_id, self.rooms)
+
     async def _handle_emit(self, message):
         # Events with callbacks are very tricky to handle across hosts
         # Here in the receiving end we set up a local callback that preserves
@@ -169,20 +531,24 @@ class AsyncPubSubManager(AsyncManager):
                                *remote_callback)
         else:
             callback = None
-        data = message['data']
-        if message.get('binary'):
-            attachments = [base64.b64decode(a) for a in data[1:]]
-            data = Packet.reconstruct_binary(data[0], attachments)
-        if isinstance(data, list):
-            if len(data) == 1:
-                data = data[0]
-            else:
-                data = tuple(data)
-        await super().emit(message['event'], data,
+        packets = message.get('packets')
+        if packets is not None:
+            # the event was encoded by the sender, so the packets are sent to
+            # the clients as they are
+            return await super().emit(
+                message['event'], None, namespace=message.get('namespace'),
+                room=message.get('room'), skip_sid=message.get('skip_sid'),
+                skip_rooms=message.get('skip_rooms'),
+                cache_key=message.get('cache_key'),
+                packets=decode_emit_packets(packets))
+        await super().emit(message['event'], decode_emit_data(message),
                            namespace=message.get('namespace'),
                            room=message.get('room'),
                            skip_sid=message.get('skip_sid'),
-                           callback=callback)
+                           skip_rooms=message.get('skip_rooms'),
+                           callback=callback,
+                           cache_key=message.get('cache_key'),
+                           binary=message.get('binary'))
 
     async def _handle_callback(self, message):
         if self.host_id == message.get('host_id'):
@@ -201,11 +567,50 @@ class AsyncPubSubManager(AsyncManager):
         if host_id == self.host_id:
             await self.trigger_callback(sid, callback_id, args)
         else:
-            await self._publish({'method': 'callback', 'host_id': host_id,
-                                 'sid': sid, 'namespace': namespace,
-                                 'id': callback_id, 'args': args})
+            await self._publish_message({'method': 'callback',
+                                         'host_id': host_id, 'sid': sid,
+                                         'namespace': namespace,
+                                         'id': callback_id, 'args': args})
+
+    async def _handle_query(self, message):
+        # the replies are addressed to the server that sent the query, which
+        # is identified by the host_id
+        reply = {'method': 'query_reply', 'host_id': message.get('host_id'),
+                 'id': message.get('id'), 'responder': self.host_id}
+        query = message.get('query')
+        namespace = message.get('namespace')
+        if query == 'participants':
+            page_size = message.get('page_size') or 1000
+            page = []
+            for sid, _ in self.get_participants(namespace,
+                                                message.get('room')):
+                page.append(sid)
+                if len(page) >= page_size:
+                    await self._publish_message(dict(reply, result=page,
+                                                     last=False))
+                    page = []
+            await self._publish_message(dict(reply, result=page, last=True))
+        elif query == 'rooms':
+            sid = message.get('sid')
+            result = None
+            if self.is_connected(sid, namespace):
+                result = self.get_rooms(sid, namespace)
+            await self._publish_message(dict(reply, result=result, last=True))
+        elif query == 'count':
+            await self._publish_message(dict(reply, result=self._count_local(
+                namespace, message.get('room')), last=True))
+
+    def _handle_query_reply(self, message):
+        if self.host_id == message.get('host_id'):
+            replies = self.pending_queries.get(message.get('id'))
+            if replies is not None:
+                replies.put_nowait(message)
 
     async def _handle_disconnect(self, message):
+        if message.get('sid') is None:
+            return await self.server.disconnect(
+                None, namespace=message.get('namespace'), ignore_queue=True,
+                room_filter=message.get('room_filter'))
         await self.server.disconnect(sid=message.get('sid'),
                                      namespace=message.get('namespace'),
                                      ignore_queue=True)
@@ -213,20 +618,57 @@ class AsyncPubSubManager(AsyncManager):
     async def _handle_enter_room(self, message):
         sid = message.get('sid')
         namespace = message.get('namespace')
-        if self.is_connected(sid, namespace):
+        if sid is None:
+            await super().enter_room(None, namespace, message.get('room'),
+                                     room_filter=message.get('room_filter'))
+        elif self.is_connected(sid, namespace):
             await super().enter_room(sid, namespace, message.get('room'))
 
     async def _handle_leave_room(self, message):
         sid = message.get('sid')
         namespace = message.get('namespace')
-        if self.is_connected(sid, namespace):
+        if sid is None:
+            await super().leave_room(None, namespace, message.get('room'),
+                                     room_filter=message.get('room_filter'))
+        elif self.is_connected(sid, namespace):
             await super().leave_room(sid, namespace, message.get('room'))
 
+    async def _heartbeat_thread(self):
+        # the other hosts remove the clients of a host from their directory
+        # when they stop receiving its heartbeats, for example after a crash
+        while True:
+            try:
+                await self._publish_message({'method': 'host_alive',
+                                             'host_id': self.host_id})
+                expired = remove_expired_hosts(
+                    self.sid_hosts, self.host_last_seen, self.host_timeout)
+                for host_id in expired:
+                    self._get_logger().warning(
+                        'Host %s has not been heard from, removing its '
+                        'clients from the directory', host_id)
+            except Exception:
+                self._get_logger().exception(
+                    'Unexpected error in the heartbeat task')
+            await self.server.sleep(self.host_heartbeat_interval)
+
+    def _handle_host_alive(self, message):
+        self.host_last_seen[message.get('host_id')] = time.time()
+
+    def _handle_directory_add(self, message):
+        self.sid_hosts[message.get('sid')] = message.get('host_id')
+        self.host_last_seen[message.get('host_id')] = time.time()
+
+    def _handle_directory_remove(self, message):
+        self.sid_hosts.pop(message.get('sid'), None)
+
     async def _handle_close_room(self, message):
         await super().close_room(room=message.get('room'),
                                  namespace=message.get('namespace'))
 
     async def _thread(self):
+        # queries issued from this task are rejected, as their replies are
+        # also received here
+        self.listener = asyncio.current_task()
         while True:
             try:
                 async for message in self._listen():  # pragma: no branch
@@ -235,18 +677,29 @@ class AsyncPubSubManager(AsyncManager):
                         data = message
                     else:
                         try:
-                            data = self.json.loads(message)
+                            data = self._decode_message(message)
                         except:
                             pass
-                    if data and 'method' in data:
+                    if not data or 'method' not in data:
+                        continue
+                    if data['method'] == 'batch':
+                        # a batch carries several messages in one publish
+                        messages = data.get('messages') or []
+                    else:
+                        messages = [data]
+                    for data in messages:
                         self._get_logger().debug('pubsub message: {}'.format(
                             data['method']))
                         try:
                             if data['method'] == 'callback':
                                 await self._handle_callback(data)
+                            elif data['method'] == 'query_reply':
+                                self._handle_query_reply(data)
                             elif data.get('host_id') != self.host_id:
                                 if data['method'] == 'emit':
-                                    await self._handle_emit(data)
+                                    if data.get('to_host') in [
+                                            None, self.host_id]:
+                                        await self._handle_emit(data)
                                 elif data['method'] == 'disconnect':
                                     await self._handle_disconnect(data)
                                 elif data['method'] == 'enter_room':
@@ -255,6 +708,14 @@ class AsyncPubSubManager(AsyncManager):
                                     await self._handle_leave_room(data)
                                 elif data['method'] == 'close_room':
                                     await self._handle_close_room(data)
+                                elif data['method'] == 'directory_add':
+                                    self._handle_directory_add(data)
+                                elif data['method'] == 'directory_remove':
+                                    self._handle_directory_remove(data)
+                                elif data['method'] == 'host_alive':
+                                    self._handle_host_alive(data)
+                                elif data['method'] == 'query':
+                                    await self._handle_query(data)
                         except asyncio.CancelledError:
                             raise  # let the outer try/except handle it
                         except Exception:
@@ -20,7 +20,7 @@ except ImportError:  # pragma: no cover
     ValkeyError = None
 
 from .async_pubsub_manager import AsyncPubSubManager
-from .redis_manager import parse_redis_sentinel_url
+from .redis_manager import get_shard, parse_redis_sentinel_url
 
 
 class AsyncRedisManager(AsyncPubSubManager):
@@ -59,21 +59,150 @@ class AsyncRedisManager(AsyncPubSubManager):
                  server is used.
     :param redis_options: additional keyword arguments to be passed to
                           ``Redis.from_url()`` or ``Sentinel()``.
+    :param serializer: The format of the messages published to the message
+                       queue, ``'default'`` for JSON or ``'msgpack'``. See
+                       :class:`AsyncPubSubManager` for details.
+    :param batch_size: The maximum number of messages that are combined into a
+                       single publish. The default of ``None`` disables
+                       batching. See :class:`AsyncPubSubManager` for details.
+    :param batch_interval: The maximum time in seconds that a message waits
+                           for its batch to fill before it is published.
+    :param sid_directory: If set to ``True``, emits addressed to a single
+                          client are only sent to the server that hosts the
+                          client. See :class:`AsyncPubSubManager` for details.
+    :param envelope: If set to ``True``, emits are published with a routing
+                     header that allows servers without recipients to discard
+                     them without decoding. See :class:`AsyncPubSubManager` for
+                     details.
+    :param packet_passthrough: If set to ``True``, emits are published as
+                               encoded Socket.IO packets. See
+                               :class:`AsyncPubSubManager` for details.
+    :param shards: The number of shard channels to use for emits addressed to
+                   a single room. The default of ``None`` publishes all the
+                   messages on the main channel. See :class:`RedisManager`
+                   for details.
+    :param packet_cache_size: The maximum number of encoded events kept in the
+                              cache used by the ``cache_key`` argument of
+                              ``emit()``.
     """
     name = 'aioredis'
 
     def __init__(self, url='redis://localhost:6379/0', channel='socketio',
-                 write_only=False, logger=None, json=None, redis_options=None):
+                 write_only=False, logger=None, json=None, redis_options=None,
+                 serializer='default', batch_size=None,
+                 batch_interval=0.005, sid_directory=False, envelope=False,
+                 packet_passthrough=False, shards=None, packet_cache_size=128):
         if aioredis and \
                 not hasattr(aioredis.Redis, 'from_url'):  # pragma: no cover
             raise RuntimeError('Version 2 of aioredis package is required.')
+        if shards and not sid_directory:
+            raise ValueError('Sharded channels require sid_directory to be '
+                             'enabled')
         super().__init__(channel=channel, write_only=write_only, logger=logger,
-                         json=json)
+                         json=json, serializer=serializer,
+                         batch_size=batch_size, batch_interval=batch_interval,
+                         sid_directory=sid_directory, envelope=envelope,
+                         packet_passthrough=packet_passthrough,
+                         packet_cache_size=packet_cache_size)
         self.redis_url = url
         self.redis_options = redis_options or {}
         self.connected = False
         self.redis = None
         self.pubsub = None
+        self.shards = shards
+        self.shard_rooms = {}  # self.shard_rooms[shard] = number of rooms
+        self.shard_tasks = set()
+
+    def basic_enter_room(self, sid, namespace, room, eio_sid=None):
+        # the room of each client is not assigned to a shard, because emits
+        # addressed to individual clients are not sharded
+        new_room = room is not None and room != sid and \
+            room not in self.rooms.get(namespace, {})
+        super().basic_enter_room(sid, namespace, room, eio_sid=eio_sid)
+        if self.shards and new_room:
+            shard = get_shard(namespace, room, self.shards)
+            self.shard_rooms[shard] = self.shard_rooms.get(shard, 0) + 1
+            if self.shard_rooms[shard] == 1:
+                self._start_shard_task(self._subscribe_shard(shard))
+
+    def basic_leave_room(self, sid, namespace, room):
+        old_room = room is not None and room != sid and \
+            room in self.rooms.get(namespace, {})
+        super().basic_leave_room(sid, namespace, room)
+        if self.shards and old_room and \
+                room not in self.rooms.get(namespace, {}):
+            shard = get_shard(namespace, room, self.shards)
+            self.shard_rooms[shard] -= 1
+            if self.shard_rooms[shard] == 0:
+                del self.shard_rooms[shard]
+                self._start_shard_task(self._unsubscribe_shard(shard))
+
+    def _start_shard_task(self, coro):
+        if self.pubsub is None or not self.pubsub.subscribed:
+            # the listener subscribes to all the shards when it connects
+            coro.close()
+            return
+        task = asyncio.create_task(coro)
+        self.shard_tasks.add(task)
+        task.add_done_callback(self.shard_tasks.discard)
+
+    def _get_shard_channel(self, shard):
+        return f'{self.channel}#{shard}'
+
+    def _get_host_channel(self, host_id):
+        return f'{self.channel}@{host_id}'
+
+    def _get_publish_channel(self, data):
+        """Return the channel on which a message is published."""
+        if data.get('to_host'):
+            return self._get_host_channel(data['to_host'])
+        if self.sid_directory and data.get('method') in ['callback',
+                                                         'query_reply']:
+            # callbacks and query replies are always addressed to a single
+            # host
+            return self._get_host_channel(data['host_id'])
+        if self.shards and data.get('method') == 'emit' and \
+                self._is_shard_room(data.get('namespace'), data.get('room')):
+            return self._get_shard_channel(get_shard(
+                data.get('namespace'), data['room'], self.shards))
+        return self.channel
+
+    def _is_shard_room(self, namespace, room):
+        """Return ``True`` if emits to this room can use a shard channel."""
+        if room is None or isinstance(room, (list, tuple)):
+            return False
+        # only a room with local members is known to be a room and not a
+        # client sid that is missing from the directory, so emits to any
+        # other room are published on the main channel, which all the
+        # servers receive
+        return room in self.rooms.get(namespace, {}) and \
+            room not in self.sid_hosts and \
+            not self.is_connected(room, namespace)
+
+    def _get_subscribe_channels(self):
+        """Return the channels this server needs to be subscribed to."""
+        channels = [self.channel]
+        if self.sid_directory:
+            channels.append(self._get_host_channel(self.host_id))
+        return channels + [self._get_shard_channel(shard)
+                           for shard in self.shard_rooms]
+
+    async def _subscribe_shard(self, shard):
+        try:
+            await self.pubsub.subscribe(self._get_shard_channel(shard))
+        except Exception as exc:  # pragma: no cover
+            # the listener subscribes to all the shards when it reconnects
+            self._get_logger().error(
+                'Cannot subscribe to redis shard',
+                extra={"redis_exception": str(exc)})
+
+    async def _unsubscribe_shard(self, shard):
+        try:
+            await self.pubsub.unsubscribe(self._get_shard_channel(shard))
+        except Exception as exc:  # pragma: no cover
+            self._get_logger().error(
+                'Cannot unsubscribe from redis shard',
+                extra={"redis_exception": str(exc)})
 
     def _get_redis_module(self):
         parsed_url = urlparse(self.redis_url)
@@ -126,7 +255,8 @@ class AsyncRedisManager(AsyncPubSubManager):
                 if not self.connected:
                     self._redis_connect()
                 return await self.redis.publish(
-                    self.channel, self.json.dumps(data))
+                    self._get_publish_channel(data),
+                    self._encode_message(data))
             except Exception as exc:
                 if retries_left > 0:
                     self._get_logger().error(
@@ -139,6 +269,26 @@ class AsyncRedisManager(AsyncPubSubManager):
                         extra={"redis_exception": str(exc)})
                     break
 
+    async def _publish_many(self, messages):
+        # the messages are sent in a pipeline, so that they all go to the
+        # server in a single round trip, each on its own channel
+        for retries_left in range(1, -1, -1):  # 2 attempts
+            try:
+                if not self.connected:
+                    self._redis_connect()
+                pipe = self.redis.pipeline(transaction=False)
+                for message in messages:
+                    pipe.publish(self._get_publish_channel(message),
+                                 self._encode_message(message))
+                return await pipe.execute()
+            except Exception as exc:
+                self.connected = False
+                if retries_left == 0:
+                    raise
+                self._get_logger().error(
+                    'Cannot publish to redis... retrying',
+                    extra={"redis_exception": str(exc)})
+
     async def _redis_listen_with_retries(self):  # pragma: no cover
         retry_sleep = 1
         subscribed = False
@@ -146,7 +296,8 @@ class AsyncRedisManager(AsyncPubSubManager):
             try:
                 if not subscribed:
                     self._redis_connect()
-                    await self.pubsub.subscribe(self.channel)
+                    await self.pubsub.subscribe(
+                        *self._get_subscribe_channels())
                     retry_sleep = 1
                 async for message in self.pubsub.listen():
                     yield message
@@ -163,8 +314,12 @@ class AsyncRedisManager(AsyncPubSubManager):
 
     async def _listen(self):  # pragma: no cover
         channel = self.channel.encode('utf-8')
+        shard_prefix = channel + b'#'
+        host_channel = self._get_host_channel(self.host_id).encode('utf-8')
         async for message in self._redis_listen_with_retries():
-            if message['channel'] == channel and \
-                    message['type'] == 'message' and 'data' in message:
+            if message['channel'] not in [channel, host_channel] and \
+                    not message['channel'].startswith(shard_prefix):
+                continue
+            if message['type'] == 'message' and 'data' in message:
                 yield message['data']
-        await self.pubsub.unsubscribe(self.channel)
+        await self.pubsub.unsubscribe(*self._get_subscribe_channels())
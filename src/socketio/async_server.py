@@ -129,7 +129,8 @@ class AsyncServer(base_server.BaseServer):
         self.eio.attach(app, socketio_path)
 
     async def emit(self, event, data=None, to=None, room=None, skip_sid=None,
-                   namespace=None, callback=None, ignore_queue=False):
+                   namespace=None, callback=None, ignore_queue=False,
+                   skip_rooms=None, cache_key=None, binary=None):
         """Emit a custom event to one or more connected clients.
 
         :param event: The event name. It can be any string. The event names
@@ -148,7 +149,11 @@ class AsyncServer(base_server.BaseServer):
         :param room: Alias for the ``to`` parameter.
         :param skip_sid: The session ID of a client to skip when broadcasting
                          to a room or to all clients. This can be used to
-                         prevent a message from being sent to the sender.
+                         prevent a message from being sent to the sender. To
+                         skip multiple sids, pass a list.
+        :param skip_rooms: A room name or a list of room names. Clients that
+                           are in any of these rooms are skipped when
+                           broadcasting to a room or to all clients.
         :param namespace: The Socket.IO namespace for the event. If this
                           argument is omitted the event is emitted to the
                           default namespace.
@@ -164,6 +169,15 @@ class AsyncServer(base_server.BaseServer):
                              single server process is used. It is recommended
                              to always leave this parameter with its default
                              value of ``False``.
+        :param cache_key: An optional key that identifies the data of the
+                          event. The encoded event is cached under this key,
+                          so that emitting the same event with the same key
+                          again, for example to many different rooms, does not
+                          need to encode it again. The application must not
+                          reuse a key with different data.
+        :param binary: ``False`` to indicate that the data does not have any
+                       binary components, which saves the work of searching
+                       for them. ``None`` (the default) searches the data.
 
         Note: this method is not designed to be used concurrently. If multiple
         tasks are emitting at the same time to the same client connection, then
@@ -178,11 +192,13 @@ class AsyncServer(base_server.BaseServer):
         self.logger.info('emitting event "%s" to %s [%s]', event,
                          room or 'all', namespace)
         await self.manager.emit(event, data, namespace, room=room,
-                                skip_sid=skip_sid, callback=callback,
-                                ignore_queue=ignore_queue)
+                                skip_sid=skip_sid, skip_rooms=skip_rooms,
+                                callback=callback, ignore_queue=ignore_queue,
+                                cache_key=cache_key, binary=binary)
 
     async def send(self, data, to=None, room=None, skip_sid=None,
-                   namespace=None, callback=None, ignore_queue=False):
+                   namespace=None, callback=None, ignore_queue=False,
+                   skip_rooms=None):
         """Send a message to one or more connected clients.
 
         This function emits an event with the name ``'message'``. Use
@@ -201,7 +217,11 @@ class AsyncServer(base_server.BaseServer):
         :param room: Alias for the ``to`` parameter.
         :param skip_sid: The session ID of a client to skip when broadcasting
                          to a room or to all clients. This can be used to
-                         prevent a message from being sent to the sender.
+                         prevent a message from being sent to the sender. To
+                         skip multiple sids, pass a list.
+        :param skip_rooms: A room name or a list of room names. Clients that
+                           are in any of these rooms are skipped when
+                           broadcasting to a room or to all clients.
         :param namespace: The Socket.IO namespace for the event. If this
                           argument is omitted the event is emitted to the
                           default namespace.
@@ -222,7 +242,8 @@ class AsyncServer(base_server.BaseServer):
         """
         await self.emit('message', data=data, to=to, room=room,
                         skip_sid=skip_sid, namespace=namespace,
-                        callback=callback, ignore_queue=ignore_queue)
+                        callback=callback, ignore_queue=ignore_queue,
+                        skip_rooms=skip_rooms)
 
     async def call(self, event, data=None, to=None, sid=None, namespace=None,
                    timeout=60, ignore_queue=False):
@@ -287,37 +308,61 @@ class AsyncServer(base_server.BaseServer):
             else callback_args[0][0] if len(callback_args[0]) == 1 \
             else None
 
-    async def enter_room(self, sid, room, namespace=None):
+    async def enter_room(self, sid, room, namespace=None, room_filter=None):
         """Enter a room.
 
         This function adds the client to a room. The :func:`emit` and
         :func:`send` functions can optionally broadcast events to all the
         clients in a room.
 
-        :param sid: Session ID of the client.
+        :param sid: Session ID of the client. If set to ``None``, all the
+                    clients selected by ``room_filter`` are added to the room,
+                    in all the servers connected to the message queue.
         :param room: Room name. If the room does not exist it is created.
         :param namespace: The Socket.IO namespace for the event. If this
                           argument is omitted the default namespace is used.
+        :param room_filter: The room, or list of rooms, with the clients to
+                            add when ``sid`` is ``None``. This argument is
+                            required in that case.
 
         Note: this method is a coroutine.
         """
         namespace = namespace or '/'
+        if sid is None:
+            if room_filter is None:
+                raise ValueError('A room_filter is required when sid is None.')
+            self.logger.info('clients in %s are entering room %s [%s]',
+                             room_filter, room, namespace)
+            return await self.manager.enter_room(None, namespace, room,
+                                                 room_filter=room_filter)
         self.logger.info('%s is entering room %s [%s]', sid, room, namespace)
         await self.manager.enter_room(sid, namespace, room)
 
-    async def leave_room(self, sid, room, namespace=None):
+    async def leave_room(self, sid, room, namespace=None, room_filter=None):
         """Leave a room.
 
         This function removes the client from a room.
 
-        :param sid: Session ID of the client.
+        :param sid: Session ID of the client. If set to ``None``, all the
+                    clients selected by ``room_filter`` are removed from the
+                    room, in all the servers connected to the message queue.
         :param room: Room name.
         :param namespace: The Socket.IO namespace for the event. If this
                           argument is omitted the default namespace is used.
+        :param room_filter: The room, or list of rooms, with the clients to
+                            remove when ``sid`` is ``None``. This argument is
+                            required in that case.
 
         Note: this method is a coroutine.
         """
         namespace = namespace or '/'
+        if sid is None:
+            if room_filter is None:
+                raise ValueError('A room_filter is required when sid is None.')
+            self.logger.info('clients in %s are leaving room %s [%s]',
+                             room_filter, room, namespace)
+            return await self.manager.leave_room(None, namespace, room,
+                                                 room_filter=room_filter)
         self.logger.info('%s is leaving room %s [%s]', sid, room, namespace)
         await self.manager.leave_room(sid, namespace, room)
 
@@ -405,10 +450,13 @@ class AsyncServer(base_server.BaseServer):
 
         return _session_context_manager(self, sid, namespace)
 
-    async def disconnect(self, sid, namespace=None, ignore_queue=False):
+    async def disconnect(self, sid, namespace=None, ignore_queue=False,
+                         room_filter=None):
         """Disconnect a client.
 
-        :param sid: Session ID of the client.
+        :param sid: Session ID of the client. If set to ``None``, all the
+                    clients selected by ``room_filter`` are disconnected, in
+                    all the servers connected to the message queue.
         :param namespace: The Socket.IO namespace to disconnect. If this
                           argument is omitted the default namespace is used.
         :param ignore_queue: Only used when a message queue is configured. If
@@ -416,10 +464,21 @@ class AsyncServer(base_server.BaseServer):
                              locally, without broadcasting on the queue. It is
                              recommended to always leave this parameter with
                              its default value of ``False``.
+        :param room_filter: The room, or list of rooms, with the clients to
+                            disconnect when ``sid`` is ``None``. This
+                            argument is required in that case.
 
         Note: this method is a coroutine.
         """
         namespace = namespace or '/'
+        if sid is None:
+            if room_filter is None:
+                raise ValueError('A room_filter is required when sid is None.')
+            self.logger.info('Disconnecting clients in %s [%s]', room_filter,
+                             namespace)
+            return await self.manager.disconnect(None, namespace=namespace,
+                                                 ignore_queue=ignore_queue,
+                                                 room_filter=room_filter)
         if ignore_queue:
             delete_it = self.manager.is_connected(sid, namespace)
         else:
@@ -534,6 +593,20 @@ class AsyncServer(base_server.BaseServer):
         """Send a raw Engine.IO packet to a client."""
         await self.eio.send_packet(eio_sid, eio_pkt)
 
+    async def _send_eio_packet_many(self, eio_sids, eio_pkts):
+        """Send a list of raw Engine.IO packets to several clients.
+
+        The packets are queued for each client in order, from a single task.
+        Clients that are not connected anymore are skipped by
+        ``send_packet()``, which logs a warning and returns. Note that since
+        each ``send_packet()`` call is awaited in turn, a client that missed
+        its ping timeout is closed, and its disconnect handler invoked, from
+        inside this loop, before the remaining clients are sent the packets.
+        """
+        for eio_sid in eio_sids:
+            for eio_pkt in eio_pkts:
+                await self.eio.send_packet(eio_sid, eio_pkt)
+
     async def _handle_connect(self, eio_sid, namespace, data):
         """Handle a client connection request."""
         namespace = namespace or '/'
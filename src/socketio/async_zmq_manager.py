@@ -0,0 +1,113 @@
+try:
+    import zmq
+    import zmq.asyncio
+except ImportError:
+    zmq = None
+
+from .async_pubsub_manager import AsyncPubSubManager
+from .zmq_manager import parse_zmq_url
+
+
+class AsyncZmqManager(AsyncPubSubManager):
+    """zmq based client manager for asyncio servers.
+
+    NOTE: this zmq implementation should be considered experimental at this
+    time.
+
+    This class implements a zmq backend for event sharing across multiple
+    processes, using the asyncio support in the pyzmq package. To use a zmq
+    backend, initialize the :class:`AsyncServer` instance as follows::
+
+        url = 'zmq+tcp://hostname:port1+port2'
+        server = socketio.AsyncServer(
+            client_manager=socketio.AsyncZmqManager(url))
+
+    A zmq message broker must be running for this manager to work. See
+    :class:`ZmqManager` for details.
+
+    :param url: The connection URL for the zmq message broker,
+                which will need to be provided and running.
+    :param channel: The channel name on which the server sends and receives
+                    notifications. Must be the same in all the servers.
+    :param write_only: If set to ``True``, only initialize to emit events. The
+                       default of ``False`` initializes the class for emitting
+                       and receiving. A write-only instance can be used
+                       independently of the server to emit to clients from an
+                       external process.
+    :param logger: a custom logger to log it. If not given, the server logger
+                   is used.
+    :param json: An alternative JSON module to use for encoding and decoding
+                 packets. Custom json modules must have ``dumps`` and ``loads``
+                 functions that are compatible with the standard library
+                 versions. This setting is only used when ``write_only`` is set
+                 to ``True``. Otherwise the JSON module configured in the
+                 server is used.
+    :param serializer: The format of the messages published to the message
+                       queue, ``'default'`` for JSON or ``'msgpack'``. See
+                       :class:`AsyncPubSubManager` for details.
+    :param batch_size: The maximum number of messages that are combined into a
+                       single publish. The default of ``None`` disables
+                       batching. See :class:`AsyncPubSubManager` for details.
+    :param batch_interval: The maximum time in seconds that a message waits
+                           for its batch to fill before it is published.
+    :param sid_directory: If set to ``True``, emits addressed to a single
+                          client are only handled by the server that hosts the
+                          client. See :class:`AsyncPubSubManager` for details.
+    :param envelope: If set to ``True``, emits are published with a routing
+                     header that allows servers without recipients to discard
+                     them without decoding. See :class:`AsyncPubSubManager` for
+                     details.
+    :param packet_passthrough: If set to ``True``, emits are published as
+                               encoded Socket.IO packets. See
+                               :class:`AsyncPubSubManager` for details.
+    :param packet_cache_size: The maximum number of encoded events kept in the
+                              cache used by the ``cache_key`` argument of
+                              ``emit()``.
+    """
+    name = 'asynczmq'
+
+    def __init__(self, url='zmq+tcp://localhost:5555+5556', channel='socketio',
+                 write_only=False, logger=None, json=None,
+                 serializer='default', batch_size=None,
+                 batch_interval=0.005, sid_directory=False, envelope=False,
+                 packet_passthrough=False, packet_cache_size=128):
+        if zmq is None:
+            raise RuntimeError('zmq package is not installed '
+                               '(Run "pip install pyzmq" in your '
+                               'virtualenv).')
+        self.sink_url, self.sub_url = parse_zmq_url(url)
+
+        super().__init__(channel=channel, write_only=write_only, logger=logger,
+                         json=json, serializer=serializer,
+                         batch_size=batch_size, batch_interval=batch_interval,
+                         sid_directory=sid_directory, envelope=envelope,
+                         packet_passthrough=packet_passthrough,
+                         packet_cache_size=packet_cache_size)
+        self.context = None
+        self.sink = None
+        self.sub = None
+
+    def _socket(self, socket_type, url):
+        if self.context is None:
+            self.context = zmq.asyncio.Context()
+        socket = self.context.socket(socket_type)
+        socket.connect(url)
+        return socket
+
+    async def _publish(self, data):
+        body = self._encode_message(data)
+        if isinstance(body, str):
+            body = body.encode()
+        if self.sink is None:
+            self.sink = self._socket(zmq.PUSH, self.sink_url)
+        await self.sink.send(self.channel.encode() + b'\0' + body)
+
+    async def _listen(self):
+        prefix = self.channel.encode() + b'\0'
+        if self.sub is None:
+            self.sub = self._socket(zmq.SUB, self.sub_url)
+            self.sub.setsockopt(zmq.SUBSCRIBE, prefix)
+        while True:
+            message = await self.sub.recv()
+            if message.startswith(prefix):
+                yield message[len(prefix):]
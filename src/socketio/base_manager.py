@@ -1,17 +1,98 @@
+import base64
+from collections import OrderedDict
 import itertools
 import logging
 import json
+import sys
+import threading
 
 from bidict import bidict, ValueDuplicationError
+from engineio import packet as eio_packet
+
+from . import packet
 
 default_logger = logging.getLogger('socketio')
 
 
+def _intern(sid):
+    # sids arriving from the message queue are new string objects, interning
+    # them ensures that all the rooms share a single copy of each sid
+    return sys.intern(sid) if type(sid) is str else sid
+
+
+class _ParticipantsIterator:
+    __slots__ = ['participants', 'remaining']
+
+    def __init__(self, participants):
+        self.participants = participants
+        self.remaining = ()
+
+
+class _BroadcastPacket(eio_packet.Packet):
+    """An Engine.IO packet that is shared by all the recipients of an emit.
+
+    The packet is encoded once for the websocket transport and once for the
+    long-polling transport, and each recipient is given the encoding that
+    matches the transport it uses.
+    """
+    def __init__(self, packet_type, data):
+        super().__init__(packet_type, data)
+        self.encode_cache = super().encode()
+        self.b64_encode_cache = None
+
+    def encode(self, b64=False):
+        if b64 and self.binary:
+            if self.b64_encode_cache is None:
+                self.b64_encode_cache = 'b' + base64.b64encode(
+                    self.data).decode('utf-8')
+            return self.b64_encode_cache
+        return self.encode_cache
+
+
+class PacketCache:
+    """A bounded cache of encoded packets, with least recently used
+    eviction.
+
+    The cache can be used from multiple threads.
+
+    :param size: The maximum number of entries in the cache.
+    """
+    def __init__(self, size=128):
+        self.size = size
+        self.packets = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        """Return the packets stored under the given key, or ``None``."""
+        with self.lock:
+            try:
+                packets = self.packets[key]
+            except KeyError:
+                self.misses += 1
+                return None
+            self.packets.move_to_end(key)
+            self.hits += 1
+            return packets
+
+    def set(self, key, packets):
+        """Store packets under the given key."""
+        with self.lock:
+            self.packets[key] = packets
+            self.packets.move_to_end(key)
+            if len(self.packets) > self.size:
+                self.packets.popitem(last=False)
+
+
 class BaseManager:
-    def __init__(self):
+    def __init__(self, packet_cache_size=128):
         self.logger = None
         self.server = None
         self.rooms = {}  # self.rooms[namespace][room][sio_sid] = eio_sid
+        self.sid_rooms = {}  # self.sid_rooms[namespace][sio_sid][room] = None
+        self.participant_iterators = {}
+        self.packet_cache = PacketCache(size=packet_cache_size)
         self.eio_to_sid = {}
         self.callbacks = {}
         self.pending_disconnect = {}
@@ -35,18 +116,83 @@ class BaseManager:
         """Return an iterable with the active participants in a room.
 
         Note that in a multi-server scenario this method only returns the
-        participants connect to the server in which the method is called. There
-        is currently no functionality to assemble a complete list of users
-        across multiple servers.
+        participants connect to the server in which the method is called. The
+        :meth:`PubSubManager.fetch_participants` method can be used to
+        assemble a complete list of users across multiple servers.
         """
         ns = self.rooms.get(namespace, {})
         if hasattr(room, '__len__') and not isinstance(room, str):
-            participants = ns[room[0]]._fwdm.copy() if room[0] in ns else {}
-            for r in room[1:]:
-                participants.update(ns[r]._fwdm if r in ns else {})
+            participants = self._iter_rooms([ns[r] for r in room if r in ns])
+        elif room in ns:
+            participants = iter(ns[room].items())
+        else:
+            return
+
+        # the participants are streamed directly from the room storage, but if
+        # the rooms in the namespace are modified during the iteration a copy
+        # of the remaining participants is made before the change is applied
+        it = _ParticipantsIterator(participants)
+        iterators = self.participant_iterators.setdefault(namespace, set())
+        iterators.add(it)
+        try:
+            yield from it.participants
+            yield from it.remaining
+        finally:
+            iterators.discard(it)
+            if len(iterators) == 0 and \
+                    self.participant_iterators.get(namespace) is iterators:
+                del self.participant_iterators[namespace]
+
+    def get_recipients(self, namespace, room, skip_sid=None,
+                       skip_rooms=None):
+        """Return an iterable with the participants in a room that are not
+        excluded by the ``skip_sid`` and ``skip_rooms`` arguments.
+
+        ``skip_sid`` can be a single sid or a list of sids, and
+        ``skip_rooms`` can be a single room name or a list of room names.
+        """
+        if skip_sid is None or isinstance(skip_sid, str):
+            skip_sids = () if skip_sid is None else (skip_sid,)
         else:
-            participants = ns[room]._fwdm.copy() if room in ns else {}
-        yield from participants.items()
+            skip_sids = skip_sid
+        if skip_rooms is None or isinstance(skip_rooms, str):
+            skip_rooms = () if skip_rooms is None else (skip_rooms,)
+        ns = self.rooms.get(namespace, {})
+        skip_rooms = [ns[r] for r in skip_rooms if r in ns]
+        if not skip_sids and not skip_rooms:
+            yield from self.get_participants(namespace, room)
+            return
+        skip_sids = frozenset(skip_sids)
+        for sid, eio_sid in self.get_participants(namespace, room):
+            if sid in skip_sids:
+                continue
+            for r in skip_rooms:
+                if sid in r:
+                    break
+            else:
+                yield sid, eio_sid
+
+    @staticmethod
+    def _iter_rooms(rooms):
+        """Iterate over the participants of several rooms, skipping clients
+        that were already returned from a previous room."""
+        if len(rooms) == 0:
+            return
+        yield from rooms[0].items()
+        for i in range(1, len(rooms)):
+            previous_rooms = rooms[:i]
+            for sid, eio_sid in rooms[i].items():
+                for room in previous_rooms:
+                    if sid in room:
+                        break
+                else:
+                    yield sid, eio_sid
+
+    def _snapshot_participants(self, namespace):
+        """Copy the remaining participants of any iterations in progress in
+        a namespace, before its rooms are modified."""
+        for it in self.participant_iterators.pop(namespace, ()):
+            it.remaining = list(it.participants)
 
     def connect(self, eio_sid, namespace):
         """Register a client connection to a namespace."""
@@ -95,10 +241,7 @@ class BaseManager:
     def basic_disconnect(self, sid, namespace, **kwargs):
         if namespace not in self.rooms:
             return
-        rooms = []
-        for room_name, room in self.rooms[namespace].copy().items():
-            if sid in room:
-                rooms.append(room_name)
+        rooms = list(self.sid_rooms.get(namespace, {}).get(sid, {}))
         for room in rooms:
             self.basic_leave_room(sid, namespace, room)
         if sid in self.callbacks:
@@ -115,12 +258,21 @@ class BaseManager:
         if namespace not in self.rooms:
             self.rooms[namespace] = {}
         if room not in self.rooms[namespace]:
-            self.rooms[namespace][room] = bidict()
+            self.rooms[namespace][room] = self._create_room(namespace, room)
+        sid = _intern(sid)
         if eio_sid is None:
             eio_sid = self.rooms[namespace][None][sid]
+        else:
+            eio_sid = _intern(eio_sid)
+        if namespace in self.participant_iterators:
+            self._snapshot_participants(namespace)
         self.rooms[namespace][room][sid] = eio_sid
+        self.sid_rooms.setdefault(namespace, {}).setdefault(sid, {})[room] = \
+            None
 
     def basic_leave_room(self, sid, namespace, room):
+        if namespace in self.participant_iterators:
+            self._snapshot_participants(namespace)
         try:
             del self.rooms[namespace][room][sid]
             if len(self.rooms[namespace][room]) == 0:
@@ -128,7 +280,13 @@ class BaseManager:
                 if len(self.rooms[namespace]) == 0:
                     del self.rooms[namespace]
         except KeyError:
-            pass
+            return
+        sid_rooms = self.sid_rooms[namespace]
+        del sid_rooms[sid][room]
+        if len(sid_rooms[sid]) == 0:
+            del sid_rooms[sid]
+            if len(sid_rooms) == 0:
+                del self.sid_rooms[namespace]
 
     def basic_close_room(self, room, namespace):
         try:
@@ -139,14 +297,52 @@ class BaseManager:
 
     def get_rooms(self, sid, namespace):
         """Return the rooms a client is in."""
-        r = []
         try:
-            for room_name, room in self.rooms[namespace].items():
-                if room_name is not None and sid in room:
-                    r.append(room_name)
+            rooms = self.sid_rooms[namespace][sid]
         except KeyError:
-            pass
-        return r
+            return []
+        return [room for room in rooms if room is not None]
+
+    def _create_room(self, namespace, room):
+        """Return the storage for the members of a new room.
+
+        The returned object must behave as a dictionary that maps sio sids to
+        eio sids. The ``None`` room, which has all the clients connected to
+        the namespace, must be a ``bidict``, so that eio sids can also be
+        mapped back to sio sids. Subclasses can override this method to use
+        alternative storage.
+        """
+        # only the namespace wide room needs to map eio sids back to sio sids,
+        # all other rooms use a plain dictionary, which is much smaller
+        return bidict() if room is None else {}
+
+    def _get_eio_packets(self, event, data, namespace, cache_key=None,
+                         binary=None, packets=None):
+        """Return the Engine.IO packets that carry an event.
+
+        When a ``cache_key`` is given the encoded packets are stored in the
+        packet cache, so that emitting the same event again with the same key
+        does not need to encode it again. When ``packets`` is given, it must
+        be the list of already encoded Socket.IO packets for the event.
+        """
+        if cache_key is not None:
+            key = (namespace, event, cache_key)
+            eio_pkts = self.packet_cache.get(key)
+            if eio_pkts is not None:
+                return eio_pkts
+        if packets is None:
+            # write-only managers are not attached to a server
+            packet_class = self.server.packet_class if self.server \
+                else packet.Packet
+            pkt = packet_class(packet.EVENT, namespace=namespace,
+                               data=[event] + data, binary=binary)
+            packets = pkt.encode()
+            if not isinstance(packets, list):
+                packets = [packets]
+        eio_pkts = [_BroadcastPacket(eio_packet.MESSAGE, p) for p in packets]
+        if cache_key is not None:
+            self.packet_cache.set(key, eio_pkts)
+        return eio_pkts
 
     def _generate_ack_id(self, sid, callback):
         """Generate a unique identifier for an ACK packet."""
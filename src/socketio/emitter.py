@@ -0,0 +1,109 @@
+from collections import deque
+import time
+
+from .pubsub_manager import PubSubManager
+
+
+class Emitter:
+    """Emit events to Socket.IO clients from an external process.
+
+    This class publishes emits on the message queue of a Socket.IO
+    deployment, without the need to create a :class:`Server` instance. It is
+    intended for worker processes that need to emit a large number of events.
+
+    The emits are published through the given client manager, which should be
+    created in write-only mode. Several emits can be given at once with
+    :meth:`emit_many`, and are published together, using a pipeline in the
+    Redis managers. If publishing fails, the messages are kept in a local
+    spool and published again before any new ones. Example::
+
+        mgr = socketio.RedisManager('redis://', write_only=True,
+                                    redis_options={'socket_timeout': 1})
+        emitter = socketio.Emitter(mgr)
+        emitter.emit('status', {'progress': 50}, to=sid)
+
+    :param client_manager: The write-only client manager that is used to
+                           publish the emits. It must be an instance of
+                           :class:`PubSubManager` or one of its subclasses.
+    :param batch_size: The maximum number of emits that are published
+                       together.
+    :param spool_size: The maximum number of messages that are kept in the
+                       local spool. When the spool is full the oldest messages
+                       are discarded.
+    :param retry_interval: The time in seconds after a failed publish during
+                           which new emits are sent directly to the spool,
+                           without trying to publish them.
+    """
+    def __init__(self, client_manager, batch_size=1000, spool_size=100000,
+                 retry_interval=1):
+        if not isinstance(client_manager, PubSubManager):
+            raise ValueError('A pub/sub client manager is required')
+        self.manager = client_manager
+        self.batch_size = batch_size
+        self.spool = deque(maxlen=spool_size)
+        self.retry_interval = retry_interval
+        self.retry_time = None
+        self.dropped = 0
+
+    def emit(self, event, data=None, to=None, room=None, skip_sid=None,
+             namespace=None, skip_rooms=None, binary=None):
+        """Emit a custom event to one or more connected clients.
+
+        The arguments are the same as in :meth:`Server.emit`, with the
+        exception of ``callback``, which is not supported.
+        """
+        self._send([self._get_message(
+            event, data, to=to, room=room, skip_sid=skip_sid,
+            namespace=namespace, skip_rooms=skip_rooms, binary=binary)])
+
+    def emit_many(self, emits):
+        """Emit several events.
+
+        :param emits: A list of emits. Each emit is given as a dictionary
+                      with the arguments of :meth:`emit`.
+        """
+        self._send([self._get_message(**emit) for emit in emits])
+
+    def flush(self):
+        """Publish the messages in the local spool.
+
+        Returns ``True`` if all the messages were published.
+        """
+        self.retry_time = None
+        self._send([])
+        return len(self.spool) == 0
+
+    def _get_message(self, event, data=None, to=None, room=None,
+                     skip_sid=None, namespace=None, skip_rooms=None,
+                     binary=None):
+        return self.manager._get_emit_message(
+            event, data, namespace or '/', room=to or room, skip_sid=skip_sid,
+            skip_rooms=skip_rooms, binary=binary)
+
+    def _send(self, messages):
+        if self.spool:
+            # spooled messages are published first, to preserve the order
+            if self.retry_time is not None and \
+                    time.time() < self.retry_time:
+                return self._spool(messages)
+            self._spool(messages)
+            messages = list(self.spool)
+            self.spool.clear()
+        for i in range(0, len(messages), self.batch_size):
+            try:
+                self.manager._publish_many(messages[i:i + self.batch_size])
+            except Exception as exc:
+                self.manager._get_logger().error(
+                    'Cannot publish, %d messages spooled', len(messages) - i,
+                    extra={'exception': str(exc)})
+                self.retry_time = time.time() + self.retry_interval
+                return self._spool(messages[i:])
+        self.retry_time = None
+
+    def _spool(self, messages):
+        discarded = len(self.spool) + len(messages) - self.spool.maxlen
+        if discarded > 0:
+            self.dropped += discarded
+            self.manager._get_logger().warning(
+                'Emitter spool is full, %d messages discarded', discarded)
+        self.spool.extend(messages)
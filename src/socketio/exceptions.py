@@ -36,3 +36,7 @@ class BadNamespaceError(SocketIOError):
 
 class DisconnectedError(SocketIOError):
     pass
+
+
+class QueueFullError(SocketIOError):
+    pass
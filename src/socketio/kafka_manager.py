@@ -1,3 +1,4 @@
+from functools import partial
 import logging
 
 try:
@@ -10,7 +11,7 @@ from .pubsub_manager import PubSubManager
 logger = logging.getLogger('socketio')
 
 
-class KafkaManager(PubSubManager):  # pragma: no cover
+class KafkaManager(PubSubManager):
     """Kafka based client manager.
 
     This class implements a Kafka backend for event sharing across multiple
@@ -42,29 +43,115 @@ class KafkaManager(PubSubManager):  # pragma: no cover
                  versions. This setting is only used when ``write_only`` is set
                  to ``True``. Otherwise the JSON module configured in the
                  server is used.
+    :param serializer: The format of the messages published to the message
+                       queue, ``'default'`` for JSON or ``'msgpack'``. See
+                       :class:`PubSubManager` for details.
+    :param batch_size: The maximum number of messages that are combined into a
+                       single publish. The default of ``None`` disables
+                       batching. See :class:`PubSubManager` for details.
+    :param batch_interval: The maximum time in seconds that a message waits
+                           for its batch to fill before it is published.
+    :param sid_directory: If set to ``True``, emits addressed to a single
+                          client are only handled by the server that hosts the
+                          client. See :class:`PubSubManager` for details.
+    :param envelope: If set to ``True``, emits are published with a routing
+                     header that allows servers without recipients to discard
+                     them without decoding. See :class:`PubSubManager` for
+                     details.
+    :param packet_passthrough: If set to ``True``, emits are published as
+                               encoded Socket.IO packets. See
+                               :class:`PubSubManager` for details.
+    :param producer_options: additional keyword arguments to be passed to the
+                             ``KafkaProducer`` constructor. The ``linger_ms``
+                             and ``batch_size`` options can be used to
+                             configure how the producer combines messages
+                             when ``flush`` is set to ``False``.
+    :param flush: If set to ``True`` (the default), each message is flushed to
+                  Kafka when it is published, so the caller waits for it to be
+                  delivered. If set to ``False``, messages are sent in the
+                  background by the producer, which can combine several of
+                  them in a single request.
+    :param delivery_callback: A function that is invoked once a published
+                              message is delivered to Kafka or fails to be
+                              delivered, with the message and the exception
+                              (or ``None`` on success) as arguments. This
+                              function is invoked from the producer's
+                              background thread.
+    :param publish_queue_size: The size of the outbound queue. When set,
+                               messages are published by a background task.
+                               See :class:`PubSubManager` for details.
+    :param publish_queue_policy: What to do when the outbound queue is full,
+                                 ``'block'``, ``'drop_oldest'`` or
+                                 ``'raise'``. See :class:`PubSubManager` for
+                                 details.
+    :param packet_cache_size: The maximum number of encoded events kept in the
+                              cache used by the ``cache_key`` argument of
+                              ``emit()``.
     """
     name = 'kafka'
 
     def __init__(self, url='kafka://localhost:9092', channel='socketio',
-                 write_only=False, logger=None, json=None):
+                 write_only=False, logger=None, json=None,
+                 serializer='default', batch_size=None,
+                 batch_interval=0.005, sid_directory=False, envelope=False,
+                 packet_passthrough=False, producer_options=None, flush=True,
+                 delivery_callback=None, publish_queue_size=None,
+                 publish_queue_policy='block', packet_cache_size=128):
         if kafka is None:
             raise RuntimeError('kafka-python package is not installed '
                                '(Run "pip install kafka-python" in your '
                                'virtualenv).')
 
         super().__init__(channel=channel, write_only=write_only, logger=logger,
-                         json=json)
+                         json=json, serializer=serializer,
+                         batch_size=batch_size, batch_interval=batch_interval,
+                         sid_directory=sid_directory, envelope=envelope,
+                         packet_passthrough=packet_passthrough,
+                         publish_queue_size=publish_queue_size,
+                         publish_queue_policy=publish_queue_policy,
+                         packet_cache_size=packet_cache_size)
 
         urls = [url] if isinstance(url, str) else url
         self.kafka_urls = [url[8:] if url != 'kafka://' else 'localhost:9092'
                            for url in urls]
-        self.producer = kafka.KafkaProducer(bootstrap_servers=self.kafka_urls)
+        self.flush = flush
+        self.delivery_callback = delivery_callback
+        self.producer = kafka.KafkaProducer(bootstrap_servers=self.kafka_urls,
+                                            **(producer_options or {}))
         self.consumer = kafka.KafkaConsumer(self.channel,
                                             bootstrap_servers=self.kafka_urls)
 
     def _publish(self, data):
-        self.producer.send(self.channel, value=self.json.dumps(data))
+        self._send(data)
+        if self.flush:
+            self.producer.flush()
+
+    def _publish_many(self, messages):
+        # all the messages are sent before waiting for their delivery, so
+        # that the producer can group them
+        futures = [self._send(message) for message in messages]
         self.producer.flush()
+        for future in futures:
+            future.get()  # raises delivery errors
+
+    def _send(self, data):
+        value = self._encode_message(data)
+        if isinstance(value, str):
+            value = value.encode()
+        future = self.producer.send(self.channel, value=value)
+        future.add_callback(partial(self._on_delivery, data))
+        future.add_errback(partial(self._on_delivery_error, data))
+        return future
+
+    def _on_delivery(self, data, metadata):
+        if self.delivery_callback:
+            self.delivery_callback(data, None)
+
+    def _on_delivery_error(self, data, exc):
+        self._get_logger().error('Cannot publish to kafka',
+                                 extra={'kafka_exception': str(exc)})
+        if self.delivery_callback:
+            self.delivery_callback(data, exc)
 
     def _kafka_listen(self):
         yield from self.consumer
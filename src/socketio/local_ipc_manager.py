@@ -0,0 +1,370 @@
+import os
+import queue
+import socket
+import stat
+import struct
+import tempfile
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None
+
+from .pubsub_manager import PubSubManager
+
+PUBLISHER = b'P'
+SUBSCRIBER = b'S'
+
+
+def default_ipc_path(channel):
+    """Return the default path of the hub socket for a channel.
+
+    The socket is created in the runtime directory of the user given in the
+    ``XDG_RUNTIME_DIR`` environment variable, or else in a directory that is
+    private to the user inside the temporary directory.
+    """
+    directory = os.environ.get('XDG_RUNTIME_DIR')
+    if not directory:
+        directory = os.path.join(tempfile.gettempdir(),
+                                 f'socketio-{os.getuid()}')
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+    st = os.lstat(directory)
+    if not stat.S_ISDIR(st.st_mode) or st.st_uid != os.getuid() or \
+            st.st_mode & 0o077:
+        raise RuntimeError(f'{directory} must be a directory owned by the '
+                           'current user and not accessible to others')
+    return os.path.join(directory, f'socketio-{channel}.sock')
+
+
+def lock_ipc_hub(path):
+    """Try to become the hub of a local channel.
+
+    Returns an open lock file when this process is the new hub, or ``None``
+    when another process holds the hub lock. The lock is released by the
+    operating system when the process ends, so that another process can take
+    over as hub.
+    """
+    lock_file = os.fdopen(os.open(path + '.lock', os.O_RDWR | os.O_CREAT,
+                                  0o600), 'r+')
+    try:
+        os.fchmod(lock_file.fileno(), 0o600)
+    except OSError:
+        lock_file.close()
+        raise
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock_file.close()
+        return None
+    if os.path.exists(path):
+        # the socket left behind by a previous hub is removed
+        os.unlink(path)
+    return lock_file
+
+
+def encode_frame(body):
+    return struct.pack('>I', len(body)) + body
+
+
+def recv_exactly(sock, size):
+    data = b''
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise ConnectionError('Connection closed')
+        data += chunk
+    return data
+
+
+def frame_size(header, max_size):
+    """Return the body size given in a frame header.
+
+    A :class:`ValueError` is raised when the size is larger than
+    ``max_size``, before any memory is allocated for the body.
+    """
+    size = struct.unpack('>I', header)[0]
+    if size > max_size:
+        raise ValueError(f'Frame of {size} bytes exceeds the maximum size of '
+                         f'{max_size} bytes')
+    return size
+
+
+def recv_frame(sock, max_size):
+    return recv_exactly(sock, frame_size(recv_exactly(sock, 4), max_size))
+
+
+class LocalIPCManager(PubSubManager):
+    """Unix socket based client manager.
+
+    This class implements a backend for event sharing across multiple
+    processes that run on the same host, such as the workers of a web server,
+    without an external message queue. The first server process that starts
+    becomes the hub of the channel, and listens on a Unix socket to which all
+    the other processes connect. The hub forwards every message it receives
+    to all the connected servers. If the hub process ends, another server
+    takes over this role.
+
+    To use a local IPC backend, initialize the :class:`Server` instance as
+    follows::
+
+        server = socketio.Server(client_manager=socketio.LocalIPCManager())
+
+    :param path: The path of the Unix socket used by the hub. The default is
+                 a file named after the channel, in a directory that is
+                 private to the current user. Must be the same in all the
+                 servers, which must run as the same user.
+    :param channel: The channel name on which the server sends and receives
+                    notifications. Must be the same in all the servers.
+    :param write_only: If set to ``True``, only initialize to emit events. The
+                       default of ``False`` initializes the class for emitting
+                       and receiving. A write-only instance can be used
+                       independently of the server to emit to clients from an
+                       external process. Write-only instances never become the
+                       hub.
+    :param logger: a custom logger to log it. If not given, the server logger
+                   is used.
+    :param json: An alternative JSON module to use for encoding and decoding
+                 packets. Custom json modules must have ``dumps`` and ``loads``
+                 functions that are compatible with the standard library
+                 versions. This setting is only used when ``write_only`` is set
+                 to ``True``. Otherwise the JSON module configured in the
+                 server is used.
+    :param serializer: The format of the messages published to the message
+                       queue, ``'default'`` for JSON or ``'msgpack'``. See
+                       :class:`PubSubManager` for details.
+    :param batch_size: The maximum number of messages that are combined into a
+                       single publish. The default of ``None`` disables
+                       batching. See :class:`PubSubManager` for details.
+    :param batch_interval: The maximum time in seconds that a message waits
+                           for its batch to fill before it is published.
+    :param sid_directory: If set to ``True``, emits addressed to a single
+                          client are only handled by the server that hosts the
+                          client. See :class:`PubSubManager` for details.
+    :param envelope: If set to ``True``, emits are published with a routing
+                     header that allows servers without recipients to discard
+                     them without decoding. See :class:`PubSubManager` for
+                     details.
+    :param packet_passthrough: If set to ``True``, emits are published as
+                               encoded Socket.IO packets. See
+                               :class:`PubSubManager` for details.
+    :param packet_cache_size: The maximum number of encoded events kept in the
+                              cache used by the ``cache_key`` argument of
+                              ``emit()``.
+    """
+    name = 'localipc'
+    send_timeout = 5  # seconds
+    max_frame_size = 16 * 1024 * 1024  # bytes
+    max_pending_frames = 10000
+
+    def __init__(self, path=None, channel='socketio', write_only=False,
+                 logger=None, json=None, serializer='default',
+                 batch_size=None, batch_interval=0.005, sid_directory=False,
+                 envelope=False, packet_passthrough=False,
+                 packet_cache_size=128):
+        if fcntl is None:  # pragma: no cover
+            raise RuntimeError('Unix sockets are not supported on this '
+                               'platform')
+        super().__init__(channel=channel, write_only=write_only, logger=logger,
+                         json=json, serializer=serializer,
+                         batch_size=batch_size, batch_interval=batch_interval,
+                         sid_directory=sid_directory, envelope=envelope,
+                         packet_passthrough=packet_passthrough,
+                         packet_cache_size=packet_cache_size)
+        self.path = path or default_ipc_path(channel)
+        self.publisher = None
+        self.publisher_lock = threading.Lock()
+        self.hub_lock_file = None
+        self.hub_socket = None
+        self.hub_subscribers = {}
+        self.hub_subscribers_lock = threading.Lock()
+
+    def initialize(self):
+        super().initialize()
+
+        monkey_patched = True
+        async_mode = getattr(self.server, 'async_mode', None) or 'threading'
+        if async_mode == 'eventlet':
+            from eventlet.patcher import is_monkey_patched
+            monkey_patched = is_monkey_patched('socket')
+        elif 'gevent' in async_mode:
+            from gevent.monkey import is_module_patched
+            monkey_patched = is_module_patched('socket')
+        if not monkey_patched:
+            raise RuntimeError(
+                'LocalIPCManager requires a monkey patched socket library '
+                'to work with ' + async_mode)
+
+    def _connect(self, role):
+        """Connect to the hub, becoming the hub first if there is none."""
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(self.path)
+        except OSError:
+            sock.close()
+            if self.write_only or not self._start_hub():
+                raise
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.connect(self.path)
+        sock.sendall(role)
+        return sock
+
+    def _start_hub(self):
+        lock_file = lock_ipc_hub(self.path)
+        if lock_file is None:
+            return False
+        hub_socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        hub_socket.bind(self.path)
+        os.chmod(self.path, 0o600)
+        hub_socket.listen(128)
+        self.hub_lock_file = lock_file
+        self.hub_socket = hub_socket
+        self.server.start_background_task(self._hub_accept)
+        self._get_logger().info('Local IPC hub started on ' + self.path)
+        return True
+
+    def _hub_accept(self):
+        while True:
+            try:
+                conn, _ = self.hub_socket.accept()
+            except OSError as exc:
+                if self.hub_socket.fileno() == -1:
+                    break  # the hub socket was closed
+                self._get_logger().error(
+                    'Local IPC hub cannot accept connections',
+                    extra={"ipc_exception": str(exc)})
+                continue
+            self.server.start_background_task(self._hub_client, conn)
+
+    def _hub_client(self, conn):
+        try:
+            role = recv_exactly(conn, 1)
+            if role == SUBSCRIBER:
+                # a subscriber that does not keep up is disconnected
+                conn.settimeout(self.send_timeout)
+                frames = queue.Queue(maxsize=self.max_pending_frames)
+                with self.hub_subscribers_lock:
+                    self.hub_subscribers[conn] = frames
+                self.server.start_background_task(self._hub_writer, conn,
+                                                  frames)
+                # subscribers do not send anything, so this ends when the
+                # connection is closed
+                while True:
+                    try:
+                        if not conn.recv(1):
+                            break
+                    except socket.timeout:
+                        pass
+            else:
+                while True:
+                    self._hub_broadcast(encode_frame(
+                        recv_frame(conn, self.max_frame_size)))
+        except Exception:
+            pass
+        with self.hub_subscribers_lock:
+            frames = self.hub_subscribers.pop(conn, None)
+        if frames is not None:
+            try:
+                frames.put_nowait(None)  # stop the writer
+            except queue.Full:
+                pass
+        conn.close()
+
+    def _hub_writer(self, conn, frames):
+        """Send the frames queued for a subscriber."""
+        while True:
+            frame = frames.get()
+            if frame is None or conn not in self.hub_subscribers:
+                break
+            try:
+                conn.sendall(frame)
+            except Exception:
+                self._hub_drop(conn)
+                break
+
+    def _hub_drop(self, conn):
+        with self.hub_subscribers_lock:
+            self.hub_subscribers.pop(conn, None)
+        try:
+            # this ends the subscriber's connection handler, which closes it
+            conn.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+    def _hub_broadcast(self, frame):
+        # the frame is queued for each subscriber, so that a slow subscriber
+        # does not delay the others
+        with self.hub_subscribers_lock:
+            subscribers = list(self.hub_subscribers.items())
+        for conn, frames in subscribers:
+            try:
+                frames.put_nowait(frame)
+            except queue.Full:
+                self._hub_drop(conn)
+
+    def _frame(self, data):
+        body = self._encode_message(data)
+        if isinstance(body, str):
+            body = body.encode()
+        if len(body) > self.max_frame_size:
+            raise ValueError(f'Message of {len(body)} bytes exceeds the '
+                             f'maximum size of {self.max_frame_size} bytes')
+        return encode_frame(body)
+
+    def _publish(self, data):
+        frame = self._frame(data)
+        for retries_left in range(1, -1, -1):  # 2 attempts
+            try:
+                with self.publisher_lock:
+                    if self.publisher is None:
+                        self.publisher = self._connect(PUBLISHER)
+                    self.publisher.sendall(frame)
+                return
+            except Exception as exc:
+                self._close_publisher()
+                if retries_left > 0:
+                    self._get_logger().error(
+                        'Cannot publish to local hub... retrying',
+                        extra={"ipc_exception": str(exc)})
+                else:
+                    self._get_logger().error(
+                        'Cannot publish to local hub... giving up',
+                        extra={"ipc_exception": str(exc)})
+
+    def _publish_many(self, messages):
+        # all the messages are sent to the hub in a single write
+        frames = b''.join([self._frame(message) for message in messages])
+        try:
+            with self.publisher_lock:
+                if self.publisher is None:
+                    self.publisher = self._connect(PUBLISHER)
+                self.publisher.sendall(frames)
+        except Exception:
+            self._close_publisher()
+            raise
+
+    def _close_publisher(self):
+        with self.publisher_lock:
+            if self.publisher is not None:
+                self.publisher.close()
+                self.publisher = None
+
+    def _listen(self):
+        retry_sleep = 1
+        while True:
+            try:
+                sock = self._connect(SUBSCRIBER)
+                retry_sleep = 1
+                try:
+                    while True:
+                        yield recv_frame(sock, self.max_frame_size)
+                finally:
+                    sock.close()
+            except Exception as exc:
+                self._get_logger().error(
+                    'Cannot receive from local hub... retrying in '
+                    f'{retry_sleep} secs',
+                    extra={"ipc_exception": str(exc)})
+                time.sleep(retry_sleep)
+                retry_sleep = min(retry_sleep * 2, 60)
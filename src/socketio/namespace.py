@@ -33,7 +33,8 @@ class Namespace(base_namespace.BaseServerNamespace):
                     raise
 
     def emit(self, event, data=None, to=None, room=None, skip_sid=None,
-             namespace=None, callback=None, ignore_queue=False):
+             namespace=None, callback=None, ignore_queue=False,
+             skip_rooms=None, cache_key=None, binary=None):
         """Emit a custom event to one or more connected clients.
 
         The only difference with the :func:`socketio.Server.emit` method is
@@ -43,10 +44,12 @@ class Namespace(base_namespace.BaseServerNamespace):
         return self.server.emit(event, data=data, to=to, room=room,
                                 skip_sid=skip_sid,
                                 namespace=namespace or self.namespace,
-                                callback=callback, ignore_queue=ignore_queue)
+                                callback=callback, ignore_queue=ignore_queue,
+                                skip_rooms=skip_rooms, cache_key=cache_key,
+                                binary=binary)
 
     def send(self, data, to=None, room=None, skip_sid=None, namespace=None,
-             callback=None, ignore_queue=False):
+             callback=None, ignore_queue=False, skip_rooms=None):
         """Send a message to one or more connected clients.
 
         The only difference with the :func:`socketio.Server.send` method is
@@ -55,7 +58,8 @@ class Namespace(base_namespace.BaseServerNamespace):
         """
         return self.server.send(data, to=to, room=room, skip_sid=skip_sid,
                                 namespace=namespace or self.namespace,
-                                callback=callback, ignore_queue=ignore_queue)
+                                callback=callback, ignore_queue=ignore_queue,
+                                skip_rooms=skip_rooms)
 
     def call(self, event, data=None, to=None, sid=None, namespace=None,
              timeout=None, ignore_queue=False):
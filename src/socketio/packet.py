@@ -1,4 +1,5 @@
-import functools
+import re
+
 from engineio import json as _json
 
 (CONNECT, DISCONNECT, EVENT, ACK, CONNECT_ERROR, BINARY_EVENT, BINARY_ACK) = \
@@ -6,6 +7,37 @@ from engineio import json as _json
 packet_names = ['CONNECT', 'DISCONNECT', 'EVENT', 'ACK', 'CONNECT_ERROR',
                 'BINARY_EVENT', 'BINARY_ACK']
 
+binary_types = (bytes, bytearray, memoryview)
+
+# matches the header that follows the packet type: attachment count,
+# namespace and id
+_header_re = re.compile(r'(?:([0-9]+)-)?(?:(/[^,]*),?)?([0-9]{1,100})?')
+
+
+def _safe_int(s):
+    if len(s) > 100:
+        raise ValueError('Integer is too large')
+    return int(s)
+
+
+def _to_eio_binary(data):
+    # engine.io only sends bytes and bytearray objects, so a memoryview is
+    # replaced with the object it wraps when it covers all of it, and is only
+    # copied when it is a slice or wraps some other type of buffer
+    if isinstance(data, memoryview):
+        if isinstance(data.obj, (bytes, bytearray)) and \
+                data.nbytes == len(data.obj):
+            return data.obj
+        return data.tobytes()
+    return data
+
+
+# the dumps() and loads() functions from engineio's json module create a new
+# encoder or decoder on each call, so when that module is used payloads are
+# encoded and decoded with these equivalent instances instead
+_json_encoder = _json.JSONEncoder(separators=(',', ':'))
+_json_decoder = _json.JSONDecoder(parse_int=_safe_int)
+
 
 class Packet:
     """Socket.IO packet."""
@@ -19,6 +51,9 @@ class Packet:
     # id: ASCII encoded, only if id is not None
     # data: JSON dump of data payload
 
+    __slots__ = ['packet_type', 'data', 'namespace', 'id',
+                 'attachment_count', 'attachments', '_deconstructed']
+
     uses_binary_events = True
     json = _json
 
@@ -28,15 +63,22 @@ class Packet:
         self.data = data
         self.namespace = namespace
         self.id = id
-        if self.uses_binary_events and \
-                (binary or (binary is None and self.data_is_binary(
-                    self.data))):
-            if self.packet_type == EVENT:
-                self.packet_type = BINARY_EVENT
-            elif self.packet_type == ACK:
-                self.packet_type = BINARY_ACK
-            else:
-                raise ValueError('Packet does not support binary payload.')
+        self._deconstructed = None
+        if self.uses_binary_events and binary is not False:
+            if binary is None:
+                # binary components are detected and extracted in a single
+                # pass, and the result is saved to be used by encode()
+                bdata, attachments = self.deconstruct_binary(self.data)
+                binary = len(attachments) > 0
+                if binary:
+                    self._deconstructed = (self.data, bdata, attachments)
+            if binary:
+                if self.packet_type == EVENT:
+                    self.packet_type = BINARY_EVENT
+                elif self.packet_type == ACK:
+                    self.packet_type = BINARY_ACK
+                else:
+                    raise ValueError('Packet does not support binary payload.')
         self.attachment_count = 0
         self.attachments = []
         if encoded_packet:
@@ -51,7 +93,11 @@ class Packet:
         """
         encoded_packet = str(self.packet_type)
         if self.packet_type == BINARY_EVENT or self.packet_type == BINARY_ACK:
-            data, attachments = self.deconstruct_binary(self.data)
+            if self._deconstructed is not None and \
+                    self._deconstructed[0] is self.data:
+                _, data, attachments = self._deconstructed
+            else:
+                data, attachments = self.deconstruct_binary(self.data)
             encoded_packet += str(len(attachments)) + '-'
         else:
             data = self.data
@@ -61,9 +107,13 @@ class Packet:
         if self.id is not None:
             encoded_packet += str(self.id)
         if data is not None:
-            encoded_packet += self.json.dumps(data, separators=(',', ':'))
+            if self.json is _json:
+                encoded_packet += _json_encoder.encode(data)
+            else:
+                encoded_packet += self.json.dumps(data, separators=(',', ':'))
         if attachments is not None:
-            encoded_packet = [encoded_packet] + attachments
+            encoded_packet = [encoded_packet] + [
+                _to_eio_binary(a) for a in attachments]
         return encoded_packet
 
     def decode(self, encoded_packet):
@@ -80,38 +130,31 @@ class Packet:
             ep = ''
         self.namespace = None
         self.data = None
-        ep = ep[1:]
-        dash = ep.find('-')
         attachment_count = 0
-        if dash > 0 and ep[0:dash].isdigit():
-            if dash > 10:
+        if len(ep) <= 1:
+            return attachment_count
+
+        # the header is parsed in place, so that the only copy of the encoded
+        # packet that is made is the one of the JSON payload
+        header = _header_re.match(ep, 1)
+        count, namespace, id = header.groups()
+        if count is not None:
+            if len(count) > 10:
                 raise ValueError('too many attachments')
-            attachment_count = int(ep[0:dash])
-            ep = ep[dash + 1:]
-        if ep and ep[0:1] == '/':
-            sep = ep.find(',')
-            if sep == -1:
-                self.namespace = ep
-                ep = ''
-            else:
-                self.namespace = ep[0:sep]
-                ep = ep[sep + 1:]
-            q = self.namespace.find('?')
-            if q != -1:
-                self.namespace = self.namespace[0:q]
-        if ep and ep[0].isdigit():
-            i = 1
-            end = len(ep)
-            while i < end:
-                if not ep[i].isdigit() or i >= 100:
-                    break
-                i += 1
-            self.id = int(ep[:i])
-            ep = ep[i:]
-            if len(ep) > 0 and ep[0].isdigit():
+            attachment_count = int(count)
+        if namespace is not None:
+            q = namespace.find('?')
+            self.namespace = namespace if q == -1 else namespace[0:q]
+        end = header.end()
+        if id is not None:
+            self.id = int(id)
+            if ep[end:end + 1].isdigit():
                 raise ValueError('id field is too long')
-        if ep:
-            self.data = self.json.loads(ep)
+        if end < len(ep):
+            if self.json is _json:
+                self.data = _json_decoder.decode(ep[end:])
+            else:
+                self.data = self.json.loads(ep[end:])
         return attachment_count
 
     def add_attachment(self, attachment):
@@ -154,34 +197,45 @@ class Packet:
 
     @classmethod
     def _deconstruct_binary_internal(cls, data, attachments):
-        if isinstance(data, (bytes, bytearray)):
+        if isinstance(data, binary_types):
+            if isinstance(data, memoryview) and not data.c_contiguous:
+                data = data.tobytes()
             attachments.append(data)
             return {'_placeholder': True, 'num': len(attachments) - 1}
         elif isinstance(data, list):
-            return [cls._deconstruct_binary_internal(item, attachments)
-                    for item in data]
+            items = enumerate(data)
         elif isinstance(data, dict):
-            return {key: cls._deconstruct_binary_internal(value, attachments)
-                    for key, value in data.items()}
+            items = data.items()
         else:
             return data
+        # lists and dicts are only copied when they have binary components,
+        # so that text only data is walked without making any allocations
+        result = None
+        for key, value in items:
+            if isinstance(value, (bytes, bytearray, memoryview, list, dict)):
+                new_value = cls._deconstruct_binary_internal(value,
+                                                             attachments)
+                if new_value is not value:
+                    if result is None:
+                        result = data.copy()
+                    result[key] = new_value
+        return data if result is None else result
 
     @classmethod
     def data_is_binary(cls, data):
         """Check if the data contains binary components."""
-        if isinstance(data, (bytes, bytearray)):
-            return True
-        elif isinstance(data, list):
-            return functools.reduce(
-                lambda a, b: a or b, [cls.data_is_binary(item)
-                                      for item in data], False)
+        if isinstance(data, list):
+            items = data
         elif isinstance(data, dict):
-            return functools.reduce(
-                lambda a, b: a or b, [cls.data_is_binary(item)
-                                      for item in data.values()],
-                False)
+            items = data.values()
         else:
-            return False
+            return isinstance(data, binary_types)
+        for item in items:
+            if isinstance(item, binary_types):
+                return True
+            if isinstance(item, (list, dict)) and cls.data_is_binary(item):
+                return True
+        return False
 
     def _to_dict(self):
         d = {
@@ -1,11 +1,200 @@
 import base64
 from functools import partial
+import queue
+import threading
+import time
 import uuid
 
+try:
+    import msgpack
+except ImportError:  # pragma: no cover
+    msgpack = None
+
+from . import exceptions
 from .manager import Manager
 from .packet import Packet
 
 
+def encode_emit_data(data, serializer):
+    """Return the data of an emit in the format in which it is published,
+    along with a flag that indicates if it has binary attachments."""
+    bdata, attachments = Packet.deconstruct_binary(data)
+    if not attachments:
+        return data, False
+    if serializer == 'msgpack':
+        # msgpack supports binary data, so attachments are not encoded
+        return [bdata, *attachments], True
+    return [bdata, *[base64.b64encode(a).decode() for a in attachments]], True
+
+
+def decode_emit_data(message):
+    """Return the data of a published emit, ready to be emitted."""
+    data = message['data']
+    if message.get('binary'):
+        attachments = [base64.b64decode(a) if isinstance(a, str) else a
+                       for a in data[1:]]
+        data = Packet.reconstruct_binary(data[0], attachments)
+    if isinstance(data, list):
+        if len(data) == 1:
+            data = data[0]
+        else:
+            data = tuple(data)
+    return data
+
+
+def decode_emit_packets(packets):
+    """Return the encoded packets of a published emit."""
+    return [base64.b64decode(p[1:])
+            if isinstance(p, str) and p.startswith('b') else p
+            for p in packets]
+
+
+def batch_message(messages, host_id):
+    """Return the message that publishes a list of messages."""
+    if len(messages) == 1:
+        return messages[0]
+    return {'method': 'batch', 'messages': messages, 'host_id': host_id}
+
+
+def serialize_message(message, serializer, json):
+    """Serialize a message with the given serializer."""
+    if serializer == 'msgpack':
+        try:
+            return msgpack.packb(message)
+        except TypeError:
+            # data that msgpack does not support is sent as JSON, which
+            # needs the binary attachments to be base64 encoded
+            if message.get('binary'):
+                data = message['data']
+                message = dict(message, data=[data[0], *[
+                    base64.b64encode(a).decode() for a in data[1:]]])
+    if message.get('packets'):
+        # binary packets are sent in base64 with a "b" prefix, as Engine.IO
+        # does with long-polling, since text Socket.IO packets always start
+        # with a digit
+        message = dict(message, packets=[
+            'b' + base64.b64encode(p).decode()
+            if isinstance(p, (bytes, bytearray)) else p
+            for p in message['packets']])
+    return json.dumps(message)
+
+
+def encode_message(message, serializer, json, envelope=False):
+    """Serialize a message for publishing.
+
+    When ``envelope`` is set, emits are prefixed with a routing header that
+    can be decoded on its own. Batches are then sent as the list of the sizes
+    of their messages followed by the messages, each encoded on its own.
+    """
+    if envelope and message.get('method') == 'batch':
+        parts = [encode_message(m, serializer, json, envelope=True)
+                 for m in message['messages']]
+        parts = [p.encode('utf-8') if isinstance(p, str) else p
+                 for p in parts]
+        header = json.dumps({'method': 'batch',
+                             'sizes': [len(p) for p in parts]})
+        if isinstance(header, str):
+            header = header.encode('utf-8')
+        # batch envelopes start with a 0x02 byte
+        return b'\x02' + header + b'\n' + b''.join(parts)
+    encoded = serialize_message(message, serializer, json)
+    if not envelope or message.get('method') != 'emit':
+        return encoded
+    if isinstance(encoded, str):
+        encoded = encoded.encode('utf-8')
+    header = json.dumps({'method': 'emit',
+                         'host_id': message.get('host_id'),
+                         'to_host': message.get('to_host'),
+                         'namespace': message.get('namespace'),
+                         'room': message.get('room'),
+                         'size': len(encoded)})
+    if isinstance(header, str):
+        header = header.encode('utf-8')
+    # version 1 envelopes start with a 0x01 byte, which is never the first
+    # byte of a JSON or msgpack encoded message
+    return b'\x01' + header + b'\n' + encoded
+
+
+def decode_message(message, json, has_recipients=None):
+    """Deserialize a message received from the message queue.
+
+    Emits that are wrapped in an envelope are only decoded when the
+    ``has_recipients`` function returns ``True`` for their routing header,
+    else ``None`` is returned. The same applies to each of the emits in an
+    enveloped batch, which are left out of the decoded batch.
+    """
+    if message[:1] in ['\x02', b'\x02']:
+        if isinstance(message, str):
+            message = message.encode('utf-8')
+        end = message.index(b'\n')
+        header = json.loads(message[1:end])
+        sizes = header.get('sizes') or []
+        if len(message) - end - 1 != sum(sizes):
+            raise ValueError('Invalid message size')
+        messages = []
+        start = end + 1
+        for size in sizes:
+            data = decode_message(message[start:start + size], json,
+                                  has_recipients=has_recipients)
+            if data is not None:
+                messages.append(data)
+            start += size
+        return {'method': 'batch', 'messages': messages}
+    if message[:1] in ['\x01', b'\x01']:
+        if isinstance(message, str):
+            message = message.encode('utf-8')
+        end = message.index(b'\n')
+        header = json.loads(message[1:end])
+        if has_recipients is not None and not has_recipients(header):
+            return None
+        message = message[end + 1:]
+        if len(message) != header.get('size'):
+            raise ValueError('Invalid message size')
+    # a msgpack encoded map starts with a byte that is 0x80 or higher, which
+    # is never the case for a JSON document
+    if isinstance(message, (bytes, bytearray)) and message[:1] >= b'\x80':
+        return msgpack.unpackb(message)
+    return json.loads(message)
+
+
+def has_local_recipients(header, host_id, rooms):
+    """Check if an emit has recipients in a server, using only its routing
+    header.
+
+    :param header: The routing header of the emit.
+    :param host_id: The host id of the server.
+    :param rooms: The rooms of the server's client manager.
+    """
+    if header.get('host_id') == host_id or \
+            header.get('to_host') not in [None, host_id]:
+        return False
+    namespace = header.get('namespace')
+    if namespace not in rooms:
+        return False
+    room = header.get('room')
+    if room is None:
+        return True
+    if not isinstance(room, list):
+        room = [room]
+    return any(r in rooms[namespace] for r in room)
+
+
+def remove_expired_hosts(sid_hosts, host_last_seen, timeout):
+    """Remove the hosts that have not been heard from in ``timeout`` seconds
+    and all their clients from the client directory."""
+    now = time.time()
+    expired = {host_id for host_id, last_seen in list(host_last_seen.items())
+               if now - last_seen > timeout}
+    if not expired:
+        return expired
+    for host_id in expired:
+        host_last_seen.pop(host_id, None)
+    for sid, host_id in list(sid_hosts.items()):
+        if host_id in expired:
+            sid_hosts.pop(sid, None)
+    return expired
+
+
 class PubSubManager(Manager):
     """Manage a client list attached to a pub/sub backend.
 
@@ -32,27 +221,157 @@ class PubSubManager(Manager):
                  versions. This setting is only used when ``write_only`` is set
                  to ``True``. Otherwise the JSON module configured in the
                  server is used.
+    :param serializer: The format of the messages published to the message
+                       queue. The default is ``'default'``, which uses JSON
+                       and encodes binary attachments in base64. With
+                       ``'msgpack'`` binary attachments are sent without any
+                       encoding. This requires the ``msgpack`` package.
+                       Received messages are accepted in either format.
+    :param batch_size: The maximum number of messages that are combined into a
+                       single publish to the message queue. The default of
+                       ``None`` disables batching, so that each message is
+                       published on its own. All the servers that share the
+                       message queue must run a version of this package that
+                       supports batches before batching is enabled.
+    :param batch_interval: The maximum time in seconds that a message waits
+                           for its batch to fill before it is published. The
+                           default is 0.005 seconds.
+    :param sid_directory: If set to ``True``, the servers share the location of
+                          their clients through the message queue, so that
+                          emits addressed to a single client are not
+                          broadcast to all the servers. Emits to a client
+                          connected to the emitting server are not published
+                          at all, and emits to a client on another server are
+                          addressed to that server. Each server sends a
+                          heartbeat every ``host_heartbeat_interval`` seconds,
+                          and the clients of a server that is not heard from
+                          for ``host_timeout`` seconds are removed from the
+                          directory. All the servers that share the message
+                          queue must enable this option.
+    :param envelope: If set to ``True``, emits are published with a small
+                     routing header in front of the message, which allows the
+                     servers that have no recipients for an emit to discard it
+                     without decoding it. When batching is enabled, each emit
+                     in a batch gets its own routing header. All the servers
+                     that share the message queue must run a version of this
+                     package that supports envelopes before this option is
+                     enabled.
+    :param packet_passthrough: If set to ``True``, emits are published as
+                               encoded Socket.IO packets, which the receiving
+                               servers send to their clients without decoding
+                               and encoding them again. Emits that request a
+                               callback are always published in the regular
+                               format. All the servers that share the message
+                               queue must use the same Socket.IO serializer,
+                               and must run a version of this package that
+                               supports pass-through packets before this
+                               option is enabled.
+    :param publish_queue_size: The size of the outbound queue. When set,
+                               messages are published by a background task,
+                               so that a slow message queue does not block
+                               the caller. The default of ``None`` publishes
+                               messages in the calling task.
+    :param publish_queue_policy: What to do when a message is published while
+                                 the outbound queue is full. With ``'block'``
+                                 (the default) the caller waits until there is
+                                 room in the queue, with ``'drop_oldest'`` the
+                                 oldest message in the queue is discarded, and
+                                 with ``'raise'`` a
+                                 :class:`socketio.exceptions.QueueFullError`
+                                 exception is raised.
+    :param packet_cache_size: The maximum number of encoded events kept in the
+                              cache used by the ``cache_key`` argument of
+                              ``emit()``.
     """
     name = 'pubsub'
+    host_heartbeat_interval = 15  # seconds
+    host_timeout = 60  # seconds
 
     def __init__(self, channel='socketio', write_only=False, logger=None,
-                 json=None):
-        super().__init__()
+                 json=None, serializer='default', batch_size=None,
+                 batch_interval=0.005, sid_directory=False, envelope=False,
+                 packet_passthrough=False, publish_queue_size=None,
+                 publish_queue_policy='block', packet_cache_size=128):
+        super().__init__(packet_cache_size=packet_cache_size)
         self.channel = channel
         self.write_only = write_only
         self.host_id = uuid.uuid4().hex
         self.logger = logger
         if json is not None:
             self.json = json
+        if serializer not in ['default', 'msgpack']:
+            raise ValueError('Invalid serializer')
+        if serializer == 'msgpack' and msgpack is None:
+            raise RuntimeError('msgpack package is not installed '
+                               '(Run "pip install msgpack" in your '
+                               'virtualenv).')
+        self.serializer = serializer
+        self.batch_size = batch_size
+        self.batch_interval = batch_interval
+        self.batch = []
+        self.batch_id = 0
+        self.sid_directory = sid_directory
+        self.sid_hosts = {}  # self.sid_hosts[sid] = host_id
+        self.host_last_seen = {}  # self.host_last_seen[host_id] = time
+        self.envelope = envelope
+        self.packet_passthrough = packet_passthrough
+        self.pending_queries = {}  # self.pending_queries[id] = queue
+        self.listener = None
+        if publish_queue_policy not in ['block', 'drop_oldest', 'raise']:
+            raise ValueError('Invalid publish queue policy')
+        self.publish_queue_size = publish_queue_size
+        self.publish_queue_policy = publish_queue_policy
+        self.publish_queue = None
+        self.publish_queue_stats = {'peak_depth': 0, 'dropped': 0,
+                                    'published': 0}
+        self.batch_lock = threading.Lock()
+        self.publish_lock = threading.Lock()
+        self.publish_queue_lock = threading.Lock()
 
     def initialize(self):
         super().initialize()
         if not self.write_only:
             self.thread = self.server.start_background_task(self._thread)
+            if self.sid_directory:
+                self.server.start_background_task(self._heartbeat_thread)
+        if self.publish_queue_size:
+            self._start_publish_queue()
         self._get_logger().info(self.name + ' backend initialized.')
 
+    def _start_publish_queue(self):
+        """Create the outbound queue and the task that publishes from it.
+
+        Write-only instances are not initialized by a server, so for them
+        this happens when the first message is published.
+        """
+        with self.publish_queue_lock:
+            if self.publish_queue is not None:
+                return
+            if self.server is not None:
+                self.publish_queue = self.server.eio.create_queue(
+                    self.publish_queue_size)
+                self.server.start_background_task(self._publish_queue_thread)
+            else:
+                self.publish_queue = queue.Queue(self.publish_queue_size)
+                threading.Thread(target=self._publish_queue_thread,
+                                 daemon=True).start()
+
+    def get_publish_queue_stats(self):
+        """Return statistics about the outbound queue.
+
+        The returned dictionary has the current number of messages in the
+        queue (``depth``), the maximum number of messages that were in the
+        queue at once (``peak_depth``), the number of messages discarded by
+        the ``'drop_oldest'`` policy (``dropped``), and the number of messages
+        published by the background task (``published``).
+        """
+        depth = self.publish_queue.qsize() if self.publish_queue else 0
+        return dict(self.publish_queue_stats, depth=depth,
+                    size=self.publish_queue_size)
+
     def emit(self, event, data, namespace=None, room=None, skip_sid=None,
-             callback=None, to=None, **kwargs):
+             callback=None, to=None, skip_rooms=None, cache_key=None,
+             binary=None, **kwargs):
         """Emit a message to a single client, a room, or all the clients
         connected to the namespace.
 
@@ -65,7 +384,8 @@ class PubSubManager(Manager):
         if kwargs.get('ignore_queue'):
             return super().emit(
                 event, data, namespace=namespace, room=room, skip_sid=skip_sid,
-                callback=callback)
+                skip_rooms=skip_rooms, callback=callback, cache_key=cache_key,
+                binary=binary)
         namespace = namespace or '/'
         if callback is not None:
             if self.server is None:
@@ -77,20 +397,31 @@ class PubSubManager(Manager):
             callback = (room, namespace, id)
         else:
             callback = None
-        if isinstance(data, tuple):
-            data = list(data)
-        else:
-            data = [data]
-        binary = Packet.data_is_binary(data)
-        if binary:
-            data, attachments = Packet.deconstruct_binary(data)
-            data = [data, *[base64.b64encode(a).decode() for a in attachments]]
-        message = {'method': 'emit', 'event': event, 'data': data,
-                   'binary': binary, 'namespace': namespace, 'room': room,
-                   'skip_sid': skip_sid, 'callback': callback,
-                   'host_id': self.host_id}
+        message = self._get_emit_message(
+            event, data, namespace=namespace, room=room, skip_sid=skip_sid,
+            skip_rooms=skip_rooms, callback=callback, cache_key=cache_key,
+            binary=binary)
+        if self.sid_directory and isinstance(room, str):
+            if self.is_connected(room, namespace):
+                # the client is in this server, so there is no need to notify
+                # other hosts
+                return self._handle_emit(message)
+            elif room in self.sid_hosts:
+                # the client is in a known server, so only that server needs
+                # to receive the message
+                message['to_host'] = self.sid_hosts[room]
+                return self._publish_message(message)
         self._handle_emit(message)  # handle in this host
-        self._publish(message)  # notify other hosts
+        self._publish_message(message)  # notify other hosts
+
+    def connect(self, eio_sid, namespace):
+        sid = super().connect(eio_sid, namespace)
+        if sid is not None and self.sid_directory:
+            # let the other hosts know where this client is
+            self._publish_message({'method': 'directory_add', 'sid': sid,
+                                   'namespace': namespace,
+                                   'host_id': self.host_id})
+        return sid
 
     def can_disconnect(self, sid, namespace):
         if self.is_connected(sid, namespace):
@@ -101,39 +432,215 @@ class PubSubManager(Manager):
             message = {'method': 'disconnect', 'sid': sid,
                        'namespace': namespace or '/', 'host_id': self.host_id}
             self._handle_disconnect(message)  # handle in this host
-            self._publish(message)  # notify other hosts
+            self._publish_message(message)  # notify other hosts
 
     def disconnect(self, sid, namespace=None, **kwargs):
         if kwargs.get('ignore_queue'):
-            return super().disconnect(sid, namespace=namespace)
+            if self.sid_directory and \
+                    sid in self.rooms.get(namespace, {}).get(None, {}):
+                self._publish_message({'method': 'directory_remove',
+                                       'sid': sid, 'namespace': namespace,
+                                       'host_id': self.host_id})
+            return super().disconnect(sid, namespace=namespace,
+                                      room_filter=kwargs.get('room_filter'))
         message = {'method': 'disconnect', 'sid': sid,
                    'namespace': namespace or '/', 'host_id': self.host_id}
+        if sid is None:
+            # a single message disconnects the selected clients in all hosts
+            if kwargs.get('room_filter') is None:
+                raise ValueError('A room_filter is required when sid is None.')
+            message['room_filter'] = kwargs.get('room_filter')
         self._handle_disconnect(message)  # handle in this host
-        self._publish(message)  # notify other hosts
+        self._publish_message(message)  # notify other hosts
 
-    def enter_room(self, sid, namespace, room, eio_sid=None):
+    def enter_room(self, sid, namespace, room, eio_sid=None,
+                   room_filter=None):
+        if sid is None:
+            # a single message adds the selected clients in all hosts
+            if room_filter is None:
+                raise ValueError('A room_filter is required when sid is None.')
+            message = {'method': 'enter_room', 'sid': None, 'room': room,
+                       'room_filter': room_filter,
+                       'namespace': namespace or '/', 'host_id': self.host_id}
+            self._handle_enter_room(message)  # handle in this host
+            return self._publish_message(message)  # notify other hosts
         if self.is_connected(sid, namespace):
             # client is in this server, so we can add to the room directly
             return super().enter_room(sid, namespace, room, eio_sid=eio_sid)
         else:
             message = {'method': 'enter_room', 'sid': sid, 'room': room,
                        'namespace': namespace or '/', 'host_id': self.host_id}
-            self._publish(message)  # notify other hosts
+            self._publish_message(message)  # notify other hosts
 
-    def leave_room(self, sid, namespace, room):
+    def leave_room(self, sid, namespace, room, room_filter=None):
+        if sid is None:
+            # a single message removes the selected clients in all hosts
+            if room_filter is None:
+                raise ValueError('A room_filter is required when sid is None.')
+            message = {'method': 'leave_room', 'sid': None, 'room': room,
+                       'room_filter': room_filter,
+                       'namespace': namespace or '/', 'host_id': self.host_id}
+            self._handle_leave_room(message)  # handle in this host
+            return self._publish_message(message)  # notify other hosts
         if self.is_connected(sid, namespace):
             # client is in this server, so we can remove from the room directly
             return super().leave_room(sid, namespace, room)
         else:
             message = {'method': 'leave_room', 'sid': sid, 'room': room,
                        'namespace': namespace or '/', 'host_id': self.host_id}
-            self._publish(message)  # notify other hosts
+            self._publish_message(message)  # notify other hosts
 
     def close_room(self, room, namespace=None):
         message = {'method': 'close_room', 'room': room,
                    'namespace': namespace or '/', 'host_id': self.host_id}
         self._handle_close_room(message)  # handle in this host
-        self._publish(message)  # notify other hosts
+        self._publish_message(message)  # notify other hosts
+
+    def fetch_participants(self, namespace, room, timeout=5, hosts=None,
+                           page_size=1000):
+        """Return an iterator with the sids of the participants in a room,
+        across all the servers connected to the message queue.
+
+        The participants connected to this server are returned first. The
+        other servers return their participants in pages of ``page_size``
+        sids, which are returned as they are received.
+
+        :param namespace: The Socket.IO namespace.
+        :param room: The room name, a list of room names, or ``None`` for all
+                     the clients connected to the namespace.
+        :param timeout: The maximum time in seconds to wait for the other
+                        servers to reply.
+        :param hosts: The number of other servers that are expected to reply.
+                      When all of them have replied the iteration ends without
+                      waiting for the timeout.
+        :param page_size: The maximum number of sids in each reply.
+        """
+        namespace = namespace or '/'
+        for sid, _ in self.get_participants(namespace, room):
+            yield sid
+        for reply in self._query('participants', timeout, hosts,
+                                 namespace=namespace, room=room,
+                                 page_size=page_size):
+            yield from reply['result']
+
+    def fetch_rooms(self, sid, namespace=None, timeout=5, hosts=None):
+        """Return the rooms a client is in, in whichever server the client
+        is connected.
+
+        ``None`` is returned if the client is not found.
+
+        :param sid: The sid of the client.
+        :param namespace: The Socket.IO namespace.
+        :param timeout: The maximum time in seconds to wait for the other
+                        servers to reply.
+        :param hosts: The number of other servers that are expected to reply.
+                      When all of them have replied without finding the
+                      client ``None`` is returned without waiting for the
+                      timeout.
+        """
+        namespace = namespace or '/'
+        if self.is_connected(sid, namespace):
+            return self.get_rooms(sid, namespace)
+        for reply in self._query('rooms', timeout, hosts, sid=sid,
+                                 namespace=namespace):
+            if reply['result'] is not None:
+                return reply['result']
+
+    def count(self, namespace, room=None, timeout=5, hosts=None):
+        """Return the number of participants in a room, across all the
+        servers connected to the message queue.
+
+        :param namespace: The Socket.IO namespace.
+        :param room: The room name, a list of room names, or ``None`` to
+                     count all the clients connected to the namespace. A
+                     client that is in several of the given rooms is counted
+                     once.
+        :param timeout: The maximum time in seconds to wait for the other
+                        servers to reply.
+        :param hosts: The number of other servers that are expected to reply.
+                      When all of them have replied the count is returned
+                      without waiting for the timeout.
+        """
+        namespace = namespace or '/'
+        total = self._count_local(namespace, room)
+        for reply in self._query('count', timeout, hosts,
+                                 namespace=namespace, room=room):
+            total += reply['result']
+        return total
+
+    def _count_local(self, namespace, room):
+        if isinstance(room, (list, tuple)):
+            # clients that are in several of the rooms are counted once
+            return sum(1 for _ in self.get_participants(namespace, room))
+        return len(self.rooms.get(namespace, {}).get(room, {}))
+
+    def _query(self, query, timeout, hosts, **kwargs):
+        """Send a query to the other servers and return an iterator with
+        their replies.
+
+        The iteration ends when the expected number of servers have sent
+        their last reply, or when the timeout expires.
+        """
+        if self.server is None or self.write_only:
+            raise RuntimeError('Queries can only be issued from the context '
+                               'of a server.')
+        if self.listener is not None and \
+                threading.get_ident() == self.listener:
+            # the replies would never be received
+            raise RuntimeError('Queries cannot be issued from the pubsub '
+                               'listening task.')
+        if hosts == 0:
+            return
+        query_id = uuid.uuid4().hex
+        replies = self.server.eio.create_queue()
+        self.pending_queries[query_id] = replies
+        try:
+            self._publish_message({'method': 'query', 'query': query,
+                                   'id': query_id, 'host_id': self.host_id,
+                                   **kwargs})
+            completed = set()
+            deadline = time.time() + timeout
+            while hosts is None or len(completed) < hosts:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                try:
+                    reply = replies.get(timeout=remaining)
+                except self.server.eio.get_queue_empty_exception():
+                    break
+                if reply.get('last'):
+                    completed.add(reply.get('responder'))
+                yield reply
+        finally:
+            del self.pending_queries[query_id]
+
+    def _get_emit_message(self, event, data, namespace, room=None,
+                          skip_sid=None, skip_rooms=None, callback=None,
+                          cache_key=None, binary=None):
+        """Return the message that is published for an emit."""
+        if isinstance(data, tuple):
+            data = list(data)
+        else:
+            data = [data]
+        if self.packet_passthrough and callback is None:
+            # the packets are encoded once here, and the other hosts send them
+            # to their clients as they are
+            packets = [eio_pkt.data for eio_pkt in self._get_eio_packets(
+                event, data, namespace, cache_key=cache_key, binary=binary)]
+            message = {'method': 'emit', 'event': event, 'packets': packets,
+                       'namespace': namespace, 'room': room,
+                       'skip_sid': skip_sid, 'skip_rooms': skip_rooms,
+                       'callback': None, 'cache_key': cache_key,
+                       'host_id': self.host_id}
+        else:
+            if binary is not False:
+                data, binary = encode_emit_data(data, self.serializer)
+            message = {'method': 'emit', 'event': event, 'data': data,
+                       'binary': binary, 'namespace': namespace,
+                       'room': room, 'skip_sid': skip_sid,
+                       'skip_rooms': skip_rooms, 'callback': callback,
+                       'cache_key': cache_key, 'host_id': self.host_id}
+        return message
 
     def _publish(self, data):
         """Publish a message on the Socket.IO channel.
@@ -144,6 +651,111 @@ class PubSubManager(Manager):
         raise NotImplementedError('This method must be implemented in a '
                                   'subclass.')  # pragma: no cover
 
+    def _publish_many(self, messages):
+        """Publish several messages at once.
+
+        The default implementation publishes the messages as a single batch.
+        Subclasses can override this method to use a more efficient method
+        provided by the backend. Unlike :meth:`_publish`, errors must be
+        raised to the caller, so subclasses with a :meth:`_publish` method
+        that handles its errors must override it.
+        """
+        if messages:
+            self._publish(self._batch_message(messages))
+
+    def _batch_message(self, messages):
+        """Return the message that publishes a list of messages."""
+        return batch_message(messages, self.host_id)
+
+    def _publish_message(self, message):
+        """Publish a message, or add it to the outbound queue when it is
+        enabled."""
+        if not self.publish_queue_size:
+            return self._send_message(message)
+        if self.publish_queue is None:
+            self._start_publish_queue()
+        if self.publish_queue_policy == 'block':
+            # the lock is not held while waiting for room in the queue
+            self.publish_queue.put(message)
+        else:
+            # the lock ensures that there is room for the message once the
+            # queue has been checked, so that the put does not block
+            with self.publish_queue_lock:
+                if self.publish_queue.qsize() >= self.publish_queue_size:
+                    if self.publish_queue_policy == 'raise':
+                        raise exceptions.QueueFullError(
+                            'The publish queue is full')
+                    try:
+                        self.publish_queue.get_nowait()
+                        self.publish_queue_stats['dropped'] += 1
+                    except Exception:  # pragma: no cover
+                        pass
+                self.publish_queue.put(message)
+        depth = self.publish_queue.qsize()
+        if depth > self.publish_queue_stats['peak_depth']:
+            self.publish_queue_stats['peak_depth'] = depth
+
+    def _publish_queue_thread(self):
+        # the messages in the outbound queue are published in order
+        while True:
+            message = self.publish_queue.get()
+            try:
+                self._send_message(message)
+                self.publish_queue_stats['published'] += 1
+            except Exception:
+                self._get_logger().exception(
+                    'Unexpected error publishing from the publish queue')
+
+    def _send_message(self, message):
+        """Publish a message, or add it to the current batch when batching
+        is enabled."""
+        if not self.batch_size:
+            return self._publish(message)
+        with self.batch_lock:
+            self.batch.append(message)
+            batch_length = len(self.batch)
+            batch_id = self.batch_id
+        if batch_length >= self.batch_size:
+            self._publish_batch()
+        elif batch_length == 1:
+            # the first message of a batch starts the timer that publishes it
+            if self.server is not None:
+                self.server.start_background_task(self._publish_batch_later,
+                                                  batch_id)
+            else:
+                threading.Thread(target=self._publish_batch_later,
+                                 args=(batch_id,), daemon=True).start()
+
+    def _publish_batch_later(self, batch_id):
+        if self.server is not None:
+            self.server.sleep(self.batch_interval)
+        else:
+            time.sleep(self.batch_interval)
+        self._publish_batch(batch_id)
+
+    def _publish_batch(self, batch_id=None):
+        """Publish the messages in the current batch.
+
+        When a ``batch_id`` is given the batch is only published if it has not
+        been published already.
+        """
+        # the publish lock ensures that batches are published in order
+        with self.publish_lock:
+            with self.batch_lock:
+                if batch_id is not None and batch_id != self.batch_id:
+                    return
+                messages = self.batch
+                self.batch = []
+                self.batch_id += 1
+            if not messages:
+                return
+            try:
+                self._publish_many(messages)
+            except Exception as exc:
+                self._get_logger().error(
+                    'Cannot publish, %d messages discarded', len(messages),
+                    extra={'exception': str(exc)})
+
     def _listen(self):
         """Return the next message published on the Socket.IO channel,
         blocking until a message is available.
@@ -154,6 +766,33 @@ class PubSubManager(Manager):
         raise NotImplementedError('This method must be implemented in a '
                                   'subclass.')  # pragma: no cover
 
+    def _encode_message(self, message):
+        """Serialize a message for publishing with the configured
+        serializer.
+
+        When envelopes are enabled, emits are prefixed with a routing header
+        that can be decoded on its own.
+        """
+        return encode_message(message, self.serializer, self.json,
+                              envelope=self.envelope)
+
+    def _serialize_message(self, message):
+        return serialize_message(message, self.serializer, self.json)
+
+    def _decode_message(self, message):
+        """Deserialize a message received from the message queue.
+
+        Emits that are wrapped in an envelope are only decoded when they have
+        recipients in this server, else ``None`` is returned.
+        """
+        return decode_message(message, self.json,
+                              has_recipients=self._has_local_recipients)
+
+    def _has_local_recipients(self, header):
+        """Check if an emit needs to be handled in this server, using only
+        its routing header."""
+        return has_local_recipients(header, self.host_id, self.rooms)
+
     def _handle_emit(self, message):
         # Events with callbacks are very tricky to handle across hosts
         # Here in the receiving end we set up a local callback that preserves
@@ -165,19 +804,23 @@ class PubSubManager(Manager):
                                *remote_callback)
         else:
             callback = None
-        data = message['data']
-        if message.get('binary'):
-            attachments = [base64.b64decode(a) for a in data[1:]]
-            data = Packet.reconstruct_binary(data[0], attachments)
-        if isinstance(data, list):
-            if len(data) == 1:
-                data = data[0]
-            else:
-                data = tuple(data)
-        super().emit(message['event'], data,
+        packets = message.get('packets')
+        if packets is not None:
+            # the event was encoded by the sender, so the packets are sent to
+            # the clients as they are
+            return super().emit(
+                message['event'], None, namespace=message.get('namespace'),
+                room=message.get('room'), skip_sid=message.get('skip_sid'),
+                skip_rooms=message.get('skip_rooms'),
+                cache_key=message.get('cache_key'),
+                packets=decode_emit_packets(packets))
+        super().emit(message['event'], decode_emit_data(message),
                      namespace=message.get('namespace'),
                      room=message.get('room'),
-                     skip_sid=message.get('skip_sid'), callback=callback)
+                     skip_sid=message.get('skip_sid'),
+                     skip_rooms=message.get('skip_rooms'), callback=callback,
+                     cache_key=message.get('cache_key'),
+                     binary=message.get('binary'))
 
     def _handle_callback(self, message):
         if self.host_id == message.get('host_id'):
@@ -195,11 +838,49 @@ class PubSubManager(Manager):
         if host_id == self.host_id:
             self.trigger_callback(sid, callback_id, args)
         else:
-            self._publish({'method': 'callback', 'host_id': host_id,
-                           'sid': sid, 'namespace': namespace,
-                           'id': callback_id, 'args': args})
+            self._publish_message({'method': 'callback', 'host_id': host_id,
+                                   'sid': sid, 'namespace': namespace,
+                                   'id': callback_id, 'args': args})
+
+    def _handle_query(self, message):
+        # the replies are addressed to the server that sent the query, which
+        # is identified by the host_id
+        reply = {'method': 'query_reply', 'host_id': message.get('host_id'),
+                 'id': message.get('id'), 'responder': self.host_id}
+        query = message.get('query')
+        namespace = message.get('namespace')
+        if query == 'participants':
+            page_size = message.get('page_size') or 1000
+            page = []
+            for sid, _ in self.get_participants(namespace,
+                                                message.get('room')):
+                page.append(sid)
+                if len(page) >= page_size:
+                    self._publish_message(dict(reply, result=page,
+                                               last=False))
+                    page = []
+            self._publish_message(dict(reply, result=page, last=True))
+        elif query == 'rooms':
+            sid = message.get('sid')
+            result = None
+            if self.is_connected(sid, namespace):
+                result = self.get_rooms(sid, namespace)
+            self._publish_message(dict(reply, result=result, last=True))
+        elif query == 'count':
+            self._publish_message(dict(reply, result=self._count_local(
+                namespace, message.get('room')), last=True))
+
+    def _handle_query_reply(self, message):
+        if self.host_id == message.get('host_id'):
+            replies = self.pending_queries.get(message.get('id'))
+            if replies is not None:
+                replies.put(message)
 
     def _handle_disconnect(self, message):
+        if message.get('sid') is None:
+            return self.server.disconnect(
+                None, namespace=message.get('namespace'), ignore_queue=True,
+                room_filter=message.get('room_filter'))
         self.server.disconnect(sid=message.get('sid'),
                                namespace=message.get('namespace'),
                                ignore_queue=True)
@@ -207,20 +888,57 @@ class PubSubManager(Manager):
     def _handle_enter_room(self, message):
         sid = message.get('sid')
         namespace = message.get('namespace')
-        if self.is_connected(sid, namespace):
+        if sid is None:
+            super().enter_room(None, namespace, message.get('room'),
+                               room_filter=message.get('room_filter'))
+        elif self.is_connected(sid, namespace):
             super().enter_room(sid, namespace, message.get('room'))
 
     def _handle_leave_room(self, message):
         sid = message.get('sid')
         namespace = message.get('namespace')
-        if self.is_connected(sid, namespace):
+        if sid is None:
+            super().leave_room(None, namespace, message.get('room'),
+                               room_filter=message.get('room_filter'))
+        elif self.is_connected(sid, namespace):
             super().leave_room(sid, namespace, message.get('room'))
 
+    def _heartbeat_thread(self):
+        # the other hosts remove the clients of a host from their directory
+        # when they stop receiving its heartbeats, for example after a crash
+        while True:
+            try:
+                self._publish_message({'method': 'host_alive',
+                                       'host_id': self.host_id})
+                expired = remove_expired_hosts(
+                    self.sid_hosts, self.host_last_seen, self.host_timeout)
+                for host_id in expired:
+                    self._get_logger().warning(
+                        'Host %s has not been heard from, removing its '
+                        'clients from the directory', host_id)
+            except Exception:
+                self._get_logger().exception(
+                    'Unexpected error in the heartbeat task')
+            self.server.sleep(self.host_heartbeat_interval)
+
+    def _handle_host_alive(self, message):
+        self.host_last_seen[message.get('host_id')] = time.time()
+
+    def _handle_directory_add(self, message):
+        self.sid_hosts[message.get('sid')] = message.get('host_id')
+        self.host_last_seen[message.get('host_id')] = time.time()
+
+    def _handle_directory_remove(self, message):
+        self.sid_hosts.pop(message.get('sid'), None)
+
     def _handle_close_room(self, message):
         super().close_room(room=message.get('room'),
                            namespace=message.get('namespace'))
 
     def _thread(self):
+        # queries issued from this thread are rejected, as their replies are
+        # also received here
+        self.listener = threading.get_ident()
         while True:
             try:
                 for message in self._listen():
@@ -229,18 +947,29 @@ class PubSubManager(Manager):
                         data = message
                     else:
                         try:
-                            data = self.json.loads(message)
+                            data = self._decode_message(message)
                         except:
                             pass
-                    if data and 'method' in data:
+                    if not data or 'method' not in data:
+                        continue
+                    if data['method'] == 'batch':
+                        # a batch carries several messages in one publish
+                        messages = data.get('messages') or []
+                    else:
+                        messages = [data]
+                    for data in messages:
                         self._get_logger().debug('pubsub message: {}'.format(
                             data['method']))
                         try:
                             if data['method'] == 'callback':
                                 self._handle_callback(data)
+                            elif data['method'] == 'query_reply':
+                                self._handle_query_reply(data)
                             elif data.get('host_id') != self.host_id:
                                 if data['method'] == 'emit':
-                                    self._handle_emit(data)
+                                    if data.get('to_host') in [
+                                            None, self.host_id]:
+                                        self._handle_emit(data)
                                 elif data['method'] == 'disconnect':
                                     self._handle_disconnect(data)
                                 elif data['method'] == 'enter_room':
@@ -249,6 +978,14 @@ class PubSubManager(Manager):
                                     self._handle_leave_room(data)
                                 elif data['method'] == 'close_room':
                                     self._handle_close_room(data)
+                                elif data['method'] == 'directory_add':
+                                    self._handle_directory_add(data)
+                                elif data['method'] == 'directory_remove':
+                                    self._handle_directory_remove(data)
+                                elif data['method'] == 'host_alive':
+                                    self._handle_host_alive(data)
+                                elif data['method'] == 'query':
+                                    self._handle_query(data)
                         except Exception:
                             self.server.logger.exception(
                                 'Handler error in pubsub listening thread')
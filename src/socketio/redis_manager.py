@@ -1,5 +1,8 @@
+from collections import deque
+import threading
 import time
 from urllib.parse import urlparse
+import zlib
 
 try:
     import redis
@@ -44,6 +47,13 @@ def parse_redis_sentinel_url(url):
     return sentinels, service_name, kwargs
 
 
+def get_shard(namespace, room, shards):
+    """Return the shard number assigned to a room."""
+    # a stable hash is needed, so that all the servers assign rooms to the
+    # same shards
+    return zlib.crc32(f'{namespace},{room}'.encode('utf-8')) % shards
+
+
 class RedisManager(PubSubManager):
     """Redis based client manager.
 
@@ -81,18 +91,77 @@ class RedisManager(PubSubManager):
                  server is used.
     :param redis_options: additional keyword arguments to be passed to
                           ``Redis.from_url()`` or ``Sentinel()``.
+    :param serializer: The format of the messages published to the message
+                       queue, ``'default'`` for JSON or ``'msgpack'``. See
+                       :class:`PubSubManager` for details.
+    :param batch_size: The maximum number of messages that are combined into a
+                       single publish. The default of ``None`` disables
+                       batching. See :class:`PubSubManager` for details.
+    :param batch_interval: The maximum time in seconds that a message waits
+                           for its batch to fill before it is published.
+    :param sid_directory: If set to ``True``, emits addressed to a single
+                          client are only sent to the server that hosts the
+                          client. See :class:`PubSubManager` for details.
+    :param envelope: If set to ``True``, emits are published with a routing
+                     header that allows servers without recipients to discard
+                     them without decoding. See :class:`PubSubManager` for
+                     details.
+    :param packet_passthrough: If set to ``True``, emits are published as
+                               encoded Socket.IO packets. See
+                               :class:`PubSubManager` for details.
+    :param shards: The number of shard channels to use for emits addressed to
+                   a single room. The default of ``None`` publishes all the
+                   messages on the main channel. When set, each room is
+                   assigned to a shard, and each server only subscribes to
+                   the shards of the rooms its clients are in, so that it
+                   does not receive emits for rooms that have no local
+                   members. Only emits to rooms that have members in the
+                   emitting server are sharded, all other emits are
+                   published on the main channel. This option requires
+                   ``sid_directory``. All the servers must use the same
+                   number of shards.
+    :param publish_queue_size: The size of the outbound queue. When set,
+                               messages are published by a background task.
+                               See :class:`PubSubManager` for details.
+    :param publish_queue_policy: What to do when the outbound queue is full,
+                                 ``'block'``, ``'drop_oldest'`` or
+                                 ``'raise'``. See :class:`PubSubManager` for
+                                 details.
+    :param packet_cache_size: The maximum number of encoded events kept in the
+                              cache used by the ``cache_key`` argument of
+                              ``emit()``.
     """
     name = 'redis'
+    shard_poll_interval = 0.1  # seconds
 
     def __init__(self, url='redis://localhost:6379/0', channel='socketio',
-                 write_only=False, logger=None, json=None, redis_options=None):
+                 write_only=False, logger=None, json=None, redis_options=None,
+                 serializer='default', batch_size=None,
+                 batch_interval=0.005, sid_directory=False, envelope=False,
+                 packet_passthrough=False, shards=None,
+                 publish_queue_size=None, publish_queue_policy='block',
+                 packet_cache_size=128):
+        if shards and not sid_directory:
+            raise ValueError('Sharded channels require sid_directory to be '
+                             'enabled')
         super().__init__(channel=channel, write_only=write_only, logger=logger,
-                         json=json)
+                         json=json, serializer=serializer,
+                         batch_size=batch_size, batch_interval=batch_interval,
+                         sid_directory=sid_directory, envelope=envelope,
+                         packet_passthrough=packet_passthrough,
+                         publish_queue_size=publish_queue_size,
+                         publish_queue_policy=publish_queue_policy,
+                         packet_cache_size=packet_cache_size)
         self.redis_url = url
         self.redis_options = redis_options or {}
         self.connected = False
         self.redis = None
         self.pubsub = None
+        self.shards = shards
+        self.shard_rooms = {}  # self.shard_rooms[shard] = number of rooms
+        self.shard_lock = threading.Lock()
+        # shard subscription changes, applied by the listener thread
+        self.shard_requests = deque()
 
     def initialize(self):  # pragma: no cover
         super().initialize()
@@ -109,6 +178,101 @@ class RedisManager(PubSubManager):
                 'Redis requires a monkey patched socket library to work '
                 'with ' + self.server.async_mode)
 
+    def basic_enter_room(self, sid, namespace, room, eio_sid=None):
+        if not self.shards or room is None or room == sid:
+            # the room of each client is not assigned to a shard, because
+            # emits addressed to individual clients are not sharded
+            return super().basic_enter_room(sid, namespace, room,
+                                            eio_sid=eio_sid)
+        with self.shard_lock:
+            new_room = room not in self.rooms.get(namespace, {})
+            super().basic_enter_room(sid, namespace, room, eio_sid=eio_sid)
+            if new_room:
+                shard = get_shard(namespace, room, self.shards)
+                self.shard_rooms[shard] = self.shard_rooms.get(shard, 0) + 1
+                if self.shard_rooms[shard] == 1:
+                    self.shard_requests.append(('subscribe', shard))
+
+    def basic_leave_room(self, sid, namespace, room):
+        if not self.shards or room is None or room == sid:
+            return super().basic_leave_room(sid, namespace, room)
+        with self.shard_lock:
+            old_room = room in self.rooms.get(namespace, {})
+            super().basic_leave_room(sid, namespace, room)
+            if old_room and room not in self.rooms.get(namespace, {}):
+                shard = get_shard(namespace, room, self.shards)
+                self.shard_rooms[shard] -= 1
+                if self.shard_rooms[shard] == 0:
+                    del self.shard_rooms[shard]
+                    self.shard_requests.append(('unsubscribe', shard))
+
+    def _get_shard_channel(self, shard):
+        return f'{self.channel}#{shard}'
+
+    def _get_host_channel(self, host_id):
+        return f'{self.channel}@{host_id}'
+
+    def _get_publish_channel(self, data):
+        """Return the channel on which a message is published."""
+        if data.get('to_host'):
+            return self._get_host_channel(data['to_host'])
+        if self.sid_directory and data.get('method') in ['callback',
+                                                         'query_reply']:
+            # callbacks and query replies are always addressed to a single
+            # host
+            return self._get_host_channel(data['host_id'])
+        if self.shards and data.get('method') == 'emit' and \
+                self._is_shard_room(data.get('namespace'), data.get('room')):
+            return self._get_shard_channel(get_shard(
+                data.get('namespace'), data['room'], self.shards))
+        return self.channel
+
+    def _is_shard_room(self, namespace, room):
+        """Return ``True`` if emits to this room can use a shard channel."""
+        if room is None or isinstance(room, (list, tuple)):
+            return False
+        # only a room with local members is known to be a room and not a
+        # client sid that is missing from the directory, so emits to any
+        # other room are published on the main channel, which all the
+        # servers receive
+        return room in self.rooms.get(namespace, {}) and \
+            room not in self.sid_hosts and \
+            not self.is_connected(room, namespace)
+
+    def _get_subscribe_channels(self):
+        """Return the channels this server needs to be subscribed to."""
+        channels = [self.channel]
+        if self.sid_directory:
+            channels.append(self._get_host_channel(self.host_id))
+        with self.shard_lock:
+            # the pending changes are included in the current shards
+            self.shard_requests.clear()
+            shards = list(self.shard_rooms)
+        return channels + [self._get_shard_channel(shard)
+                           for shard in shards]
+
+    def _update_shard_subscriptions(self):
+        """Apply the pending shard subscription changes.
+
+        The pubsub object is not thread-safe, so this method is only called
+        from the listener.
+        """
+        while self.shard_requests:
+            action, shard = self.shard_requests.popleft()
+            getattr(self.pubsub, action)(self._get_shard_channel(shard))
+
+    def _pubsub_listen(self):
+        if not self.shards:
+            yield from self.pubsub.listen()
+            return
+        # the listener wakes up periodically to update its subscriptions
+        while True:
+            self._update_shard_subscriptions()
+            message = self.pubsub.get_message(
+                timeout=self.shard_poll_interval)
+            if message is not None:
+                yield message
+
     def _get_redis_module(self):
         parsed_url = urlparse(self.redis_url)
         scheme = parsed_url.scheme.split('+', 1)[0].lower()
@@ -159,7 +323,8 @@ class RedisManager(PubSubManager):
             try:
                 if not self.connected:
                     self._redis_connect()
-                return self.redis.publish(self.channel, self.json.dumps(data))
+                return self.redis.publish(self._get_publish_channel(data),
+                                          self._encode_message(data))
             except Exception as exc:
                 if retries_left > 0:
                     self._get_logger().error(
@@ -174,6 +339,26 @@ class RedisManager(PubSubManager):
                     )
                     break
 
+    def _publish_many(self, messages):
+        # the messages are sent in a pipeline, so that they all go to the
+        # server in a single round trip, each on its own channel
+        for retries_left in range(1, -1, -1):  # 2 attempts
+            try:
+                if not self.connected:
+                    self._redis_connect()
+                pipe = self.redis.pipeline(transaction=False)
+                for message in messages:
+                    pipe.publish(self._get_publish_channel(message),
+                                 self._encode_message(message))
+                return pipe.execute()
+            except Exception as exc:
+                self.connected = False
+                if retries_left == 0:
+                    raise
+                self._get_logger().error(
+                    'Cannot publish to redis... retrying',
+                    extra={"redis_exception": str(exc)})
+
     def _redis_listen_with_retries(self):  # pragma: no cover
         retry_sleep = 1
         subscribed = False
@@ -181,9 +366,9 @@ class RedisManager(PubSubManager):
             try:
                 if not subscribed:
                     self._redis_connect()
-                    self.pubsub.subscribe(self.channel)
+                    self.pubsub.subscribe(*self._get_subscribe_channels())
                     retry_sleep = 1
-                yield from self.pubsub.listen()
+                yield from self._pubsub_listen()
             except Exception as exc:
                 self._get_logger().error(
                     'Cannot receive from redis... '
@@ -197,8 +382,12 @@ class RedisManager(PubSubManager):
 
     def _listen(self):  # pragma: no cover
         channel = self.channel.encode('utf-8')
+        shard_prefix = channel + b'#'
+        host_channel = self._get_host_channel(self.host_id).encode('utf-8')
         for message in self._redis_listen_with_retries():
-            if message['channel'] == channel and \
-                    message['type'] == 'message' and 'data' in message:
+            if message['channel'] not in [channel, host_channel] and \
+                    not message['channel'].startswith(shard_prefix):
+                continue
+            if message['type'] == 'message' and 'data' in message:
                 yield message['data']
-        self.pubsub.unsubscribe(self.channel)
+        self.pubsub.unsubscribe(*self._get_subscribe_channels())
@@ -0,0 +1,187 @@
+import time
+
+from .redis_manager import RedisManager
+
+
+class RedisStreamsManager(RedisManager):
+    """Redis Streams based client manager.
+
+    This class implements a Redis backend for event sharing across multiple
+    processes that uses a Redis stream instead of a pub/sub channel. Each
+    server keeps track of the last message it has read from the stream, so
+    that messages published while it is reconnecting to Redis are received
+    once the connection is restored.
+
+    To use a Redis Streams backend, initialize the :class:`Server` instance as
+    follows::
+
+        url = 'redis://hostname:port/0'
+        server = socketio.Server(
+            client_manager=socketio.RedisStreamsManager(url))
+
+    :param url: The connection URL for the Redis server. For a default Redis
+                store running on the same host, use ``redis://``.  To use a
+                TLS connection, use ``rediss://``. To use Redis Sentinel, use
+                ``redis+sentinel://`` with a comma-separated list of hosts
+                and the service name after the db in the URL path. Example:
+                ``redis+sentinel://user:pw@host1:1234,host2:2345/0/myredis``.
+    :param channel: The name of the stream on which the server sends and
+                    receives notifications. Must be the same in all the
+                    servers.
+    :param write_only: If set to ``True``, only initialize to emit events. The
+                       default of ``False`` initializes the class for emitting
+                       and receiving. A write-only instance can be used
+                       independently of the server to emit to clients from an
+                       external process.
+    :param logger: a custom logger to log it. If not given, the server logger
+                   is used.
+    :param json: An alternative JSON module to use for encoding and decoding
+                 packets. Custom json modules must have ``dumps`` and ``loads``
+                 functions that are compatible with the standard library
+                 versions. This setting is only used when ``write_only`` is set
+                 to ``True``. Otherwise the JSON module configured in the
+                 server is used.
+    :param redis_options: additional keyword arguments to be passed to
+                          ``Redis.from_url()`` or ``Sentinel()``.
+    :param serializer: The format of the messages published to the message
+                       queue, ``'default'`` for JSON or ``'msgpack'``. See
+                       :class:`PubSubManager` for details.
+    :param batch_size: The maximum number of messages that are combined into a
+                       single publish. The default of ``None`` disables
+                       batching. See :class:`PubSubManager` for details.
+    :param batch_interval: The maximum time in seconds that a message waits
+                           for its batch to fill before it is published.
+    :param sid_directory: If set to ``True``, emits addressed to a single
+                          client are only handled by the server that hosts the
+                          client. See :class:`PubSubManager` for details.
+    :param envelope: If set to ``True``, emits are published with a routing
+                     header that allows servers without recipients to discard
+                     them without decoding. See :class:`PubSubManager` for
+                     details.
+    :param packet_passthrough: If set to ``True``, emits are published as
+                               encoded Socket.IO packets. See
+                               :class:`PubSubManager` for details.
+    :param maxlen: The approximate number of messages that are kept in the
+                   stream. Older messages are trimmed as new ones are added.
+                   This determines how many messages a server can recover
+                   after it reconnects to Redis.
+    :param read_count: The maximum number of messages that are read from the
+                       stream in a single request.
+    :param publish_queue_size: The size of the outbound queue. When set,
+                               messages are published by a background task.
+                               See :class:`PubSubManager` for details.
+    :param publish_queue_policy: What to do when the outbound queue is full,
+                                 ``'block'``, ``'drop_oldest'`` or
+                                 ``'raise'``. See :class:`PubSubManager` for
+                                 details.
+    :param packet_cache_size: The maximum number of encoded events kept in the
+                              cache used by the ``cache_key`` argument of
+                              ``emit()``.
+    """
+    name = 'redisstreams'
+    read_block = 1000  # milliseconds
+
+    def __init__(self, url='redis://localhost:6379/0', channel='socketio',
+                 write_only=False, logger=None, json=None, redis_options=None,
+                 serializer='default', batch_size=None,
+                 batch_interval=0.005, sid_directory=False, envelope=False,
+                 packet_passthrough=False, maxlen=10000, read_count=100,
+                 publish_queue_size=None, publish_queue_policy='block',
+                 packet_cache_size=128):
+        super().__init__(url=url, channel=channel, write_only=write_only,
+                         logger=logger, json=json, redis_options=redis_options,
+                         serializer=serializer, batch_size=batch_size,
+                         batch_interval=batch_interval,
+                         sid_directory=sid_directory, envelope=envelope,
+                         packet_passthrough=packet_passthrough,
+                         publish_queue_size=publish_queue_size,
+                         publish_queue_policy=publish_queue_policy,
+                         packet_cache_size=packet_cache_size)
+        self.maxlen = maxlen
+        self.read_count = read_count
+        self.last_id = None
+
+    def _publish(self, data):
+        for retries_left in range(1, -1, -1):  # 2 attempts
+            try:
+                if not self.connected:
+                    self._redis_connect()
+                return self.redis.xadd(
+                    self.channel, {'data': self._encode_message(data)},
+                    maxlen=self.maxlen, approximate=True)
+            except Exception as exc:
+                if retries_left > 0:
+                    self._get_logger().error(
+                        'Cannot publish to redis... retrying',
+                        extra={"redis_exception": str(exc)}
+                    )
+                    self.connected = False
+                else:
+                    self._get_logger().error(
+                        'Cannot publish to redis... giving up',
+                        extra={"redis_exception": str(exc)}
+                    )
+                    break
+
+    def _publish_many(self, messages):
+        for retries_left in range(1, -1, -1):  # 2 attempts
+            try:
+                if not self.connected:
+                    self._redis_connect()
+                pipe = self.redis.pipeline(transaction=False)
+                for message in messages:
+                    pipe.xadd(self.channel,
+                              {'data': self._encode_message(message)},
+                              maxlen=self.maxlen, approximate=True)
+                return pipe.execute()
+            except Exception as exc:
+                self.connected = False
+                if retries_left == 0:
+                    raise
+                self._get_logger().error(
+                    'Cannot publish to redis... retrying',
+                    extra={"redis_exception": str(exc)})
+
+    def _get_last_id(self):
+        """Return the id of the newest message in the stream."""
+        entries = self.redis.xrevrange(self.channel, count=1)
+        if entries:
+            return entries[0][0]
+        return '0-0'
+
+    def _redis_listen_with_retries(self):
+        retry_sleep = 1
+        connected = False
+        while True:
+            try:
+                if not connected:
+                    self._redis_connect()
+                    if self.last_id is None:
+                        # only messages published after this server started
+                        # are received
+                        self.last_id = self._get_last_id()
+                    connected = True
+                    retry_sleep = 1
+                streams = self.redis.xread({self.channel: self.last_id},
+                                           count=self.read_count,
+                                           block=self.read_block)
+                for _, entries in streams or []:
+                    for entry_id, fields in entries:
+                        self.last_id = entry_id
+                        yield fields
+            except Exception as exc:
+                self._get_logger().error(
+                    'Cannot receive from redis... '
+                    f'retrying in {retry_sleep} secs',
+                    extra={"redis_exception": str(exc)})
+                connected = False
+                time.sleep(retry_sleep)
+                retry_sleep *= 2
+                if retry_sleep > 60:
+                    retry_sleep = 60
+
+    def _listen(self):
+        for fields in self._redis_listen_with_retries():
+            data = fields.get(b'data', fields.get('data'))
+            if data is not None:
+                yield data
@@ -117,7 +117,8 @@ class Server(base_server.BaseServer):
                             ``engineio_logger`` is ``False``.
     """
     def emit(self, event, data=None, to=None, room=None, skip_sid=None,
-             namespace=None, callback=None, ignore_queue=False):
+             namespace=None, callback=None, ignore_queue=False,
+             skip_rooms=None, cache_key=None, binary=None):
         """Emit a custom event to one or more connected clients.
 
         :param event: The event name. It can be any string. The event names
@@ -138,6 +139,9 @@ class Server(base_server.BaseServer):
                          to a room or to all clients. This can be used to
                          prevent a message from being sent to the sender. To
                          skip multiple sids, pass a list.
+        :param skip_rooms: A room name or a list of room names. Clients that
+                           are in any of these rooms are skipped when
+                           broadcasting to a room or to all clients.
         :param namespace: The Socket.IO namespace for the event. If this
                           argument is omitted the event is emitted to the
                           default namespace.
@@ -153,6 +157,15 @@ class Server(base_server.BaseServer):
                              single server process is used. It is recommended
                              to always leave this parameter with its default
                              value of ``False``.
+        :param cache_key: An optional key that identifies the data of the
+                          event. The encoded event is cached under this key,
+                          so that emitting the same event with the same key
+                          again, for example to many different rooms, does not
+                          need to encode it again. The application must not
+                          reuse a key with different data.
+        :param binary: ``False`` to indicate that the data does not have any
+                       binary components, which saves the work of searching
+                       for them. ``None`` (the default) searches the data.
 
         Note: this method is not thread safe. If multiple threads are emitting
         at the same time to the same client, then messages composed of
@@ -165,11 +178,12 @@ class Server(base_server.BaseServer):
         self.logger.info('emitting event "%s" to %s [%s]', event,
                          room or 'all', namespace)
         self.manager.emit(event, data, namespace, room=room,
-                          skip_sid=skip_sid, callback=callback,
-                          ignore_queue=ignore_queue)
+                          skip_sid=skip_sid, skip_rooms=skip_rooms,
+                          callback=callback, ignore_queue=ignore_queue,
+                          cache_key=cache_key, binary=binary)
 
     def send(self, data, to=None, room=None, skip_sid=None, namespace=None,
-             callback=None, ignore_queue=False):
+             callback=None, ignore_queue=False, skip_rooms=None):
         """Send a message to one or more connected clients.
 
         This function emits an event with the name ``'message'``. Use
@@ -190,6 +204,9 @@ class Server(base_server.BaseServer):
                          to a room or to all clients. This can be used to
                          prevent a message from being sent to the sender. To
                          skip multiple sids, pass a list.
+        :param skip_rooms: A room name or a list of room names. Clients that
+                           are in any of these rooms are skipped when
+                           broadcasting to a room or to all clients.
         :param namespace: The Socket.IO namespace for the event. If this
                           argument is omitted the event is emitted to the
                           default namespace.
@@ -208,7 +225,7 @@ class Server(base_server.BaseServer):
         """
         self.emit('message', data=data, to=to, room=room, skip_sid=skip_sid,
                   namespace=namespace, callback=callback,
-                  ignore_queue=ignore_queue)
+                  ignore_queue=ignore_queue, skip_rooms=skip_rooms)
 
     def call(self, event, data=None, to=None, sid=None, namespace=None,
              timeout=60, ignore_queue=False):
@@ -269,33 +286,57 @@ class Server(base_server.BaseServer):
             else callback_args[0][0] if len(callback_args[0]) == 1 \
             else None
 
-    def enter_room(self, sid, room, namespace=None):
+    def enter_room(self, sid, room, namespace=None, room_filter=None):
         """Enter a room.
 
         This function adds the client to a room. The :func:`emit` and
         :func:`send` functions can optionally broadcast events to all the
         clients in a room.
 
-        :param sid: Session ID of the client.
+        :param sid: Session ID of the client. If set to ``None``, all the
+                    clients selected by ``room_filter`` are added to the room,
+                    in all the servers connected to the message queue.
         :param room: Room name. If the room does not exist it is created.
         :param namespace: The Socket.IO namespace for the event. If this
                           argument is omitted the default namespace is used.
+        :param room_filter: The room, or list of rooms, with the clients to
+                            add when ``sid`` is ``None``. This argument is
+                            required in that case.
         """
         namespace = namespace or '/'
+        if sid is None:
+            if room_filter is None:
+                raise ValueError('A room_filter is required when sid is None.')
+            self.logger.info('clients in %s are entering room %s [%s]',
+                             room_filter, room, namespace)
+            return self.manager.enter_room(None, namespace, room,
+                                           room_filter=room_filter)
         self.logger.info('%s is entering room %s [%s]', sid, room, namespace)
         self.manager.enter_room(sid, namespace, room)
 
-    def leave_room(self, sid, room, namespace=None):
+    def leave_room(self, sid, room, namespace=None, room_filter=None):
         """Leave a room.
 
         This function removes the client from a room.
 
-        :param sid: Session ID of the client.
+        :param sid: Session ID of the client. If set to ``None``, all the
+                    clients selected by ``room_filter`` are removed from the
+                    room, in all the servers connected to the message queue.
         :param room: Room name.
         :param namespace: The Socket.IO namespace for the event. If this
                           argument is omitted the default namespace is used.
+        :param room_filter: The room, or list of rooms, with the clients to
+                            remove when ``sid`` is ``None``. This argument is
+                            required in that case.
         """
         namespace = namespace or '/'
+        if sid is None:
+            if room_filter is None:
+                raise ValueError('A room_filter is required when sid is None.')
+            self.logger.info('clients in %s are leaving room %s [%s]',
+                             room_filter, room, namespace)
+            return self.manager.leave_room(None, namespace, room,
+                                           room_filter=room_filter)
         self.logger.info('%s is leaving room %s [%s]', sid, room, namespace)
         self.manager.leave_room(sid, namespace, room)
 
@@ -382,10 +423,13 @@ class Server(base_server.BaseServer):
 
         return _session_context_manager(self, sid, namespace)
 
-    def disconnect(self, sid, namespace=None, ignore_queue=False):
+    def disconnect(self, sid, namespace=None, ignore_queue=False,
+                   room_filter=None):
         """Disconnect a client.
 
-        :param sid: Session ID of the client.
+        :param sid: Session ID of the client. If set to ``None``, all the
+                    clients selected by ``room_filter`` are disconnected, in
+                    all the servers connected to the message queue.
         :param namespace: The Socket.IO namespace to disconnect. If this
                           argument is omitted the default namespace is used.
         :param ignore_queue: Only used when a message queue is configured. If
@@ -393,8 +437,19 @@ class Server(base_server.BaseServer):
                              locally, without broadcasting on the queue. It is
                              recommended to always leave this parameter with
                              its default value of ``False``.
+        :param room_filter: The room, or list of rooms, with the clients to
+                            disconnect when ``sid`` is ``None``. This
+                            argument is required in that case.
         """
         namespace = namespace or '/'
+        if sid is None:
+            if room_filter is None:
+                raise ValueError('A room_filter is required when sid is None.')
+            self.logger.info('Disconnecting clients in %s [%s]', room_filter,
+                             namespace)
+            return self.manager.disconnect(None, namespace=namespace,
+                                           ignore_queue=ignore_queue,
+                                           room_filter=room_filter)
         if ignore_queue:
             delete_it = self.manager.is_connected(sid, namespace)
         else:
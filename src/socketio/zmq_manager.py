@@ -1,13 +1,60 @@
 import re
+import threading
+
+try:
+    import zmq
+except ImportError:
+    zmq = None
 
 from .pubsub_manager import PubSubManager
 
 
-class ZmqManager(PubSubManager):  # pragma: no cover
+def parse_zmq_url(url):
+    """Return the sink and subscriber URLs of a zmq connection string."""
+    if not (url.startswith('zmq+tcp://') and re.search(r':\d+\+\d+$', url)):
+        raise RuntimeError('unexpected connection string: ' + url)
+    sink_url, sub_port = url[4:].split('+')
+    sub_url = sink_url[:sink_url.rindex(':') + 1] + sub_port
+    return sink_url, sub_url
+
+
+def zmq_forwarder(url='zmq+tcp://*:5555+5556', context=None):
+    """Run a message forwarder for the zmq client managers.
+
+    The forwarder receives the messages that the servers publish on the first
+    port of the connection string, and sends them to all the servers that are
+    connected to the second port. This function blocks until the zmq context
+    is terminated, so it is normally run in its own process or thread.
+
+    :param url: The connection string, with the two ports in which the
+                forwarder listens.
+    :param context: The zmq context in which the sockets are created. If not
+                    given, the global context is used.
+    """
+    if zmq is None:
+        raise RuntimeError('zmq package is not installed '
+                           '(Run "pip install pyzmq" in your '
+                           'virtualenv).')
+    sink_url, sub_url = parse_zmq_url(url)
+    context = context or zmq.Context.instance()
+    receiver = context.socket(zmq.PULL)
+    publisher = context.socket(zmq.PUB)
+    try:
+        receiver.bind(sink_url)
+        publisher.bind(sub_url)
+        zmq.proxy(receiver, publisher)
+    except zmq.ContextTerminated:
+        pass
+    finally:
+        receiver.close(linger=0)
+        publisher.close(linger=0)
+
+
+class ZmqManager(PubSubManager):
     """zmq based client manager.
 
     NOTE: this zmq implementation should be considered experimental at this
-    time. At this time, eventlet is required to use zmq.
+    time.
 
     This class implements a zmq backend for event sharing across multiple
     processes. To use a zmq backend, initialize the :class:`Server` instance as
@@ -16,6 +63,21 @@ class ZmqManager(PubSubManager):  # pragma: no cover
         url = 'zmq+tcp://hostname:port1+port2'
         server = socketio.Server(client_manager=socketio.ZmqManager(url))
 
+    The green version of the zmq package is used when the server runs under
+    eventlet or gevent.
+
+    A zmq message broker must be running for the zmq_manager to work. The
+    :func:`socketio.zmq_manager.zmq_forwarder` function implements a simple
+    broker that can be started as follows::
+
+        from socketio.zmq_manager import zmq_forwarder
+
+        zmq_forwarder('zmq+tcp://*:5555+5556')
+
+    Each message is sent as a single zmq frame that starts with the channel
+    name, followed by a null byte and the encoded message, so a broker that
+    forwards single frames also works.
+
     :param url: The connection URL for the zmq message broker,
                 which will need to be provided and running.
     :param channel: The channel name on which the server sends and receives
@@ -33,81 +95,86 @@ class ZmqManager(PubSubManager):  # pragma: no cover
                  versions. This setting is only used when ``write_only`` is set
                  to ``True``. Otherwise the JSON module configured in the
                  server is used.
-
-    A zmq message broker must be running for the zmq_manager to work.
-    you can write your own or adapt one from the following simple broker
-    below::
-
-        import zmq
-
-        receiver = zmq.Context().socket(zmq.PULL)
-        receiver.bind("tcp://*:5555")
-
-        publisher = zmq.Context().socket(zmq.PUB)
-        publisher.bind("tcp://*:5556")
-
-        while True:
-            publisher.send(receiver.recv())
+    :param serializer: The format of the messages published to the message
+                       queue, ``'default'`` for JSON or ``'msgpack'``. See
+                       :class:`PubSubManager` for details.
+    :param batch_size: The maximum number of messages that are combined into a
+                       single publish. The default of ``None`` disables
+                       batching. See :class:`PubSubManager` for details.
+    :param batch_interval: The maximum time in seconds that a message waits
+                           for its batch to fill before it is published.
+    :param sid_directory: If set to ``True``, emits addressed to a single
+                          client are only handled by the server that hosts the
+                          client. See :class:`PubSubManager` for details.
+    :param envelope: If set to ``True``, emits are published with a routing
+                     header that allows servers without recipients to discard
+                     them without decoding. See :class:`PubSubManager` for
+                     details.
+    :param packet_passthrough: If set to ``True``, emits are published as
+                               encoded Socket.IO packets. See
+                               :class:`PubSubManager` for details.
+    :param packet_cache_size: The maximum number of encoded events kept in the
+                              cache used by the ``cache_key`` argument of
+                              ``emit()``.
     """
     name = 'zmq'
 
     def __init__(self, url='zmq+tcp://localhost:5555+5556', channel='socketio',
-                 write_only=False, logger=None, json=None):
-        try:
-            from eventlet.green import zmq
-        except ImportError:
+                 write_only=False, logger=None, json=None,
+                 serializer='default', batch_size=None,
+                 batch_interval=0.005, sid_directory=False, envelope=False,
+                 packet_passthrough=False, packet_cache_size=128):
+        if zmq is None:
             raise RuntimeError('zmq package is not installed '
                                '(Run "pip install pyzmq" in your '
                                'virtualenv).')
-
-        r = re.compile(r':\d+\+\d+$')
-        if not (url.startswith('zmq+tcp://') and r.search(url)):
-            raise RuntimeError('unexpected connection string: ' + url)
+        self.sink_url, self.sub_url = parse_zmq_url(url)
 
         super().__init__(channel=channel, write_only=write_only, logger=logger,
-                         json=json)
-        url = url.replace('zmq+', '')
-        (sink_url, sub_port) = url.split('+')
-        sink_port = sink_url.split(':')[-1]
-        sub_url = sink_url.replace(sink_port, sub_port)
-
-        sink = zmq.Context().socket(zmq.PUSH)
-        sink.connect(sink_url)
-
-        sub = zmq.Context().socket(zmq.SUB)
-        sub.setsockopt_string(zmq.SUBSCRIBE, '')
-        sub.connect(sub_url)
-
-        self.sink = sink
-        self.sub = sub
-        self.channel = channel
+                         json=json, serializer=serializer,
+                         batch_size=batch_size, batch_interval=batch_interval,
+                         sid_directory=sid_directory, envelope=envelope,
+                         packet_passthrough=packet_passthrough,
+                         packet_cache_size=packet_cache_size)
+        self.context = None
+        self.sink = None
+        self.sub = None
+        # zmq sockets cannot be used from multiple threads at the same time
+        self.sink_lock = threading.Lock()
+
+    def _zmq(self):
+        async_mode = getattr(self.server, 'async_mode', None)
+        if async_mode == 'eventlet':
+            from eventlet.green import zmq as green_zmq
+            return green_zmq
+        elif async_mode in ['gevent', 'gevent_uwsgi']:
+            import zmq.green as green_zmq
+            return green_zmq
+        return zmq
+
+    def _socket(self, socket_type, url):
+        zmq_module = self._zmq()
+        if self.context is None:
+            self.context = zmq_module.Context()
+        socket = self.context.socket(socket_type)
+        socket.connect(url)
+        return socket
 
     def _publish(self, data):
-        packed_data = self.json.dumps(
-            {
-                'type': 'message',
-                'channel': self.channel,
-                'data': data
-            }
-        ).encode()
-        return self.sink.send(packed_data)
-
-    def zmq_listen(self):
-        while True:
-            response = self.sub.recv()
-            if response is not None:
-                yield response
+        body = self._encode_message(data)
+        if isinstance(body, str):
+            body = body.encode()
+        with self.sink_lock:
+            if self.sink is None:
+                self.sink = self._socket(zmq.PUSH, self.sink_url)
+            self.sink.send(self.channel.encode() + b'\0' + body)
 
     def _listen(self):
-        for message in self.zmq_listen():
-            if isinstance(message, bytes):
-                try:
-                    message = self.json.loads(message)
-                except Exception:
-                    pass
-            if isinstance(message, dict) and \
-                    message['type'] == 'message' and \
-                    message['channel'] == self.channel and \
-                    'data' in message:
-                yield message['data']
-        return
+        prefix = self.channel.encode() + b'\0'
+        if self.sub is None:
+            self.sub = self._socket(zmq.SUB, self.sub_url)
+            self.sub.setsockopt(zmq.SUBSCRIBE, prefix)
+        while True:
+            message = self.sub.recv()
+            if message.startswith(prefix):
+                yield message[len(prefix):]
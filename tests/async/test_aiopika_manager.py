@@ -0,0 +1,271 @@
+import asyncio
+import enum
+import types
+from unittest import mock
+
+import pytest
+
+from socketio import async_aiopika_manager
+from socketio.async_aiopika_manager import AsyncAioPikaManager
+
+
+class DeliveryMode(enum.IntEnum):
+    NOT_PERSISTENT = 1
+    PERSISTENT = 2
+
+
+class ChannelInvalidStateError(Exception):
+    pass
+
+
+class Message:
+    def __init__(self, body, delivery_mode):
+        self.body = body
+        self.delivery_mode = delivery_mode
+
+
+class FakeAioPika:
+    """An in-process replacement for the aio_pika package."""
+    DeliveryMode = DeliveryMode
+    ExchangeType = types.SimpleNamespace(FANOUT='fanout')
+    Message = Message
+    exceptions = types.SimpleNamespace(
+        ChannelInvalidStateError=ChannelInvalidStateError)
+
+    def __init__(self):
+        self.published = []
+        self.deliveries = []
+        self.acks = []
+        self.exchanges = []
+        self.prefetch_count = None
+        self.connect_errors = []
+        self.publish_errors = []
+
+    async def connect_robust(self, url):
+        if self.connect_errors:
+            raise self.connect_errors.pop(0)
+        return FakeConnection(self)
+
+
+class FakeConnection:
+    def __init__(self, pika):
+        self.pika = pika
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        pass
+
+    async def channel(self):
+        return FakeChannel(self.pika)
+
+
+class FakeChannel:
+    def __init__(self, pika):
+        self.pika = pika
+
+    async def set_qos(self, prefetch_count):
+        self.pika.prefetch_count = prefetch_count
+
+    async def declare_exchange(self, name, type):
+        self.pika.exchanges.append((name, type))
+        return FakeExchange(self.pika)
+
+    async def declare_queue(self, durable, arguments):
+        return FakeQueue(self.pika)
+
+
+class FakeExchange:
+    def __init__(self, pika):
+        self.pika = pika
+
+    async def publish(self, message, routing_key):
+        if self.pika.publish_errors:
+            raise self.pika.publish_errors.pop(0)
+        self.pika.published.append(message)
+
+
+class FakeQueue:
+    def __init__(self, pika):
+        self.pika = pika
+
+    async def bind(self, exchange):
+        pass
+
+    def iterator(self):
+        return FakeQueueIterator(self.pika)
+
+
+class FakeQueueIterator:
+    def __init__(self, pika):
+        self.pika = pika
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        pass
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        # the tests only read the messages that are available
+        return self.pika.deliveries.pop(0)
+
+
+class FakeDelivery:
+    def __init__(self, pika, body, ack_error=None):
+        self.pika = pika
+        self.body = body
+        self.ack_error = ack_error
+
+    async def ack(self, multiple=False):
+        if self.ack_error:
+            raise self.ack_error
+        self.pika.acks.append((self.body, multiple))
+
+
+class TestAsyncAioPikaManager:
+    def setup_method(self):
+        self.pika = FakeAioPika()
+        self.patcher = mock.patch.object(async_aiopika_manager, 'aio_pika',
+                                         self.pika)
+        self.patcher.start()
+
+    def teardown_method(self):
+        self.patcher.stop()
+
+    def _deliver(self, *bodies):
+        self.pika.deliveries.extend(
+            [FakeDelivery(self.pika, body) for body in bodies])
+
+    def test_aio_pika_not_installed(self):
+        async_aiopika_manager.aio_pika = None
+        with pytest.raises(RuntimeError):
+            AsyncAioPikaManager()
+
+    def test_ack_batch_size_validation(self):
+        with pytest.raises(ValueError):
+            AsyncAioPikaManager(ack_batch_size=0)
+        with pytest.raises(ValueError):
+            AsyncAioPikaManager(prefetch_count=10, ack_batch_size=10)
+        pm = AsyncAioPikaManager(prefetch_count=1, ack_batch_size=1)
+        assert pm.ack_batch_size == 1
+        pm = AsyncAioPikaManager(prefetch_count=0, ack_batch_size=500)
+        assert pm.ack_batch_size == 500
+
+    async def test_publish(self):
+        pm = AsyncAioPikaManager(channel='foo', write_only=True)
+        await pm._publish({'method': 'emit', 'value': 'foo'})
+        await pm._publish_many([{'method': 'emit', 'value': 'bar'},
+                                {'method': 'emit', 'value': 'baz'}])
+        assert self.pika.exchanges == [('foo', 'fanout')]
+        assert [m.body for m in self.pika.published] == [
+            b'{"method": "emit", "value": "foo"}',
+            b'{"method": "emit", "value": "bar"}',
+            b'{"method": "emit", "value": "baz"}']
+        assert {m.delivery_mode for m in self.pika.published} == {
+            DeliveryMode.NOT_PERSISTENT}
+
+        pm = AsyncAioPikaManager(write_only=True, persistent=True)
+        await pm._publish({'method': 'emit', 'value': 'foo'})
+        assert self.pika.published[-1].delivery_mode == \
+            DeliveryMode.PERSISTENT
+
+    async def test_publish_error(self):
+        logger = mock.MagicMock()
+        pm = AsyncAioPikaManager(write_only=True, logger=logger)
+        self.pika.publish_errors = [RuntimeError('foo')]
+        await pm._publish({'method': 'emit', 'value': 'foo'})
+        assert len(self.pika.published) == 1
+        assert 'retrying' in logger.error.call_args[0][0]
+
+        self.pika.publish_errors = [RuntimeError('foo'), RuntimeError('bar')]
+        await pm._publish({'method': 'emit', 'value': 'foo'})
+        assert len(self.pika.published) == 1
+        assert 'giving up' in logger.error.call_args[0][0]
+
+        self.pika.publish_errors = [ChannelInvalidStateError()]
+        with pytest.raises(asyncio.CancelledError):
+            await pm._publish({'method': 'emit', 'value': 'foo'})
+        self.pika.publish_errors = [ChannelInvalidStateError()]
+        with pytest.raises(asyncio.CancelledError):
+            await pm._publish_many([{'method': 'emit', 'value': 'foo'}])
+
+    async def test_listen_with_batched_acks(self):
+        pm = AsyncAioPikaManager(prefetch_count=5, ack_batch_size=3)
+        self._deliver(b'one', b'two', b'three', b'four')
+        listener = pm._listen()
+        assert [await listener.__anext__() for _ in range(3)] == [
+            b'one', b'two', b'three']
+        assert self.pika.prefetch_count == 5
+        assert self.pika.acks == []
+        ack_task = pm.ack_task
+        assert ack_task is not None
+
+        # the third message completes the batch
+        assert await listener.__anext__() == b'four'
+        assert self.pika.acks == [(b'three', True)]
+        assert pm.unacked_count == 0
+
+        # the timer of the pending acknowledgements ends with the listener
+        await listener.aclose()
+        await asyncio.sleep(0)
+        assert ack_task.cancelled()
+        assert pm.ack_task is None
+
+    async def test_ack_after_interval(self):
+        pm = AsyncAioPikaManager(ack_batch_size=3)
+        pm.ack_interval = 0.01
+        self._deliver(b'one', b'two')
+        await pm._ack(self.pika.deliveries[0])
+        await pm._ack(self.pika.deliveries[1])
+        assert self.pika.acks == []
+        await asyncio.wait_for(pm.ack_task, 5)
+        assert self.pika.acks == [(b'two', True)]
+        assert pm.unacked is None
+        assert pm.unacked_count == 0
+
+    async def test_ack_each_message(self):
+        pm = AsyncAioPikaManager(ack_batch_size=1)
+        self._deliver(b'one')
+        await pm._ack(self.pika.deliveries[0])
+        assert self.pika.acks == [(b'one', False)]
+        assert pm.ack_task is None
+
+    async def test_ack_error(self):
+        logger = mock.MagicMock()
+        pm = AsyncAioPikaManager(ack_batch_size=2, logger=logger)
+        pm.ack_id = 5
+        await pm._ack(FakeDelivery(self.pika, b'one',
+                                   ack_error=RuntimeError('foo')))
+        await pm._ack_pending(4)
+        logger.error.assert_not_called()
+        await pm._ack_pending(5)
+        logger.error.assert_called_once_with(
+            'Cannot acknowledge rabbitmq messages',
+            extra={'rabbitmq_exception': 'foo'})
+        pm._cancel_ack_task()
+
+    async def test_listen_retry(self):
+        logger = mock.MagicMock()
+        pm = AsyncAioPikaManager(ack_batch_size=1, logger=logger)
+        self.pika.connect_errors = [RuntimeError('foo')]
+        self._deliver(b'one')
+        sleep = asyncio.sleep
+
+        async def fake_sleep(delay):
+            await sleep(0)
+
+        listener = pm._listen()
+        with mock.patch.object(async_aiopika_manager.asyncio, 'sleep',
+                               new=fake_sleep):
+            assert await listener.__anext__() == b'one'
+        assert 'retrying' in logger.error.call_args[0][0]
+        await listener.aclose()
+
+        self.pika.connect_errors = [ChannelInvalidStateError()]
+        with pytest.raises(asyncio.CancelledError):
+            await pm._listen().__anext__()
@@ -0,0 +1,103 @@
+from unittest import mock
+
+import pytest
+
+from socketio import async_emitter
+from socketio import async_manager
+from socketio import async_pubsub_manager
+
+
+class TestAsyncEmitter:
+    def setup_method(self):
+        self.pm = async_pubsub_manager.AsyncPubSubManager(write_only=True)
+        self.pm.host_id = '123456'
+        self.pm._publish_many = mock.AsyncMock()
+        self.emitter = async_emitter.AsyncEmitter(self.pm, batch_size=2,
+                                                  spool_size=4)
+
+    def _published(self):
+        return [[m['data'] for m in c[0][0]]
+                for c in self.pm._publish_many.await_args_list]
+
+    async def test_bad_manager(self):
+        with pytest.raises(ValueError):
+            async_emitter.AsyncEmitter(async_manager.AsyncManager())
+
+    async def test_emit(self):
+        await self.emitter.emit('foo', 'bar', to='sid', skip_sid='a')
+        self.pm._publish_many.assert_awaited_once_with([
+            {'method': 'emit', 'event': 'foo', 'data': ['bar'],
+             'binary': False, 'namespace': '/', 'room': 'sid',
+             'skip_sid': 'a', 'skip_rooms': None, 'callback': None,
+             'cache_key': None, 'host_id': '123456'}])
+
+    async def test_emit_binary(self):
+        await self.emitter.emit('foo', b'bar', room='room', namespace='/foo')
+        message = self.pm._publish_many.await_args[0][0][0]
+        assert message['binary'] is True
+        assert message['namespace'] == '/foo'
+        assert message['room'] == 'room'
+        assert message['data'] == [[{'_placeholder': True, 'num': 0}], 'YmFy']
+
+    async def test_emit_many(self):
+        await self.emitter.emit_many([{'event': 'foo', 'data': i}
+                                      for i in range(5)])
+        assert self._published() == [[[0], [1]], [[2], [3]], [[4]]]
+
+    @mock.patch('socketio.async_emitter.time.time', return_value=100)
+    async def test_spool(self, time):
+        self.pm._publish_many.side_effect = [None, RuntimeError()]
+        await self.emitter.emit_many([{'event': 'foo', 'data': i}
+                                      for i in range(3)])
+        assert list(self.emitter.spool) == [
+            self.pm._get_emit_message('foo', 2, '/')]
+        assert self.emitter.retry_time == 101
+
+        # new emits go directly to the spool until the retry time
+        self.pm._publish_many.reset_mock(side_effect=True)
+        await self.emitter.emit('foo', 3)
+        self.pm._publish_many.assert_not_awaited()
+        assert len(self.emitter.spool) == 2
+
+        time.return_value = 101
+        await self.emitter.emit('foo', 4)
+        assert self._published() == [[[2], [3]], [[4]]]
+        assert len(self.emitter.spool) == 0
+        assert self.emitter.retry_time is None
+
+    async def test_spool_full(self):
+        self.pm._publish_many.side_effect = RuntimeError()
+        await self.emitter.emit_many([{'event': 'foo', 'data': i}
+                                      for i in range(3)])
+        await self.emitter.emit_many([{'event': 'foo', 'data': i}
+                                      for i in range(3, 6)])
+        assert [m['data'] for m in self.emitter.spool] == [
+            [2], [3], [4], [5]]
+        assert self.emitter.dropped == 2
+
+    async def test_flush(self):
+        self.pm._publish_many.side_effect = RuntimeError()
+        await self.emitter.emit('foo', 1)
+        assert await self.emitter.flush() is False
+        assert self.pm._publish_many.await_count == 2
+
+        self.pm._publish_many.reset_mock(side_effect=True)
+        assert await self.emitter.flush() is True
+        assert self._published() == [[[1]]]
+        assert await self.emitter.flush() is True
+        assert self.pm._publish_many.await_count == 1
+
+    async def test_publish_many(self):
+        pm = async_pubsub_manager.AsyncPubSubManager(write_only=True)
+        pm.host_id = '123456'
+        pm._publish = mock.AsyncMock()
+        await pm._publish_many([])
+        pm._publish.assert_not_awaited()
+        await pm._publish_many([{'method': 'emit'}])
+        pm._publish.assert_awaited_once_with({'method': 'emit'})
+        await pm._publish_many([{'method': 'emit'},
+                                {'method': 'close_room'}])
+        pm._publish.assert_awaited_with(
+            {'method': 'batch', 'messages': [{'method': 'emit'},
+                                             {'method': 'close_room'}],
+             'host_id': '123456'})
@@ -0,0 +1,171 @@
+import asyncio
+from collections import namedtuple
+from unittest import mock
+
+import pytest
+
+from socketio import async_kafka_manager
+from socketio.async_kafka_manager import AsyncKafkaManager
+
+Record = namedtuple('Record', ['topic', 'value'])
+
+
+class FakeAioKafka:
+    """An in-process replacement for the aiokafka package."""
+    def __init__(self):
+        self.records = []
+        self.producers = []
+        self.auto_deliver = True
+
+    def AIOKafkaProducer(self, bootstrap_servers, **kwargs):
+        self.bootstrap_servers = bootstrap_servers
+        self.producer_options = kwargs
+        self.producers.append(FakeProducer(self))
+        return self.producers[-1]
+
+    def AIOKafkaConsumer(self, topic, bootstrap_servers):
+        return FakeConsumer(self)
+
+
+class FakeProducer:
+    def __init__(self, kafka):
+        self.kafka = kafka
+        self.started = False
+        self.pending = []
+
+    async def start(self):
+        self.started = True
+
+    async def send(self, topic, value):
+        assert self.started
+        assert isinstance(value, bytes)
+        future = asyncio.get_running_loop().create_future()
+        self.pending.append((Record(topic, value), future))
+        if self.kafka.auto_deliver:
+            asyncio.get_running_loop().call_soon(self.deliver)
+        return future
+
+    def deliver(self, exc=None):
+        pending = self.pending
+        self.pending = []
+        for record, future in pending:
+            if exc is not None:
+                future.set_exception(exc)
+            else:
+                self.kafka.records.append(record)
+                future.set_result(len(self.kafka.records) - 1)
+
+
+class FakeConsumer:
+    def __init__(self, kafka):
+        self.kafka = kafka
+        self.stopped = False
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        self.stopped = True
+
+    async def __aiter__(self):
+        for record in self.kafka.records:
+            yield record
+
+
+class TestAsyncKafkaManager:
+    def setup_method(self):
+        self.kafka = FakeAioKafka()
+        self.patcher = mock.patch.object(async_kafka_manager, 'aiokafka',
+                                         self.kafka)
+        self.patcher.start()
+
+    def teardown_method(self):
+        self.patcher.stop()
+
+    def test_aiokafka_not_installed(self):
+        async_kafka_manager.aiokafka = None
+        with pytest.raises(RuntimeError):
+            AsyncKafkaManager()
+
+    async def test_urls(self):
+        pm = AsyncKafkaManager(['kafka://foo:123', 'kafka://bar:456'],
+                               producer_options={'linger_ms': 5})
+        assert pm.kafka_urls == ['foo:123', 'bar:456']
+        assert AsyncKafkaManager('kafka://').kafka_urls == ['localhost:9092']
+        await pm._publish({'method': 'emit', 'value': 'foo'})
+        assert self.kafka.bootstrap_servers == ['foo:123', 'bar:456']
+        assert self.kafka.producer_options == {'linger_ms': 5}
+
+    async def test_publish(self):
+        callback = mock.MagicMock()
+        pm = AsyncKafkaManager(delivery_callback=callback)
+        await pm._publish({'method': 'emit', 'value': 'foo'})
+        await pm._publish({'method': 'emit', 'value': 'bar'})
+        assert len(self.kafka.producers) == 1
+        assert self.kafka.records == [
+            Record('socketio', b'{"method": "emit", "value": "foo"}'),
+            Record('socketio', b'{"method": "emit", "value": "bar"}')]
+        assert callback.call_count == 2
+        callback.assert_called_with({'method': 'emit', 'value': 'bar'}, None)
+
+    async def test_publish_without_flush(self):
+        self.kafka.auto_deliver = False
+        callback = mock.MagicMock()
+        pm = AsyncKafkaManager(flush=False, delivery_callback=callback)
+        await pm._publish({'method': 'emit', 'value': 'foo'})
+        await pm._publish({'method': 'emit', 'value': 'bar'})
+        assert self.kafka.records == []
+        pm.producer.deliver()
+        await asyncio.sleep(0)
+        assert len(self.kafka.records) == 2
+        assert callback.call_count == 2
+
+    async def test_publish_error(self):
+        self.kafka.auto_deliver = False
+        callback = mock.MagicMock()
+        logger = mock.MagicMock()
+        pm = AsyncKafkaManager(flush=False, logger=logger,
+                               delivery_callback=callback)
+        await pm._publish({'method': 'emit', 'value': 'foo'})
+        exc = RuntimeError('foo')
+        pm.producer.deliver(exc)
+        await asyncio.sleep(0)
+        callback.assert_called_once_with(
+            {'method': 'emit', 'value': 'foo'}, exc)
+        logger.error.assert_called_once_with(
+            'Cannot publish to kafka', extra={'kafka_exception': 'foo'})
+
+        await pm._publish({'method': 'emit', 'value': 'bar'})
+        pm.producer.pending[0][1].cancel()
+        await asyncio.sleep(0)
+        assert callback.call_count == 1
+
+    async def test_publish_many(self):
+        callback = mock.MagicMock()
+        pm = AsyncKafkaManager(flush=False, delivery_callback=callback)
+        await pm._publish_many([{'method': 'emit', 'value': 'foo'},
+                                {'method': 'emit', 'value': 'bar'}])
+        assert self.kafka.records == [
+            Record('socketio', b'{"method": "emit", "value": "foo"}'),
+            Record('socketio', b'{"method": "emit", "value": "bar"}')]
+        assert callback.call_count == 2
+
+        self.kafka.auto_deliver = False
+        task = asyncio.create_task(
+            pm._publish_many([{'method': 'emit', 'value': 'baz'}]))
+        await asyncio.sleep(0)
+        pm.producer.deliver(RuntimeError('foo'))
+        with pytest.raises(RuntimeError):
+            await task
+        assert len(self.kafka.records) == 2
+
+    async def test_listen(self):
+        sender = AsyncKafkaManager(serializer='msgpack', write_only=True)
+        receiver = AsyncKafkaManager()
+        await sender._publish({'method': 'emit', 'value': 'foo'})
+        self.kafka.records.append(Record('other', b'{"method": "emit"}'))
+        await sender._publish({'method': 'emit', 'value': b'bar'})
+        messages = [receiver._decode_message(message)
+                    async for message in receiver._listen()]
+        assert messages == [{'method': 'emit', 'value': 'foo'},
+                            {'method': 'emit', 'value': b'bar'}]
@@ -0,0 +1,142 @@
+import asyncio
+import os
+from unittest import mock
+
+import pytest
+
+from socketio import async_local_ipc_manager
+from socketio import packet
+from socketio.async_local_ipc_manager import AsyncLocalIPCManager
+
+
+async def wait_for(condition, timeout=5):
+    async def wait():
+        while not condition():
+            await asyncio.sleep(0.01)
+
+    await asyncio.wait_for(wait(), timeout)
+
+
+def stop_hub(pm):
+    pm.hub_server.close()
+    for writer in pm.hub_subscribers:
+        writer.close()
+    pm.hub_lock_file.close()
+
+
+class TestAsyncLocalIPCManager:
+    def _manager(self, tmp_path, **kwargs):
+        pm = AsyncLocalIPCManager(path=str(tmp_path / 'socketio.sock'),
+                                  **kwargs)
+        if not pm.write_only:
+            server = mock.MagicMock()
+            server.packet_class = packet.Packet
+            pm.set_server(server)
+        return pm
+
+    def _listen(self, pm, count=1):
+        async def listen():
+            received = []
+            async for message in pm._listen():
+                received.append(pm._decode_message(message))
+                if len(received) == count:
+                    return received
+
+        return asyncio.create_task(listen())
+
+    def test_default_path(self, tmp_path):
+        tmp_path.chmod(0o700)
+        with mock.patch.dict(os.environ, {'XDG_RUNTIME_DIR': str(tmp_path)}):
+            pm = AsyncLocalIPCManager(channel='foo')
+        assert pm.path == str(tmp_path / 'socketio-foo.sock')
+
+    async def test_publish_and_listen(self, tmp_path):
+        receiver = self._manager(tmp_path)
+        sender = self._manager(tmp_path, write_only=True,
+                               serializer='msgpack')
+        listener = self._listen(receiver, count=3)
+        # the first server to connect becomes the hub
+        await wait_for(lambda: len(receiver.hub_subscribers) == 1)
+        await sender._publish({'method': 'emit', 'value': 'foo'})
+        await sender._publish_many([{'method': 'emit', 'value': b'bar'},
+                                    {'method': 'emit', 'value': 'baz'}])
+        assert await asyncio.wait_for(listener, 5) == [
+            {'method': 'emit', 'value': 'foo'},
+            {'method': 'emit', 'value': b'bar'},
+            {'method': 'emit', 'value': 'baz'}]
+        assert sender.hub_server is None
+        stop_hub(receiver)
+
+    async def test_publish_to_self(self, tmp_path):
+        pm = self._manager(tmp_path)
+        listener = self._listen(pm)
+        await wait_for(lambda: len(pm.hub_subscribers) == 1)
+        await pm._publish({'method': 'emit', 'value': 'bar'})
+        assert await asyncio.wait_for(listener, 5) == [
+            {'method': 'emit', 'value': 'bar'}]
+        assert os.stat(pm.path).st_mode & 0o777 == 0o600
+        stop_hub(pm)
+
+    async def test_publish_without_hub(self, tmp_path):
+        logger = mock.MagicMock()
+        pm = self._manager(tmp_path, write_only=True, logger=logger)
+        await pm._publish({'method': 'emit', 'value': 'foo'})
+        assert logger.error.call_count == 2
+        assert 'giving up' in logger.error.call_args[0][0]
+        assert pm.publisher is None
+        with pytest.raises(OSError):
+            await pm._publish_many([{'method': 'emit', 'value': 'foo'}])
+
+    async def test_oversized_frame(self, tmp_path):
+        pm = self._manager(tmp_path)
+        pm.max_frame_size = 32
+        listener = self._listen(pm)
+        await wait_for(lambda: len(pm.hub_subscribers) == 1)
+        with pytest.raises(ValueError):
+            await pm._publish({'method': 'emit', 'value': 'x' * 32})
+        # a publisher that sends an oversized frame is disconnected
+        reader, writer = await asyncio.open_unix_connection(pm.path)
+        writer.write(b'P\xff\xff\xff\xff')
+        assert await asyncio.wait_for(reader.read(), 5) == b''
+        writer.close()
+        await pm._publish({'method': 'emit'})
+        assert await asyncio.wait_for(listener, 5) == [{'method': 'emit'}]
+        stop_hub(pm)
+
+    async def test_slow_subscriber(self, tmp_path):
+        pm = self._manager(tmp_path)
+        listener = self._listen(pm)
+        await wait_for(lambda: len(pm.hub_subscribers) == 1)
+        writer = pm.hub_subscribers[0]
+        with mock.patch.object(writer.transport, 'get_write_buffer_size',
+                               return_value=pm.max_buffer_size + 1):
+            pm._hub_broadcast(b'\x00\x00\x00\x00')
+        assert pm.hub_subscribers == []
+        listener.cancel()
+        stop_hub(pm)
+
+    async def test_hub_takeover(self, tmp_path):
+        hub = self._manager(tmp_path)
+        pm = self._manager(tmp_path)
+        assert await hub._start_hub()
+        assert not await pm._start_hub()
+        sleep = asyncio.sleep
+
+        async def fake_sleep(delay):
+            await sleep(0)
+
+        with mock.patch.object(async_local_ipc_manager.asyncio, 'sleep',
+                               new=fake_sleep):
+            listener = self._listen(pm)
+            await wait_for(lambda: len(hub.hub_subscribers) == 1)
+
+            # the hub goes away, and the other server takes its place
+            stop_hub(hub)
+            hub._close_publisher()
+            await wait_for(lambda: pm.hub_server is not None)
+            await wait_for(lambda: len(pm.hub_subscribers) == 1)
+            sender = self._manager(tmp_path, write_only=True)
+            await sender._publish({'method': 'emit', 'value': 'bar'})
+            assert await asyncio.wait_for(listener, 5) == [
+                {'method': 'emit', 'value': 'bar'}]
+        stop_hub(pm)
@@ -1,5 +1,7 @@
 from unittest import mock
 
+import pytest
+
 from socketio import async_manager
 from socketio import packet
 
@@ -16,6 +18,13 @@ class TestAsyncManager:
         mock_server = mock.MagicMock()
         mock_server._send_packet = mock.AsyncMock()
         mock_server._send_eio_packet = mock.AsyncMock()
+
+        async def send_eio_packet_many(eio_sids, eio_pkts):
+            for eio_sid in eio_sids:
+                for eio_pkt in eio_pkts:
+                    await mock_server._send_eio_packet(eio_sid, eio_pkt)
+
+        mock_server._send_eio_packet_many = send_eio_packet_many
         mock_server.eio.generate_id = generate_id
         mock_server.packet_class = packet.Packet
         self.bm = async_manager.AsyncManager()
@@ -98,6 +107,49 @@ class TestAsyncManager:
         await self.bm.disconnect(sid1, '/foo')
         await self.bm.disconnect(sid2, '/foo')
         assert self.bm.rooms == {}
+        assert self.bm.sid_rooms == {}
+
+    async def test_disconnect_room_filter(self):
+        self.bm.server.disconnect = mock.AsyncMock()
+        sid1 = await self.bm.connect('123', '/foo')
+        sid2 = await self.bm.connect('456', '/foo')
+        await self.bm.connect('789', '/foo')
+        await self.bm.enter_room(sid1, '/foo', 'bar')
+        await self.bm.enter_room(sid2, '/foo', 'bar')
+        await self.bm.disconnect(None, '/foo', room_filter='bar')
+        assert self.bm.server.disconnect.await_args_list == [
+            mock.call(sid1, namespace='/foo', ignore_queue=True),
+            mock.call(sid2, namespace='/foo', ignore_queue=True)]
+
+    async def test_enter_leave_room_filter(self):
+        sid1 = await self.bm.connect('123', '/foo')
+        sid2 = await self.bm.connect('456', '/foo')
+        sid3 = await self.bm.connect('789', '/foo')
+        await self.bm.enter_room(sid1, '/foo', 'bar')
+        await self.bm.enter_room(sid2, '/foo', 'baz')
+        await self.bm.enter_room(None, '/foo', 'qux',
+                                 room_filter=['bar', 'baz'])
+        assert dict(self.bm.rooms['/foo']['qux']) == {sid1: '123',
+                                                      sid2: '456'}
+        await self.bm.enter_room(None, '/foo', 'qux', room_filter=sid3)
+        assert sid3 in self.bm.rooms['/foo']['qux']
+        await self.bm.leave_room(None, '/foo', 'qux', room_filter='bar')
+        assert dict(self.bm.rooms['/foo']['qux']) == {sid2: '456',
+                                                      sid3: '789'}
+        await self.bm.leave_room(None, '/foo', 'qux', room_filter='qux')
+        assert 'qux' not in self.bm.rooms['/foo']
+
+    async def test_room_filter_required(self):
+        sid = await self.bm.connect('123', '/foo')
+        with pytest.raises(ValueError):
+            await self.bm.enter_room(None, '/foo', 'bar')
+        with pytest.raises(ValueError):
+            await self.bm.leave_room(None, '/foo', None)
+        with pytest.raises(ValueError):
+            await self.bm.disconnect(None, '/foo')
+        assert 'bar' not in self.bm.rooms['/foo']
+        assert self.bm.is_connected(sid, '/foo')
+        self.bm.server.disconnect.assert_not_called()
 
     async def test_disconnect_with_callbacks(self):
         sid1 = await self.bm.connect('123', '/')
@@ -196,6 +248,26 @@ class TestAsyncManager:
         assert sid in r
         assert 'bar' in r
 
+    async def test_rooms_index(self):
+        sid1 = await self.bm.connect('123', '/foo')
+        sid2 = await self.bm.connect('456', '/foo')
+        await self.bm.enter_room(sid1, '/foo', 'bar')
+        await self.bm.enter_room(sid1, '/foo', 'baz')
+        await self.bm.enter_room(sid2, '/foo', 'baz')
+        assert self.bm.sid_rooms['/foo'] == {
+            sid1: {None: None, sid1: None, 'bar': None, 'baz': None},
+            sid2: {None: None, sid2: None, 'baz': None},
+        }
+        await self.bm.leave_room(sid1, '/foo', 'baz')
+        await self.bm.leave_room(sid1, '/foo', 'baz')
+        assert self.bm.get_rooms(sid1, '/foo') == [sid1, 'bar']
+        await self.bm.close_room('baz', '/foo')
+        assert self.bm.get_rooms(sid2, '/foo') == [sid2]
+        await self.bm.disconnect(sid1, '/foo')
+        assert sid1 not in self.bm.sid_rooms['/foo']
+        assert 'bar' not in self.bm.rooms['/foo']
+        assert self.bm.get_rooms(sid1, '/foo') == []
+
     async def test_emit_to_sid(self):
         sid = await self.bm.connect('123', '/foo')
         await self.bm.connect('456', '/foo')
@@ -312,6 +384,67 @@ class TestAsyncManager:
         pkt = self.bm.server._send_eio_packet.await_args_list[0][0][1]
         assert pkt.encode() == '42/foo,["my event",{"foo":"bar"}]'
 
+    async def test_emit_to_all_skip_set(self):
+        sid1 = await self.bm.connect('123', '/foo')
+        sid2 = await self.bm.connect('456', '/foo')
+        await self.bm.connect('789', '/foo')
+        await self.bm.emit(
+            'my event', {'foo': 'bar'}, namespace='/foo',
+            skip_sid={sid1, sid2}
+        )
+        assert self.bm.server._send_eio_packet.call_count == 1
+        assert self.bm.server._send_eio_packet.call_args_list[0][0][0] == '789'
+
+    async def test_emit_to_all_skip_rooms(self):
+        sid1 = await self.bm.connect('123', '/foo')
+        await self.bm.enter_room(sid1, '/foo', 'bar')
+        sid2 = await self.bm.connect('456', '/foo')
+        await self.bm.enter_room(sid2, '/foo', 'baz')
+        sid3 = await self.bm.connect('789', '/foo')
+        await self.bm.connect('abc', '/foo')
+        await self.bm.emit(
+            'my event', {'foo': 'bar'}, namespace='/foo', skip_rooms='bar'
+        )
+        assert self.bm.server._send_eio_packet.call_count == 3
+        await self.bm.emit(
+            'my event', {'foo': 'bar'}, namespace='/foo', skip_sid=sid3,
+            skip_rooms=['bar', 'baz', 'unknown']
+        )
+        assert self.bm.server._send_eio_packet.call_count == 4
+        assert self.bm.server._send_eio_packet.call_args_list[3][0][0] == 'abc'
+
+    async def test_emit_single_task(self):
+        sid1 = await self.bm.connect('123', '/foo')
+        await self.bm.connect('456', '/foo')
+        self.bm.server._send_eio_packet_many = mock.AsyncMock()
+        with mock.patch('asyncio.create_task') as create_task:
+            await self.bm.emit('my event', b'my binary data',
+                               namespace='/foo', skip_sid=sid1)
+        create_task.assert_not_called()
+        self.bm.server._send_eio_packet_many.assert_awaited_once()
+        eio_sids, pkts = self.bm.server._send_eio_packet_many.await_args[0]
+        assert eio_sids == ['456']
+        assert [pkt.encode() for pkt in pkts] == [
+            '451-/foo,["my event",{"_placeholder":true,"num":0}]',
+            b'my binary data',
+        ]
+
+    async def test_emit_with_cache_key(self):
+        sid1 = await self.bm.connect('123', '/foo')
+        sid2 = await self.bm.connect('456', '/foo')
+        await self.bm.emit('my event', {'foo': 'bar'}, namespace='/foo',
+                           to=sid1, cache_key='k')
+        await self.bm.emit('my event', {'foo': 'baz'}, namespace='/foo',
+                           to=sid2, cache_key='k')
+        await self.bm.emit('my event', {'foo': 'baz'}, namespace='/foo',
+                           to=sid2)
+        assert self.bm.packet_cache.hits == 1
+        assert self.bm.packet_cache.misses == 1
+        calls = self.bm.server._send_eio_packet.await_args_list
+        assert calls[0][0][1] is calls[1][0][1]
+        assert calls[1][0][1].encode() == '42/foo,["my event",{"foo":"bar"}]'
+        assert calls[2][0][1].encode() == '42/foo,["my event",{"foo":"baz"}]'
+
     async def test_emit_with_callback(self):
         sid = await self.bm.connect('123', '/foo')
         self.bm._generate_ack_id = mock.MagicMock()
@@ -380,3 +513,36 @@ class TestAsyncManager:
             == '123'
         pkt = self.bm.server._send_eio_packet.await_args_list[1][0][1]
         assert pkt.encode() == b'my binary data'
+
+    async def test_emit_binary_long_polling(self):
+        sid = await self.bm.connect('123', '/')
+        await self.bm.emit(
+            'my event', b'my binary data', namespace='/', room=sid
+        )
+        pkt = self.bm.server._send_eio_packet.await_args_list[1][0][1]
+        assert pkt.encode() == b'my binary data'
+        assert pkt.encode(b64=True) == 'bbXkgYmluYXJ5IGRhdGE='
+        assert pkt.encode() == b'my binary data'
+        pkt = self.bm.server._send_eio_packet.await_args_list[0][0][1]
+        assert pkt.encode(b64=True) == pkt.encode()
+
+    async def test_emit_memoryview(self):
+        sid = await self.bm.connect('123', '/')
+        data = b'my binary data'
+        await self.bm.emit(
+            'my event', memoryview(data), namespace='/', room=sid
+        )
+        assert self.bm.server._send_eio_packet.await_count == 2
+        pkt = self.bm.server._send_eio_packet.await_args_list[0][0][1]
+        assert pkt.encode() == '451-["my event",{"_placeholder":true,"num":0}]'
+        pkt = self.bm.server._send_eio_packet.await_args_list[1][0][1]
+        assert pkt.encode() is data
+
+    async def test_emit_not_binary(self):
+        sid = await self.bm.connect('123', '/')
+        await self.bm.emit(
+            'my event', ['foo', 'bar'], namespace='/', room=sid, binary=False
+        )
+        assert self.bm.server._send_eio_packet.await_count == 1
+        pkt = self.bm.server._send_eio_packet.await_args_list[0][0][1]
+        assert pkt.encode() == '42["my event",["foo","bar"]]'
@@ -103,6 +103,9 @@ class TestAsyncNamespace:
             to='room',
             room=None,
             skip_sid='skip',
+            skip_rooms=None,
+            cache_key=None,
+            binary=None,
             namespace='/foo',
             callback='cb',
             ignore_queue=False,
@@ -122,6 +125,9 @@ class TestAsyncNamespace:
             to=None,
             room='room',
             skip_sid='skip',
+            skip_rooms=None,
+            cache_key=None,
+            binary=None,
             namespace='/bar',
             callback='cb',
             ignore_queue=True,
@@ -138,6 +144,7 @@ class TestAsyncNamespace:
             to='room',
             room=None,
             skip_sid='skip',
+            skip_rooms=None,
             namespace='/foo',
             callback='cb',
             ignore_queue=False,
@@ -155,6 +162,7 @@ class TestAsyncNamespace:
             to=None,
             room='room',
             skip_sid='skip',
+            skip_rooms=None,
             namespace='/bar',
             callback='cb',
             ignore_queue=True,
@@ -1,8 +1,10 @@
 import asyncio
 import functools
 import json
+import time
 from unittest import mock
 
+import msgpack
 import pytest
 
 from engineio.packet import Packet as EIOPacket
@@ -26,6 +28,13 @@ class TestAsyncPubSubManager:
         mock_server.packet_class = packet.Packet
         mock_server._send_packet = mock.AsyncMock()
         mock_server._send_eio_packet = mock.AsyncMock()
+
+        async def send_eio_packet_many(eio_sids, eio_pkts):
+            for eio_sid in eio_sids:
+                for eio_pkt in eio_pkts:
+                    await mock_server._send_eio_packet(eio_sid, eio_pkt)
+
+        mock_server._send_eio_packet_many = send_eio_packet_many
         mock_server.disconnect = mock.AsyncMock()
         self.pm = async_pubsub_manager.AsyncPubSubManager()
         self.pm._publish = mock.AsyncMock()
@@ -53,6 +62,90 @@ class TestAsyncPubSubManager:
         assert len(pm.host_id) == 32
         assert pm.server.start_background_task.call_count == 0
 
+    def test_invalid_serializer(self):
+        with pytest.raises(ValueError):
+            async_pubsub_manager.AsyncPubSubManager(serializer='foo')
+
+    def test_msgpack_serializer_not_installed(self):
+        with mock.patch.object(async_pubsub_manager, 'msgpack', None):
+            with pytest.raises(RuntimeError):
+                async_pubsub_manager.AsyncPubSubManager(serializer='msgpack')
+
+    async def test_batch_publish(self):
+        self.pm.batch_size = 2
+        await self.pm.emit('foo', 'bar')
+        self.pm._publish.assert_not_awaited()
+        assert self.pm.batch_task is not None
+        await self.pm.enter_room('456', '/', 'baz')
+        self.pm._publish.assert_awaited_once_with({
+            'method': 'batch',
+            'messages': [
+                {
+                    'method': 'emit',
+                    'event': 'foo',
+                    'binary': False,
+                    'data': ['bar'],
+                    'namespace': '/',
+                    'room': None,
+                    'skip_sid': None,
+                    'skip_rooms': None,
+                    'cache_key': None,
+                    'callback': None,
+                    'host_id': '123456',
+                },
+                {
+                    'method': 'enter_room',
+                    'sid': '456',
+                    'room': 'baz',
+                    'namespace': '/',
+                    'host_id': '123456',
+                },
+            ],
+            'host_id': '123456',
+        })
+        assert self.pm.batch == []
+
+        # the timer of the batch that was already published does nothing
+        await self.pm.batch_task
+        assert self.pm._publish.await_count == 1
+
+    async def test_batch_publish_interval(self):
+        self.pm.batch_size = 10
+        self.pm.batch_interval = 0.01
+        await self.pm.close_room('baz', '/')
+        await self.pm.close_room('qux', '/')
+        self.pm._publish.assert_not_awaited()
+        await self.pm.batch_task
+        self.pm._publish.assert_awaited_once_with({
+            'method': 'batch',
+            'messages': [
+                {'method': 'close_room', 'room': 'baz', 'namespace': '/',
+                 'host_id': '123456'},
+                {'method': 'close_room', 'room': 'qux', 'namespace': '/',
+                 'host_id': '123456'},
+            ],
+            'host_id': '123456',
+        })
+        await self.pm.close_room('baz', '/')
+        await self.pm.batch_task
+        self.pm._publish.assert_awaited_with({
+            'method': 'close_room', 'room': 'baz', 'namespace': '/',
+            'host_id': '123456'})
+
+    async def test_batch_publish_error(self):
+        self.pm.batch_size = 2
+        self.pm._publish.side_effect = RuntimeError('foo')
+        logger = mock.MagicMock()
+        self.pm._get_logger = mock.MagicMock(return_value=logger)
+        await self.pm.close_room('baz', '/')
+        await self.pm.close_room('qux', '/')
+        logger.error.assert_called_once_with(
+            'Cannot publish, %d messages discarded', 2,
+            extra={'exception': 'foo'})
+        assert self.pm.batch == []
+        await self.pm._publish_batch()
+        assert self.pm._publish.await_count == 1
+
     async def test_emit(self):
         await self.pm.emit('foo', 'bar')
         self.pm._publish.assert_awaited_once_with(
@@ -64,6 +157,8 @@ class TestAsyncPubSubManager:
                 'namespace': '/',
                 'room': None,
                 'skip_sid': None,
+                'skip_rooms': None,
+                'cache_key': None,
                 'callback': None,
                 'host_id': '123456',
             }
@@ -80,6 +175,8 @@ class TestAsyncPubSubManager:
                 'namespace': '/',
                 'room': None,
                 'skip_sid': None,
+                'skip_rooms': None,
+                'cache_key': None,
                 'callback': None,
                 'host_id': '123456',
             }
@@ -94,11 +191,56 @@ class TestAsyncPubSubManager:
                 'namespace': '/',
                 'room': None,
                 'skip_sid': None,
+                'skip_rooms': None,
+                'cache_key': None,
                 'callback': None,
                 'host_id': '123456',
             }
         )
 
+    async def test_emit_packet_passthrough(self):
+        self.pm.packet_passthrough = True
+        await self.pm.emit('foo', 'bar')
+        self.pm._publish.assert_awaited_once_with(
+            {
+                'method': 'emit',
+                'event': 'foo',
+                'packets': ['2["foo","bar"]'],
+                'namespace': '/',
+                'room': None,
+                'skip_sid': None,
+                'skip_rooms': None,
+                'cache_key': None,
+                'callback': None,
+                'host_id': '123456',
+            }
+        )
+        await self.pm.emit('foo', b'bar', room='baz')
+        self.pm._publish.assert_awaited_with(
+            {
+                'method': 'emit',
+                'event': 'foo',
+                'packets': ['51-["foo",{"_placeholder":true,"num":0}]',
+                            b'bar'],
+                'namespace': '/',
+                'room': 'baz',
+                'skip_sid': None,
+                'skip_rooms': None,
+                'cache_key': None,
+                'callback': None,
+                'host_id': '123456',
+            }
+        )
+
+    async def test_emit_packet_passthrough_with_callback(self):
+        self.pm.packet_passthrough = True
+        with mock.patch.object(
+            self.pm, '_generate_ack_id', return_value='123'
+        ):
+            await self.pm.emit('foo', 'bar', room='baz', callback='cb')
+            assert 'packets' not in self.pm._publish.call_args[0][0]
+            assert self.pm._publish.call_args[0][0]['data'] == ['bar']
+
     async def test_emit_bytearray(self):
         await self.pm.emit('foo', bytearray(b'bar'))
         self.pm._publish.assert_awaited_once_with(
@@ -110,6 +252,8 @@ class TestAsyncPubSubManager:
                 'namespace': '/',
                 'room': None,
                 'skip_sid': None,
+                'skip_rooms': None,
+                'cache_key': None,
                 'callback': None,
                 'host_id': '123456',
             }
@@ -124,6 +268,63 @@ class TestAsyncPubSubManager:
                 'namespace': '/',
                 'room': None,
                 'skip_sid': None,
+                'skip_rooms': None,
+                'cache_key': None,
+                'callback': None,
+                'host_id': '123456',
+            }
+        )
+
+    async def test_emit_memoryview(self):
+        await self.pm.emit('foo', memoryview(b'foobar')[3:])
+        self.pm._publish.assert_awaited_once_with(
+            {
+                'method': 'emit',
+                'event': 'foo',
+                'binary': True,
+                'data': [[{'_placeholder': True, 'num': 0}], 'YmFy'],
+                'namespace': '/',
+                'room': None,
+                'skip_sid': None,
+                'skip_rooms': None,
+                'cache_key': None,
+                'callback': None,
+                'host_id': '123456',
+            }
+        )
+
+    async def test_emit_binary_msgpack(self):
+        self.pm.serializer = 'msgpack'
+        await self.pm.emit('foo', {'foo': b'bar'})
+        self.pm._publish.assert_awaited_once_with(
+            {
+                'method': 'emit',
+                'event': 'foo',
+                'binary': True,
+                'data': [[{'foo': {'_placeholder': True, 'num': 0}}], b'bar'],
+                'namespace': '/',
+                'room': None,
+                'skip_sid': None,
+                'skip_rooms': None,
+                'cache_key': None,
+                'callback': None,
+                'host_id': '123456',
+            }
+        )
+
+    async def test_emit_not_binary(self):
+        await self.pm.emit('foo', ['bar'], binary=False)
+        self.pm._publish.assert_awaited_once_with(
+            {
+                'method': 'emit',
+                'event': 'foo',
+                'binary': False,
+                'data': [['bar']],
+                'namespace': '/',
+                'room': None,
+                'skip_sid': None,
+                'skip_rooms': None,
+                'cache_key': None,
                 'callback': None,
                 'host_id': '123456',
             }
@@ -140,6 +341,8 @@ class TestAsyncPubSubManager:
                 'namespace': '/',
                 'room': None,
                 'skip_sid': None,
+                'skip_rooms': None,
+                'cache_key': None,
                 'callback': None,
                 'host_id': '123456',
             }
@@ -156,6 +359,8 @@ class TestAsyncPubSubManager:
                 'namespace': '/',
                 'room': None,
                 'skip_sid': None,
+                'skip_rooms': None,
+                'cache_key': None,
                 'callback': None,
                 'host_id': '123456',
             }
@@ -172,6 +377,8 @@ class TestAsyncPubSubManager:
                 'namespace': '/',
                 'room': None,
                 'skip_sid': None,
+                'skip_rooms': None,
+                'cache_key': None,
                 'callback': None,
                 'host_id': '123456',
             }
@@ -188,6 +395,8 @@ class TestAsyncPubSubManager:
                 'namespace': '/',
                 'room': None,
                 'skip_sid': None,
+                'skip_rooms': None,
+                'cache_key': None,
                 'callback': None,
                 'host_id': '123456',
             }
@@ -204,6 +413,8 @@ class TestAsyncPubSubManager:
                 'namespace': '/',
                 'room': None,
                 'skip_sid': None,
+                'skip_rooms': None,
+                'cache_key': None,
                 'callback': None,
                 'host_id': '123456',
             }
@@ -221,6 +432,8 @@ class TestAsyncPubSubManager:
                 'namespace': '/',
                 'room': sid,
                 'skip_sid': None,
+                'skip_rooms': None,
+                'cache_key': None,
                 'callback': None,
                 'host_id': '123456',
             }
@@ -237,6 +450,8 @@ class TestAsyncPubSubManager:
                 'namespace': '/baz',
                 'room': None,
                 'skip_sid': None,
+                'skip_rooms': None,
+                'cache_key': None,
                 'callback': None,
                 'host_id': '123456',
             }
@@ -253,6 +468,8 @@ class TestAsyncPubSubManager:
                 'namespace': '/',
                 'room': 'baz',
                 'skip_sid': None,
+                'skip_rooms': None,
+                'cache_key': None,
                 'callback': None,
                 'host_id': '123456',
             }
@@ -269,6 +486,26 @@ class TestAsyncPubSubManager:
                 'namespace': '/',
                 'room': None,
                 'skip_sid': 'baz',
+                'skip_rooms': None,
+                'cache_key': None,
+                'callback': None,
+                'host_id': '123456',
+            }
+        )
+
+    async def test_emit_with_skip_rooms(self):
+        await self.pm.emit('foo', 'bar', skip_rooms=['baz'])
+        self.pm._publish.assert_awaited_once_with(
+            {
+                'method': 'emit',
+                'event': 'foo',
+                'binary': False,
+                'data': ['bar'],
+                'namespace': '/',
+                'room': None,
+                'skip_sid': None,
+                'skip_rooms': ['baz'],
+                'cache_key': None,
                 'callback': None,
                 'host_id': '123456',
             }
@@ -288,6 +525,8 @@ class TestAsyncPubSubManager:
                     'namespace': '/',
                     'room': 'baz',
                     'skip_sid': None,
+                    'skip_rooms': None,
+                    'cache_key': None,
                     'callback': ('baz', '/', '123'),
                     'host_id': '123456',
                 }
@@ -333,6 +572,24 @@ class TestAsyncPubSubManager:
              'host_id': '123456'}
         )
 
+    async def test_disconnect_room_filter(self):
+        sid = await self.pm.connect('123', '/')
+        await self.pm.enter_room(sid, '/', 'foo')
+        await self.pm.connect('456', '/')
+        await self.pm.disconnect(None, '/', room_filter='foo')
+        self.pm.server.disconnect.assert_awaited_once_with(
+            None, namespace='/', ignore_queue=True, room_filter='foo')
+        self.pm._publish.assert_awaited_once_with(
+            {'method': 'disconnect', 'sid': None, 'namespace': '/',
+             'room_filter': 'foo', 'host_id': '123456'}
+        )
+
+        await self.pm.disconnect(None, '/', ignore_queue=True,
+                                 room_filter='foo')
+        self.pm.server.disconnect.assert_awaited_with(
+            sid, namespace='/', ignore_queue=True)
+        assert self.pm._publish.await_count == 1
+
     async def test_disconnect_ignore_queue(self):
         sid = await self.pm.connect('123', '/')
         self.pm.pre_disconnect(sid, '/')
@@ -340,6 +597,111 @@ class TestAsyncPubSubManager:
         self.pm._publish.assert_not_awaited()
         assert self.pm.is_connected(sid, '/') is False
 
+    async def test_sid_directory_connect_disconnect(self):
+        self.pm.sid_directory = True
+        sid = await self.pm.connect('123', '/')
+        self.pm._publish.assert_awaited_once_with(
+            {'method': 'directory_add', 'sid': sid, 'namespace': '/',
+             'host_id': '123456'}
+        )
+        self.pm._publish.reset_mock()
+        self.pm.pre_disconnect(sid, '/')
+        await self.pm.disconnect(sid, '/', ignore_queue=True)
+        self.pm._publish.assert_awaited_once_with(
+            {'method': 'directory_remove', 'sid': sid, 'namespace': '/',
+             'host_id': '123456'}
+        )
+        self.pm._publish.reset_mock()
+        await self.pm.disconnect(sid, '/', ignore_queue=True)
+        self.pm._publish.assert_not_awaited()
+
+    async def test_emit_sid_directory_local(self):
+        self.pm.sid_directory = True
+        sid = await self.pm.connect('123', '/')
+        self.pm._publish.reset_mock()
+        await self.pm.emit('foo', 'bar', to=sid)
+        self.pm._publish.assert_not_awaited()
+        assert self.pm.server._send_eio_packet.call_count == 1
+        assert self.pm.server._send_eio_packet.call_args_list[0][0][0] == '123'
+
+    async def test_emit_sid_directory_remote(self):
+        self.pm.sid_directory = True
+        self.pm._handle_emit = mock.AsyncMock()
+        self.pm._handle_directory_add({'method': 'directory_add',
+                                       'sid': '456', 'namespace': '/',
+                                       'host_id': 'x'})
+        await self.pm.emit('foo', 'bar', to='456')
+        self.pm._handle_emit.assert_not_awaited()
+        self.pm._publish.assert_awaited_once_with(
+            {'method': 'emit', 'event': 'foo', 'data': ['bar'],
+             'binary': False, 'namespace': '/', 'room': '456',
+             'skip_sid': None, 'skip_rooms': None, 'callback': None,
+             'cache_key': None, 'host_id': '123456', 'to_host': 'x'}
+        )
+
+        self.pm._publish.reset_mock()
+        self.pm._handle_directory_remove({'method': 'directory_remove',
+                                          'sid': '456', 'namespace': '/',
+                                          'host_id': 'x'})
+        assert self.pm.sid_hosts == {}
+        await self.pm.emit('foo', 'bar', to='456')
+        assert self.pm._handle_emit.call_count == 1
+        assert 'to_host' not in self.pm._publish.call_args[0][0]
+
+    def test_sid_directory_init(self):
+        pm = async_pubsub_manager.AsyncPubSubManager(sid_directory=True)
+        pm.set_server(mock.MagicMock())
+        pm.initialize()
+        pm.server.start_background_task.assert_any_call(pm._heartbeat_thread)
+
+    async def test_sid_directory_host_crash(self):
+        self.pm.sid_directory = True
+        self.pm._handle_emit = mock.AsyncMock()
+        self.pm._handle_directory_add({'method': 'directory_add',
+                                       'sid': '456', 'namespace': '/',
+                                       'host_id': 'x'})
+        self.pm._handle_directory_add({'method': 'directory_add',
+                                       'sid': '789', 'namespace': '/',
+                                       'host_id': 'y'})
+
+        # host x crashes, while host y keeps sending heartbeats
+        self.pm.server.sleep = mock.AsyncMock(
+            side_effect=asyncio.CancelledError)
+        with mock.patch.object(async_pubsub_manager.time, 'time',
+                               return_value=time.time() + 61):
+            self.pm._handle_host_alive({'method': 'host_alive',
+                                        'host_id': 'y'})
+            with pytest.raises(asyncio.CancelledError):
+                await self.pm._heartbeat_thread()
+        self.pm._publish.assert_awaited_once_with(
+            {'method': 'host_alive', 'host_id': '123456'})
+        self.pm.server.sleep.assert_awaited_once_with(
+            self.pm.host_heartbeat_interval)
+        assert self.pm.sid_hosts == {'789': 'y'}
+        assert list(self.pm.host_last_seen) == ['y']
+
+        # emits to the clients of the crashed host go to all the hosts
+        self.pm._publish.reset_mock()
+        await self.pm.emit('foo', 'bar', to='456')
+        assert self.pm._handle_emit.await_count == 1
+        assert 'to_host' not in self.pm._publish.call_args[0][0]
+
+    async def test_sid_directory_heartbeat_error(self):
+        self.pm._publish.side_effect = RuntimeError
+        self.pm.server.sleep = mock.AsyncMock(
+            side_effect=asyncio.CancelledError)
+        with mock.patch.object(self.pm, '_get_logger') as get_logger:
+            with pytest.raises(asyncio.CancelledError):
+                await self.pm._heartbeat_thread()
+        get_logger().exception.assert_called_once_with(
+            'Unexpected error in the heartbeat task')
+
+    async def test_emit_sid_directory_room(self):
+        self.pm.sid_directory = True
+        self.pm.sid_hosts['456'] = 'x'
+        await self.pm.emit('foo', 'bar', to=['456'])
+        assert 'to_host' not in self.pm._publish.call_args[0][0]
+
     async def test_enter_room(self):
         sid = await self.pm.connect('123', '/')
         await self.pm.enter_room(sid, '/', 'foo')
@@ -361,6 +723,39 @@ class TestAsyncPubSubManager:
              'namespace': '/', 'host_id': '123456'}
         )
 
+    async def test_enter_leave_room_filter(self):
+        sid1 = await self.pm.connect('123', '/')
+        sid2 = await self.pm.connect('456', '/')
+        await self.pm.enter_room(sid1, '/', 'foo')
+        await self.pm.enter_room(None, '/', 'bar', room_filter='foo')
+        assert dict(self.pm.rooms['/']['bar']) == {sid1: '123'}
+        self.pm._publish.assert_awaited_once_with(
+            {'method': 'enter_room', 'sid': None, 'room': 'bar',
+             'room_filter': 'foo', 'namespace': '/', 'host_id': '123456'}
+        )
+        await self.pm.leave_room(None, '/', 'foo', room_filter=[sid1, sid2])
+        assert 'foo' not in self.pm.rooms['/']
+        self.pm._publish.assert_awaited_with(
+            {'method': 'leave_room', 'sid': None, 'room': 'foo',
+             'room_filter': [sid1, sid2], 'namespace': '/',
+             'host_id': '123456'}
+        )
+        assert sid2 not in self.pm.rooms['/']['bar']
+
+    async def test_room_filter_required(self):
+        await self.pm.connect('123', '/')
+        with pytest.raises(ValueError):
+            await self.pm.enter_room(None, '/', 'foo')
+        with pytest.raises(ValueError):
+            await self.pm.leave_room(None, '/', 'foo')
+        with pytest.raises(ValueError):
+            await self.pm.disconnect(None, '/')
+        with pytest.raises(ValueError):
+            await self.pm.disconnect(None, '/', ignore_queue=True)
+        assert 'foo' not in self.pm.rooms['/']
+        self.pm.server.disconnect.assert_not_awaited()
+        self.pm._publish.assert_not_awaited()
+
     async def test_close_room(self):
         await self.pm.close_room('foo')
         self.pm._publish.assert_awaited_once_with(
@@ -386,6 +781,9 @@ class TestAsyncPubSubManager:
                 namespace=None,
                 room=None,
                 skip_sid=None,
+                skip_rooms=None,
+                cache_key=None,
+                binary=None,
                 callback=None,
             )
 
@@ -400,6 +798,9 @@ class TestAsyncPubSubManager:
                 namespace=None,
                 room=None,
                 skip_sid=None,
+                skip_rooms=None,
+                cache_key=None,
+                binary=None,
                 callback=None,
             )
 
@@ -418,6 +819,9 @@ class TestAsyncPubSubManager:
                 namespace=None,
                 room=None,
                 skip_sid=None,
+                skip_rooms=None,
+                cache_key=None,
+                binary=True,
                 callback=None,
             )
             await self.pm._handle_emit({
@@ -431,9 +835,48 @@ class TestAsyncPubSubManager:
                 namespace=None,
                 room=None,
                 skip_sid=None,
+                skip_rooms=None,
+                cache_key=None,
+                binary=True,
                 callback=None,
             )
 
+    async def test_handle_emit_packets(self):
+        with mock.patch.object(
+            async_manager.AsyncManager, 'emit'
+        ) as super_emit:
+            await self.pm._handle_emit({
+                'event': 'foo',
+                'packets': ['51-["foo",{"_placeholder":true,"num":0}]',
+                            'bYmFy'],
+                'namespace': '/',
+                'room': 'baz',
+            })
+            super_emit.assert_awaited_once_with(
+                'foo',
+                None,
+                namespace='/',
+                room='baz',
+                skip_sid=None,
+                skip_rooms=None,
+                cache_key=None,
+                packets=['51-["foo",{"_placeholder":true,"num":0}]',
+                         b'bar'],
+            )
+
+    async def test_handle_emit_packets_delivery(self):
+        sid = await self.pm.connect('123', '/')
+        await self.pm._handle_emit({
+            'event': 'foo',
+            'packets': ['2["foo","bar"]'],
+            'namespace': '/',
+            'room': sid,
+        })
+        assert self.pm.server._send_eio_packet.call_count == 1
+        assert self.pm.server._send_eio_packet.call_args_list[0][0][0] == '123'
+        pkt = self.pm.server._send_eio_packet.call_args_list[0][0][1]
+        assert pkt.encode() == '42["foo","bar"]'
+
     async def test_handle_legacy_emit_binary(self):
         with mock.patch.object(
             async_manager.AsyncManager, 'emit'
@@ -449,6 +892,9 @@ class TestAsyncPubSubManager:
                 namespace=None,
                 room=None,
                 skip_sid=None,
+                skip_rooms=None,
+                cache_key=None,
+                binary=True,
                 callback=None,
             )
             await self.pm._handle_emit({
@@ -462,6 +908,30 @@ class TestAsyncPubSubManager:
                 namespace=None,
                 room=None,
                 skip_sid=None,
+                skip_rooms=None,
+                cache_key=None,
+                binary=True,
+                callback=None,
+            )
+
+    async def test_handle_emit_binary_msgpack(self):
+        with mock.patch.object(
+            async_manager.AsyncManager, 'emit'
+        ) as super_emit:
+            await self.pm._handle_emit({
+                'event': 'foo',
+                'binary': True,
+                'data': [[{'_placeholder': True, 'num': 0}], b'bar'],
+            })
+            super_emit.assert_awaited_once_with(
+                'foo',
+                b'bar',
+                namespace=None,
+                room=None,
+                skip_sid=None,
+                skip_rooms=None,
+                cache_key=None,
+                binary=True,
                 callback=None,
             )
 
@@ -476,6 +946,9 @@ class TestAsyncPubSubManager:
                 namespace=None,
                 room=None,
                 skip_sid=None,
+                skip_rooms=None,
+                cache_key=None,
+                binary=None,
                 callback=None,
             )
             await self.pm._handle_emit({
@@ -491,6 +964,9 @@ class TestAsyncPubSubManager:
                 namespace=None,
                 room=None,
                 skip_sid=None,
+                skip_rooms=None,
+                cache_key=None,
+                binary=True,
                 callback=None,
             )
 
@@ -505,6 +981,9 @@ class TestAsyncPubSubManager:
                 namespace=None,
                 room=None,
                 skip_sid=None,
+                skip_rooms=None,
+                cache_key=None,
+                binary=None,
                 callback=None,
             )
 
@@ -519,6 +998,9 @@ class TestAsyncPubSubManager:
                 namespace=None,
                 room=None,
                 skip_sid=None,
+                skip_rooms=None,
+                cache_key=None,
+                binary=None,
                 callback=None,
             )
             await self.pm._handle_emit({
@@ -534,6 +1016,9 @@ class TestAsyncPubSubManager:
                 namespace=None,
                 room=None,
                 skip_sid=None,
+                skip_rooms=None,
+                cache_key=None,
+                binary=True,
                 callback=None,
             )
 
@@ -550,6 +1035,9 @@ class TestAsyncPubSubManager:
                 namespace='/baz',
                 room=None,
                 skip_sid=None,
+                skip_rooms=None,
+                cache_key=None,
+                binary=None,
                 callback=None,
             )
 
@@ -566,6 +1054,9 @@ class TestAsyncPubSubManager:
                 namespace=None,
                 room='baz',
                 skip_sid=None,
+                skip_rooms=None,
+                cache_key=None,
+                binary=None,
                 callback=None,
             )
 
@@ -582,6 +1073,28 @@ class TestAsyncPubSubManager:
                 namespace=None,
                 room=None,
                 skip_sid='123',
+                skip_rooms=None,
+                cache_key=None,
+                binary=None,
+                callback=None,
+            )
+
+    async def test_handle_emit_with_skip_rooms(self):
+        with mock.patch.object(
+            async_manager.AsyncManager, 'emit'
+        ) as super_emit:
+            await self.pm._handle_emit(
+                {'event': 'foo', 'data': 'bar', 'skip_rooms': ['baz']}
+            )
+            super_emit.assert_awaited_once_with(
+                'foo',
+                'bar',
+                namespace=None,
+                room=None,
+                skip_sid=None,
+                skip_rooms=['baz'],
+                cache_key=None,
+                binary=None,
                 callback=None,
             )
 
@@ -713,6 +1226,29 @@ class TestAsyncPubSubManager:
             sid='123', namespace='/foo', ignore_queue=True
         )
 
+    async def test_handle_disconnect_room_filter(self):
+        await self.pm._handle_disconnect(
+            {'method': 'disconnect', 'sid': None, 'namespace': '/foo',
+             'room_filter': 'bar'}
+        )
+        self.pm.server.disconnect.assert_awaited_once_with(
+            None, namespace='/foo', ignore_queue=True, room_filter='bar'
+        )
+
+    async def test_handle_enter_leave_room_filter(self):
+        sid1 = await self.pm.connect('123', '/')
+        sid2 = await self.pm.connect('456', '/')
+        await self.pm.enter_room(sid2, '/', 'foo')
+        await self.pm._handle_enter_room({
+            'method': 'enter_room', 'sid': None, 'namespace': '/',
+            'room': 'bar', 'room_filter': [sid1, 'foo']})
+        assert dict(self.pm.rooms['/']['bar']) == {sid1: '123', sid2: '456'}
+        await self.pm._handle_leave_room({
+            'method': 'leave_room', 'sid': None, 'namespace': '/',
+            'room': 'bar', 'room_filter': 'foo'})
+        assert dict(self.pm.rooms['/']['bar']) == {sid1: '123'}
+        self.pm._publish.assert_not_awaited()
+
     async def test_handle_enter_room(self):
         sid = await self.pm.connect('123', '/')
         with mock.patch.object(
@@ -849,6 +1385,183 @@ class TestAsyncPubSubManager:
             {'method': 'emit', 'value': 'bar', 'host_id': 'x'}
         )
 
+    async def test_background_thread_batch(self):
+        self.pm._handle_emit = mock.AsyncMock()
+        self.pm._handle_callback = mock.AsyncMock()
+        host_id = self.pm.host_id
+
+        async def messages():
+            yield {'method': 'batch', 'host_id': 'x', 'messages': [
+                {'method': 'emit', 'value': 'foo', 'host_id': 'x'},
+                {'method': 'callback', 'value': 'bar', 'host_id': host_id},
+            ]}
+            yield {'method': 'batch', 'host_id': 'x'}
+
+        self.pm._listen = messages
+        await self.pm._thread()
+
+        self.pm._handle_emit.assert_awaited_once_with(
+            {'method': 'emit', 'value': 'foo', 'host_id': 'x'}
+        )
+        self.pm._handle_callback.assert_awaited_once_with(
+            {'method': 'callback', 'value': 'bar', 'host_id': host_id}
+        )
+
+    async def test_background_thread_sid_directory(self):
+        self.pm._handle_emit = mock.AsyncMock()
+        host_id = self.pm.host_id
+
+        async def messages():
+            yield {'method': 'directory_add', 'sid': '456', 'namespace': '/',
+                   'host_id': 'x'}
+            yield {'method': 'emit', 'value': 'foo', 'host_id': 'x',
+                   'to_host': host_id}
+            yield {'method': 'emit', 'value': 'bar', 'host_id': 'x',
+                   'to_host': 'y'}
+            yield {'method': 'directory_add', 'sid': '789', 'namespace': '/',
+                   'host_id': 'x'}
+            yield {'method': 'directory_remove', 'sid': '456',
+                   'namespace': '/', 'host_id': 'x'}
+            yield {'method': 'host_alive', 'host_id': 'z'}
+
+        self.pm._listen = messages
+        await self.pm._thread()
+
+        self.pm._handle_emit.assert_awaited_once_with(
+            {'method': 'emit', 'value': 'foo', 'host_id': 'x',
+             'to_host': host_id}
+        )
+        assert self.pm.sid_hosts == {'789': 'x'}
+        assert set(self.pm.host_last_seen) == {'x', 'z'}
+
+    async def test_background_thread_msgpack(self):
+        self.pm._handle_emit = mock.AsyncMock()
+
+        async def messages():
+            yield msgpack.packb({'method': 'emit', 'value': 'foo',
+                                 'host_id': 'x'})
+            yield b'{"method": "emit", "value": "bar", "host_id": "x"}'
+            yield b'\x81bad data'
+
+        self.pm._listen = messages
+        await self.pm._thread()
+
+        self.pm._handle_emit.assert_any_await(
+            {'method': 'emit', 'value': 'foo', 'host_id': 'x'}
+        )
+        self.pm._handle_emit.assert_awaited_with(
+            {'method': 'emit', 'value': 'bar', 'host_id': 'x'}
+        )
+        assert self.pm._handle_emit.await_count == 2
+
+    def test_encode_message(self):
+        message = {'method': 'emit', 'binary': True,
+                   'data': [[{'_placeholder': True, 'num': 0}], b'bar']}
+        self.pm.serializer = 'msgpack'
+        assert self.pm._encode_message(message) == msgpack.packb(message)
+        message['data'][0].append(object())
+        self.pm.json = mock.MagicMock()
+        self.pm.json.dumps.return_value = 'foo'
+        assert self.pm._encode_message(message) == 'foo'
+        assert self.pm.json.dumps.call_args[0][0]['data'][1] == 'YmFy'
+        self.pm.serializer = 'default'
+        self.pm._encode_message({'method': 'emit'})
+        self.pm.json.dumps.assert_called_with({'method': 'emit'})
+
+    def test_decode_message(self):
+        message = {'method': 'emit', 'data': [b'bar']}
+        assert self.pm._decode_message(msgpack.packb(message)) == message
+        assert self.pm._decode_message('{"method": "emit"}') == {
+            'method': 'emit'}
+        assert self.pm._decode_message(b'{"method": "emit"}') == {
+            'method': 'emit'}
+
+    def test_encode_message_packets(self):
+        message = {'method': 'emit', 'packets': ['51-["foo"]', b'bar']}
+        assert json.loads(self.pm._encode_message(message)) == {
+            'method': 'emit', 'packets': ['51-["foo"]', 'bYmFy']}
+        self.pm.serializer = 'msgpack'
+        assert self.pm._encode_message(message) == msgpack.packb(message)
+
+    def test_encode_message_envelope(self):
+        self.pm.envelope = True
+        message = {'method': 'emit', 'event': 'foo', 'data': ['bar'],
+                   'namespace': '/', 'room': 'baz', 'host_id': 'x'}
+        encoded = self.pm._encode_message(message)
+        payload = json.dumps(message).encode()
+        assert encoded.startswith(b'\x01')
+        header, data = encoded[1:].split(b'\n', 1)
+        assert json.loads(header) == {
+            'method': 'emit', 'host_id': 'x', 'to_host': None,
+            'namespace': '/', 'room': 'baz', 'size': len(payload)}
+        assert data == payload
+
+        self.pm.serializer = 'msgpack'
+        encoded = self.pm._encode_message(message)
+        assert encoded.endswith(b'\n' + msgpack.packb(message))
+
+        message = {'method': 'disconnect', 'sid': '123', 'namespace': '/'}
+        assert self.pm._encode_message(message) == msgpack.packb(message)
+
+    async def test_decode_message_envelope(self):
+        sid = await self.pm.connect('123', '/')
+        sender = async_pubsub_manager.AsyncPubSubManager(
+            envelope=True)
+        sender.host_id = 'x'
+        for serializer in ['default', 'msgpack']:
+            sender.serializer = serializer
+            for room, to_host, local in [
+                    (None, None, True), (sid, None, True),
+                    ([sid, 'foo'], None, True), ('foo', None, False),
+                    (['foo'], None, False), (None, '123456', True),
+                    (None, 'y', False)]:
+                message = {'method': 'emit', 'event': 'foo', 'data': ['bar'],
+                           'namespace': '/', 'room': room, 'host_id': 'x',
+                           'to_host': to_host}
+                encoded = sender._encode_message(message)
+                if local:
+                    assert self.pm._decode_message(encoded) == message
+                else:
+                    assert self.pm._decode_message(encoded) is None
+            message = {'method': 'emit', 'namespace': '/foo', 'room': None,
+                       'host_id': 'x'}
+            assert self.pm._decode_message(
+                sender._encode_message(message)) is None
+            message = {'method': 'emit', 'namespace': '/', 'room': None,
+                       'host_id': '123456'}
+            assert self.pm._decode_message(
+                sender._encode_message(message)) is None
+
+        sender.serializer = 'default'
+        message = {'method': 'emit', 'namespace': '/', 'room': None,
+                   'host_id': 'x'}
+        encoded = sender._encode_message(message)
+        assert self.pm._decode_message(encoded.decode()) == message
+        with pytest.raises(ValueError):
+            self.pm._decode_message(encoded[:-1])
+
+    async def test_batch_envelope(self):
+        sid = await self.pm.connect('123', '/')
+        sender = async_pubsub_manager.AsyncPubSubManager(envelope=True)
+        sender.host_id = 'x'
+        local = {'method': 'emit', 'event': 'foo', 'data': ['bar'],
+                 'namespace': '/', 'room': sid, 'host_id': 'x'}
+        remote = {'method': 'emit', 'event': 'foo', 'data': ['baz'],
+                  'namespace': '/', 'room': 'foo', 'host_id': 'x'}
+        disconnect = {'method': 'disconnect', 'sid': sid, 'namespace': '/',
+                      'host_id': 'x'}
+        for serializer in ['default', 'msgpack']:
+            sender.serializer = serializer
+            encoded = sender._encode_message(
+                sender._batch_message([local, remote, disconnect]))
+            assert encoded.startswith(b'\x02')
+            assert json.loads(encoded[1:].split(b'\n', 1)[0])['method'] == \
+                'batch'
+            assert self.pm._decode_message(encoded) == {
+                'method': 'batch', 'messages': [local, disconnect]}
+        with pytest.raises(ValueError):
+            self.pm._decode_message(encoded[:-1])
+
     def test_custom_json(self):
         saved_json = packet.Packet.json
 
@@ -859,3 +1572,172 @@ class TestAsyncPubSubManager:
 
         packet.Packet.json = saved_json
         EIOPacket.json = saved_json
+
+    def _reply_with(self, *replies):
+        # simulate the other hosts replying to the published query
+        async def publish(message):
+            assert message['method'] == 'query'
+            assert message['host_id'] == '123456'
+            for reply in replies:
+                self.pm._handle_query_reply(dict(
+                    reply, method='query_reply', host_id='123456',
+                    id=message['id']))
+
+        self.pm._publish.side_effect = publish
+
+    async def test_fetch_participants(self):
+        sid1 = await self.pm.connect('123', '/')
+        await self.pm.enter_room(sid1, '/', 'room')
+        await self.pm.connect('456', '/')
+        self._reply_with(
+            {'responder': 'x', 'result': ['a', 'b'], 'last': False},
+            {'responder': 'y', 'result': ['c'], 'last': True},
+            {'responder': 'x', 'result': ['d'], 'last': True})
+        assert [sid async for sid in self.pm.fetch_participants(
+            '/', 'room', hosts=2, page_size=2)] == [sid1, 'a', 'b', 'c', 'd']
+        message = self.pm._publish.await_args[0][0]
+        assert message['query'] == 'participants'
+        assert message['room'] == 'room'
+        assert message['page_size'] == 2
+        assert self.pm.pending_queries == {}
+
+    async def test_fetch_participants_timeout(self):
+        sid1 = await self.pm.connect('123', '/')
+        self._reply_with({'responder': 'x', 'result': ['a'], 'last': True})
+        start = asyncio.get_running_loop().time()
+        assert [sid async for sid in self.pm.fetch_participants(
+            '/', None, timeout=0.05)] == [sid1, 'a']
+        assert asyncio.get_running_loop().time() - start >= 0.04
+        assert self.pm.pending_queries == {}
+
+    async def test_fetch_participants_no_hosts(self):
+        sid1 = await self.pm.connect('123', '/')
+        assert [sid async for sid in self.pm.fetch_participants(
+            '/', None, hosts=0)] == [sid1]
+        self.pm._publish.assert_not_awaited()
+
+    async def test_fetch_rooms(self):
+        sid1 = await self.pm.connect('123', '/')
+        await self.pm.enter_room(sid1, '/', 'room')
+        assert await self.pm.fetch_rooms(sid1) == [sid1, 'room']
+        self.pm._publish.assert_not_awaited()
+
+        self._reply_with({'responder': 'x', 'result': None, 'last': True},
+                         {'responder': 'y', 'result': ['a', 'b'],
+                          'last': True})
+        assert await self.pm.fetch_rooms('a', '/', hosts=3) == ['a', 'b']
+        assert self.pm._publish.await_args[0][0]['sid'] == 'a'
+        assert self.pm.pending_queries == {}
+
+        self._reply_with({'responder': 'x', 'result': None, 'last': True})
+        assert await self.pm.fetch_rooms('a', '/', hosts=1) is None
+
+    async def test_count(self):
+        sid1 = await self.pm.connect('123', '/')
+        await self.pm.enter_room(sid1, '/', 'room')
+        await self.pm.connect('456', '/')
+        self._reply_with({'responder': 'x', 'result': 3, 'last': True},
+                         {'responder': 'y', 'result': 4, 'last': True})
+        assert await self.pm.count('/', hosts=2) == 9
+        assert await self.pm.count('/', 'room', hosts=2) == 8
+        assert await self.pm.count('/', 'bad', hosts=0) == 0
+
+    async def test_count_rooms(self):
+        sid1 = await self.pm.connect('123', '/')
+        sid2 = await self.pm.connect('456', '/')
+        await self.pm.enter_room(sid1, '/', 'room')
+        await self.pm.enter_room(sid1, '/', 'other')
+        await self.pm.enter_room(sid2, '/', 'other')
+        self._reply_with({'responder': 'x', 'result': 3, 'last': True})
+        assert await self.pm.count('/', ['room', 'other', 'bad'],
+                                   hosts=1) == 5
+        assert self.pm._publish.await_args[0][0]['room'] == [
+            'room', 'other', 'bad']
+
+        self.pm._publish.side_effect = None
+        await self.pm._handle_query({
+            'method': 'query', 'query': 'count', 'id': 'q', 'host_id': 'x',
+            'namespace': '/', 'room': ['room', 'other']})
+        assert self.pm._publish.await_args[0][0]['result'] == 2
+
+    async def test_query_without_server(self):
+        pm = async_pubsub_manager.AsyncPubSubManager(write_only=True)
+        with pytest.raises(RuntimeError):
+            await pm.count('/')
+
+    async def test_query_from_listener(self):
+        async def messages():
+            return
+            yield
+
+        self.pm._listen = messages
+        await self.pm._thread()
+        assert self.pm.listener is asyncio.current_task()
+        with pytest.raises(RuntimeError):
+            await self.pm.count('/')
+        self.pm._publish.assert_not_awaited()
+
+    async def test_handle_query_participants(self):
+        sids = [await self.pm.connect(str(i), '/') for i in range(5)]
+        await self.pm._handle_query({
+            'method': 'query', 'query': 'participants', 'id': 'q',
+            'host_id': 'x', 'namespace': '/', 'room': None, 'page_size': 2})
+        reply = {'method': 'query_reply', 'host_id': 'x', 'id': 'q',
+                 'responder': '123456'}
+        assert self.pm._publish.await_args_list == [
+            mock.call(dict(reply, result=sids[0:2], last=False)),
+            mock.call(dict(reply, result=sids[2:4], last=False)),
+            mock.call(dict(reply, result=sids[4:], last=True)),
+        ]
+
+        self.pm._publish.reset_mock()
+        await self.pm._handle_query({
+            'method': 'query', 'query': 'participants', 'id': 'q',
+            'host_id': 'x', 'namespace': '/', 'room': 'bad', 'page_size': 2})
+        self.pm._publish.assert_awaited_once_with(
+            dict(reply, result=[], last=True))
+
+    async def test_handle_query_rooms_and_count(self):
+        sid1 = await self.pm.connect('123', '/')
+        await self.pm.enter_room(sid1, '/', 'room')
+        reply = {'method': 'query_reply', 'host_id': 'x', 'id': 'q',
+                 'responder': '123456', 'last': True}
+        await self.pm._handle_query({
+            'method': 'query', 'query': 'rooms', 'id': 'q', 'host_id': 'x',
+            'namespace': '/', 'sid': sid1})
+        self.pm._publish.assert_awaited_with(
+            dict(reply, result=[sid1, 'room']))
+        await self.pm._handle_query({
+            'method': 'query', 'query': 'rooms', 'id': 'q', 'host_id': 'x',
+            'namespace': '/', 'sid': 'a'})
+        self.pm._publish.assert_awaited_with(dict(reply, result=None))
+        await self.pm._handle_query({
+            'method': 'query', 'query': 'count', 'id': 'q', 'host_id': 'x',
+            'namespace': '/', 'room': 'room'})
+        self.pm._publish.assert_awaited_with(dict(reply, result=1))
+
+    async def test_handle_query_reply_bad_host_id(self):
+        replies = mock.MagicMock()
+        self.pm.pending_queries['q'] = replies
+        self.pm._handle_query_reply({'method': 'query_reply', 'id': 'q',
+                                     'host_id': 'bad'})
+        self.pm._handle_query_reply({'method': 'query_reply', 'id': 'bad',
+                                     'host_id': '123456'})
+        replies.put_nowait.assert_not_called()
+
+    async def test_background_thread_query(self):
+        self.pm._handle_query = mock.AsyncMock()
+        self.pm._handle_query_reply = mock.MagicMock()
+
+        async def messages():
+            yield {'method': 'query', 'query': 'count', 'host_id': 'x'}
+            yield {'method': 'query', 'query': 'count', 'host_id': '123456'}
+            yield {'method': 'query_reply', 'host_id': '123456'}
+
+        self.pm._listen = messages
+        await self.pm._thread()
+
+        self.pm._handle_query.assert_awaited_once_with(
+            {'method': 'query', 'query': 'count', 'host_id': 'x'})
+        self.pm._handle_query_reply.assert_called_once_with(
+            {'method': 'query_reply', 'host_id': '123456'})
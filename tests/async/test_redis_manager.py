@@ -1,9 +1,12 @@
+import asyncio
+from unittest import mock
+
 import pytest
 import redis
 import valkey
 
 from engineio.packet import Packet as EIOPacket
-from socketio import async_redis_manager, AsyncServer
+from socketio import async_redis_manager, redis_manager, AsyncServer
 from socketio.async_redis_manager import AsyncRedisManager
 from socketio.packet import Packet
 
@@ -112,6 +115,36 @@ class TestAsyncRedisManager:
 
         async_redis_manager.aioredis = saved_redis
 
+    async def test_publish_many(self):
+        cm = AsyncRedisManager('redis://', channel='foo', write_only=True,
+                               sid_directory=True, shards=8)
+        cm.redis = mock.MagicMock()
+        cm.connected = True
+        pipe = cm.redis.pipeline.return_value
+        pipe.execute = mock.AsyncMock()
+        await cm._publish_many([
+            {'method': 'emit', 'namespace': '/', 'room': None},
+            {'method': 'close_room', 'room': 'bar'}])
+        cm.redis.pipeline.assert_called_once_with(transaction=False)
+        assert pipe.publish.call_args_list == [
+            mock.call('foo', '{"method": "emit", "namespace": "/", '
+                             '"room": null}'),
+            mock.call('foo', '{"method": "close_room", "room": "bar"}')]
+        pipe.execute.assert_awaited_once_with()
+
+        # a failed publish is retried once, after reconnecting
+        pipe.execute.reset_mock()
+        pipe.execute.side_effect = [RuntimeError(), None]
+        cm._redis_connect = mock.MagicMock()
+        await cm._publish_many([{'method': 'emit'}])
+        cm._redis_connect.assert_called_once_with()
+        assert pipe.execute.await_count == 2
+
+        pipe.execute.side_effect = RuntimeError()
+        with pytest.raises(RuntimeError):
+            await cm._publish_many([{'method': 'emit'}])
+        assert cm.connected is False
+
     def test_custom_json(self):
         saved_json = Packet.json
 
@@ -122,3 +155,114 @@ class TestAsyncRedisManager:
 
         Packet.json = saved_json
         EIOPacket.json = saved_json
+
+    def test_publish_channel_sid_directory(self):
+        cm = AsyncRedisManager('redis://', channel='foo', sid_directory=True,
+                               shards=8)
+        cm.host_id = 'abc'
+        assert cm._get_publish_channel(
+            {'method': 'emit', 'namespace': '/', 'room': 'room',
+             'to_host': 'x'}) == 'foo@x'
+        assert cm._get_publish_channel(
+            {'method': 'callback', 'host_id': 'x'}) == 'foo@x'
+        assert cm._get_publish_channel(
+            {'method': 'query_reply', 'host_id': 'x'}) == 'foo@x'
+        assert cm._get_publish_channel(
+            {'method': 'emit', 'namespace': '/', 'room': None}) == 'foo'
+        assert cm._get_subscribe_channels() == ['foo', 'foo@abc']
+
+    def test_shards_require_sid_directory(self):
+        with pytest.raises(ValueError):
+            AsyncRedisManager('redis://', shards=8)
+
+    def test_publish_channel(self):
+        cm = AsyncRedisManager('redis://', channel='foo', sid_directory=True,
+                               shards=8)
+        shard = redis_manager.get_shard('/', 'room', 8)
+        # the room has no local members, so it could be a client sid
+        assert cm._get_publish_channel(
+            {'method': 'emit', 'namespace': '/', 'room': 'room'}) == 'foo'
+        cm.basic_enter_room('sid3', '/', None, eio_sid='3')
+        cm.basic_enter_room('sid3', '/', 'room', eio_sid='3')
+        assert cm._get_publish_channel(
+            {'method': 'emit', 'namespace': '/', 'room': 'room'}) == \
+            f'foo#{shard}'
+
+        # emits to clients are not sharded
+        cm.basic_enter_room('sid1', '/', None, eio_sid='1')
+        cm.sid_hosts['sid2'] = 'x'
+        assert cm._get_publish_channel(
+            {'method': 'emit', 'namespace': '/', 'room': 'sid1'}) == 'foo'
+        assert cm._get_publish_channel(
+            {'method': 'emit', 'namespace': '/', 'room': 'sid2'}) == 'foo'
+        assert cm._get_publish_channel(
+            {'method': 'emit', 'namespace': '/', 'room': None}) == 'foo'
+        assert cm._get_publish_channel(
+            {'method': 'emit', 'namespace': '/', 'room': ['a', 'b']}) == \
+            'foo'
+        assert cm._get_publish_channel(
+            {'method': 'batch', 'messages': []}) == 'foo'
+
+        # write-only instances do not know which rooms are clients
+        cm = AsyncRedisManager('redis://', channel='foo', sid_directory=True,
+                               shards=8, write_only=True)
+        assert cm._get_publish_channel(
+            {'method': 'emit', 'namespace': '/', 'room': 'room'}) == 'foo'
+
+    def test_publish_channel_unknown_sid(self):
+        # a client connects to the first server before the second server
+        # starts, so the second server does not have it in its directory
+        first = AsyncRedisManager('redis://', channel='foo',
+                                  sid_directory=True, shards=8)
+        first.basic_enter_room('sid1', '/', None, eio_sid='1')
+        first.basic_enter_room('sid1', '/', 'sid1', eio_sid='1')
+        first.basic_enter_room('sid1', '/', 'room', eio_sid='1')
+        second = AsyncRedisManager('redis://', channel='foo',
+                                   sid_directory=True, shards=8)
+        second.basic_enter_room('sid2', '/', None, eio_sid='2')
+        second.basic_enter_room('sid2', '/', 'room', eio_sid='2')
+
+        # the emits from the second server reach the first one
+        for room in ['sid1', 'room']:
+            channel = second._get_publish_channel(
+                {'method': 'emit', 'namespace': '/', 'room': room})
+            assert channel in first._get_subscribe_channels()
+        channel = second._get_publish_channel(
+            {'method': 'emit', 'namespace': '/', 'room': 'sid1'})
+        assert channel == 'foo'
+
+    async def test_shard_subscriptions(self):
+        cm = AsyncRedisManager('redis://', channel='foo', sid_directory=True,
+                               shards=8)
+        cm.host_id = 'abc'
+        cm.basic_enter_room('123', '/', 'room', eio_sid='1')
+        shard = redis_manager.get_shard('/', 'room', 8)
+        assert cm.shard_rooms == {shard: 1}
+        assert cm._get_subscribe_channels() == ['foo', 'foo@abc',
+                                                f'foo#{shard}']
+
+        cm.pubsub = mock.MagicMock(subscribed=True)
+        cm.pubsub.subscribe = mock.AsyncMock()
+        cm.pubsub.unsubscribe = mock.AsyncMock()
+        cm.basic_enter_room('456', '/', 'room', eio_sid='2')
+        cm.basic_leave_room('123', '/', 'room')
+        assert cm.shard_rooms == {shard: 1}
+        cm.basic_leave_room('456', '/', 'room')
+        assert cm.shard_rooms == {}
+        await asyncio.gather(*cm.shard_tasks)
+        cm.pubsub.unsubscribe.assert_awaited_once_with(f'foo#{shard}')
+
+        cm.basic_enter_room('123', '/', 'room', eio_sid='1')
+        await asyncio.gather(*cm.shard_tasks)
+        cm.pubsub.subscribe.assert_awaited_once_with(f'foo#{shard}')
+        assert cm.shard_tasks == set()
+
+    def test_shard_subscriptions_sid_rooms(self):
+        cm = AsyncRedisManager('redis://', channel='foo', sid_directory=True,
+                               shards=8)
+        cm.basic_enter_room('sid1', '/', None, eio_sid='1')
+        cm.basic_enter_room('sid1', '/', 'sid1', eio_sid='1')
+        assert cm.shard_rooms == {}
+        cm.basic_leave_room('sid1', '/', 'sid1')
+        cm.basic_leave_room('sid1', '/', None)
+        assert cm.shard_rooms == {}
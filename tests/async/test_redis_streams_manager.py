@@ -0,0 +1,154 @@
+from unittest import mock
+
+import pytest
+
+from socketio.async_redis_streams_manager import AsyncRedisStreamsManager
+
+
+class FakeStreams:
+    """An in-memory replacement for the stream commands of a Redis client."""
+    def __init__(self):
+        self.entries = []
+        self.xadd_calls = []
+        self.xread_calls = []
+        self.fail_reads = 0
+        self.incoming = []
+
+    def publish(self, *messages):
+        # messages that are added to the stream during the next read
+        self.incoming.append(messages)
+
+    async def xadd(self, name, fields, maxlen=None, approximate=True):
+        self.xadd_calls.append((name, maxlen, approximate))
+        entry_id = f'{len(self.entries) + 1}-0'.encode()
+        self.entries.append((entry_id, {k.encode(): v
+                                        for k, v in fields.items()}))
+        return entry_id
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+    async def xrevrange(self, name, count=None):
+        return list(reversed(self.entries))[:count]
+
+    async def xread(self, streams, count=None, block=None):
+        self.xread_calls.append((streams, count, block))
+        if self.incoming:
+            for data in self.incoming.pop(0):
+                await self.xadd('socketio', {'data': data})
+        if self.fail_reads:
+            self.fail_reads -= 1
+            raise RuntimeError('connection lost')
+        name, last_id = list(streams.items())[0]
+        last = int(last_id.split(b'-')[0] if isinstance(last_id, bytes)
+                   else last_id.split('-')[0])
+        entries = [(entry_id, fields) for entry_id, fields in self.entries
+                   if int(entry_id.split(b'-')[0]) > last][:count]
+        return [[name, entries]] if entries else []
+
+
+class FakePipeline:
+    def __init__(self, streams):
+        self.streams = streams
+        self.commands = []
+
+    def xadd(self, *args, **kwargs):
+        self.commands.append((args, kwargs))
+
+    async def execute(self):
+        return [await self.streams.xadd(*args, **kwargs)
+                for args, kwargs in self.commands]
+
+
+async def take(listener, count):
+    return [await listener.__anext__() for _ in range(count)]
+
+
+class TestAsyncRedisStreamsManager:
+    def setup_method(self):
+        self.streams = FakeStreams()
+
+        def connect(pm):
+            pm.redis = self.streams
+            pm.connected = True
+
+        self.connect = mock.patch.object(AsyncRedisStreamsManager,
+                                         '_redis_connect', connect)
+        self.connect.start()
+
+    def teardown_method(self):
+        self.connect.stop()
+
+    async def test_publish(self):
+        pm = AsyncRedisStreamsManager('redis://', write_only=True, maxlen=50)
+        await pm._publish({'method': 'emit', 'event': 'foo'})
+        assert self.streams.xadd_calls == [('socketio', 50, True)]
+        assert len(self.streams.entries) == 1
+        assert pm._decode_message(self.streams.entries[0][1][b'data']) == {
+            'method': 'emit', 'event': 'foo'}
+
+    async def test_publish_many(self):
+        pm = AsyncRedisStreamsManager('redis://', write_only=True, maxlen=50)
+        await pm._publish_many([{'method': 'emit', 'event': 'foo'},
+                                {'method': 'emit', 'event': 'bar'}])
+        assert self.streams.xadd_calls == [('socketio', 50, True)] * 2
+        assert [pm._decode_message(fields[b'data'])['event']
+                for _, fields in self.streams.entries] == ['foo', 'bar']
+
+        # a failed publish is retried once, after reconnecting
+        pm.redis = broken = mock.MagicMock()
+        broken.pipeline.return_value.execute = mock.AsyncMock(
+            side_effect=RuntimeError())
+        await pm._publish_many([{'method': 'emit', 'event': 'baz'}])
+        broken.pipeline.return_value.execute.assert_awaited_once_with()
+        assert pm.redis == self.streams
+        assert len(self.streams.entries) == 3
+
+        pm.redis = broken
+        pm._redis_connect = mock.MagicMock()
+        with pytest.raises(RuntimeError):
+            await pm._publish_many([{'method': 'emit'}])
+        assert pm.connected is False
+
+    async def test_publish_retry(self):
+        pm = AsyncRedisStreamsManager('redis://', write_only=True)
+        pm.redis = broken = mock.MagicMock()
+        broken.xadd = mock.AsyncMock(side_effect=RuntimeError())
+        pm.connected = True
+        await pm._publish({'method': 'emit'})
+        broken.xadd.assert_awaited_once()
+        assert pm.redis == self.streams
+        assert len(self.streams.entries) == 1
+
+    async def test_listen_from_newest(self):
+        pm = AsyncRedisStreamsManager('redis://', write_only=True,
+                                      read_count=2)
+        await self.streams.xadd('socketio', {'data': 'old'})
+        self.streams.publish('a', 'b', 'c')
+        listener = pm._listen()
+        assert await take(listener, 3) == ['a', 'b', 'c']
+        assert pm.last_id == b'4-0'
+        assert self.streams.xread_calls[0] == ({'socketio': b'1-0'}, 2, 1000)
+        assert self.streams.xread_calls[1] == ({'socketio': b'3-0'}, 2, 1000)
+
+    async def test_listen_empty_stream(self):
+        pm = AsyncRedisStreamsManager('redis://', write_only=True)
+        self.streams.publish('a')
+        listener = pm._redis_listen_with_retries()
+        assert await take(listener, 1) == [{b'data': 'a'}]
+        assert self.streams.xread_calls[0][0] == {'socketio': '0-0'}
+
+    @mock.patch('socketio.async_redis_streams_manager.asyncio.sleep',
+                new_callable=mock.AsyncMock)
+    async def test_listen_reconnect(self, sleep):
+        pm = AsyncRedisStreamsManager('redis://', write_only=True)
+        self.streams.publish('a')
+        listener = pm._listen()
+        assert await take(listener, 1) == ['a']
+
+        # messages published while the connection is down are not lost
+        self.streams.fail_reads = 2
+        await self.streams.xadd('socketio', {'data': 'b'})
+        await self.streams.xadd('socketio', {'data': 'c'})
+        assert await take(listener, 2) == ['b', 'c']
+        assert sleep.await_args_list == [mock.call(1), mock.call(1)]
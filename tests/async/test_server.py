@@ -3,6 +3,7 @@ import logging
 from unittest import mock
 from datetime import datetime, timezone, timedelta
 
+import engineio
 from engineio import json
 from engineio import packet as eio_packet
 import pytest
@@ -85,6 +86,9 @@ class TestAsyncServer:
             '/foo',
             room='room',
             skip_sid='123',
+            skip_rooms=None,
+            cache_key=None,
+            binary=None,
             callback='cb',
             ignore_queue=False,
         )
@@ -103,6 +107,9 @@ class TestAsyncServer:
             '/foo',
             room='room',
             skip_sid='123',
+            skip_rooms=None,
+            cache_key=None,
+            binary=None,
             callback='cb',
             ignore_queue=True,
         )
@@ -123,6 +130,9 @@ class TestAsyncServer:
             '/',
             room='room',
             skip_sid='123',
+            skip_rooms=None,
+            cache_key=None,
+            binary=None,
             callback='cb',
             ignore_queue=False,
         )
@@ -140,6 +150,9 @@ class TestAsyncServer:
             '/',
             room='room',
             skip_sid='123',
+            skip_rooms=None,
+            cache_key=None,
+            binary=None,
             callback='cb',
             ignore_queue=True,
         )
@@ -160,6 +173,9 @@ class TestAsyncServer:
             '/foo',
             room='room',
             skip_sid='123',
+            skip_rooms=None,
+            cache_key=None,
+            binary=None,
             callback='cb',
             ignore_queue=False,
         )
@@ -177,6 +193,9 @@ class TestAsyncServer:
             '/foo',
             room='room',
             skip_sid='123',
+            skip_rooms=None,
+            cache_key=None,
+            binary=None,
             callback='cb',
             ignore_queue=True,
         )
@@ -240,6 +259,30 @@ class TestAsyncServer:
         await s.leave_room('123', 'room')
         s.manager.leave_room.assert_awaited_once_with('123', '/', 'room')
 
+    async def test_enter_leave_room_filter(self, eio):
+        mgr = self._get_mock_manager()
+        s = async_server.AsyncServer(client_manager=mgr)
+        await s.enter_room(None, 'room', room_filter='foo')
+        s.manager.enter_room.assert_awaited_once_with(
+            None, '/', 'room', room_filter='foo')
+        await s.leave_room(None, 'room', namespace='/foo',
+                           room_filter=['a', 'b'])
+        s.manager.leave_room.assert_awaited_once_with(
+            None, '/foo', 'room', room_filter=['a', 'b'])
+
+    async def test_room_filter_required(self, eio):
+        mgr = self._get_mock_manager()
+        s = async_server.AsyncServer(client_manager=mgr)
+        with pytest.raises(ValueError):
+            await s.enter_room(None, 'room')
+        with pytest.raises(ValueError):
+            await s.leave_room(None, 'room')
+        with pytest.raises(ValueError):
+            await s.disconnect(None)
+        s.manager.enter_room.assert_not_awaited()
+        s.manager.leave_room.assert_not_awaited()
+        s.manager.disconnect.assert_not_called()
+
     async def test_close_room(self, eio):
         mgr = self._get_mock_manager()
         s = async_server.AsyncServer(client_manager=mgr)
@@ -289,6 +332,21 @@ class TestAsyncServer:
         pkt = s.eio.send_packet.await_args_list[0][0][1]
         assert pkt.encode() == '4hello'
 
+    async def test_send_eio_packet_many(self, eio):
+        s = async_server.AsyncServer()
+        s.eio.send_packet = mock.AsyncMock()
+        pkt1 = eio_packet.Packet(eio_packet.MESSAGE, 'hello')
+        pkt2 = eio_packet.Packet(eio_packet.MESSAGE, b'data')
+        await s._send_eio_packet_many(['123', '456', '789'], [pkt1, pkt2])
+        assert s.eio.send_packet.await_args_list == [
+            mock.call('123', pkt1),
+            mock.call('123', pkt2),
+            mock.call('456', pkt1),
+            mock.call('456', pkt2),
+            mock.call('789', pkt1),
+            mock.call('789', pkt2),
+        ]
+
     async def test_transport(self, eio):
         eio.return_value.send = mock.AsyncMock()
         s = async_server.AsyncServer()
@@ -903,6 +961,23 @@ class TestAsyncServer:
         s.eio.send.assert_any_await('123', '1')
         assert not s.manager.is_connected('1', '/')
 
+    async def test_disconnect_room_filter(self, eio):
+        eio.return_value.send = mock.AsyncMock()
+        eio.return_value.disconnect = mock.AsyncMock()
+        s = async_server.AsyncServer()
+        s.handlers['/'] = {}
+        await s._handle_eio_connect('123', 'environ')
+        await s._handle_eio_message('123', '0')
+        await s._handle_eio_connect('456', 'environ')
+        await s._handle_eio_message('456', '0')
+        await s.enter_room('1', 'room')
+        await s.disconnect(None, room_filter='room')
+        s.eio.send.assert_any_await('123', '1')
+        assert not s.manager.is_connected('1', '/')
+        assert s.manager.is_connected('2', '/')
+        await s.disconnect(None, room_filter=['1', '2'])
+        assert not s.manager.is_connected('2', '/')
+
     async def test_disconnect_namespace(self, eio):
         eio.return_value.send = mock.AsyncMock()
         eio.return_value.disconnect = mock.AsyncMock()
@@ -1141,3 +1216,43 @@ class TestAsyncServer:
         assert "current" in p2.data
         assert isinstance(p2.data["current"], str)
         assert default(data["current"]) == p2.data["current"]
+
+
+class TestAsyncServerBroadcast:
+    async def test_send_eio_packet_many_disconnect(self):
+        s = async_server.AsyncServer()
+        sockets = {}
+        for eio_sid in ['123', '456', '789', 'abc']:
+            sockets[eio_sid] = engineio.async_socket.AsyncSocket(s.eio,
+                                                                 eio_sid)
+            s.eio.sockets[eio_sid] = sockets[eio_sid]
+        sid = await s.manager.connect('789', '/')
+        disconnect_handler = mock.MagicMock()
+        s.on('disconnect', disconnect_handler)
+
+        # the second client goes away while the first is sent the packets
+        put = sockets['123'].queue.put
+
+        async def put_and_disconnect(pkt):
+            await put(pkt)
+            sockets['456'].closed = True
+
+        sockets['123'].queue.put = put_and_disconnect
+
+        # the third client missed its ping timeout
+        sockets['789'].last_ping = 1
+
+        pkt1 = eio_packet.Packet(eio_packet.MESSAGE, 'hello')
+        pkt2 = eio_packet.Packet(eio_packet.MESSAGE, b'data')
+        await s._send_eio_packet_many(['123', '456', '789', 'abc'],
+                                      [pkt1, pkt2])
+        for eio_sid in ['123', 'abc']:
+            assert sockets[eio_sid].queue.qsize() == 2
+            assert sockets[eio_sid].queue.get_nowait() == pkt1
+            assert sockets[eio_sid].queue.get_nowait() == pkt2
+        assert sockets['456'].queue.qsize() == 0
+        assert '456' not in s.eio.sockets
+        assert sockets['789'].closed
+        assert '789' not in s.eio.sockets
+        disconnect_handler.assert_called_once_with(sid,
+                                                   s.reason.PING_TIMEOUT)
@@ -0,0 +1,113 @@
+import asyncio
+import socket
+import threading
+from unittest import mock
+
+import pytest
+
+from socketio import async_zmq_manager
+from socketio.async_zmq_manager import AsyncZmqManager
+from socketio.zmq_manager import zmq_forwarder
+
+zmq = pytest.importorskip('zmq')
+
+
+def free_ports():
+    sockets = [socket.socket() for _ in range(2)]
+    for s in sockets:
+        s.bind(('127.0.0.1', 0))
+    ports = [s.getsockname()[1] for s in sockets]
+    for s in sockets:
+        s.close()
+    return ports
+
+
+class FakeSocket:
+    def __init__(self, messages=None):
+        self.sent = []
+        self.messages = messages or []
+        self.options = {}
+
+    def setsockopt(self, option, value):
+        self.options[option] = value
+
+    async def send(self, message):
+        self.sent.append(message)
+
+    async def recv(self):
+        # an IndexError ends the test when there are no more messages
+        return self.messages.pop(0)
+
+
+class TestAsyncZmqManager:
+    def test_zmq_not_installed(self):
+        with mock.patch.object(async_zmq_manager, 'zmq', None):
+            with pytest.raises(RuntimeError):
+                AsyncZmqManager()
+
+    def test_bad_url(self):
+        with pytest.raises(RuntimeError):
+            AsyncZmqManager('zmq+tcp://localhost:5555')
+
+    async def test_publish(self):
+        pm = AsyncZmqManager(channel='foo')
+        sink = FakeSocket()
+        pm._socket = mock.MagicMock(return_value=sink)
+        await pm._publish({'method': 'emit', 'value': 'foo'})
+        await pm._publish({'method': 'emit', 'value': 'bar'})
+        pm._socket.assert_called_once_with(zmq.PUSH, 'tcp://localhost:5555')
+        assert sink.sent == [
+            b'foo\0{"method": "emit", "value": "foo"}',
+            b'foo\0{"method": "emit", "value": "bar"}',
+        ]
+
+    async def test_publish_msgpack(self):
+        pm = AsyncZmqManager(serializer='msgpack')
+        pm.sink = FakeSocket()
+        await pm._publish({'method': 'emit', 'value': b'foo'})
+        assert pm._decode_message(pm.sink.sent[0][9:]) == \
+            {'method': 'emit', 'value': b'foo'}
+
+    async def test_listen(self):
+        pm = AsyncZmqManager(channel='foo')
+        sub = FakeSocket(messages=[b'foo\0one', b'foobar\0two', b'foo',
+                                   b'foo\0three'])
+        pm._socket = mock.MagicMock(return_value=sub)
+        messages = []
+        with pytest.raises(IndexError):
+            async for message in pm._listen():
+                messages.append(message)
+        pm._socket.assert_called_once_with(zmq.SUB, 'tcp://localhost:5556')
+        assert sub.options == {zmq.SUBSCRIBE: b'foo\0'}
+        assert messages == [b'one', b'three']
+
+    async def test_forwarder(self):
+        url = 'zmq+tcp://127.0.0.1:{}+{}'.format(*free_ports())
+        context = zmq.Context()
+        forwarder = threading.Thread(target=zmq_forwarder,
+                                     args=(url, context))
+        forwarder.start()
+
+        sender = AsyncZmqManager(url, write_only=True)
+        other_sender = AsyncZmqManager(url, channel='socketio2',
+                                       write_only=True)
+        receiver = AsyncZmqManager(url)
+
+        async def listen():
+            async for message in receiver._listen():
+                return receiver._decode_message(message)
+
+        listener = asyncio.create_task(listen())
+        # subscriptions take some time to reach the forwarder
+        for _ in range(100):
+            await other_sender._publish({'method': 'emit', 'value': 'bar'})
+            await sender._publish({'method': 'emit', 'value': 'foo'})
+            done, _ = await asyncio.wait([listener], timeout=0.05)
+            if done:
+                break
+        assert await listener == {'method': 'emit', 'value': 'foo'}
+
+        for pm in [sender, other_sender, receiver]:
+            pm.context.destroy(linger=0)
+        context.term()
+        forwarder.join()
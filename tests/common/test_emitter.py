@@ -0,0 +1,121 @@
+from unittest import mock
+
+import pytest
+
+from socketio import emitter
+from socketio import kombu_manager
+from socketio import manager
+from socketio import pubsub_manager
+
+
+class TestEmitter:
+    def setup_method(self):
+        self.pm = pubsub_manager.PubSubManager(write_only=True)
+        self.pm.host_id = '123456'
+        self.pm._publish_many = mock.MagicMock()
+        self.emitter = emitter.Emitter(self.pm, batch_size=2, spool_size=4)
+
+    def _published(self):
+        return [[m['data'] for m in c[0][0]]
+                for c in self.pm._publish_many.call_args_list]
+
+    def test_bad_manager(self):
+        with pytest.raises(ValueError):
+            emitter.Emitter(manager.Manager())
+
+    def test_emit(self):
+        self.emitter.emit('foo', 'bar', to='sid', skip_sid='a')
+        self.pm._publish_many.assert_called_once_with([
+            {'method': 'emit', 'event': 'foo', 'data': ['bar'],
+             'binary': False, 'namespace': '/', 'room': 'sid',
+             'skip_sid': 'a', 'skip_rooms': None, 'callback': None,
+             'cache_key': None, 'host_id': '123456'}])
+
+    def test_emit_binary(self):
+        self.emitter.emit('foo', b'bar', room='room', namespace='/foo')
+        message = self.pm._publish_many.call_args[0][0][0]
+        assert message['binary'] is True
+        assert message['namespace'] == '/foo'
+        assert message['room'] == 'room'
+        assert message['data'] == [[{'_placeholder': True, 'num': 0}], 'YmFy']
+
+    def test_emit_many(self):
+        self.emitter.emit_many([{'event': 'foo', 'data': i}
+                                for i in range(5)])
+        assert self._published() == [[[0], [1]], [[2], [3]], [[4]]]
+
+    @mock.patch('socketio.emitter.time.time', return_value=100)
+    def test_spool(self, time):
+        self.pm._publish_many.side_effect = [None, RuntimeError()]
+        self.emitter.emit_many([{'event': 'foo', 'data': i}
+                                for i in range(3)])
+        assert list(self.emitter.spool) == [
+            self.pm._get_emit_message('foo', 2, '/')]
+        assert self.emitter.retry_time == 101
+
+        # new emits go directly to the spool until the retry time
+        self.pm._publish_many.reset_mock(side_effect=True)
+        self.emitter.emit('foo', 3)
+        self.pm._publish_many.assert_not_called()
+        assert len(self.emitter.spool) == 2
+
+        time.return_value = 101
+        self.emitter.emit('foo', 4)
+        assert self._published() == [[[2], [3]], [[4]]]
+        assert len(self.emitter.spool) == 0
+        assert self.emitter.retry_time is None
+
+    def test_spool_full(self):
+        self.pm._publish_many.side_effect = RuntimeError()
+        self.emitter.emit_many([{'event': 'foo', 'data': i}
+                                for i in range(3)])
+        self.emitter.emit_many([{'event': 'foo', 'data': i}
+                                for i in range(3, 6)])
+        assert [m['data'] for m in self.emitter.spool] == [
+            [2], [3], [4], [5]]
+        assert self.emitter.dropped == 2
+
+    def test_flush(self):
+        self.pm._publish_many.side_effect = RuntimeError()
+        self.emitter.emit('foo', 1)
+        assert self.emitter.flush() is False
+        assert self.pm._publish_many.call_count == 2
+
+        self.pm._publish_many.reset_mock(side_effect=True)
+        assert self.emitter.flush() is True
+        assert self._published() == [[[1]]]
+        assert self.emitter.flush() is True
+        assert self.pm._publish_many.call_count == 1
+
+    @mock.patch.object(kombu_manager, 'kombu')
+    def test_spool_kombu(self, kombu):
+        # the kombu manager handles its own publish errors, but they must
+        # reach the emitter so that the messages are spooled
+        pm = kombu_manager.KombuManager(write_only=True)
+        producer_publish = mock.MagicMock(side_effect=ConnectionError())
+        pm._producer_publish = mock.MagicMock(return_value=producer_publish)
+        em = emitter.Emitter(pm, batch_size=2, spool_size=4)
+        em.emit_many([{'event': 'foo', 'data': i} for i in range(3)])
+        assert [m['data'] for m in em.spool] == [[0], [1], [2]]
+        assert producer_publish.call_count == 2  # one retry
+
+        producer_publish.side_effect = None
+        assert em.flush() is True
+        assert len(em.spool) == 0
+        assert [pm._decode_message(c[0][0])['method']
+                for c in producer_publish.call_args_list[2:]] == [
+            'batch', 'emit']
+
+    def test_publish_many(self):
+        pm = pubsub_manager.PubSubManager(write_only=True)
+        pm.host_id = '123456'
+        pm._publish = mock.MagicMock()
+        pm._publish_many([])
+        pm._publish.assert_not_called()
+        pm._publish_many([{'method': 'emit'}])
+        pm._publish.assert_called_once_with({'method': 'emit'})
+        pm._publish_many([{'method': 'emit'}, {'method': 'close_room'}])
+        pm._publish.assert_called_with(
+            {'method': 'batch', 'messages': [{'method': 'emit'},
+                                             {'method': 'close_room'}],
+             'host_id': '123456'})
@@ -0,0 +1,166 @@
+from collections import namedtuple
+from unittest import mock
+
+import pytest
+
+from socketio import kafka_manager
+from socketio.kafka_manager import KafkaManager
+
+Record = namedtuple('Record', ['topic', 'value'])
+
+
+class FakeFuture:
+    def __init__(self):
+        self.callbacks = []
+        self.errbacks = []
+        self.value = None
+        self.exception = None
+
+    def add_callback(self, f):
+        self.callbacks.append(f)
+
+    def add_errback(self, f):
+        self.errbacks.append(f)
+
+    def get(self):
+        if self.exception is not None:
+            raise self.exception
+        return self.value
+
+    def success(self, value):
+        self.value = value
+        for f in self.callbacks:
+            f(value)
+
+    def failure(self, exc):
+        self.exception = exc
+        for f in self.errbacks:
+            f(exc)
+
+
+class FakeKafka:
+    """An in-process replacement for the kafka-python package."""
+    def __init__(self):
+        self.records = []
+        self.producer_options = None
+        self.error = None
+
+    def KafkaProducer(self, bootstrap_servers, **kwargs):
+        self.bootstrap_servers = bootstrap_servers
+        self.producer_options = kwargs
+        return FakeProducer(self)
+
+    def KafkaConsumer(self, topic, bootstrap_servers):
+        return self.records
+
+
+class FakeProducer:
+    def __init__(self, kafka):
+        self.kafka = kafka
+        self.pending = []
+
+    def send(self, topic, value):
+        assert isinstance(value, bytes)
+        future = FakeFuture()
+        self.pending.append((Record(topic, value), future))
+        return future
+
+    def flush(self):
+        pending = self.pending
+        self.pending = []
+        for record, future in pending:
+            if self.kafka.error is not None:
+                future.failure(self.kafka.error)
+                continue
+            self.kafka.records.append(record)
+            future.success(len(self.kafka.records) - 1)
+
+
+class TestKafkaManager:
+    def setup_method(self):
+        self.kafka = FakeKafka()
+        self.patcher = mock.patch.object(kafka_manager, 'kafka', self.kafka)
+        self.patcher.start()
+
+    def teardown_method(self):
+        self.patcher.stop()
+
+    def test_kafka_not_installed(self):
+        kafka_manager.kafka = None
+        with pytest.raises(RuntimeError):
+            KafkaManager()
+
+    def test_urls(self):
+        KafkaManager()
+        assert self.kafka.bootstrap_servers == ['localhost:9092']
+        KafkaManager('kafka://')
+        assert self.kafka.bootstrap_servers == ['localhost:9092']
+        KafkaManager(['kafka://foo:123', 'kafka://bar:456'],
+                     producer_options={'linger_ms': 5})
+        assert self.kafka.bootstrap_servers == ['foo:123', 'bar:456']
+        assert self.kafka.producer_options == {'linger_ms': 5}
+
+    def test_publish(self):
+        callback = mock.MagicMock()
+        pm = KafkaManager(delivery_callback=callback)
+        pm._publish({'method': 'emit', 'value': 'foo'})
+        assert self.kafka.records == [
+            Record('socketio', b'{"method": "emit", "value": "foo"}')]
+        callback.assert_called_once_with(
+            {'method': 'emit', 'value': 'foo'}, None)
+
+    def test_publish_without_flush(self):
+        callback = mock.MagicMock()
+        pm = KafkaManager(flush=False, delivery_callback=callback)
+        pm._publish({'method': 'emit', 'value': 'foo'})
+        pm._publish({'method': 'emit', 'value': 'bar'})
+        assert self.kafka.records == []
+        callback.assert_not_called()
+        pm.producer.flush()
+        assert len(self.kafka.records) == 2
+        assert callback.call_count == 2
+
+    def test_publish_error(self):
+        callback = mock.MagicMock()
+        logger = mock.MagicMock()
+        pm = KafkaManager(flush=False, logger=logger,
+                          delivery_callback=callback)
+        pm._publish({'method': 'emit', 'value': 'foo'})
+        exc = RuntimeError('foo')
+        pm.producer.pending[0][1].failure(exc)
+        callback.assert_called_once_with(
+            {'method': 'emit', 'value': 'foo'}, exc)
+        logger.error.assert_called_once_with(
+            'Cannot publish to kafka', extra={'kafka_exception': 'foo'})
+
+        pm = KafkaManager(flush=False, logger=logger)
+        pm._publish({'method': 'emit', 'value': 'foo'})
+        pm.producer.pending[0][1].failure(exc)
+        assert logger.error.call_count == 2
+
+    def test_publish_many(self):
+        callback = mock.MagicMock()
+        pm = KafkaManager(flush=False, delivery_callback=callback)
+        pm._publish_many([{'method': 'emit', 'value': 'foo'},
+                          {'method': 'emit', 'value': 'bar'}])
+        assert self.kafka.records == [
+            Record('socketio', b'{"method": "emit", "value": "foo"}'),
+            Record('socketio', b'{"method": "emit", "value": "bar"}')]
+        assert callback.call_count == 2
+
+        self.kafka.error = RuntimeError('foo')
+        with pytest.raises(RuntimeError):
+            pm._publish_many([{'method': 'emit', 'value': 'baz'}])
+        assert len(self.kafka.records) == 2
+        assert callback.call_count == 3
+
+    def test_listen(self):
+        sender = KafkaManager(serializer='msgpack', write_only=True)
+        receiver = KafkaManager()
+        sender._publish({'method': 'emit', 'value': 'foo'})
+        self.kafka.records.append(Record('other', b'{"method": "emit"}'))
+        sender._publish({'method': 'emit', 'value': b'bar'})
+        messages = [receiver._decode_message(message)
+                    for message in receiver._listen()]
+        assert messages == [{'method': 'emit', 'value': 'foo'},
+                            {'method': 'emit', 'value': b'bar'}]
@@ -0,0 +1,197 @@
+import os
+import socket
+import sys
+import threading
+import time
+from unittest import mock
+
+import pytest
+
+from socketio import local_ipc_manager
+from socketio import packet
+from socketio.local_ipc_manager import LocalIPCManager
+
+
+def start_thread(target, *args):
+    thread = threading.Thread(target=target, args=args, daemon=True)
+    thread.start()
+    return thread
+
+
+def wait_for(condition, timeout=5):
+    start = time.time()
+    while not condition():
+        assert time.time() - start < timeout
+        threading.Event().wait(0.01)
+
+
+def stop_hub(pm):
+    pm.hub_socket.shutdown(socket.SHUT_RDWR)
+    pm.hub_socket.close()
+    for conn in list(pm.hub_subscribers):
+        conn.shutdown(socket.SHUT_RDWR)
+    pm.hub_lock_file.close()
+
+
+class TestLocalIPCManager:
+    def setup_method(self):
+        self.server = mock.MagicMock(async_mode='threading')
+        self.server.packet_class = packet.Packet
+        self.server.start_background_task = start_thread
+
+    def _manager(self, tmp_path, **kwargs):
+        pm = LocalIPCManager(path=str(tmp_path / 'socketio.sock'), **kwargs)
+        if not pm.write_only:
+            pm.set_server(self.server)
+        return pm
+
+    def _listen(self, pm, count=1):
+        received = []
+
+        def listen():
+            for message in pm._listen():
+                received.append(pm._decode_message(message))
+                if len(received) == count:
+                    break
+
+        return received, start_thread(listen)
+
+    def test_default_path(self, tmp_path):
+        with mock.patch.dict(os.environ, {'XDG_RUNTIME_DIR': ''}):
+            with mock.patch.object(local_ipc_manager.tempfile,
+                                   'gettempdir', return_value=str(tmp_path)):
+                pm = LocalIPCManager(channel='foo')
+        directory = tmp_path / f'socketio-{os.getuid()}'
+        assert pm.path == str(directory / 'socketio-foo.sock')
+        assert directory.stat().st_mode & 0o777 == 0o700
+
+    def test_default_path_runtime_dir(self, tmp_path):
+        tmp_path.chmod(0o700)
+        with mock.patch.dict(os.environ, {'XDG_RUNTIME_DIR': str(tmp_path)}):
+            pm = LocalIPCManager(channel='foo')
+        assert pm.path == str(tmp_path / 'socketio-foo.sock')
+
+    def test_default_path_insecure(self, tmp_path):
+        tmp_path.chmod(0o777)
+        with mock.patch.dict(os.environ, {'XDG_RUNTIME_DIR': str(tmp_path)}):
+            with pytest.raises(RuntimeError):
+                LocalIPCManager(channel='foo')
+
+    def test_initialize(self):
+        pm = LocalIPCManager(write_only=True)
+        pm.initialize()
+        mock_server = mock.MagicMock(async_mode='eventlet')
+        pm.set_server(mock_server)
+        patcher = mock.MagicMock()
+        patcher.is_monkey_patched.return_value = False
+        with mock.patch.dict(sys.modules, {'eventlet': mock.MagicMock(),
+                                           'eventlet.patcher': patcher}):
+            with pytest.raises(RuntimeError):
+                pm.initialize()
+
+    def test_lock_hub(self, tmp_path):
+        path = str(tmp_path / 'socketio.sock')
+        open(path, 'w').close()
+        lock_file = local_ipc_manager.lock_ipc_hub(path)
+        assert lock_file is not None
+        assert not os.path.exists(path)
+        assert os.stat(path + '.lock').st_mode & 0o777 == 0o600
+        assert local_ipc_manager.lock_ipc_hub(path) is None
+        lock_file.close()
+        local_ipc_manager.lock_ipc_hub(path).close()
+
+    def test_frame_size(self, tmp_path):
+        assert local_ipc_manager.frame_size(b'\x00\x00\x01\x00', 256) == 256
+        with pytest.raises(ValueError):
+            local_ipc_manager.frame_size(b'\x00\x00\x01\x01', 256)
+        pm = self._manager(tmp_path, write_only=True)
+        pm.max_frame_size = 16
+        with pytest.raises(ValueError):
+            pm._publish({'method': 'emit', 'value': 'foo'})
+
+    def test_publish_and_listen(self, tmp_path):
+        receiver = self._manager(tmp_path)
+        sender = self._manager(tmp_path, write_only=True,
+                               serializer='msgpack')
+        received, listener = self._listen(receiver, count=3)
+        # the first server to connect becomes the hub
+        wait_for(lambda: len(receiver.hub_subscribers) == 1)
+        sender._publish({'method': 'emit', 'value': 'foo'})
+        sender._publish_many([{'method': 'emit', 'value': b'bar'},
+                              {'method': 'emit', 'value': 'baz'}])
+        listener.join(5)
+        assert received == [{'method': 'emit', 'value': 'foo'},
+                            {'method': 'emit', 'value': b'bar'},
+                            {'method': 'emit', 'value': 'baz'}]
+        assert sender.hub_socket is None
+        stop_hub(receiver)
+
+    def test_publish_to_self(self, tmp_path):
+        pm = self._manager(tmp_path)
+        received, listener = self._listen(pm)
+        wait_for(lambda: len(pm.hub_subscribers) == 1)
+        pm._publish({'method': 'emit', 'value': 'bar'})
+        assert pm.hub_socket is not None
+        assert os.stat(pm.path).st_mode & 0o777 == 0o600
+        listener.join(5)
+        assert received == [{'method': 'emit', 'value': 'bar'}]
+        stop_hub(pm)
+
+    def test_publish_without_hub(self, tmp_path):
+        logger = mock.MagicMock()
+        pm = self._manager(tmp_path, write_only=True, logger=logger)
+        pm._publish({'method': 'emit', 'value': 'foo'})
+        assert logger.error.call_count == 2
+        assert 'giving up' in logger.error.call_args[0][0]
+        assert pm.publisher is None
+        with pytest.raises(OSError):
+            pm._publish_many([{'method': 'emit', 'value': 'foo'}])
+
+    def test_slow_subscriber(self, tmp_path):
+        pm = self._manager(tmp_path)
+        pm.max_pending_frames = 1
+        received, listener = self._listen(pm)
+        wait_for(lambda: len(pm.hub_subscribers) == 1)
+        conn, frames = list(pm.hub_subscribers.items())[0]
+        with mock.patch.object(frames, 'put_nowait',
+                               side_effect=local_ipc_manager.queue.Full):
+            pm._hub_broadcast(b'\x00\x00\x00\x00')
+        assert conn not in pm.hub_subscribers
+        # the subscriber reconnects to the hub
+        wait_for(lambda: len(pm.hub_subscribers) == 1)
+        pm._publish({'method': 'emit', 'value': 'bar'})
+        listener.join(5)
+        assert received == [{'method': 'emit', 'value': 'bar'}]
+        stop_hub(pm)
+
+    def test_hub_writer_error(self, tmp_path):
+        pm = self._manager(tmp_path)
+        conn = mock.MagicMock()
+        conn.sendall.side_effect = OSError
+        conn.shutdown.side_effect = OSError
+        frames = local_ipc_manager.queue.Queue()
+        pm.hub_subscribers[conn] = frames
+        frames.put(b'foo')
+        pm._hub_writer(conn, frames)
+        assert pm.hub_subscribers == {}
+        conn.shutdown.assert_called_once_with(socket.SHUT_RDWR)
+
+    def test_hub_takeover(self, tmp_path):
+        hub = self._manager(tmp_path)
+        pm = self._manager(tmp_path)
+        assert hub._start_hub()
+        assert not pm._start_hub()
+        with mock.patch.object(local_ipc_manager, 'time'):
+            received, listener = self._listen(pm)
+            wait_for(lambda: len(hub.hub_subscribers) == 1)
+
+            # the hub goes away, and the other server takes its place
+            stop_hub(hub)
+            hub._close_publisher()
+            wait_for(lambda: pm.hub_socket is not None)
+            wait_for(lambda: len(pm.hub_subscribers) == 1)
+            sender = self._manager(tmp_path, write_only=True)
+            sender._publish({'method': 'emit', 'value': 'bar'})
+            listener.join(5)
+        assert received == [{'method': 'emit', 'value': 'bar'}]
+        stop_hub(pm)
@@ -1,7 +1,10 @@
+import threading
 from unittest import mock
 
+from bidict import bidict
 import pytest
 
+from socketio import base_manager
 from socketio import manager
 from socketio import packet
 
@@ -37,6 +40,20 @@ class TestBaseManager:
         assert self.bm.eio_sid_from_sid('x', '/foo') is None
         assert self.bm.eio_sid_from_sid(sid, '/bar') is None
 
+    def test_room_storage(self):
+        sid = self.bm.connect('123', '/foo')
+        self.bm.enter_room(sid, '/foo', 'bar')
+        assert isinstance(self.bm.rooms['/foo'][None], bidict)
+        assert type(self.bm.rooms['/foo'][sid]) is dict
+        assert type(self.bm.rooms['/foo']['bar']) is dict
+
+    def test_custom_room_storage(self):
+        self.bm._create_room = mock.MagicMock(side_effect=[bidict(), {}])
+        sid = self.bm.connect('123', '/foo')
+        self.bm._create_room.assert_any_call('/foo', None)
+        self.bm._create_room.assert_any_call('/foo', sid)
+        assert self.bm.get_rooms(sid, '/foo') == [sid]
+
     def test_pre_disconnect(self):
         sid1 = self.bm.connect('123', '/foo')
         sid2 = self.bm.connect('456', '/foo')
@@ -103,6 +120,7 @@ class TestBaseManager:
         self.bm.disconnect(sid1, '/foo')
         self.bm.disconnect(sid2, '/foo')
         assert self.bm.rooms == {}
+        assert self.bm.sid_rooms == {}
 
     def test_disconnect_with_callbacks(self):
         sid1 = self.bm.connect('123', '/')
@@ -117,6 +135,46 @@ class TestBaseManager:
         assert sid1 not in self.bm.callbacks
         assert sid3 in self.bm.callbacks
 
+    def test_disconnect_room_filter(self):
+        sid1 = self.bm.connect('123', '/foo')
+        sid2 = self.bm.connect('456', '/foo')
+        self.bm.connect('789', '/foo')
+        self.bm.enter_room(sid1, '/foo', 'bar')
+        self.bm.enter_room(sid2, '/foo', 'bar')
+        self.bm.disconnect(None, '/foo', room_filter='bar')
+        assert self.bm.server.disconnect.call_args_list == [
+            mock.call(sid1, namespace='/foo', ignore_queue=True),
+            mock.call(sid2, namespace='/foo', ignore_queue=True)]
+
+    def test_enter_leave_room_filter(self):
+        sid1 = self.bm.connect('123', '/foo')
+        sid2 = self.bm.connect('456', '/foo')
+        sid3 = self.bm.connect('789', '/foo')
+        self.bm.enter_room(sid1, '/foo', 'bar')
+        self.bm.enter_room(sid2, '/foo', 'baz')
+        self.bm.enter_room(None, '/foo', 'qux', room_filter=['bar', 'baz'])
+        assert dict(self.bm.rooms['/foo']['qux']) == {sid1: '123',
+                                                      sid2: '456'}
+        self.bm.enter_room(None, '/foo', 'qux', room_filter=sid3)
+        assert sid3 in self.bm.rooms['/foo']['qux']
+        self.bm.leave_room(None, '/foo', 'qux', room_filter='bar')
+        assert dict(self.bm.rooms['/foo']['qux']) == {sid2: '456',
+                                                      sid3: '789'}
+        self.bm.leave_room(None, '/foo', 'qux', room_filter='qux')
+        assert 'qux' not in self.bm.rooms['/foo']
+
+    def test_room_filter_required(self):
+        sid = self.bm.connect('123', '/foo')
+        with pytest.raises(ValueError):
+            self.bm.enter_room(None, '/foo', 'bar')
+        with pytest.raises(ValueError):
+            self.bm.leave_room(None, '/foo', None)
+        with pytest.raises(ValueError):
+            self.bm.disconnect(None, '/foo')
+        assert 'bar' not in self.bm.rooms['/foo']
+        assert self.bm.is_connected(sid, '/foo')
+        self.bm.server.disconnect.assert_not_called()
+
     def test_disconnect_bad_namespace(self):
         self.bm.connect('123', '/')
         self.bm.connect('123', '/foo')
@@ -152,6 +210,41 @@ class TestBaseManager:
         self.bm.trigger_callback(sid, id + 1, ['foo'])
         assert cb.call_count == 0
 
+    def test_packet_cache(self):
+        cache = base_manager.PacketCache(size=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        assert cache.get('a') == 1
+        cache.set('c', 3)
+        assert cache.get('b') is None
+        assert cache.get('a') == 1
+        assert cache.get('c') == 3
+        cache.set('c', 4)
+        assert cache.get('c') == 4
+        assert list(cache.packets) == ['a', 'c']
+        assert cache.hits == 4
+        assert cache.misses == 1
+
+    def test_packet_cache_size(self):
+        assert self.bm.packet_cache.size == 128
+        assert manager.Manager(packet_cache_size=2).packet_cache.size == 2
+
+    def test_packet_cache_threads(self):
+        cache = base_manager.PacketCache(size=8)
+
+        def run(n):
+            for i in range(2000):
+                cache.set((n, i % 16), i)
+                cache.get((n, (i + 1) % 16))
+
+        threads = [threading.Thread(target=run, args=(n,)) for n in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert len(cache.packets) == 8
+        assert cache.hits + cache.misses == 8000
+
     def test_get_namespaces(self):
         assert list(self.bm.get_namespaces()) == []
         self.bm.connect('123', '/')
@@ -173,6 +266,47 @@ class TestBaseManager:
         assert (sid2, '456') in participants
         assert (sid3, '789') not in participants
 
+    def test_get_participants_multiple_rooms(self):
+        sid1 = self.bm.connect('123', '/')
+        sid2 = self.bm.connect('456', '/')
+        sid3 = self.bm.connect('789', '/')
+        self.bm.enter_room(sid1, '/', 'foo')
+        self.bm.enter_room(sid2, '/', 'foo')
+        self.bm.enter_room(sid2, '/', 'bar')
+        self.bm.enter_room(sid3, '/', 'bar')
+        participants = list(self.bm.get_participants(
+            '/', ['foo', 'baz', 'bar', 'foo']))
+        assert participants == [(sid1, '123'), (sid2, '456'), (sid3, '789')]
+        assert list(self.bm.get_participants('/', [])) == []
+        assert list(self.bm.get_participants('/', 'baz')) == []
+        assert list(self.bm.get_participants('/bar', 'foo')) == []
+
+    def test_get_participants_while_modifying_rooms(self):
+        sid1 = self.bm.connect('123', '/')
+        sid2 = self.bm.connect('456', '/')
+        sid3 = self.bm.connect('789', '/')
+        for sid in [sid1, sid2, sid3]:
+            self.bm.enter_room(sid, '/', 'foo')
+        self.bm.enter_room(sid3, '/', 'bar')
+        participants = []
+        for sid, eio_sid in self.bm.get_participants('/', ['foo', 'bar']):
+            participants.append((sid, eio_sid))
+            self.bm.leave_room(sid, '/', 'foo')
+            self.bm.enter_room(sid, '/', 'baz')
+        assert participants == [(sid1, '123'), (sid2, '456'), (sid3, '789')]
+        assert 'foo' not in self.bm.rooms['/']
+        assert len(self.bm.rooms['/']['baz']) == 3
+        assert self.bm.participant_iterators == {}
+
+    def test_get_participants_interrupted(self):
+        self.bm.connect('123', '/')
+        self.bm.connect('456', '/')
+        participants = self.bm.get_participants('/', None)
+        next(participants)
+        assert len(self.bm.participant_iterators['/']) == 1
+        participants.close()
+        assert self.bm.participant_iterators == {}
+
     def test_leave_invalid_room(self):
         sid = self.bm.connect('123', '/foo')
         self.bm.leave_room(sid, '/foo', 'baz')
@@ -202,6 +336,26 @@ class TestBaseManager:
         assert sid in r
         assert 'bar' in r
 
+    def test_rooms_index(self):
+        sid1 = self.bm.connect('123', '/foo')
+        sid2 = self.bm.connect('456', '/foo')
+        self.bm.enter_room(sid1, '/foo', 'bar')
+        self.bm.enter_room(sid1, '/foo', 'baz')
+        self.bm.enter_room(sid2, '/foo', 'baz')
+        assert self.bm.sid_rooms['/foo'] == {
+            sid1: {None: None, sid1: None, 'bar': None, 'baz': None},
+            sid2: {None: None, sid2: None, 'baz': None},
+        }
+        self.bm.leave_room(sid1, '/foo', 'baz')
+        self.bm.leave_room(sid1, '/foo', 'baz')
+        assert self.bm.get_rooms(sid1, '/foo') == [sid1, 'bar']
+        self.bm.close_room('baz', '/foo')
+        assert self.bm.get_rooms(sid2, '/foo') == [sid2]
+        self.bm.disconnect(sid1, '/foo')
+        assert sid1 not in self.bm.sid_rooms['/foo']
+        assert 'bar' not in self.bm.rooms['/foo']
+        assert self.bm.get_rooms(sid1, '/foo') == []
+
     def test_emit_to_sid(self):
         sid = self.bm.connect('123', '/foo')
         self.bm.connect('456', '/foo')
@@ -296,6 +450,51 @@ class TestBaseManager:
         pkt = self.bm.server._send_eio_packet.call_args_list[0][0][1]
         assert pkt.encode() == '42/foo,["my event",{"foo":"bar"}]'
 
+    def test_emit_to_all_skip_set(self):
+        sid1 = self.bm.connect('123', '/foo')
+        sid2 = self.bm.connect('456', '/foo')
+        self.bm.connect('789', '/foo')
+        self.bm.emit(
+            'my event', {'foo': 'bar'}, namespace='/foo',
+            skip_sid={sid1, sid2}
+        )
+        assert self.bm.server._send_eio_packet.call_count == 1
+        assert self.bm.server._send_eio_packet.call_args_list[0][0][0] == '789'
+
+    def test_emit_to_all_skip_rooms(self):
+        sid1 = self.bm.connect('123', '/foo')
+        self.bm.enter_room(sid1, '/foo', 'bar')
+        sid2 = self.bm.connect('456', '/foo')
+        self.bm.enter_room(sid2, '/foo', 'baz')
+        sid3 = self.bm.connect('789', '/foo')
+        self.bm.connect('abc', '/foo')
+        self.bm.emit(
+            'my event', {'foo': 'bar'}, namespace='/foo', skip_rooms='bar'
+        )
+        assert self.bm.server._send_eio_packet.call_count == 3
+        self.bm.emit(
+            'my event', {'foo': 'bar'}, namespace='/foo', skip_sid=sid3,
+            skip_rooms=['bar', 'baz', 'unknown']
+        )
+        assert self.bm.server._send_eio_packet.call_count == 4
+        assert self.bm.server._send_eio_packet.call_args_list[3][0][0] == 'abc'
+
+    def test_emit_with_cache_key(self):
+        sid1 = self.bm.connect('123', '/foo')
+        sid2 = self.bm.connect('456', '/foo')
+        self.bm.emit('my event', {'foo': 'bar'}, namespace='/foo',
+                     to=sid1, cache_key='k')
+        self.bm.emit('my event', {'foo': 'baz'}, namespace='/foo',
+                     to=sid2, cache_key='k')
+        self.bm.emit('my event', {'foo': 'baz'}, namespace='/foo',
+                     to=sid2)
+        assert self.bm.packet_cache.hits == 1
+        assert self.bm.packet_cache.misses == 1
+        calls = self.bm.server._send_eio_packet.call_args_list
+        assert calls[0][0][1] is calls[1][0][1]
+        assert calls[1][0][1].encode() == '42/foo,["my event",{"foo":"bar"}]'
+        assert calls[2][0][1].encode() == '42/foo,["my event",{"foo":"baz"}]'
+
     def test_emit_with_callback(self):
         sid = self.bm.connect('123', '/foo')
         self.bm._generate_ack_id = mock.MagicMock()
@@ -349,3 +548,31 @@ class TestBaseManager:
         assert self.bm.server._send_eio_packet.call_args_list[1][0][0] == '123'
         pkt = self.bm.server._send_eio_packet.call_args_list[1][0][1]
         assert pkt.encode() == b'my binary data'
+
+    def test_emit_binary_long_polling(self):
+        sid = self.bm.connect('123', '/')
+        self.bm.emit('my event', b'my binary data', namespace='/', room=sid)
+        pkt = self.bm.server._send_eio_packet.call_args_list[1][0][1]
+        assert pkt.encode() == b'my binary data'
+        assert pkt.encode(b64=True) == 'bbXkgYmluYXJ5IGRhdGE='
+        assert pkt.encode() == b'my binary data'
+        pkt = self.bm.server._send_eio_packet.call_args_list[0][0][1]
+        assert pkt.encode(b64=True) == pkt.encode()
+
+    def test_emit_memoryview(self):
+        sid = self.bm.connect('123', '/')
+        data = b'my binary data'
+        self.bm.emit('my event', memoryview(data), namespace='/', room=sid)
+        assert self.bm.server._send_eio_packet.call_count == 2
+        pkt = self.bm.server._send_eio_packet.call_args_list[0][0][1]
+        assert pkt.encode() == '451-["my event",{"_placeholder":true,"num":0}]'
+        pkt = self.bm.server._send_eio_packet.call_args_list[1][0][1]
+        assert pkt.encode() is data
+
+    def test_emit_not_binary(self):
+        sid = self.bm.connect('123', '/')
+        self.bm.emit('my event', ['foo', 'bar'], namespace='/', room=sid,
+                     binary=False)
+        assert self.bm.server._send_eio_packet.call_count == 1
+        pkt = self.bm.server._send_eio_packet.call_args_list[0][0][1]
+        assert pkt.encode() == '42["my event",["foo","bar"]]'
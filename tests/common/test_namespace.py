@@ -74,6 +74,9 @@ class TestNamespace:
             to='room',
             room=None,
             skip_sid='skip',
+            skip_rooms=None,
+            cache_key=None,
+            binary=None,
             namespace='/foo',
             callback='cb',
             ignore_queue=False,
@@ -93,6 +96,9 @@ class TestNamespace:
             to=None,
             room='room',
             skip_sid='skip',
+            skip_rooms=None,
+            cache_key=None,
+            binary=None,
             namespace='/bar',
             callback='cb',
             ignore_queue=True,
@@ -107,6 +113,7 @@ class TestNamespace:
             to='room',
             room=None,
             skip_sid='skip',
+            skip_rooms=None,
             namespace='/foo',
             callback='cb',
             ignore_queue=False,
@@ -124,6 +131,7 @@ class TestNamespace:
             to=None,
             room='room',
             skip_sid='skip',
+            skip_rooms=None,
             namespace='/bar',
             callback='cb',
             ignore_queue=True,
@@ -1,3 +1,5 @@
+from unittest import mock
+
 import pytest
 
 from socketio import packet
@@ -274,12 +276,66 @@ class TestPacket:
             rdata = packet.Packet.reconstruct_binary(bdata, attachments)
             assert data == rdata
 
+    def test_deconstruct_binary_no_copy(self):
+        data = [{'foo': ['bar', 1]}, 'baz']
+        bdata, attachments = packet.Packet.deconstruct_binary(data)
+        assert bdata is data
+        assert attachments == []
+        data = [{'foo': ['bar', b'baz']}, {'qux': 1}]
+        bdata, attachments = packet.Packet.deconstruct_binary(data)
+        assert bdata == [{'foo': ['bar', {'_placeholder': True, 'num': 0}]},
+                         {'qux': 1}]
+        assert bdata[1] is data[1]
+        assert data == [{'foo': ['bar', b'baz']}, {'qux': 1}]
+        assert attachments == [b'baz']
+
+    def test_encode_memoryview(self):
+        buf = b'foobar'
+        pkt = packet.Packet(packet.EVENT, data=[memoryview(buf)])
+        assert pkt.packet_type == packet.BINARY_EVENT
+        encoded_packet = pkt.encode()
+        assert encoded_packet == [
+            '51-[{"_placeholder":true,"num":0}]', b'foobar']
+        assert encoded_packet[1] is buf
+        buf = bytearray(b'foobar')
+        encoded_packet = packet.Packet(packet.EVENT,
+                                       data=[memoryview(buf)]).encode()
+        assert encoded_packet[1] is buf
+        encoded_packet = packet.Packet(
+            packet.EVENT, data=['foo', memoryview(b'foobar')[3:]]).encode()
+        assert encoded_packet == [
+            '51-["foo",{"_placeholder":true,"num":0}]', b'bar']
+        assert isinstance(encoded_packet[1], bytes)
+
+    def test_deconstruct_binary_memoryview(self):
+        data = {'foo': memoryview(b'abcdef')[::2]}
+        bdata, attachments = packet.Packet.deconstruct_binary(data)
+        assert bdata == {'foo': {'_placeholder': True, 'num': 0}}
+        assert attachments == [b'ace']
+        assert isinstance(attachments[0], bytes)
+        view = memoryview(b'abcdef')[1:]
+        bdata, attachments = packet.Packet.deconstruct_binary([view])
+        assert attachments[0] is view
+
+    def test_encode_not_binary(self):
+        pkt = packet.Packet(packet.EVENT, data=['foo', 'bar'], binary=False)
+        assert pkt.packet_type == packet.EVENT
+        assert pkt.encode() == '2["foo","bar"]'
+
+    def test_encode_binary_after_data_change(self):
+        pkt = packet.Packet(packet.EVENT, data=[b'foo'])
+        assert pkt.encode() == ['51-[{"_placeholder":true,"num":0}]', b'foo']
+        pkt.data = ['bar', b'baz']
+        assert pkt.encode() == [
+            '51-["bar",{"_placeholder":true,"num":0}]', b'baz']
+
     def test_data_is_binary_list(self):
         pkt = packet.Packet()
         assert not pkt.data_is_binary(['foo'])
         assert not pkt.data_is_binary([])
         assert pkt.data_is_binary([b'foo'])
         assert pkt.data_is_binary([bytearray(b'foo')])
+        assert pkt.data_is_binary([memoryview(b'foo')])
         assert pkt.data_is_binary(['foo', b'bar'])
         assert pkt.data_is_binary(['foo', bytearray(b'bar')])
 
@@ -289,5 +345,32 @@ class TestPacket:
         assert not pkt.data_is_binary({})
         assert pkt.data_is_binary({'a': b'foo'})
         assert pkt.data_is_binary({'a': bytearray(b'foo')})
+        assert pkt.data_is_binary({'a': memoryview(b'foo')})
         assert pkt.data_is_binary({'a': 'foo', 'b': b'bar'})
         assert pkt.data_is_binary({'a': 'foo', 'b': bytearray(b'bar')})
+
+    def test_data_is_binary_nested(self):
+        pkt = packet.Packet()
+        assert not pkt.data_is_binary([{'a': ['foo', {'b': 1}]}, []])
+        assert pkt.data_is_binary([{'a': ['foo', {'b': b'bar'}]}, []])
+        assert pkt.data_is_binary({'a': [[], [bytearray(b'foo')]]})
+
+    def test_custom_json(self):
+        class CustomPacket(packet.Packet):
+            json = mock.MagicMock()
+
+        CustomPacket.json.dumps.return_value = '"foo"'
+        CustomPacket.json.loads.return_value = 'bar'
+        pkt = CustomPacket(packet.EVENT, data='foo')
+        assert pkt.encode() == '2"foo"'
+        CustomPacket.json.dumps.assert_called_once_with(
+            'foo', separators=(',', ':'))
+        pkt = CustomPacket(encoded_packet='2/foo,"foo"')
+        assert pkt.data == 'bar'
+        assert pkt.namespace == '/foo'
+        CustomPacket.json.loads.assert_called_once_with('"foo"')
+
+    def test_slots(self):
+        pkt = packet.Packet(packet.EVENT, data='foo')
+        with pytest.raises(AttributeError):
+            pkt.foo = 'bar'
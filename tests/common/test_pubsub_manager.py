@@ -1,11 +1,16 @@
 import functools
 import json
 import logging
+import queue
+import threading
+import time
 from unittest import mock
 
+import msgpack
 import pytest
 
 from engineio.packet import Packet as EIOPacket
+from socketio import exceptions
 from socketio import manager
 from socketio import pubsub_manager
 from socketio import packet
@@ -37,9 +42,11 @@ class TestPubSubManager:
         )
 
     def test_custom_init(self):
-        pubsub = pubsub_manager.PubSubManager(channel='foo')
+        pubsub = pubsub_manager.PubSubManager(channel='foo',
+                                              packet_cache_size=16)
         assert pubsub.channel == 'foo'
         assert len(pubsub.host_id) == 32
+        assert pubsub.packet_cache.size == 16
 
     def test_write_only_init(self):
         mock_server = mock.MagicMock()
@@ -65,6 +72,249 @@ class TestPubSubManager:
         assert len(pm.host_id) == 32
         assert pm._get_logger() == test_logger
 
+    def test_invalid_serializer(self):
+        with pytest.raises(ValueError):
+            pubsub_manager.PubSubManager(serializer='foo')
+
+    def test_msgpack_serializer_not_installed(self):
+        with mock.patch.object(pubsub_manager, 'msgpack', None):
+            with pytest.raises(RuntimeError):
+                pubsub_manager.PubSubManager(serializer='msgpack')
+
+    def test_batch_publish(self):
+        self.pm.batch_size = 2
+        self.pm.emit('foo', 'bar')
+        self.pm._publish.assert_not_called()
+        self.pm.server.start_background_task.assert_called_with(
+            self.pm._publish_batch_later, 0)
+        self.pm.enter_room('456', '/', 'baz')
+        self.pm._publish.assert_called_once_with({
+            'method': 'batch',
+            'messages': [
+                {
+                    'method': 'emit',
+                    'event': 'foo',
+                    'binary': False,
+                    'data': ['bar'],
+                    'namespace': '/',
+                    'room': None,
+                    'skip_sid': None,
+                    'skip_rooms': None,
+                    'cache_key': None,
+                    'callback': None,
+                    'host_id': '123456',
+                },
+                {
+                    'method': 'enter_room',
+                    'sid': '456',
+                    'room': 'baz',
+                    'namespace': '/',
+                    'host_id': '123456',
+                },
+            ],
+            'host_id': '123456',
+        })
+        assert self.pm.batch == []
+
+        # the timer of the batch that was already published does nothing
+        self.pm._publish_batch_later(0)
+        self.pm.server.sleep.assert_called_once_with(0.005)
+        assert self.pm._publish.call_count == 1
+
+    def test_batch_publish_interval(self):
+        self.pm.batch_size = 10
+        self.pm.close_room('baz', '/')
+        self.pm._publish.assert_not_called()
+        self.pm._publish_batch_later(0)
+        self.pm._publish.assert_called_once_with({
+            'method': 'close_room', 'room': 'baz', 'namespace': '/',
+            'host_id': '123456'})
+        self.pm._publish_batch_later(1)
+        assert self.pm._publish.call_count == 1
+
+    def test_batch_publish_error(self):
+        self.pm.batch_size = 2
+        self.pm._publish.side_effect = RuntimeError('foo')
+        logger = mock.MagicMock()
+        self.pm._get_logger = mock.MagicMock(return_value=logger)
+        self.pm.close_room('baz', '/')
+        self.pm.close_room('qux', '/')
+        logger.error.assert_called_once_with(
+            'Cannot publish, %d messages discarded', 2,
+            extra={'exception': 'foo'})
+        assert self.pm.batch == []
+        self.pm._publish_batch()
+        assert self.pm._publish.call_count == 1
+
+    def test_message_helpers(self):
+        message = {'method': 'emit', 'event': 'foo', 'data': ['bar'],
+                   'namespace': '/', 'room': 'baz', 'host_id': 'x'}
+        for serializer in ['default', 'msgpack']:
+            encoded = pubsub_manager.encode_message(message, serializer, json,
+                                                    envelope=True)
+            assert encoded[:1] == b'\x01'
+            assert pubsub_manager.decode_message(encoded, json) == message
+            assert pubsub_manager.decode_message(
+                encoded, json, has_recipients=lambda header: False) is None
+        assert pubsub_manager.batch_message([message], 'x') == message
+        assert pubsub_manager.batch_message([message, message], 'x') == {
+            'method': 'batch', 'messages': [message, message],
+            'host_id': 'x'}
+        assert pubsub_manager.has_local_recipients(
+            {'namespace': '/', 'room': ['foo', 'baz']}, 'y',
+            {'/': {'baz': {}}})
+        assert not pubsub_manager.has_local_recipients(
+            {'namespace': '/', 'room': 'baz', 'host_id': 'y'}, 'y',
+            {'/': {'baz': {}}})
+
+    def test_invalid_publish_queue_policy(self):
+        with pytest.raises(ValueError):
+            pubsub_manager.PubSubManager(publish_queue_size=10,
+                                         publish_queue_policy='foo')
+
+    def _publish_queue_pm(self, size, policy='block'):
+        mock_server = mock.MagicMock()
+        mock_server.eio.create_queue = queue.Queue
+        pm = pubsub_manager.PubSubManager(publish_queue_size=size,
+                                          publish_queue_policy=policy)
+        pm._publish = mock.MagicMock()
+        pm.set_server(mock_server)
+        pm.host_id = '123456'
+        pm.initialize()
+        return pm
+
+    def test_publish_queue_init(self):
+        pm = self._publish_queue_pm(10)
+        assert pm.publish_queue.maxsize == 10
+        pm.server.start_background_task.assert_any_call(
+            pm._publish_queue_thread)
+        assert pm.get_publish_queue_stats() == {
+            'depth': 0, 'size': 10, 'peak_depth': 0, 'dropped': 0,
+            'published': 0}
+
+    def test_publish_queue_disabled(self):
+        assert self.pm.publish_queue is None
+        assert self.pm.get_publish_queue_stats() == {
+            'depth': 0, 'size': None, 'peak_depth': 0, 'dropped': 0,
+            'published': 0}
+
+    def test_publish_queue_without_server(self):
+        pm = pubsub_manager.PubSubManager(write_only=True,
+                                          publish_queue_size=10)
+        pm._publish = mock.MagicMock()
+        with mock.patch.object(pubsub_manager.threading, 'Thread') as thread:
+            pm.initialize()
+        assert isinstance(pm.publish_queue, queue.Queue)
+        thread.assert_called_once_with(target=pm._publish_queue_thread,
+                                       daemon=True)
+        thread().start.assert_called_once_with()
+
+    def test_publish_queue_write_only(self):
+        # write-only instances are not initialized by a server
+        pm = pubsub_manager.PubSubManager(write_only=True,
+                                          publish_queue_size=10)
+        pm._publish = mock.MagicMock()
+        with mock.patch.object(pubsub_manager.threading, 'Thread') as thread:
+            pm.close_room('foo', '/')
+            pm.close_room('bar', '/')
+        thread.assert_called_once_with(target=pm._publish_queue_thread,
+                                       daemon=True)
+        thread().start.assert_called_once_with()
+        pm._publish.assert_not_called()
+        assert pm.publish_queue.qsize() == 2
+        assert pm.publish_queue.get()['room'] == 'foo'
+
+    def test_publish_queue(self):
+        pm = self._publish_queue_pm(10)
+        pm.close_room('foo', '/')
+        pm.close_room('bar', '/')
+        pm._publish.assert_not_called()
+        assert pm.publish_queue.qsize() == 2
+        pm.publish_queue.get = mock.MagicMock(side_effect=[
+            pm.publish_queue.get(), pm.publish_queue.get(), StopIteration])
+        try:
+            pm._publish_queue_thread()
+        except StopIteration:
+            pass
+        assert pm._publish.call_args_list == [
+            mock.call({'method': 'close_room', 'room': 'foo',
+                       'namespace': '/', 'host_id': '123456'}),
+            mock.call({'method': 'close_room', 'room': 'bar',
+                       'namespace': '/', 'host_id': '123456'}),
+        ]
+        assert pm.get_publish_queue_stats() == {
+            'depth': 0, 'size': 10, 'peak_depth': 2, 'dropped': 0,
+            'published': 2}
+
+    def test_publish_queue_thread_exception(self):
+        pm = self._publish_queue_pm(10)
+        pm._publish.side_effect = [RuntimeError(), None]
+        pm.close_room('foo', '/')
+        pm.close_room('bar', '/')
+        pm.publish_queue.get = mock.MagicMock(side_effect=[
+            pm.publish_queue.get(), pm.publish_queue.get(), StopIteration])
+        try:
+            pm._publish_queue_thread()
+        except StopIteration:
+            pass
+        assert pm._publish.call_count == 2
+        assert pm.get_publish_queue_stats()['published'] == 1
+
+    def test_publish_queue_full_block(self):
+        pm = self._publish_queue_pm(1)
+        pm.close_room('foo', '/')
+
+        def put(message):
+            # other threads can publish while this one waits
+            assert not pm.publish_queue_lock.locked()
+
+        pm.publish_queue.put = mock.MagicMock(side_effect=put)
+        pm.close_room('bar', '/')
+        pm.publish_queue.put.assert_called_once_with({
+            'method': 'close_room', 'room': 'bar', 'namespace': '/',
+            'host_id': '123456'})
+
+    def test_publish_queue_full_drop_oldest(self):
+        pm = self._publish_queue_pm(2, policy='drop_oldest')
+        pm.close_room('foo', '/')
+        pm.close_room('bar', '/')
+        pm.close_room('baz', '/')
+        assert [pm.publish_queue.get()['room'] for _ in range(2)] == \
+            ['bar', 'baz']
+        assert pm.get_publish_queue_stats() == {
+            'depth': 0, 'size': 2, 'peak_depth': 2, 'dropped': 1,
+            'published': 0}
+
+    def test_publish_queue_full_raise(self):
+        pm = self._publish_queue_pm(1, policy='raise')
+        pm.close_room('foo', '/')
+        with pytest.raises(exceptions.QueueFullError):
+            pm.close_room('bar', '/')
+        assert pm.publish_queue.qsize() == 1
+        assert pm.publish_queue.get()['room'] == 'foo'
+
+    def test_batch_publish_without_server(self):
+        pm = pubsub_manager.PubSubManager(write_only=True, batch_size=10,
+                                          batch_interval=0.01)
+        pm._publish = mock.MagicMock()
+        pm.close_room('baz', '/')
+        pm.close_room('qux', '/')
+        pm._publish.assert_not_called()
+        for _ in range(100):
+            time.sleep(0.01)
+            if pm._publish.call_count:
+                break
+        pm._publish.assert_called_once_with({
+            'method': 'batch',
+            'messages': [
+                {'method': 'close_room', 'room': 'baz', 'namespace': '/',
+                 'host_id': pm.host_id},
+                {'method': 'close_room', 'room': 'qux', 'namespace': '/',
+                 'host_id': pm.host_id},
+            ],
+            'host_id': pm.host_id,
+        })
+
     def test_emit(self):
         self.pm.emit('foo', 'bar')
         self.pm._publish.assert_called_once_with(
@@ -76,6 +326,8 @@ class TestPubSubManager:
                 'namespace': '/',
                 'room': None,
                 'skip_sid': None,
+                'skip_rooms': None,
+                'cache_key': None,
                 'callback': None,
                 'host_id': '123456',
             }
@@ -92,6 +344,8 @@ class TestPubSubManager:
                 'namespace': '/',
                 'room': None,
                 'skip_sid': None,
+                'skip_rooms': None,
+                'cache_key': None,
                 'callback': None,
                 'host_id': '123456',
             }
@@ -106,11 +360,56 @@ class TestPubSubManager:
                 'namespace': '/',
                 'room': None,
                 'skip_sid': None,
+                'skip_rooms': None,
+                'cache_key': None,
                 'callback': None,
                 'host_id': '123456',
             }
         )
 
+    def test_emit_packet_passthrough(self):
+        self.pm.packet_passthrough = True
+        self.pm.emit('foo', 'bar')
+        self.pm._publish.assert_called_once_with(
+            {
+                'method': 'emit',
+                'event': 'foo',
+                'packets': ['2["foo","bar"]'],
+                'namespace': '/',
+                'room': None,
+                'skip_sid': None,
+                'skip_rooms': None,
+                'cache_key': None,
+                'callback': None,
+                'host_id': '123456',
+            }
+        )
+        self.pm.emit('foo', b'bar', room='baz')
+        self.pm._publish.assert_called_with(
+            {
+                'method': 'emit',
+                'event': 'foo',
+                'packets': ['51-["foo",{"_placeholder":true,"num":0}]',
+                            b'bar'],
+                'namespace': '/',
+                'room': 'baz',
+                'skip_sid': None,
+                'skip_rooms': None,
+                'cache_key': None,
+                'callback': None,
+                'host_id': '123456',
+            }
+        )
+
+    def test_emit_packet_passthrough_with_callback(self):
+        self.pm.packet_passthrough = True
+        with mock.patch.object(
+            self.pm, '_generate_ack_id', return_value='123'
+        ):
+            self.pm.emit('foo', 'bar', room='baz', callback='cb')
+            assert 'packets' not in self.pm._publish.call_args[0][0]
+            assert self.pm._publish.call_args[0][0]['data'] == ['bar']
+
     def test_emit_bytearray(self):
         self.pm.emit('foo', bytearray(b'bar'))
         self.pm._publish.assert_called_once_with(
@@ -122,6 +421,8 @@ class TestPubSubManager:
                 'namespace': '/',
                 'room': None,
                 'skip_sid': None,
+                'skip_rooms': None,
+                'cache_key': None,
                 'callback': None,
                 'host_id': '123456',
             }
@@ -136,6 +437,63 @@ class TestPubSubManager:
                 'namespace': '/',
                 'room': None,
                 'skip_sid': None,
+                'skip_rooms': None,
+                'cache_key': None,
+                'callback': None,
+                'host_id': '123456',
+            }
+        )
+
+    def test_emit_memoryview(self):
+        self.pm.emit('foo', memoryview(b'foobar')[3:])
+        self.pm._publish.assert_called_once_with(
+            {
+                'method': 'emit',
+                'event': 'foo',
+                'binary': True,
+                'data': [[{'_placeholder': True, 'num': 0}], 'YmFy'],
+                'namespace': '/',
+                'room': None,
+                'skip_sid': None,
+                'skip_rooms': None,
+                'cache_key': None,
+                'callback': None,
+                'host_id': '123456',
+            }
+        )
+
+    def test_emit_binary_msgpack(self):
+        self.pm.serializer = 'msgpack'
+        self.pm.emit('foo', {'foo': b'bar'})
+        self.pm._publish.assert_called_once_with(
+            {
+                'method': 'emit',
+                'event': 'foo',
+                'binary': True,
+                'data': [[{'foo': {'_placeholder': True, 'num': 0}}], b'bar'],
+                'namespace': '/',
+                'room': None,
+                'skip_sid': None,
+                'skip_rooms': None,
+                'cache_key': None,
+                'callback': None,
+                'host_id': '123456',
+            }
+        )
+
+    def test_emit_not_binary(self):
+        self.pm.emit('foo', ['bar'], binary=False)
+        self.pm._publish.assert_called_once_with(
+            {
+                'method': 'emit',
+                'event': 'foo',
+                'binary': False,
+                'data': [['bar']],
+                'namespace': '/',
+                'room': None,
+                'skip_sid': None,
+                'skip_rooms': None,
+                'cache_key': None,
                 'callback': None,
                 'host_id': '123456',
             }
@@ -152,6 +510,8 @@ class TestPubSubManager:
                 'namespace': '/',
                 'room': None,
                 'skip_sid': None,
+                'skip_rooms': None,
+                'cache_key': None,
                 'callback': None,
                 'host_id': '123456',
             }
@@ -168,6 +528,8 @@ class TestPubSubManager:
                 'namespace': '/',
                 'room': None,
                 'skip_sid': None,
+                'skip_rooms': None,
+                'cache_key': None,
                 'callback': None,
                 'host_id': '123456',
             }
@@ -184,6 +546,8 @@ class TestPubSubManager:
                 'namespace': '/',
                 'room': None,
                 'skip_sid': None,
+                'skip_rooms': None,
+                'cache_key': None,
                 'callback': None,
                 'host_id': '123456',
             }
@@ -200,6 +564,8 @@ class TestPubSubManager:
                 'namespace': '/',
                 'room': None,
                 'skip_sid': None,
+                'skip_rooms': None,
+                'cache_key': None,
                 'callback': None,
                 'host_id': '123456',
             }
@@ -216,6 +582,8 @@ class TestPubSubManager:
                 'namespace': '/',
                 'room': None,
                 'skip_sid': None,
+                'skip_rooms': None,
+                'cache_key': None,
                 'callback': None,
                 'host_id': '123456',
             }
@@ -233,6 +601,8 @@ class TestPubSubManager:
                 'namespace': '/',
                 'room': sid,
                 'skip_sid': None,
+                'skip_rooms': None,
+                'cache_key': None,
                 'callback': None,
                 'host_id': '123456',
             }
@@ -249,6 +619,8 @@ class TestPubSubManager:
                 'namespace': '/baz',
                 'room': None,
                 'skip_sid': None,
+                'skip_rooms': None,
+                'cache_key': None,
                 'callback': None,
                 'host_id': '123456',
             }
@@ -265,6 +637,8 @@ class TestPubSubManager:
                 'namespace': '/',
                 'room': 'baz',
                 'skip_sid': None,
+                'skip_rooms': None,
+                'cache_key': None,
                 'callback': None,
                 'host_id': '123456',
             }
@@ -281,6 +655,26 @@ class TestPubSubManager:
                 'namespace': '/',
                 'room': None,
                 'skip_sid': 'baz',
+                'skip_rooms': None,
+                'cache_key': None,
+                'callback': None,
+                'host_id': '123456',
+            }
+        )
+
+    def test_emit_with_skip_rooms(self):
+        self.pm.emit('foo', 'bar', skip_rooms=['baz'])
+        self.pm._publish.assert_called_once_with(
+            {
+                'method': 'emit',
+                'event': 'foo',
+                'binary': False,
+                'data': ['bar'],
+                'namespace': '/',
+                'room': None,
+                'skip_sid': None,
+                'skip_rooms': ['baz'],
+                'cache_key': None,
                 'callback': None,
                 'host_id': '123456',
             }
@@ -300,6 +694,8 @@ class TestPubSubManager:
                     'namespace': '/',
                     'room': 'baz',
                     'skip_sid': None,
+                    'skip_rooms': None,
+                    'cache_key': None,
                     'callback': ('baz', '/', '123'),
                     'host_id': '123456',
                 }
@@ -344,6 +740,23 @@ class TestPubSubManager:
              'host_id': '123456'}
         )
 
+    def test_disconnect_room_filter(self):
+        sid = self.pm.connect('123', '/')
+        self.pm.enter_room(sid, '/', 'foo')
+        self.pm.connect('456', '/')
+        self.pm.disconnect(None, '/', room_filter='foo')
+        self.pm.server.disconnect.assert_called_once_with(
+            None, namespace='/', ignore_queue=True, room_filter='foo')
+        self.pm._publish.assert_called_once_with(
+            {'method': 'disconnect', 'sid': None, 'namespace': '/',
+             'room_filter': 'foo', 'host_id': '123456'}
+        )
+
+        self.pm.disconnect(None, '/', ignore_queue=True, room_filter='foo')
+        self.pm.server.disconnect.assert_called_with(
+            sid, namespace='/', ignore_queue=True)
+        assert self.pm._publish.call_count == 1
+
     def test_disconnect_ignore_queue(self):
         sid = self.pm.connect('123', '/')
         self.pm.pre_disconnect(sid, '/')
@@ -351,6 +764,109 @@ class TestPubSubManager:
         self.pm._publish.assert_not_called()
         assert not self.pm.is_connected(sid, '/')
 
+    def test_sid_directory_connect_disconnect(self):
+        self.pm.sid_directory = True
+        sid = self.pm.connect('123', '/')
+        self.pm._publish.assert_called_once_with(
+            {'method': 'directory_add', 'sid': sid, 'namespace': '/',
+             'host_id': '123456'}
+        )
+        self.pm._publish.reset_mock()
+        self.pm.pre_disconnect(sid, '/')
+        self.pm.disconnect(sid, '/', ignore_queue=True)
+        self.pm._publish.assert_called_once_with(
+            {'method': 'directory_remove', 'sid': sid, 'namespace': '/',
+             'host_id': '123456'}
+        )
+        self.pm._publish.reset_mock()
+        self.pm.disconnect(sid, '/', ignore_queue=True)
+        self.pm._publish.assert_not_called()
+
+    def test_emit_sid_directory_local(self):
+        self.pm.sid_directory = True
+        sid = self.pm.connect('123', '/')
+        self.pm._publish.reset_mock()
+        self.pm.emit('foo', 'bar', to=sid)
+        self.pm._publish.assert_not_called()
+        assert self.pm.server._send_eio_packet.call_count == 1
+        assert self.pm.server._send_eio_packet.call_args_list[0][0][0] == '123'
+
+    def test_emit_sid_directory_remote(self):
+        self.pm.sid_directory = True
+        self.pm._handle_emit = mock.MagicMock()
+        self.pm._handle_directory_add({'method': 'directory_add',
+                                       'sid': '456', 'namespace': '/',
+                                       'host_id': 'x'})
+        self.pm.emit('foo', 'bar', to='456')
+        self.pm._handle_emit.assert_not_called()
+        self.pm._publish.assert_called_once_with(
+            {'method': 'emit', 'event': 'foo', 'data': ['bar'],
+             'binary': False, 'namespace': '/', 'room': '456',
+             'skip_sid': None, 'skip_rooms': None, 'callback': None,
+             'cache_key': None, 'host_id': '123456', 'to_host': 'x'}
+        )
+
+        self.pm._publish.reset_mock()
+        self.pm._handle_directory_remove({'method': 'directory_remove',
+                                          'sid': '456', 'namespace': '/',
+                                          'host_id': 'x'})
+        assert self.pm.sid_hosts == {}
+        self.pm.emit('foo', 'bar', to='456')
+        assert self.pm._handle_emit.call_count == 1
+        assert 'to_host' not in self.pm._publish.call_args[0][0]
+
+    def test_sid_directory_init(self):
+        pm = pubsub_manager.PubSubManager(sid_directory=True)
+        pm.set_server(mock.MagicMock())
+        pm.initialize()
+        pm.server.start_background_task.assert_any_call(pm._heartbeat_thread)
+
+    def test_sid_directory_host_crash(self):
+        self.pm.sid_directory = True
+        self.pm._handle_emit = mock.MagicMock()
+        self.pm._handle_directory_add({'method': 'directory_add',
+                                       'sid': '456', 'namespace': '/',
+                                       'host_id': 'x'})
+        self.pm._handle_directory_add({'method': 'directory_add',
+                                       'sid': '789', 'namespace': '/',
+                                       'host_id': 'y'})
+
+        # host x crashes, while host y keeps sending heartbeats
+        self.pm.server.sleep.side_effect = StopIteration
+        with mock.patch.object(pubsub_manager.time, 'time',
+                               return_value=time.time() + 61):
+            self.pm._handle_host_alive({'method': 'host_alive',
+                                        'host_id': 'y'})
+            with pytest.raises(StopIteration):
+                self.pm._heartbeat_thread()
+        self.pm._publish.assert_called_once_with(
+            {'method': 'host_alive', 'host_id': '123456'})
+        self.pm.server.sleep.assert_called_once_with(
+            self.pm.host_heartbeat_interval)
+        assert self.pm.sid_hosts == {'789': 'y'}
+        assert list(self.pm.host_last_seen) == ['y']
+
+        # emits to the clients of the crashed host go to all the hosts
+        self.pm._publish.reset_mock()
+        self.pm.emit('foo', 'bar', to='456')
+        assert self.pm._handle_emit.call_count == 1
+        assert 'to_host' not in self.pm._publish.call_args[0][0]
+
+    def test_sid_directory_heartbeat_error(self):
+        self.pm._publish.side_effect = RuntimeError
+        self.pm.server.sleep.side_effect = StopIteration
+        with mock.patch.object(self.pm, '_get_logger') as get_logger:
+            with pytest.raises(StopIteration):
+                self.pm._heartbeat_thread()
+        get_logger().exception.assert_called_once_with(
+            'Unexpected error in the heartbeat task')
+
+    def test_emit_sid_directory_room(self):
+        self.pm.sid_directory = True
+        self.pm.sid_hosts['456'] = 'x'
+        self.pm.emit('foo', 'bar', to=['456'])
+        assert 'to_host' not in self.pm._publish.call_args[0][0]
+
     def test_enter_room(self):
         sid = self.pm.connect('123', '/')
         self.pm.enter_room(sid, '/', 'foo')
@@ -372,6 +888,39 @@ class TestPubSubManager:
              'namespace': '/', 'host_id': '123456'}
         )
 
+    def test_enter_leave_room_filter(self):
+        sid1 = self.pm.connect('123', '/')
+        sid2 = self.pm.connect('456', '/')
+        self.pm.enter_room(sid1, '/', 'foo')
+        self.pm.enter_room(None, '/', 'bar', room_filter='foo')
+        assert dict(self.pm.rooms['/']['bar']) == {sid1: '123'}
+        self.pm._publish.assert_called_once_with(
+            {'method': 'enter_room', 'sid': None, 'room': 'bar',
+             'room_filter': 'foo', 'namespace': '/', 'host_id': '123456'}
+        )
+        self.pm.leave_room(None, '/', 'foo', room_filter=[sid1, sid2])
+        assert 'foo' not in self.pm.rooms['/']
+        self.pm._publish.assert_called_with(
+            {'method': 'leave_room', 'sid': None, 'room': 'foo',
+             'room_filter': [sid1, sid2], 'namespace': '/',
+             'host_id': '123456'}
+        )
+        assert sid2 not in self.pm.rooms['/']['bar']
+
+    def test_room_filter_required(self):
+        self.pm.connect('123', '/')
+        with pytest.raises(ValueError):
+            self.pm.enter_room(None, '/', 'foo')
+        with pytest.raises(ValueError):
+            self.pm.leave_room(None, '/', 'foo')
+        with pytest.raises(ValueError):
+            self.pm.disconnect(None, '/')
+        with pytest.raises(ValueError):
+            self.pm.disconnect(None, '/', ignore_queue=True)
+        assert 'foo' not in self.pm.rooms['/']
+        self.pm.server.disconnect.assert_not_called()
+        self.pm._publish.assert_not_called()
+
     def test_close_room(self):
         self.pm.close_room('foo')
         self.pm._publish.assert_called_once_with(
@@ -395,6 +944,9 @@ class TestPubSubManager:
                 namespace=None,
                 room=None,
                 skip_sid=None,
+                skip_rooms=None,
+                cache_key=None,
+                binary=None,
                 callback=None,
             )
 
@@ -407,6 +959,9 @@ class TestPubSubManager:
                 namespace=None,
                 room=None,
                 skip_sid=None,
+                skip_rooms=None,
+                cache_key=None,
+                binary=None,
                 callback=None,
             )
 
@@ -423,6 +978,9 @@ class TestPubSubManager:
                 namespace=None,
                 room=None,
                 skip_sid=None,
+                skip_rooms=None,
+                cache_key=None,
+                binary=True,
                 callback=None,
             )
             self.pm._handle_emit({
@@ -436,9 +994,48 @@ class TestPubSubManager:
                 namespace=None,
                 room=None,
                 skip_sid=None,
+                skip_rooms=None,
+                cache_key=None,
+                binary=True,
                 callback=None,
             )
 
+    def test_handle_emit_packets(self):
+        with mock.patch.object(
+            manager.Manager, 'emit'
+        ) as super_emit:
+            self.pm._handle_emit({
+                'event': 'foo',
+                'packets': ['51-["foo",{"_placeholder":true,"num":0}]',
+                            'bYmFy'],
+                'namespace': '/',
+                'room': 'baz',
+            })
+            super_emit.assert_called_once_with(
+                'foo',
+                None,
+                namespace='/',
+                room='baz',
+                skip_sid=None,
+                skip_rooms=None,
+                cache_key=None,
+                packets=['51-["foo",{"_placeholder":true,"num":0}]',
+                         b'bar'],
+            )
+
+    def test_handle_emit_packets_delivery(self):
+        sid = self.pm.connect('123', '/')
+        self.pm._handle_emit({
+            'event': 'foo',
+            'packets': ['2["foo","bar"]'],
+            'namespace': '/',
+            'room': sid,
+        })
+        assert self.pm.server._send_eio_packet.call_count == 1
+        assert self.pm.server._send_eio_packet.call_args_list[0][0][0] == '123'
+        pkt = self.pm.server._send_eio_packet.call_args_list[0][0][1]
+        assert pkt.encode() == '42["foo","bar"]'
+
     def test_handle_legacy_emit_binary(self):
         with mock.patch.object(manager.Manager, 'emit') as super_emit:
             self.pm._handle_emit({
@@ -452,6 +1049,9 @@ class TestPubSubManager:
                 namespace=None,
                 room=None,
                 skip_sid=None,
+                skip_rooms=None,
+                cache_key=None,
+                binary=True,
                 callback=None,
             )
             self.pm._handle_emit({
@@ -465,6 +1065,28 @@ class TestPubSubManager:
                 namespace=None,
                 room=None,
                 skip_sid=None,
+                skip_rooms=None,
+                cache_key=None,
+                binary=True,
+                callback=None,
+            )
+
+    def test_handle_emit_binary_msgpack(self):
+        with mock.patch.object(manager.Manager, 'emit') as super_emit:
+            self.pm._handle_emit({
+                'event': 'foo',
+                'binary': True,
+                'data': [[{'_placeholder': True, 'num': 0}], b'bar'],
+            })
+            super_emit.assert_called_once_with(
+                'foo',
+                b'bar',
+                namespace=None,
+                room=None,
+                skip_sid=None,
+                skip_rooms=None,
+                cache_key=None,
+                binary=True,
                 callback=None,
             )
 
@@ -477,6 +1099,9 @@ class TestPubSubManager:
                 namespace=None,
                 room=None,
                 skip_sid=None,
+                skip_rooms=None,
+                cache_key=None,
+                binary=None,
                 callback=None,
             )
             self.pm._handle_emit({
@@ -492,6 +1117,9 @@ class TestPubSubManager:
                 namespace=None,
                 room=None,
                 skip_sid=None,
+                skip_rooms=None,
+                cache_key=None,
+                binary=True,
                 callback=None,
             )
 
@@ -504,6 +1132,9 @@ class TestPubSubManager:
                 namespace=None,
                 room=None,
                 skip_sid=None,
+                skip_rooms=None,
+                cache_key=None,
+                binary=None,
                 callback=None,
             )
 
@@ -516,6 +1147,9 @@ class TestPubSubManager:
                 namespace=None,
                 room=None,
                 skip_sid=None,
+                skip_rooms=None,
+                cache_key=None,
+                binary=None,
                 callback=None,
             )
             self.pm._handle_emit({
@@ -531,6 +1165,9 @@ class TestPubSubManager:
                 namespace=None,
                 room=None,
                 skip_sid=None,
+                skip_rooms=None,
+                cache_key=None,
+                binary=True,
                 callback=None,
             )
 
@@ -545,6 +1182,9 @@ class TestPubSubManager:
                 namespace='/baz',
                 room=None,
                 skip_sid=None,
+                skip_rooms=None,
+                cache_key=None,
+                binary=None,
                 callback=None,
             )
 
@@ -559,6 +1199,9 @@ class TestPubSubManager:
                 namespace=None,
                 room='baz',
                 skip_sid=None,
+                skip_rooms=None,
+                cache_key=None,
+                binary=None,
                 callback=None,
             )
 
@@ -573,6 +1216,26 @@ class TestPubSubManager:
                 namespace=None,
                 room=None,
                 skip_sid='123',
+                skip_rooms=None,
+                cache_key=None,
+                binary=None,
+                callback=None,
+            )
+
+    def test_handle_emit_with_skip_rooms(self):
+        with mock.patch.object(manager.Manager, 'emit') as super_emit:
+            self.pm._handle_emit(
+                {'event': 'foo', 'data': 'bar', 'skip_rooms': ['baz']}
+            )
+            super_emit.assert_called_once_with(
+                'foo',
+                'bar',
+                namespace=None,
+                room=None,
+                skip_sid=None,
+                skip_rooms=['baz'],
+                cache_key=None,
+                binary=None,
                 callback=None,
             )
 
@@ -694,6 +1357,29 @@ class TestPubSubManager:
             sid='123', namespace='/foo', ignore_queue=True
         )
 
+    def test_handle_disconnect_room_filter(self):
+        self.pm._handle_disconnect(
+            {'method': 'disconnect', 'sid': None, 'namespace': '/foo',
+             'room_filter': 'bar'}
+        )
+        self.pm.server.disconnect.assert_called_once_with(
+            None, namespace='/foo', ignore_queue=True, room_filter='bar'
+        )
+
+    def test_handle_enter_leave_room_filter(self):
+        sid1 = self.pm.connect('123', '/')
+        sid2 = self.pm.connect('456', '/')
+        self.pm.enter_room(sid2, '/', 'foo')
+        self.pm._handle_enter_room({
+            'method': 'enter_room', 'sid': None, 'namespace': '/',
+            'room': 'bar', 'room_filter': [sid1, 'foo']})
+        assert dict(self.pm.rooms['/']['bar']) == {sid1: '123', sid2: '456'}
+        self.pm._handle_leave_room({
+            'method': 'leave_room', 'sid': None, 'namespace': '/',
+            'room': 'bar', 'room_filter': 'foo'})
+        assert dict(self.pm.rooms['/']['bar']) == {sid1: '123'}
+        self.pm._publish.assert_not_called()
+
     def test_handle_enter_room(self):
         sid = self.pm.connect('123', '/')
         with mock.patch.object(
@@ -825,6 +1511,191 @@ class TestPubSubManager:
             {'method': 'emit', 'value': 'bar', 'host_id': 'x'}
         )
 
+    def test_background_thread_batch(self):
+        self.pm._handle_emit = mock.MagicMock()
+        self.pm._handle_callback = mock.MagicMock()
+        host_id = self.pm.host_id
+
+        def messages():
+            yield {'method': 'batch', 'host_id': 'x', 'messages': [
+                {'method': 'emit', 'value': 'foo', 'host_id': 'x'},
+                {'method': 'callback', 'value': 'bar', 'host_id': host_id},
+            ]}
+            yield {'method': 'batch', 'host_id': 'x'}
+
+        self.pm._listen = mock.MagicMock(side_effect=messages)
+        try:
+            self.pm._thread()
+        except StopIteration:
+            pass
+
+        self.pm._handle_emit.assert_called_once_with(
+            {'method': 'emit', 'value': 'foo', 'host_id': 'x'}
+        )
+        self.pm._handle_callback.assert_called_once_with(
+            {'method': 'callback', 'value': 'bar', 'host_id': host_id}
+        )
+
+    def test_background_thread_sid_directory(self):
+        self.pm._handle_emit = mock.MagicMock()
+        host_id = self.pm.host_id
+
+        def messages():
+            yield {'method': 'directory_add', 'sid': '456', 'namespace': '/',
+                   'host_id': 'x'}
+            yield {'method': 'emit', 'value': 'foo', 'host_id': 'x',
+                   'to_host': host_id}
+            yield {'method': 'emit', 'value': 'bar', 'host_id': 'x',
+                   'to_host': 'y'}
+            yield {'method': 'directory_add', 'sid': '789', 'namespace': '/',
+                   'host_id': 'x'}
+            yield {'method': 'directory_remove', 'sid': '456',
+                   'namespace': '/', 'host_id': 'x'}
+            yield {'method': 'host_alive', 'host_id': 'z'}
+
+        self.pm._listen = mock.MagicMock(side_effect=messages)
+        try:
+            self.pm._thread()
+        except StopIteration:
+            pass
+
+        self.pm._handle_emit.assert_called_once_with(
+            {'method': 'emit', 'value': 'foo', 'host_id': 'x',
+             'to_host': host_id}
+        )
+        assert self.pm.sid_hosts == {'789': 'x'}
+        assert set(self.pm.host_last_seen) == {'x', 'z'}
+
+    def test_background_thread_msgpack(self):
+        self.pm._handle_emit = mock.MagicMock()
+
+        def messages():
+            yield msgpack.packb({'method': 'emit', 'value': 'foo',
+                                 'host_id': 'x'})
+            yield b'{"method": "emit", "value": "bar", "host_id": "x"}'
+            yield b'\x81bad data'
+
+        self.pm._listen = mock.MagicMock(side_effect=messages)
+        try:
+            self.pm._thread()
+        except StopIteration:
+            pass
+
+        self.pm._handle_emit.assert_any_call(
+            {'method': 'emit', 'value': 'foo', 'host_id': 'x'}
+        )
+        self.pm._handle_emit.assert_called_with(
+            {'method': 'emit', 'value': 'bar', 'host_id': 'x'}
+        )
+        assert self.pm._handle_emit.call_count == 2
+
+    def test_encode_message(self):
+        message = {'method': 'emit', 'binary': True,
+                   'data': [[{'_placeholder': True, 'num': 0}], b'bar']}
+        self.pm.serializer = 'msgpack'
+        assert self.pm._encode_message(message) == msgpack.packb(message)
+        message['data'][0].append(object())
+        self.pm.json = mock.MagicMock()
+        self.pm.json.dumps.return_value = 'foo'
+        assert self.pm._encode_message(message) == 'foo'
+        assert self.pm.json.dumps.call_args[0][0]['data'][1] == 'YmFy'
+        self.pm.serializer = 'default'
+        self.pm._encode_message({'method': 'emit'})
+        self.pm.json.dumps.assert_called_with({'method': 'emit'})
+
+    def test_decode_message(self):
+        message = {'method': 'emit', 'data': [b'bar']}
+        assert self.pm._decode_message(msgpack.packb(message)) == message
+        assert self.pm._decode_message('{"method": "emit"}') == {
+            'method': 'emit'}
+        assert self.pm._decode_message(b'{"method": "emit"}') == {
+            'method': 'emit'}
+
+    def test_encode_message_packets(self):
+        message = {'method': 'emit', 'packets': ['51-["foo"]', b'bar']}
+        assert json.loads(self.pm._encode_message(message)) == {
+            'method': 'emit', 'packets': ['51-["foo"]', 'bYmFy']}
+        self.pm.serializer = 'msgpack'
+        assert self.pm._encode_message(message) == msgpack.packb(message)
+
+    def test_encode_message_envelope(self):
+        self.pm.envelope = True
+        message = {'method': 'emit', 'event': 'foo', 'data': ['bar'],
+                   'namespace': '/', 'room': 'baz', 'host_id': 'x'}
+        encoded = self.pm._encode_message(message)
+        payload = json.dumps(message).encode()
+        assert encoded.startswith(b'\x01')
+        header, data = encoded[1:].split(b'\n', 1)
+        assert json.loads(header) == {
+            'method': 'emit', 'host_id': 'x', 'to_host': None,
+            'namespace': '/', 'room': 'baz', 'size': len(payload)}
+        assert data == payload
+
+        self.pm.serializer = 'msgpack'
+        encoded = self.pm._encode_message(message)
+        assert encoded.endswith(b'\n' + msgpack.packb(message))
+
+        message = {'method': 'disconnect', 'sid': '123', 'namespace': '/'}
+        assert self.pm._encode_message(message) == msgpack.packb(message)
+
+    def test_decode_message_envelope(self):
+        sid = self.pm.connect('123', '/')
+        sender = pubsub_manager.PubSubManager(envelope=True)
+        sender.host_id = 'x'
+        for serializer in ['default', 'msgpack']:
+            sender.serializer = serializer
+            for room, to_host, local in [
+                    (None, None, True), (sid, None, True),
+                    ([sid, 'foo'], None, True), ('foo', None, False),
+                    (['foo'], None, False), (None, '123456', True),
+                    (None, 'y', False)]:
+                message = {'method': 'emit', 'event': 'foo', 'data': ['bar'],
+                           'namespace': '/', 'room': room, 'host_id': 'x',
+                           'to_host': to_host}
+                encoded = sender._encode_message(message)
+                if local:
+                    assert self.pm._decode_message(encoded) == message
+                else:
+                    assert self.pm._decode_message(encoded) is None
+            message = {'method': 'emit', 'namespace': '/foo', 'room': None,
+                       'host_id': 'x'}
+            assert self.pm._decode_message(
+                sender._encode_message(message)) is None
+            message = {'method': 'emit', 'namespace': '/', 'room': None,
+                       'host_id': '123456'}
+            assert self.pm._decode_message(
+                sender._encode_message(message)) is None
+
+        sender.serializer = 'default'
+        message = {'method': 'emit', 'namespace': '/', 'room': None,
+                   'host_id': 'x'}
+        encoded = sender._encode_message(message)
+        assert self.pm._decode_message(encoded.decode()) == message
+        with pytest.raises(ValueError):
+            self.pm._decode_message(encoded[:-1])
+
+    def test_batch_envelope(self):
+        sid = self.pm.connect('123', '/')
+        sender = pubsub_manager.PubSubManager(envelope=True)
+        sender.host_id = 'x'
+        local = {'method': 'emit', 'event': 'foo', 'data': ['bar'],
+                 'namespace': '/', 'room': sid, 'host_id': 'x'}
+        remote = {'method': 'emit', 'event': 'foo', 'data': ['baz'],
+                  'namespace': '/', 'room': 'foo', 'host_id': 'x'}
+        disconnect = {'method': 'disconnect', 'sid': sid, 'namespace': '/',
+                      'host_id': 'x'}
+        for serializer in ['default', 'msgpack']:
+            sender.serializer = serializer
+            encoded = sender._encode_message(
+                sender._batch_message([local, remote, disconnect]))
+            assert encoded.startswith(b'\x02')
+            assert json.loads(encoded[1:].split(b'\n', 1)[0])['method'] == \
+                'batch'
+            assert self.pm._decode_message(encoded) == {
+                'method': 'batch', 'messages': [local, disconnect]}
+        with pytest.raises(ValueError):
+            self.pm._decode_message(encoded[:-1])
+
     def test_custom_json(self):
         saved_json = packet.Packet.json
 
@@ -835,3 +1706,174 @@ class TestPubSubManager:
 
         packet.Packet.json = saved_json
         EIOPacket.json = saved_json
+
+    def _reply_with(self, *replies):
+        # simulate the other hosts replying to the published query
+        self.pm.server.eio.create_queue = queue.Queue
+        self.pm.server.eio.get_queue_empty_exception.return_value = \
+            queue.Empty
+
+        def publish(message):
+            assert message['method'] == 'query'
+            assert message['host_id'] == '123456'
+            for reply in replies:
+                self.pm._handle_query_reply(dict(
+                    reply, method='query_reply', host_id='123456',
+                    id=message['id']))
+
+        self.pm._publish.side_effect = publish
+
+    def test_fetch_participants(self):
+        sid1 = self.pm.connect('123', '/')
+        self.pm.enter_room(sid1, '/', 'room')
+        self.pm.connect('456', '/')
+        self._reply_with(
+            {'responder': 'x', 'result': ['a', 'b'], 'last': False},
+            {'responder': 'y', 'result': ['c'], 'last': True},
+            {'responder': 'x', 'result': ['d'], 'last': True})
+        assert list(self.pm.fetch_participants('/', 'room', hosts=2,
+                                               page_size=2)) == [
+            sid1, 'a', 'b', 'c', 'd']
+        message = self.pm._publish.call_args[0][0]
+        assert message['query'] == 'participants'
+        assert message['room'] == 'room'
+        assert message['page_size'] == 2
+        assert self.pm.pending_queries == {}
+
+    def test_fetch_participants_timeout(self):
+        sid1 = self.pm.connect('123', '/')
+        self._reply_with({'responder': 'x', 'result': ['a'], 'last': True})
+        start = time.time()
+        assert list(self.pm.fetch_participants('/', None, timeout=0.05)) == [
+            sid1, 'a']
+        assert time.time() - start >= 0.05
+        assert self.pm.pending_queries == {}
+
+    def test_fetch_participants_no_hosts(self):
+        sid1 = self.pm.connect('123', '/')
+        assert list(self.pm.fetch_participants('/', None, hosts=0)) == [sid1]
+        self.pm._publish.assert_not_called()
+
+    def test_fetch_rooms(self):
+        sid1 = self.pm.connect('123', '/')
+        self.pm.enter_room(sid1, '/', 'room')
+        assert self.pm.fetch_rooms(sid1) == [sid1, 'room']
+        self.pm._publish.assert_not_called()
+
+        self._reply_with({'responder': 'x', 'result': None, 'last': True},
+                         {'responder': 'y', 'result': ['a', 'b'],
+                          'last': True})
+        assert self.pm.fetch_rooms('a', '/', hosts=3) == ['a', 'b']
+        assert self.pm._publish.call_args[0][0]['sid'] == 'a'
+        assert self.pm.pending_queries == {}
+
+        self._reply_with({'responder': 'x', 'result': None, 'last': True})
+        assert self.pm.fetch_rooms('a', '/', hosts=1) is None
+
+    def test_count(self):
+        sid1 = self.pm.connect('123', '/')
+        self.pm.enter_room(sid1, '/', 'room')
+        self.pm.connect('456', '/')
+        self._reply_with({'responder': 'x', 'result': 3, 'last': True},
+                         {'responder': 'y', 'result': 4, 'last': True})
+        assert self.pm.count('/', hosts=2) == 9
+        assert self.pm.count('/', 'room', hosts=2) == 8
+        assert self.pm.count('/', 'bad', hosts=0) == 0
+
+    def test_count_rooms(self):
+        sid1 = self.pm.connect('123', '/')
+        sid2 = self.pm.connect('456', '/')
+        self.pm.enter_room(sid1, '/', 'room')
+        self.pm.enter_room(sid1, '/', 'other')
+        self.pm.enter_room(sid2, '/', 'other')
+        self._reply_with({'responder': 'x', 'result': 3, 'last': True})
+        assert self.pm.count('/', ['room', 'other', 'bad'], hosts=1) == 5
+        assert self.pm._publish.call_args[0][0]['room'] == [
+            'room', 'other', 'bad']
+
+        self.pm._publish.side_effect = None
+        self.pm._handle_query({'method': 'query', 'query': 'count',
+                               'id': 'q', 'host_id': 'x', 'namespace': '/',
+                               'room': ['room', 'other']})
+        assert self.pm._publish.call_args[0][0]['result'] == 2
+
+    def test_query_without_server(self):
+        pm = pubsub_manager.PubSubManager(write_only=True)
+        with pytest.raises(RuntimeError):
+            pm.count('/')
+
+    def test_query_from_listener(self):
+        self.pm._listen = mock.MagicMock(return_value=[])
+        self.pm._thread()
+        assert self.pm.listener == threading.get_ident()
+        with pytest.raises(RuntimeError):
+            self.pm.count('/')
+        with pytest.raises(RuntimeError):
+            list(self.pm.fetch_participants('/', 'room'))
+        self.pm._publish.assert_not_called()
+
+    def test_handle_query_participants(self):
+        sids = [self.pm.connect(str(i), '/') for i in range(5)]
+        self.pm._handle_query({'method': 'query', 'query': 'participants',
+                               'id': 'q', 'host_id': 'x', 'namespace': '/',
+                               'room': None, 'page_size': 2})
+        reply = {'method': 'query_reply', 'host_id': 'x', 'id': 'q',
+                 'responder': '123456'}
+        assert self.pm._publish.call_args_list == [
+            mock.call(dict(reply, result=sids[0:2], last=False)),
+            mock.call(dict(reply, result=sids[2:4], last=False)),
+            mock.call(dict(reply, result=sids[4:], last=True)),
+        ]
+
+        self.pm._publish.reset_mock()
+        self.pm._handle_query({'method': 'query', 'query': 'participants',
+                               'id': 'q', 'host_id': 'x', 'namespace': '/',
+                               'room': 'bad', 'page_size': 2})
+        self.pm._publish.assert_called_once_with(
+            dict(reply, result=[], last=True))
+
+    def test_handle_query_rooms_and_count(self):
+        sid1 = self.pm.connect('123', '/')
+        self.pm.enter_room(sid1, '/', 'room')
+        reply = {'method': 'query_reply', 'host_id': 'x', 'id': 'q',
+                 'responder': '123456', 'last': True}
+        self.pm._handle_query({'method': 'query', 'query': 'rooms', 'id': 'q',
+                               'host_id': 'x', 'namespace': '/', 'sid': sid1})
+        self.pm._publish.assert_called_with(
+            dict(reply, result=[sid1, 'room']))
+        self.pm._handle_query({'method': 'query', 'query': 'rooms', 'id': 'q',
+                               'host_id': 'x', 'namespace': '/', 'sid': 'a'})
+        self.pm._publish.assert_called_with(dict(reply, result=None))
+        self.pm._handle_query({'method': 'query', 'query': 'count', 'id': 'q',
+                               'host_id': 'x', 'namespace': '/',
+                               'room': 'room'})
+        self.pm._publish.assert_called_with(dict(reply, result=1))
+
+    def test_handle_query_reply_bad_host_id(self):
+        replies = mock.MagicMock()
+        self.pm.pending_queries['q'] = replies
+        self.pm._handle_query_reply({'method': 'query_reply', 'id': 'q',
+                                     'host_id': 'bad'})
+        self.pm._handle_query_reply({'method': 'query_reply', 'id': 'bad',
+                                     'host_id': '123456'})
+        replies.put.assert_not_called()
+
+    def test_background_thread_query(self):
+        self.pm._handle_query = mock.MagicMock()
+        self.pm._handle_query_reply = mock.MagicMock()
+
+        def messages():
+            yield {'method': 'query', 'query': 'count', 'host_id': 'x'}
+            yield {'method': 'query', 'query': 'count', 'host_id': '123456'}
+            yield {'method': 'query_reply', 'host_id': '123456'}
+
+        self.pm._listen = mock.MagicMock(side_effect=messages)
+        try:
+            self.pm._thread()
+        except StopIteration:
+            pass
+
+        self.pm._handle_query.assert_called_once_with(
+            {'method': 'query', 'query': 'count', 'host_id': 'x'})
+        self.pm._handle_query_reply.assert_called_once_with(
+            {'method': 'query_reply', 'host_id': '123456'})
@@ -1,3 +1,5 @@
+from unittest import mock
+
 import pytest
 import redis
 import valkey
@@ -147,6 +149,34 @@ class TestPubSubManager:
             {'username': 'user', 'password': 'password', 'db': 0}
         )
 
+    def test_publish_many(self):
+        cm = RedisManager('redis://', channel='foo', write_only=True,
+                          sid_directory=True, shards=8)
+        cm.redis = mock.MagicMock()
+        cm.connected = True
+        pipe = cm.redis.pipeline.return_value
+        cm._publish_many([{'method': 'emit', 'namespace': '/', 'room': None},
+                          {'method': 'close_room', 'room': 'bar'}])
+        cm.redis.pipeline.assert_called_once_with(transaction=False)
+        assert pipe.publish.call_args_list == [
+            mock.call('foo', '{"method": "emit", "namespace": "/", '
+                             '"room": null}'),
+            mock.call('foo', '{"method": "close_room", "room": "bar"}')]
+        pipe.execute.assert_called_once_with()
+
+        # a failed publish is retried once, after reconnecting
+        pipe.execute.reset_mock()
+        pipe.execute.side_effect = [RuntimeError(), None]
+        cm._redis_connect = mock.MagicMock()
+        cm._publish_many([{'method': 'emit'}])
+        cm._redis_connect.assert_called_once_with()
+        assert pipe.execute.call_count == 2
+
+        pipe.execute.side_effect = RuntimeError()
+        with pytest.raises(RuntimeError):
+            cm._publish_many([{'method': 'emit'}])
+        assert cm.connected is False
+
     def test_custom_json(self):
         saved_json = Packet.json
 
@@ -157,3 +187,154 @@ class TestPubSubManager:
 
         Packet.json = saved_json
         EIOPacket.json = saved_json
+
+    def test_get_shard(self):
+        assert redis_manager.get_shard('/', 'room', 8) == \
+            redis_manager.get_shard('/', 'room', 8)
+        shards = {redis_manager.get_shard('/', f'room{i}', 8)
+                  for i in range(100)}
+        assert shards == set(range(8))
+
+    def test_publish_channel_sid_directory(self):
+        cm = RedisManager('redis://', channel='foo', sid_directory=True,
+                          shards=8)
+        cm.host_id = 'abc'
+        assert cm._get_publish_channel(
+            {'method': 'emit', 'namespace': '/', 'room': 'room',
+             'to_host': 'x'}) == 'foo@x'
+        assert cm._get_publish_channel(
+            {'method': 'callback', 'host_id': 'x'}) == 'foo@x'
+        assert cm._get_publish_channel(
+            {'method': 'query_reply', 'host_id': 'x'}) == 'foo@x'
+        assert cm._get_publish_channel(
+            {'method': 'emit', 'namespace': '/', 'room': None}) == 'foo'
+        assert cm._get_subscribe_channels() == ['foo', 'foo@abc']
+
+    def test_shards_require_sid_directory(self):
+        with pytest.raises(ValueError):
+            RedisManager('redis://', shards=8)
+
+    def test_publish_channel(self):
+        cm = RedisManager('redis://', channel='foo')
+        assert cm._get_publish_channel(
+            {'method': 'emit', 'namespace': '/', 'room': 'room'}) == 'foo'
+
+        cm = RedisManager('redis://', channel='foo', sid_directory=True,
+                          shards=8)
+        shard = redis_manager.get_shard('/', 'room', 8)
+        # the room has no local members, so it could be a client sid
+        assert cm._get_publish_channel(
+            {'method': 'emit', 'namespace': '/', 'room': 'room'}) == 'foo'
+        cm.basic_enter_room('sid3', '/', None, eio_sid='3')
+        cm.basic_enter_room('sid3', '/', 'room', eio_sid='3')
+        assert cm._get_publish_channel(
+            {'method': 'emit', 'namespace': '/', 'room': 'room'}) == \
+            f'foo#{shard}'
+
+        # emits to clients are not sharded
+        cm.basic_enter_room('sid1', '/', None, eio_sid='1')
+        cm.sid_hosts['sid2'] = 'x'
+        assert cm._get_publish_channel(
+            {'method': 'emit', 'namespace': '/', 'room': 'sid1'}) == 'foo'
+        assert cm._get_publish_channel(
+            {'method': 'emit', 'namespace': '/', 'room': 'sid2'}) == 'foo'
+        assert cm._get_publish_channel(
+            {'method': 'emit', 'namespace': '/', 'room': None}) == 'foo'
+        assert cm._get_publish_channel(
+            {'method': 'emit', 'namespace': '/', 'room': ['a', 'b']}) == \
+            'foo'
+        assert cm._get_publish_channel(
+            {'method': 'close_room', 'namespace': '/', 'room': 'room'}) == \
+            'foo'
+        assert cm._get_publish_channel(
+            {'method': 'batch', 'messages': []}) == 'foo'
+
+        # write-only instances do not know which rooms are clients
+        cm = RedisManager('redis://', channel='foo', sid_directory=True,
+                          shards=8, write_only=True)
+        assert cm._get_publish_channel(
+            {'method': 'emit', 'namespace': '/', 'room': 'room'}) == 'foo'
+
+    def test_publish_channel_unknown_sid(self):
+        # a client connects to the first server before the second server
+        # starts, so the second server does not have it in its directory
+        first = RedisManager('redis://', channel='foo',
+                             sid_directory=True, shards=8)
+        first.basic_enter_room('sid1', '/', None, eio_sid='1')
+        first.basic_enter_room('sid1', '/', 'sid1', eio_sid='1')
+        first.basic_enter_room('sid1', '/', 'room', eio_sid='1')
+        second = RedisManager('redis://', channel='foo',
+                              sid_directory=True, shards=8)
+        second.basic_enter_room('sid2', '/', None, eio_sid='2')
+        second.basic_enter_room('sid2', '/', 'room', eio_sid='2')
+
+        # the emits from the second server reach the first one
+        for room in ['sid1', 'room']:
+            channel = second._get_publish_channel(
+                {'method': 'emit', 'namespace': '/', 'room': room})
+            assert channel in first._get_subscribe_channels()
+        channel = second._get_publish_channel(
+            {'method': 'emit', 'namespace': '/', 'room': 'sid1'})
+        assert channel == 'foo'
+
+    def test_shard_subscriptions(self):
+        cm = RedisManager('redis://', channel='foo', sid_directory=True,
+                          shards=8)
+        cm.host_id = 'abc'
+        cm.basic_enter_room('123', '/', 'room', eio_sid='1')
+        shard = redis_manager.get_shard('/', 'room', 8)
+        assert cm.shard_rooms == {shard: 1}
+        assert list(cm.shard_requests) == [('subscribe', shard)]
+        assert cm._get_subscribe_channels() == ['foo', 'foo@abc',
+                                                f'foo#{shard}']
+        assert list(cm.shard_requests) == []
+
+        cm.basic_enter_room('456', '/', 'room', eio_sid='2')
+        assert cm.shard_rooms == {shard: 1}
+        cm.basic_leave_room('123', '/', 'room')
+        assert cm.shard_rooms == {shard: 1}
+        assert list(cm.shard_requests) == []
+        cm.basic_leave_room('456', '/', 'room')
+        assert cm.shard_rooms == {}
+        cm.basic_leave_room('456', '/', 'room')
+        assert cm.shard_rooms == {}
+        cm.basic_enter_room('123', '/', 'room', eio_sid='1')
+        assert cm.shard_rooms == {shard: 1}
+        assert list(cm.shard_requests) == [('unsubscribe', shard),
+                                           ('subscribe', shard)]
+
+        # the changes are applied by the listener
+        cm.pubsub = mock.MagicMock()
+        cm.pubsub.get_message.side_effect = [None, {'data': 'foo'}]
+        assert next(cm._pubsub_listen()) == {'data': 'foo'}
+        cm.pubsub.unsubscribe.assert_called_once_with(f'foo#{shard}')
+        cm.pubsub.subscribe.assert_called_once_with(f'foo#{shard}')
+        cm.pubsub.get_message.assert_called_with(
+            timeout=cm.shard_poll_interval)
+        assert list(cm.shard_requests) == []
+
+    def test_shard_subscriptions_sid_rooms(self):
+        cm = RedisManager('redis://', channel='foo', sid_directory=True,
+                          shards=8)
+        cm.basic_enter_room('sid1', '/', None, eio_sid='1')
+        cm.basic_enter_room('sid1', '/', 'sid1', eio_sid='1')
+        assert cm.shard_rooms == {}
+        cm.basic_leave_room('sid1', '/', 'sid1')
+        cm.basic_leave_room('sid1', '/', None)
+        assert cm.shard_rooms == {}
+        assert list(cm.shard_requests) == []
+
+    def test_listen_without_shards(self):
+        cm = RedisManager('redis://', channel='foo')
+        cm.pubsub = mock.MagicMock()
+        cm.pubsub.listen.return_value = iter([{'data': 'foo'}])
+        assert list(cm._pubsub_listen()) == [{'data': 'foo'}]
+
+    def test_shard_subscriptions_disabled(self):
+        cm = RedisManager('redis://', channel='foo')
+        cm.pubsub = mock.MagicMock(subscribed=True)
+        cm.basic_enter_room('123', '/', 'room', eio_sid='1')
+        cm.basic_leave_room('123', '/', 'room')
+        assert cm.shard_rooms == {}
+        cm.pubsub.subscribe.assert_not_called()
+        cm.pubsub.unsubscribe.assert_not_called()
@@ -0,0 +1,143 @@
+import itertools
+from unittest import mock
+
+import pytest
+
+from socketio.redis_streams_manager import RedisStreamsManager
+
+
+class FakeStreams:
+    """An in-memory replacement for the stream commands of a Redis client."""
+    def __init__(self):
+        self.entries = []
+        self.xadd_calls = []
+        self.xread_calls = []
+        self.fail_reads = 0
+        self.incoming = []
+
+    def publish(self, *messages):
+        # messages that are added to the stream during the next read
+        self.incoming.append(messages)
+
+    def xadd(self, name, fields, maxlen=None, approximate=True):
+        self.xadd_calls.append((name, maxlen, approximate))
+        entry_id = f'{len(self.entries) + 1}-0'.encode()
+        self.entries.append((entry_id, {k.encode(): v
+                                        for k, v in fields.items()}))
+        return entry_id
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+    def xrevrange(self, name, count=None):
+        return list(reversed(self.entries))[:count]
+
+    def xread(self, streams, count=None, block=None):
+        self.xread_calls.append((streams, count, block))
+        if self.incoming:
+            for data in self.incoming.pop(0):
+                self.xadd('socketio', {'data': data})
+        if self.fail_reads:
+            self.fail_reads -= 1
+            raise RuntimeError('connection lost')
+        name, last_id = list(streams.items())[0]
+        last = int(last_id.split(b'-')[0] if isinstance(last_id, bytes)
+                   else last_id.split('-')[0])
+        entries = [(entry_id, fields) for entry_id, fields in self.entries
+                   if int(entry_id.split(b'-')[0]) > last][:count]
+        return [[name, entries]] if entries else []
+
+
+class FakePipeline:
+    def __init__(self, streams):
+        self.streams = streams
+        self.commands = []
+
+    def xadd(self, *args, **kwargs):
+        self.commands.append((args, kwargs))
+
+    def execute(self):
+        return [self.streams.xadd(*args, **kwargs)
+                for args, kwargs in self.commands]
+
+
+class TestRedisStreamsManager:
+    def setup_method(self):
+        self.streams = FakeStreams()
+
+        def connect(pm):
+            pm.redis = self.streams
+            pm.connected = True
+
+        self.connect = mock.patch.object(RedisStreamsManager, '_redis_connect',
+                                         connect)
+        self.connect.start()
+
+    def teardown_method(self):
+        self.connect.stop()
+
+    def test_publish(self):
+        pm = RedisStreamsManager('redis://', write_only=True, maxlen=50)
+        pm._publish({'method': 'emit', 'event': 'foo'})
+        assert self.streams.xadd_calls == [('socketio', 50, True)]
+        assert len(self.streams.entries) == 1
+        assert pm._decode_message(self.streams.entries[0][1][b'data']) == {
+            'method': 'emit', 'event': 'foo'}
+
+    def test_publish_many(self):
+        pm = RedisStreamsManager('redis://', write_only=True, maxlen=50)
+        pm._publish_many([{'method': 'emit', 'event': 'foo'},
+                          {'method': 'emit', 'event': 'bar'}])
+        assert self.streams.xadd_calls == [('socketio', 50, True)] * 2
+        assert [pm._decode_message(fields[b'data'])['event']
+                for _, fields in self.streams.entries] == ['foo', 'bar']
+
+        pm.redis = mock.MagicMock()
+        pm.redis.pipeline.return_value.execute.side_effect = RuntimeError()
+        pm._redis_connect = mock.MagicMock()
+        with pytest.raises(RuntimeError):
+            pm._publish_many([{'method': 'emit'}])
+        assert pm.connected is False
+        pm._redis_connect.assert_called_once_with()
+        assert pm.redis.pipeline.return_value.execute.call_count == 2
+
+    def test_publish_retry(self):
+        pm = RedisStreamsManager('redis://', write_only=True)
+        pm.redis = broken = mock.MagicMock()
+        broken.xadd.side_effect = RuntimeError()
+        pm.connected = True
+        pm._publish({'method': 'emit'})
+        assert broken.xadd.call_count == 1
+        assert pm.redis == self.streams
+        assert len(self.streams.entries) == 1
+
+    def test_listen_from_newest(self):
+        pm = RedisStreamsManager('redis://', write_only=True, read_count=2)
+        self.streams.xadd('socketio', {'data': 'old'})
+        self.streams.publish('a', 'b', 'c')
+        listener = pm._listen()
+        assert list(itertools.islice(listener, 3)) == ['a', 'b', 'c']
+        assert pm.last_id == b'4-0'
+        assert self.streams.xread_calls[0] == ({'socketio': b'1-0'}, 2, 1000)
+        assert self.streams.xread_calls[1] == ({'socketio': b'3-0'}, 2, 1000)
+
+    def test_listen_empty_stream(self):
+        pm = RedisStreamsManager('redis://', write_only=True)
+        self.streams.publish('a')
+        listener = pm._redis_listen_with_retries()
+        assert next(listener) == {b'data': 'a'}
+        assert self.streams.xread_calls[0][0] == {'socketio': '0-0'}
+
+    @mock.patch('socketio.redis_streams_manager.time.sleep')
+    def test_listen_reconnect(self, sleep):
+        pm = RedisStreamsManager('redis://', write_only=True)
+        self.streams.publish('a')
+        listener = pm._listen()
+        assert next(listener) == 'a'
+
+        # messages published while the connection is down are not lost
+        self.streams.fail_reads = 2
+        self.streams.xadd('socketio', {'data': 'b'})
+        self.streams.xadd('socketio', {'data': 'c'})
+        assert list(itertools.islice(listener, 2)) == ['b', 'c']
+        assert sleep.call_args_list == [mock.call(1), mock.call(1)]
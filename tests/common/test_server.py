@@ -92,6 +92,9 @@ class TestServer:
             '/foo',
             room='room',
             skip_sid='123',
+            skip_rooms=None,
+            cache_key=None,
+            binary=None,
             callback='cb',
             ignore_queue=False,
         )
@@ -110,6 +113,9 @@ class TestServer:
             '/foo',
             room='room',
             skip_sid='123',
+            skip_rooms=None,
+            cache_key=None,
+            binary=None,
             callback='cb',
             ignore_queue=True,
         )
@@ -130,6 +136,9 @@ class TestServer:
             '/',
             room='room',
             skip_sid='123',
+            skip_rooms=None,
+            cache_key=None,
+            binary=None,
             callback='cb',
             ignore_queue=False,
         )
@@ -147,6 +156,9 @@ class TestServer:
             '/',
             room='room',
             skip_sid='123',
+            skip_rooms=None,
+            cache_key=None,
+            binary=None,
             callback='cb',
             ignore_queue=True,
         )
@@ -163,6 +175,9 @@ class TestServer:
             '/foo',
             room='room',
             skip_sid='123',
+            skip_rooms=None,
+            cache_key=None,
+            binary=None,
             callback='cb',
             ignore_queue=False,
         )
@@ -179,6 +194,9 @@ class TestServer:
             '/foo',
             room='room',
             skip_sid='123',
+            skip_rooms=None,
+            cache_key=None,
+            binary=None,
             callback='cb',
             ignore_queue=True,
         )
@@ -242,6 +260,29 @@ class TestServer:
         s.leave_room('123', 'room')
         s.manager.leave_room.assert_called_once_with('123', '/', 'room')
 
+    def test_enter_leave_room_filter(self, eio):
+        mgr = mock.MagicMock()
+        s = server.Server(client_manager=mgr)
+        s.enter_room(None, 'room', room_filter='foo')
+        s.manager.enter_room.assert_called_once_with(None, '/', 'room',
+                                                     room_filter='foo')
+        s.leave_room(None, 'room', namespace='/foo', room_filter=['a', 'b'])
+        s.manager.leave_room.assert_called_once_with(None, '/foo', 'room',
+                                                     room_filter=['a', 'b'])
+
+    def test_room_filter_required(self, eio):
+        mgr = mock.MagicMock()
+        s = server.Server(client_manager=mgr)
+        with pytest.raises(ValueError):
+            s.enter_room(None, 'room')
+        with pytest.raises(ValueError):
+            s.leave_room(None, 'room')
+        with pytest.raises(ValueError):
+            s.disconnect(None)
+        s.manager.enter_room.assert_not_called()
+        s.manager.leave_room.assert_not_called()
+        s.manager.disconnect.assert_not_called()
+
     def test_close_room(self, eio):
         mgr = mock.MagicMock()
         s = server.Server(client_manager=mgr)
@@ -836,6 +877,21 @@ class TestServer:
         s.disconnect('1', ignore_queue=True)
         s.eio.send.assert_any_call('123', '1')
 
+    def test_disconnect_room_filter(self, eio):
+        s = server.Server()
+        s.handlers['/'] = {}
+        s._handle_eio_connect('123', 'environ')
+        s._handle_eio_message('123', '0')
+        s._handle_eio_connect('456', 'environ')
+        s._handle_eio_message('456', '0')
+        s.enter_room('1', 'room')
+        s.disconnect(None, room_filter='room')
+        s.eio.send.assert_any_call('123', '1')
+        assert not s.manager.is_connected('1', '/')
+        assert s.manager.is_connected('2', '/')
+        s.disconnect(None, room_filter=['1', '2'])
+        assert not s.manager.is_connected('2', '/')
+
     def test_disconnect_namespace(self, eio):
         s = server.Server()
         s.handlers['/foo'] = {}
@@ -0,0 +1,183 @@
+import socket
+import sys
+import threading
+import time
+from unittest import mock
+
+import pytest
+
+from socketio import zmq_manager
+from socketio.zmq_manager import ZmqManager
+
+zmq = pytest.importorskip('zmq')
+
+
+def free_ports():
+    sockets = [socket.socket() for _ in range(2)]
+    for s in sockets:
+        s.bind(('127.0.0.1', 0))
+    ports = [s.getsockname()[1] for s in sockets]
+    for s in sockets:
+        s.close()
+    return ports
+
+
+class FakeSocket:
+    def __init__(self, messages=None):
+        self.sent = []
+        self.messages = messages or []
+        self.options = {}
+        self.url = None
+
+    def connect(self, url):
+        self.url = url
+
+    def setsockopt(self, option, value):
+        self.options[option] = value
+
+    def send(self, message):
+        self.sent.append(message)
+
+    def recv(self):
+        # an IndexError ends the test when there are no more messages
+        return self.messages.pop(0)
+
+
+class TestZmqManager:
+    def test_zmq_not_installed(self):
+        with mock.patch.object(zmq_manager, 'zmq', None):
+            with pytest.raises(RuntimeError):
+                ZmqManager()
+            with pytest.raises(RuntimeError):
+                zmq_manager.zmq_forwarder()
+
+    def test_parse_url(self):
+        assert zmq_manager.parse_zmq_url('zmq+tcp://localhost:5555+5556') == \
+            ('tcp://localhost:5555', 'tcp://localhost:5556')
+        assert zmq_manager.parse_zmq_url('zmq+tcp://host5555:5555+6666') == \
+            ('tcp://host5555:5555', 'tcp://host5555:6666')
+        with pytest.raises(RuntimeError):
+            ZmqManager('zmq+tcp://localhost:5555')
+        with pytest.raises(RuntimeError):
+            ZmqManager('tcp://localhost:5555+5556')
+
+    def test_zmq_module(self):
+        pm = ZmqManager()
+        assert pm._zmq() == zmq
+        pm.set_server(mock.MagicMock(async_mode='threading'))
+        assert pm._zmq() == zmq
+
+        green = mock.MagicMock()
+        pm.server.async_mode = 'eventlet'
+        with mock.patch.dict(sys.modules, {'eventlet': mock.MagicMock(),
+                                           'eventlet.green': green}):
+            assert pm._zmq() == green.zmq
+        pm.server.async_mode = 'gevent'
+        with mock.patch.dict(sys.modules, {'zmq.green': green}):
+            assert pm._zmq() == green
+
+    def test_publish(self):
+        pm = ZmqManager(channel='foo')
+        sink = FakeSocket()
+        pm._socket = mock.MagicMock(return_value=sink)
+        pm._publish({'method': 'emit', 'value': 'foo'})
+        pm._publish({'method': 'emit', 'value': 'bar'})
+        pm._socket.assert_called_once_with(zmq.PUSH, 'tcp://localhost:5555')
+        assert sink.sent == [
+            b'foo\0{"method": "emit", "value": "foo"}',
+            b'foo\0{"method": "emit", "value": "bar"}',
+        ]
+
+    def test_publish_msgpack(self):
+        pm = ZmqManager(serializer='msgpack')
+        pm.sink = FakeSocket()
+        pm._publish({'method': 'emit', 'value': b'foo'})
+        assert pm._decode_message(pm.sink.sent[0][9:]) == \
+            {'method': 'emit', 'value': b'foo'}
+
+    def test_listen(self):
+        pm = ZmqManager(channel='foo')
+        sub = FakeSocket(messages=[b'foo\0one', b'foobar\0two', b'foo',
+                                   b'foo\0three'])
+        pm._socket = mock.MagicMock(return_value=sub)
+        messages = []
+        with pytest.raises(IndexError):
+            for message in pm._listen():
+                messages.append(message)
+        pm._socket.assert_called_once_with(zmq.SUB, 'tcp://localhost:5556')
+        assert sub.options == {zmq.SUBSCRIBE: b'foo\0'}
+        assert messages == [b'one', b'three']
+
+    def test_forwarder(self):
+        url = 'zmq+tcp://127.0.0.1:{}+{}'.format(*free_ports())
+        context = zmq.Context()
+        forwarder = threading.Thread(target=zmq_manager.zmq_forwarder,
+                                     args=(url, context))
+        forwarder.start()
+
+        sender = ZmqManager(url, write_only=True)
+        other_sender = ZmqManager(url, channel='socketio2', write_only=True)
+        receiver = ZmqManager(url)
+        received = []
+
+        def listen():
+            for message in receiver._listen():
+                received.append(receiver._decode_message(message))
+                break
+
+        listener = threading.Thread(target=listen)
+        listener.start()
+        # subscriptions take some time to reach the forwarder
+        start = time.time()
+        while listener.is_alive() and time.time() - start < 5:
+            other_sender._publish({'method': 'emit', 'value': 'bar'})
+            sender._publish({'method': 'emit', 'value': 'foo'})
+            listener.join(0.05)
+        assert received == [{'method': 'emit', 'value': 'foo'}]
+
+        for pm in [sender, other_sender, receiver]:
+            pm.context.destroy(linger=0)
+        context.term()
+        forwarder.join()
+
+    def test_single_frame_broker(self):
+        sink_port, sub_port = free_ports()
+        url = f'zmq+tcp://127.0.0.1:{sink_port}+{sub_port}'
+        context = zmq.Context()
+        receiver = context.socket(zmq.PULL)
+        receiver.bind(f'tcp://127.0.0.1:{sink_port}')
+        publisher = context.socket(zmq.PUB)
+        publisher.bind(f'tcp://127.0.0.1:{sub_port}')
+
+        def broker():
+            try:
+                while True:
+                    publisher.send(receiver.recv())
+            except zmq.ContextTerminated:
+                receiver.close(linger=0)
+                publisher.close(linger=0)
+
+        broker_thread = threading.Thread(target=broker)
+        broker_thread.start()
+
+        sender = ZmqManager(url, write_only=True)
+        receiver_pm = ZmqManager(url)
+        received = []
+
+        def listen():
+            for message in receiver_pm._listen():
+                received.append(receiver_pm._decode_message(message))
+                break
+
+        listener = threading.Thread(target=listen)
+        listener.start()
+        start = time.time()
+        while listener.is_alive() and time.time() - start < 5:
+            sender._publish({'method': 'emit', 'value': 'foo'})
+            listener.join(0.05)
+        assert received == [{'method': 'emit', 'value': 'foo'}]
+
+        for pm in [sender, receiver_pm]:
+            pm.context.destroy(linger=0)
+        context.term()
+        broker_thread.join()
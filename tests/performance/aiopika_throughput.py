@@ -0,0 +1,183 @@
+import asyncio
+import collections
+import enum
+import time
+import types
+
+import socketio
+from socketio import async_aiopika_manager
+
+ROUND_TRIP = 0.0005  # simulated broker round trip, in seconds
+PERSIST = 0.0002  # simulated cost of storing a persistent message
+MESSAGES = 2000
+
+
+class DeliveryMode(enum.IntEnum):
+    NOT_PERSISTENT = 1
+    PERSISTENT = 2
+
+
+class Message:
+    def __init__(self, body, delivery_mode):
+        self.body = body
+        self.delivery_mode = delivery_mode
+
+
+class Broker:
+    """A stand-in RabbitMQ broker with a single fanout queue."""
+    def __init__(self):
+        self.messages = asyncio.Queue()
+        self.slots = collections.deque()
+        self.unacked = []
+        self.acks = 0
+        self.slot_freed = asyncio.Event()
+
+    async def publish(self, message, routing_key):
+        if message.delivery_mode == DeliveryMode.PERSISTENT:
+            await asyncio.sleep(PERSIST)
+        # publisher confirm
+        await asyncio.sleep(ROUND_TRIP)
+        await self.messages.put(message)
+
+    def set_prefetch_count(self, prefetch_count):
+        self.slots.extend([0] * prefetch_count)
+
+    async def ack(self, message, multiple=False):
+        self.acks += 1
+        if multiple:
+            index = self.unacked.index(message)
+            freed = self.unacked[:index + 1]
+            del self.unacked[:index + 1]
+        else:
+            self.unacked.remove(message)
+            freed = [message]
+        # a message sent in place of an acknowledged one arrives after a
+        # round trip
+        self.slots.extend([time.time() + ROUND_TRIP] * len(freed))
+        self.slot_freed.set()
+
+    async def deliver(self):
+        while not self.slots:
+            self.slot_freed.clear()
+            await self.slot_freed.wait()
+        delay = self.slots.popleft() - time.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        message = await self.messages.get()
+        delivered = types.SimpleNamespace(body=message.body)
+        delivered.ack = lambda multiple=False: self.ack(delivered, multiple)
+        self.unacked.append(delivered)
+        return delivered
+
+
+class QueueIterator:
+    def __init__(self, broker):
+        self.broker = broker
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        pass
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        return await self.broker.deliver()
+
+
+class Channel:
+    def __init__(self, broker):
+        self.broker = broker
+
+    async def set_qos(self, prefetch_count):
+        self.broker.set_prefetch_count(prefetch_count)
+
+    async def declare_exchange(self, name, type):
+        return types.SimpleNamespace(publish=self.broker.publish)
+
+    async def declare_queue(self, **kwargs):
+        async def bind(exchange):
+            pass
+
+        return types.SimpleNamespace(
+            bind=bind, iterator=lambda: QueueIterator(self.broker))
+
+
+class Connection:
+    def __init__(self, broker):
+        self.broker = broker
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        pass
+
+    async def channel(self):
+        return Channel(self.broker)
+
+
+def use_broker(broker):
+    async def connect_robust(url):
+        return Connection(broker)
+
+    async_aiopika_manager.aio_pika = types.SimpleNamespace(
+        connect_robust=connect_robust, Message=Message,
+        DeliveryMode=DeliveryMode,
+        ExchangeType=types.SimpleNamespace(FANOUT='fanout'),
+        exceptions=types.SimpleNamespace(
+            ChannelInvalidStateError=type('ChannelInvalidStateError',
+                                          (Exception,), {})))
+
+
+async def test_publish(persistent, many):
+    broker = Broker()
+    use_broker(broker)
+    mgr = socketio.AsyncAioPikaManager(write_only=True, persistent=persistent)
+    messages = [{'method': 'emit', 'data': i} for i in range(MESSAGES)]
+    start = time.time()
+    if many:
+        for i in range(0, MESSAGES, 100):
+            await mgr._publish_many(messages[i:i + 100])
+    else:
+        for message in messages:
+            await mgr._publish(message)
+    return MESSAGES / (time.time() - start)
+
+
+async def test_receive(prefetch_count, ack_batch_size):
+    broker = Broker()
+    use_broker(broker)
+    mgr = socketio.AsyncAioPikaManager(prefetch_count=prefetch_count,
+                                       ack_batch_size=ack_batch_size)
+    for i in range(MESSAGES):
+        broker.messages.put_nowait(Message(b'message', 1))
+    received = 0
+    start = time.time()
+    listener = mgr._listen()
+    async for _ in listener:
+        received += 1
+        if received == MESSAGES:
+            break
+    elapsed = time.time() - start
+    await listener.aclose()
+    return MESSAGES / elapsed, broker.acks
+
+
+async def main():
+    for persistent, many in [(True, False), (False, False), (False, True)]:
+        rate = await test_publish(persistent, many)
+        print(f'aiopika_throughput (publish, persistent={persistent}, '
+              f'batched confirms={many}): {rate:.0f} messages/sec.')
+    for prefetch_count, ack_batch_size in [(1, 1), (100, 1), (100, 10),
+                                           (500, 50)]:
+        rate, acks = await test_receive(prefetch_count, ack_batch_size)
+        print(f'aiopika_throughput (receive, prefetch_count={prefetch_count}'
+              f', ack_batch_size={ack_batch_size}): {rate:.0f} '
+              f'messages/sec, {acks} acks.')
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,38 @@
+import asyncio
+import time
+
+from engineio.async_socket import AsyncSocket
+import socketio
+
+
+async def test(clients, emits=10):
+    s = socketio.AsyncServer(ping_timeout=3600)
+    for i in range(clients):
+        s.eio.sockets[str(i)] = AsyncSocket(s.eio, str(i))
+        await s._handle_eio_connect(str(i), 'environ')
+        await s._handle_eio_message(str(i), '0')
+
+    tasks = 0
+    loop = asyncio.get_running_loop()
+
+    def task_factory(loop, coro, **kwargs):
+        nonlocal tasks
+        tasks += 1
+        return asyncio.Task(coro, loop=loop, **kwargs)
+
+    loop.set_task_factory(task_factory)
+    start = time.time()
+    for i in range(emits):
+        await s.emit('test', 'hello')
+    latency = (time.time() - start) / emits
+    loop.set_task_factory(None)
+    for socket in s.eio.sockets.values():
+        assert socket.queue.qsize() == emits + 1
+    return tasks // emits, latency
+
+
+if __name__ == '__main__':
+    for clients in [1000, 10000, 100000]:
+        tasks, latency = asyncio.run(test(clients))
+        print(f'async_server_send_broadcast ({clients} clients):',
+              f'{tasks} tasks and {latency * 1000:.2f}ms per emit.')
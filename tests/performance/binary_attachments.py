@@ -0,0 +1,42 @@
+import time
+import socketio
+
+SIZES = [1, 4, 16, 64]  # MB
+
+
+class Server(socketio.Server):
+    def _send_packet(self, eio_sid, pkt):
+        pkt.encode()
+
+    def _send_eio_packet(self, eio_sid, eio_pkt):
+        eio_pkt.encode()
+
+
+def test(size, mode):
+    s = Server()
+    s._handle_eio_connect('123', 'environ')
+    s._handle_eio_message('123', '0')
+    buffer = bytes(size * 1024 * 1024)
+    start = time.time()
+    count = 0
+    while True:
+        if mode == 'bytes':
+            # the application copies its buffer into a bytes object
+            data = bytes(memoryview(buffer)[1:])
+        elif mode == 'memoryview':
+            data = memoryview(buffer)
+        else:
+            data = memoryview(buffer)[1:]
+        s.emit('test', data)
+        count += 1
+        if time.time() - start >= 2:
+            break
+    return count / (time.time() - start)
+
+
+if __name__ == '__main__':
+    for size in SIZES:
+        for mode in ['bytes', 'memoryview', 'memoryview slice']:
+            rate = test(size, mode)
+            print(f'binary_attachments ({size}MB, {mode}): {rate:.0f} '
+                  'events/sec.')
@@ -0,0 +1,59 @@
+import time
+import socketio
+
+ROUND_TRIP = 0.0005  # simulated broker round trip, in seconds
+EMITS = 100000
+
+
+class FakeBrokerManager(socketio.PubSubManager):
+    """A write-only pub/sub manager with a simulated broker that pays one
+    round trip per publish, or per pipeline of publishes."""
+    def __init__(self, **kwargs):
+        super().__init__(write_only=True, **kwargs)
+        self.round_trips = 0
+        self.published = 0
+
+    def _publish(self, data):
+        self._publish_many([data])
+
+    def _publish_many(self, messages):
+        for message in messages:
+            self._encode_message(message)
+        time.sleep(ROUND_TRIP)
+        self.round_trips += 1
+        self.published += len(messages)
+
+
+def test_manager(count):
+    mgr = FakeBrokerManager()
+    start = time.time()
+    for i in range(count):
+        mgr.emit('test', {'progress': i}, room=f'sid{i}')
+    return count / (time.time() - start), mgr.round_trips
+
+
+def test_emitter(count, batch_size, serializer='default', binary=None):
+    mgr = FakeBrokerManager(serializer=serializer)
+    emitter = socketio.Emitter(mgr, batch_size=batch_size)
+    start = time.time()
+    for i in range(0, count, batch_size):
+        emitter.emit_many([{'event': 'test', 'data': {'progress': j},
+                            'to': f'sid{j}', 'binary': binary}
+                           for j in range(i, min(i + batch_size, count))])
+    assert mgr.published == count
+    return count / (time.time() - start), mgr.round_trips
+
+
+if __name__ == '__main__':
+    rate, round_trips = test_manager(EMITS // 100)
+    print(f'emitter (write-only manager): {rate:.0f} emits/sec, '
+          f'{round_trips} round trips.')
+    for batch_size, serializer, binary in [(100, 'default', None),
+                                           (1000, 'default', None),
+                                           (1000, 'default', False),
+                                           (1000, 'msgpack', False)]:
+        rate, round_trips = test_emitter(EMITS, batch_size, serializer,
+                                         binary)
+        print(f'emitter (emit_many, batch_size={batch_size}, '
+              f'serializer={serializer}, binary={binary}): {rate:.0f} '
+              f'emits/sec, {round_trips} round trips.')
@@ -0,0 +1,100 @@
+import os
+import tempfile
+import threading
+import time
+from unittest import mock
+
+import socketio
+
+MESSAGES = 20000
+ROUND_TRIPS = 2000
+
+
+def make_server():
+    server = mock.MagicMock(async_mode='threading')
+    server.packet_class = socketio.packet.Packet
+
+    def start_background_task(target, *args):
+        thread = threading.Thread(target=target, args=args, daemon=True)
+        thread.start()
+        return thread
+
+    server.start_background_task = start_background_task
+    return server
+
+
+def test(receiver, sender):
+    receiver.set_server(make_server())
+    listener = receiver._listen()
+    message = {'method': 'emit', 'event': 'test', 'data': ['x' * 100],
+               'namespace': '/', 'room': None, 'sent': 0}
+
+    # wait until the receiver is subscribed
+    ready = threading.Event()
+
+    def publish_until_ready():
+        while not ready.is_set():
+            sender._publish({'method': 'ready'})
+            ready.wait(0.05)
+
+    threading.Thread(target=publish_until_ready, daemon=True).start()
+    while receiver._decode_message(next(listener))['method'] != 'ready':
+        pass
+    ready.set()
+    time.sleep(0.1)
+
+    received = 0
+
+    def receive():
+        nonlocal received
+        while received < MESSAGES:
+            data = receiver._decode_message(next(listener))
+            if data['method'] == 'emit':
+                received += 1
+
+    # messages are received in their own thread, as they would be in a
+    # different worker process
+    receiver_thread = threading.Thread(target=receive)
+    start = time.time()
+    receiver_thread.start()
+    for i in range(MESSAGES):
+        message['sent'] = time.perf_counter()
+        sender._publish(message)
+    receiver_thread.join()
+    elapsed = time.time() - start
+
+    # latency is measured with a single message in flight
+    latencies = []
+    for i in range(ROUND_TRIPS):
+        message['sent'] = time.perf_counter()
+        sender._publish(message)
+        data = receiver._decode_message(next(listener))
+        latencies.append(time.perf_counter() - data['sent'])
+    latencies.sort()
+    return (MESSAGES / elapsed, latencies[len(latencies) // 2],
+            latencies[len(latencies) * 99 // 100])
+
+
+def report(name, results):
+    rate, median, p99 = results
+    print(f'local_ipc ({name}): {rate:.0f} messages/sec, '
+          f'{median * 1000000:.0f}us median latency, '
+          f'{p99 * 1000000:.0f}us p99 latency.')
+
+
+if __name__ == '__main__':
+    path = os.path.join(tempfile.mkdtemp(), 'socketio.sock')
+    report('LocalIPCManager', test(
+        socketio.LocalIPCManager(path=path),
+        socketio.LocalIPCManager(path=path, write_only=True)))
+
+    try:
+        import redis
+        redis.Redis().ping()
+    except Exception:
+        print('local_ipc (RedisManager): skipped, no Redis server on '
+              'localhost.')
+    else:
+        report('RedisManager', test(
+            socketio.RedisManager('redis://'),
+            socketio.RedisManager('redis://', write_only=True)))
@@ -0,0 +1,42 @@
+import tracemalloc
+
+from bidict import bidict
+import socketio
+
+
+class BidictManager(socketio.Manager):
+    """Manager that stores every room in a bidict, as older releases did."""
+    def _create_room(self, namespace, room):
+        return bidict()
+
+
+class Server:
+    class eio:
+        id = 0
+
+        @classmethod
+        def generate_id(cls):
+            cls.id += 1
+            return f'sid{cls.id:016d}'
+
+    packet_class = socketio.packet.Packet
+
+
+def test(manager_class, clients):
+    m = manager_class()
+    m.set_server(Server)
+    tracemalloc.start()
+    for i in range(clients):
+        sid = m.connect(f'eio{i:016d}', '/')
+        m.enter_room(sid, '/', f'topic{i % 100}')
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return size
+
+
+if __name__ == '__main__':
+    for clients in [100000, 1000000]:
+        for manager_class in [BidictManager, socketio.Manager]:
+            size = test(manager_class, clients)
+            print(f'manager_memory: {manager_class.__name__} with {clients} '
+                  f'clients uses {size // clients} bytes per client.')
@@ -0,0 +1,38 @@
+import time
+from socketio import packet
+
+SHAPES = {
+    'text': (packet.EVENT, ['message', 'hello'], None, None),
+    'json': (packet.EVENT, ['message', {'foo': 'bar', 'baz': [1, 2, 3]}],
+             None, None),
+    'namespace_id': (packet.EVENT, ['message', 'hello'], '/chat', 123),
+    'ack': (packet.ACK, ['ok'], '/chat', 123),
+    'binary': (packet.EVENT, ['message', {'foo': b'bar'}], None, None),
+    'large_json': (packet.EVENT, ['message', [{'id': i, 'name': str(i)}
+                                              for i in range(10000)]],
+                   None, None),
+}
+
+
+def test(packet_type, data, namespace, id):
+    p = packet.Packet(packet_type, data, namespace=namespace, id=id)
+    start = time.time()
+    count = 0
+    while True:
+        eps = p.encode()
+        if isinstance(eps, list):
+            p = packet.Packet(encoded_packet=eps[0])
+            for ep in eps[1:]:
+                p.add_attachment(ep)
+        else:
+            p = packet.Packet(encoded_packet=eps)
+        count += 1
+        if time.time() - start >= 2:
+            break
+    return count / (time.time() - start)
+
+
+if __name__ == '__main__':
+    for name, shape in SHAPES.items():
+        rate = test(*shape)
+        print(f'packet_codec ({name}): {rate:.0f} packets/sec.')
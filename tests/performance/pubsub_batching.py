@@ -0,0 +1,44 @@
+import time
+import socketio
+
+ROUND_TRIP = 0.0005  # simulated broker round trip, in seconds
+EMITS = 5000
+
+
+class FakeQueueManager(socketio.PubSubManager):
+    """A pub/sub manager with a simulated message queue."""
+    def __init__(self, **kwargs):
+        super().__init__(write_only=True, **kwargs)
+        self.publishes = 0
+        self.latencies = []
+
+    def _publish(self, data):
+        time.sleep(ROUND_TRIP)
+        now = time.time()
+        self.publishes += 1
+        messages = data['messages'] if data['method'] == 'batch' else [data]
+        for message in messages:
+            self.latencies.append(now - message['data'][0])
+
+
+def test(batch_size, batch_interval):
+    mgr = FakeQueueManager(batch_size=batch_size,
+                           batch_interval=batch_interval)
+    start = time.time()
+    for i in range(EMITS):
+        mgr.emit('test', time.time())
+    while len(mgr.latencies) < EMITS:
+        time.sleep(0.001)
+    elapsed = time.time() - start
+    latency = sum(mgr.latencies) / len(mgr.latencies)
+    return EMITS / elapsed, mgr.publishes, latency
+
+
+if __name__ == '__main__':
+    for batch_size, batch_interval in [(None, 0), (10, 0.005), (100, 0.001),
+                                       (100, 0.005)]:
+        rate, publishes, latency = test(batch_size, batch_interval)
+        print(f'pubsub_batching (batch_size={batch_size}, '
+              f'batch_interval={batch_interval}): {rate:.0f} emits/sec, '
+              f'{publishes} publishes, {latency * 1000:.2f}ms average '
+              'latency.')
@@ -0,0 +1,54 @@
+import time
+import socketio
+
+SIZES = [64, 1024, 4096]  # KB
+
+
+class Server(socketio.Server):
+    def _send_packet(self, eio_sid, pkt):
+        pass
+
+    def _send_eio_packet(self, eio_sid, eio_pkt):
+        pass
+
+
+class FakeQueueManager(socketio.PubSubManager):
+    """A pub/sub manager with a local list as message queue."""
+    def __init__(self, queue, **kwargs):
+        super().__init__(**kwargs)
+        self.queue = queue
+
+    def _publish(self, data):
+        self.queue.append(self._encode_message(data))
+
+
+def test(size, serializer):
+    queue = []
+    sender = FakeQueueManager(queue, write_only=True, serializer=serializer)
+    # messages are delivered to the receiver directly, without a listener
+    receiver = FakeQueueManager(queue, write_only=True, serializer=serializer)
+    s = Server(client_manager=receiver)
+    s._handle_eio_connect('123', 'environ')
+    s._handle_eio_message('123', '0')
+    data = bytes(size * 1024)
+    start = time.time()
+    count = 0
+    queued_bytes = 0
+    while True:
+        sender.emit('test', data)
+        message = queue.pop()
+        queued_bytes += len(message)
+        receiver._handle_emit(receiver._decode_message(message))
+        count += 1
+        if time.time() - start >= 2:
+            break
+    elapsed = time.time() - start
+    return count / elapsed, queued_bytes / count / len(data)
+
+
+if __name__ == '__main__':
+    for size in SIZES:
+        for serializer in ['default', 'msgpack']:
+            rate, overhead = test(size, serializer)
+            print(f'pubsub_binary ({size}KB, {serializer}): {rate:.0f} '
+                  f'events/sec, {overhead:.2f} queued bytes per data byte.')
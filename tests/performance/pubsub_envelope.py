@@ -0,0 +1,45 @@
+import time
+import socketio
+
+SIZES = [1, 64]  # KB
+
+
+class Server(socketio.Server):
+    def _send_packet(self, eio_sid, pkt):
+        pass
+
+    def _send_eio_packet(self, eio_sid, eio_pkt):
+        pass
+
+
+def test(size, envelope, local):
+    sender = socketio.PubSubManager(write_only=True, envelope=envelope)
+    receiver = socketio.PubSubManager(write_only=True)
+    s = Server(client_manager=receiver)
+    s._handle_eio_connect('123', 'environ')
+    s._handle_eio_message('123', '0')
+    if local:
+        s.enter_room(receiver.sid_from_eio_sid('123', '/'), 'room')
+    message = sender._encode_message({
+        'method': 'emit', 'event': 'test',
+        'data': [{'items': ['x' * 100] * (size * 10)}], 'binary': False,
+        'namespace': '/', 'room': 'room', 'host_id': sender.host_id})
+    start = time.time()
+    count = 0
+    while True:
+        data = receiver._decode_message(message)
+        if data:
+            receiver._handle_emit(data)
+        count += 1
+        if time.time() - start >= 2:
+            break
+    return count / (time.time() - start)
+
+
+if __name__ == '__main__':
+    for size in SIZES:
+        for local in [False, True]:
+            for envelope in [False, True]:
+                rate = test(size, envelope, local)
+                print(f'pubsub_envelope ({size}KB, local_recipients={local}, '
+                      f'envelope={envelope}): {rate:.0f} messages/sec.')
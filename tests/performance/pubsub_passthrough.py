@@ -0,0 +1,46 @@
+import time
+import socketio
+
+SIZES = [1, 64]  # KB
+
+
+class Server(socketio.Server):
+    def _send_packet(self, eio_sid, pkt):
+        pass
+
+    def _send_eio_packet(self, eio_sid, eio_pkt):
+        eio_pkt.encode()
+
+
+def test(size, serializer, packet_passthrough):
+    sender = socketio.PubSubManager(write_only=True, serializer=serializer,
+                                    packet_passthrough=packet_passthrough)
+    sender._publish = lambda data: messages.append(
+        sender._encode_message(data))
+    messages = []
+    receiver = socketio.PubSubManager(write_only=True, serializer=serializer)
+    s = Server(client_manager=receiver)
+    s._handle_eio_connect('123', 'environ')
+    s._handle_eio_message('123', '0')
+    sender.emit('test', {'items': [{'id': i, 'name': 'x' * 90}
+                                   for i in range(size * 10)]})
+    message = messages[0]
+    start = time.time()
+    count = 0
+    while True:
+        # this is the work that each receiving host does for an emit
+        receiver._handle_emit(receiver._decode_message(message))
+        count += 1
+        if time.time() - start >= 2:
+            break
+    return count / (time.time() - start)
+
+
+if __name__ == '__main__':
+    for size in SIZES:
+        for serializer in ['default', 'msgpack']:
+            for packet_passthrough in [False, True]:
+                rate = test(size, serializer, packet_passthrough)
+                print(f'pubsub_passthrough ({size}KB, {serializer}, '
+                      f'packet_passthrough={packet_passthrough}): '
+                      f'{rate:.0f} messages/sec.')
@@ -0,0 +1,47 @@
+import time
+import socketio
+
+ROUND_TRIP = 0.0005  # simulated broker round trip, in seconds
+EMITS = 2000
+
+
+class FakeQueueManager(socketio.PubSubManager):
+    """A pub/sub manager with a simulated message queue."""
+    def __init__(self, **kwargs):
+        super().__init__(write_only=True, **kwargs)
+        self.publishes = 0
+
+    def _publish(self, data):
+        time.sleep(ROUND_TRIP)
+        self.publishes += 1
+
+
+def test(publish_queue_size, publish_queue_policy):
+    mgr = FakeQueueManager(publish_queue_size=publish_queue_size,
+                           publish_queue_policy=publish_queue_policy)
+    mgr.initialize()
+    latencies = []
+    start = time.time()
+    for i in range(EMITS):
+        emit_start = time.time()
+        mgr.emit('test', i)
+        latencies.append(time.time() - emit_start)
+    caller_time = time.time() - start
+    stats = mgr.get_publish_queue_stats()
+    while mgr.publishes + stats['dropped'] < EMITS:
+        time.sleep(0.001)
+        stats = mgr.get_publish_queue_stats()
+    latency = sum(latencies) / len(latencies)
+    return EMITS / caller_time, latency, max(latencies), stats
+
+
+if __name__ == '__main__':
+    for size, policy in [(None, 'block'), (100, 'block'),
+                         (100, 'drop_oldest'), (10000, 'block')]:
+        rate, latency, max_latency, stats = test(size, policy)
+        print(f'pubsub_publish_queue (publish_queue_size={size}, '
+              f'publish_queue_policy={policy}): {rate:.0f} emits/sec, '
+              f'{latency * 1000000:.1f}us average emit latency, '
+              f'{max_latency * 1000:.2f}ms max emit latency, '
+              f'peak depth {stats["peak_depth"]}, '
+              f'{stats["dropped"]} dropped.')
@@ -0,0 +1,108 @@
+import queue
+import threading
+import time
+import socketio
+
+HOSTS = 4
+CLIENTS = 50  # per host
+EMITS = 10000
+
+
+class Server(socketio.Server):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.received = 0
+        self.lock = threading.Lock()
+
+    def _send_packet(self, eio_sid, pkt):
+        pass
+
+    def _send_eio_packet(self, eio_sid, eio_pkt):
+        with self.lock:
+            self.received += 1
+
+
+class FakeBroker:
+    """An in-process message broker with one queue per subscriber."""
+    def __init__(self):
+        self.subscribers = {}
+        self.deliveries = 0
+
+    def subscribe(self, channel, subscriber):
+        self.subscribers.setdefault(channel, []).append(subscriber)
+
+    def publish(self, channel, message):
+        for subscriber in self.subscribers.get(channel, []):
+            self.deliveries += 1
+            subscriber.put(message)
+
+
+class FakeBrokerManager(socketio.PubSubManager):
+    """A pub/sub manager connected to the fake broker, with a global channel
+    and a channel for each host."""
+    def __init__(self, broker, **kwargs):
+        super().__init__(**kwargs)
+        self.broker = broker
+        self.queue = queue.Queue()
+        self.decoded = 0
+        broker.subscribe(self.channel, self.queue)
+        broker.subscribe(f'{self.channel}@{self.host_id}', self.queue)
+
+    def _publish(self, data):
+        channel = self.channel
+        if data.get('to_host'):
+            channel += '@' + data['to_host']
+        self.broker.publish(channel, self._encode_message(data))
+
+    def _listen(self):
+        while True:
+            yield self.queue.get()
+
+    def _decode_message(self, message):
+        self.decoded += 1
+        return super()._decode_message(message)
+
+
+def wait_for(condition):
+    while not condition():
+        time.sleep(0.001)
+
+
+def test(sid_directory):
+    broker = FakeBroker()
+    servers = []
+    for i in range(HOSTS):
+        mgr = FakeBrokerManager(broker, sid_directory=sid_directory)
+        servers.append(Server(client_manager=mgr, async_mode='threading'))
+    # clients are connected once all the hosts are listening, so that the
+    # directory is complete in all of them
+    sids = []
+    for i, s in enumerate(servers):
+        for j in range(CLIENTS):
+            eio_sid = f'{i}-{j}'
+            s._handle_eio_connect(eio_sid, 'environ')
+            s._handle_eio_message(eio_sid, '0')
+        sids += list(s.manager.rooms['/'][None])
+    if sid_directory:
+        wait_for(lambda: all(len(s.manager.sid_hosts) == (HOSTS - 1) * CLIENTS
+                             for s in servers))
+    wait_for(lambda: all(s.manager.queue.empty() for s in servers))
+    for s in servers:
+        s.manager.decoded = 0
+    broker.deliveries = 0
+
+    start = time.time()
+    for i in range(EMITS):
+        servers[0].emit('test', 'hello', to=sids[i % len(sids)])
+    wait_for(lambda: sum(s.received for s in servers) >= EMITS)
+    elapsed = time.time() - start
+    decoded = sum(s.manager.decoded for s in servers)
+    return EMITS / elapsed, broker.deliveries / EMITS, decoded / EMITS
+
+
+if __name__ == '__main__':
+    for sid_directory in [False, True]:
+        rate, deliveries, decoded = test(sid_directory)
+        print(f'pubsub_unicast (sid_directory={sid_directory}): {rate:.0f} '
+              f'emits/sec, {deliveries:.2f} broker deliveries and '
+              f'{decoded:.2f} decoded messages per emit.')
@@ -6,3 +6,17 @@ python namespace_packet.py
 python server_receive.py
 python server_send.py
 python server_send_broadcast.py
+python manager_memory.py
+python async_server_send_broadcast.py
+python packet_codec.py
+python binary_attachments.py
+python pubsub_binary.py
+python pubsub_batching.py
+python pubsub_unicast.py
+python pubsub_envelope.py
+python pubsub_passthrough.py
+python emitter.py
+python pubsub_publish_queue.py
+python aiopika_throughput.py
+python zmq_throughput.py
+python local_ipc.py
@@ -1,30 +1,55 @@
 import time
-import socketio
-
 
-class Server(socketio.Server):
-    def _send_packet(self, eio_sid, pkt):
-        pass
-
-    def _send_eio_packet(self, eio_sid, eio_pkt):
-        pass
+from engineio.payload import Payload
+from engineio.socket import Socket
+import socketio
 
 
-def test():
-    s = Server()
-    start = time.time()
-    count = 0
-    for i in range(100):
+def test(clients, data, polling=False):
+    s = socketio.Server(ping_timeout=3600)
+    for i in range(clients):
+        # real engine.io sockets are used, so that the packets go through the
+        # complete send path, including the encoding done by the transports
+        s.eio.sockets[str(i)] = Socket(s.eio, str(i))
         s._handle_eio_connect(str(i), 'environ')
         s._handle_eio_message(str(i), '0')
+        sid = s.manager.sid_from_eio_sid(str(i), '/')
+        s.enter_room(sid, 'room1' if i % 2 else 'room2')
+    sockets = list(s.eio.sockets.values())
+    for socket in sockets:
+        socket.poll()  # discard the connection packet
+    start = time.time()
+    count = 0
     while True:
-        s.emit('test', 'hello')
-        count += 1
+        s.emit('test', data)
+        s.emit('test', data, to='room1')
+        s.emit('test', data, to=['room1', 'room2'])
+        count += 3
+        for i, socket in enumerate(sockets):
+            packets = socket.poll()
+            if polling and i % 2:
+                # every other client uses the long-polling transport
+                Payload(packets=packets).encode()
+            else:
+                for pkt in packets:
+                    pkt.encode()
         if time.time() - start >= 5:
             break
-    return count
+    return count / (time.time() - start)
 
 
 if __name__ == '__main__':
-    count = test()
-    print('server_send:', count, 'packets received.')
+    for clients in [100, 10000]:
+        for name, data, polling in [
+                ('text, websocket', 'hello', False),
+                ('text, mixed', 'hello', True),
+                ('binary, websocket', b'hello', False),
+                ('binary, mixed', b'hello', True)]:
+            try:
+                rate = test(clients, data, polling=polling)
+            except Exception as exc:
+                print(f'server_send_broadcast ({clients} clients, {name}):',
+                      f'failed with {exc!r}')
+            else:
+                print(f'server_send_broadcast ({clients} clients, {name}):',
+                      f'{rate:.0f} emits/sec.')
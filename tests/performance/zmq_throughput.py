@@ -0,0 +1,50 @@
+import threading
+import time
+
+import zmq
+
+import socketio
+from socketio.zmq_manager import zmq_forwarder
+
+URL = 'zmq+tcp://127.0.0.1:5555+5556'
+MESSAGES = 20000
+WINDOW = 500  # below the zmq high water mark, so that nothing is dropped
+
+
+def test():
+    context = zmq.Context()
+    forwarder = threading.Thread(target=zmq_forwarder, args=(URL, context))
+    forwarder.start()
+    sender = socketio.ZmqManager(URL, write_only=True)
+    receiver = socketio.ZmqManager(URL)
+    receiver.sub = receiver._socket(zmq.SUB, receiver.sub_url)
+    receiver.sub.setsockopt(zmq.SUBSCRIBE, b'socketio')
+    # wait for the subscription to reach the forwarder
+    while True:
+        sender._publish({'method': 'emit', 'data': 'ready'})
+        if receiver.sub.poll(100):
+            break
+    while receiver.sub.poll(100):
+        receiver.sub.recv_multipart()
+    listener = receiver._listen()
+
+    message = {'method': 'emit', 'event': 'test', 'data': ['x' * 100],
+               'namespace': '/', 'room': None}
+    start = time.time()
+    for i in range(MESSAGES // WINDOW):
+        for j in range(WINDOW):
+            sender._publish(message)
+        for j in range(WINDOW):
+            receiver._decode_message(next(listener))
+    elapsed = time.time() - start
+
+    for mgr in [sender, receiver]:
+        mgr.context.destroy(linger=0)
+    context.term()
+    forwarder.join()
+    return MESSAGES / elapsed
+
+
+if __name__ == '__main__':
+    rate = test()
+    print(f'zmq_throughput: {rate:.0f} messages/sec.')